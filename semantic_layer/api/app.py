@@ -1,10 +1,13 @@
 """FastAPI application."""
 
-from contextlib import asynccontextmanager
-from typing import Dict, Any, Optional, Union, List
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+from typing import Awaitable, Dict, Any, Iterator, Optional, Union, List, TypeVar
 
 from fastapi import FastAPI, HTTPException, Request, Depends
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
 
 from semantic_layer.auth.base import BaseAuth, SecurityContext
@@ -15,19 +18,35 @@ from semantic_layer.cache.memory import MemoryCache
 from semantic_layer.cache.redis_cache import RedisCache
 from semantic_layer.config import get_settings
 from semantic_layer.drivers.base_driver import BaseDriver, ConnectionConfig
-from semantic_layer.orchestrator import QueryEngine
-from semantic_layer.exceptions import SemanticLayerError
+from semantic_layer.orchestrator import AdmissionController, QueryEngine, QueryJobManager
+from semantic_layer.orchestrator.admission import PRIORITY_INTERACTIVE
+from semantic_layer.orchestrator.limits import create_limit
+from semantic_layer.exceptions import OverloadedError, QueryTimeoutError, SemanticLayerError
 from semantic_layer.schema import Schema, SchemaLoader
 from semantic_layer.api.middleware import get_security_context, check_authorization
 from semantic_layer.api.graphql import create_graphql_router
 from semantic_layer.api.sql_api import execute_sql_query, SQLQueryRequest
-from semantic_layer.monitoring import QueryLogger, MetricsCollector
+from semantic_layer.monitoring import EventBus, QueryLogger, MetricsCollector, SlowQueryLog
+from semantic_layer.monitoring.handlers import SlowQueryCallbackHandler
+from semantic_layer.monitoring.log_sink import JSONLLogSink
+from semantic_layer.monitoring.timings import StageTimings, collect_timings, stage
+from semantic_layer.monitoring.tracing import (
+    SPAN_KIND_SERVER,
+    BatchSpanProcessor,
+    Span,
+    TraceContext,
+    Tracer,
+    create_exporter,
+)
 from semantic_layer.sql import SQLBuilder
 from semantic_layer.utils.file_watcher import FileWatcher
 from semantic_layer.pre_aggregations.manager import PreAggregationManager
 from semantic_layer.pre_aggregations.storage import DatabasePreAggregation
 from semantic_layer.pre_aggregations.scheduler import PreAggregationScheduler
+from semantic_layer.pre_aggregations.refresh_keys import RefreshKeyStore
 from semantic_layer.pre_aggregations.base import PreAggregationDefinition
+from semantic_layer.pre_aggregations.advisor import PreAggregationAdvisor, proposals_to_yaml
+from semantic_layer.scheduling.jobs import JobStatus
 
 # Import PostgreSQL driver conditionally
 try:
@@ -47,6 +66,74 @@ query_logger: Optional[QueryLogger] = None
 metrics_collector: Optional[MetricsCollector] = None
 pre_aggregation_manager: Optional[PreAggregationManager] = None
 pre_aggregation_scheduler: Optional[PreAggregationScheduler] = None
+query_job_manager: Optional[QueryJobManager] = None
+event_bus: Optional[EventBus] = None
+tracer: Optional[Tracer] = None
+slow_query_log: Optional[SlowQueryLog] = None
+
+# How often a running query checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 0.5
+
+T = TypeVar("T")
+
+
+async def run_while_connected(http_request: Request, awaitable: Awaitable[T]) -> T:
+    """Run a query, cancelling it (down to the database) if the client disconnects."""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                task.cancel()
+                return await task
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+@contextmanager
+def traced_request(http_request: Request, route: str) -> Iterator[Optional[Span]]:
+    """Trace a request, continuing the trace of its traceparent header (if any)."""
+    if tracer is None:
+        yield None
+        return
+    with tracer.start_span(
+        f"{http_request.method} {route}",
+        context=TraceContext.from_headers(http_request.headers),
+        attributes={"http.method": http_request.method, "http.route": route},
+        kind=SPAN_KIND_SERVER,
+    ) as span:
+        yield span
+
+
+# Stages timed by the API rather than the query engine
+API_STAGES = ("parse", "encode")
+
+
+def timed_response(
+    result: Dict[str, Any], timings: StageTimings, include_timings: bool = False
+) -> JSONResponse:
+    """Encode a query result, reporting its stage timings.
+
+    The timings go into the Server-Timing header, and into meta.timings
+    (or a top-level "timings" key for blending queries) when requested.
+    """
+    if include_timings:
+        # Copied so a cached result does not keep this request's timings
+        if "meta" in result:
+            result = {**result, "meta": {**result["meta"], "timings": timings.to_dict()}}
+        else:
+            result = {**result, "timings": timings.to_dict()}
+    with collect_timings() as encode_timings:
+        with stage("encode"):
+            response = JSONResponse(content=jsonable_encoder(result))
+    timings.merge(encode_timings)
+    if metrics_collector:
+        metrics_collector.record_stages({name: timings.get(name) for name in API_STAGES})
+    response.headers["Server-Timing"] = timings.server_timing()
+    return response
 
 
 def register_pre_aggregations() -> None:
@@ -70,6 +157,9 @@ def register_pre_aggregations() -> None:
                     time_dimension=pre_agg_data.get("time_dimension"),
                     granularity=pre_agg_data.get("granularity"),
                     refresh_key=pre_agg_data.get("refresh_key"),
+                    depends_on=pre_agg_data.get("depends_on"),
+                    lambda_mode=pre_agg_data.get("lambda", False),
+                    indexes=pre_agg_data.get("indexes"),
                 )
                 pre_aggregation_manager.register(definition)
                 print(f"Registered pre-aggregation: {definition.name} for cube {cube.name}")
@@ -83,7 +173,7 @@ def reload_schema() -> None:
         schema = SchemaLoader.load_default()
         if query_engine:
             query_engine.schema = schema
-            query_engine.sql_builder = SQLBuilder(schema)
+            query_engine.sql_builder = SQLBuilder(schema, dialect=query_engine.sql_builder.dialect)
         register_pre_aggregations()
         print(f"Schema reloaded: {len(schema.cubes)} cubes")
     except Exception as e:
@@ -94,17 +184,47 @@ def reload_schema() -> None:
 async def lifespan(app: FastAPI):
     """Manage application lifespan."""
     global query_engine, schema, cache, auth, connector, file_watcher, query_logger
-    global pre_aggregation_manager, pre_aggregation_scheduler
+    global pre_aggregation_manager, pre_aggregation_scheduler, query_job_manager, event_bus, tracer
+    global slow_query_log
 
     # Startup
     settings = get_settings()
     
     # Initialize query logger
-    query_logger = QueryLogger(enabled=True)
+    query_log_sink = None
+    if settings.query_log_path:
+        query_log_sink = JSONLLogSink(
+            settings.query_log_path,
+            max_file_bytes=settings.query_log_max_file_bytes,
+            max_files=settings.query_log_max_files,
+            cache_hit_sample_rate=settings.query_log_cache_hit_sample_rate,
+        )
+        query_log_sink.start()
+    query_logger = QueryLogger(
+        enabled=True,
+        max_entries=settings.query_log_max_entries,
+        sink=query_log_sink,
+        echo=settings.query_log_stdout,
+    )
     
     # Initialize metrics collector
     metrics_collector = MetricsCollector(enabled=True)
 
+    # Spans are exported in batches in the background
+    if settings.tracing_enabled:
+        exporter = create_exporter(
+            settings.tracing_exporter,
+            otlp_endpoint=settings.tracing_otlp_endpoint,
+            file_path=settings.tracing_file_path,
+            service_name=settings.tracing_service_name,
+        )
+        tracer = Tracer(
+            BatchSpanProcessor(exporter),
+            service_name=settings.tracing_service_name,
+            sample_rate=settings.tracing_sample_rate,
+        )
+        tracer.processor.start()
+
     # Load schema
     try:
         schema = SchemaLoader.load_default()
@@ -161,6 +281,22 @@ async def lifespan(app: FastAPI):
     # Store connector in app state for SQL API
     app.state.connector = connector
 
+    # One admission queue for queries and rollup builds, starting at the pool size
+    admission_controller = None
+    if settings.query_queue_enabled:
+        admission_controller = AdmissionController(
+            max_queue_depth=settings.query_queue_max_depth,
+            tenant_weights=settings.query_queue_tenant_weights,
+            limit=create_limit(
+                settings.query_concurrency_limit,
+                initial_limit=settings.database_pool_size,
+                min_limit=settings.query_concurrency_min,
+                max_limit=settings.query_concurrency_max
+                or settings.database_pool_size + settings.database_max_overflow,
+            ),
+            metrics_collector=metrics_collector,
+        )
+
     # Initialize pre-aggregation storage and manager
     if settings.pre_aggregations_enabled:
         try:
@@ -169,6 +305,8 @@ async def lifespan(app: FastAPI):
                 schema,
                 connector,
                 storage=pre_agg_storage,
+                query_logger=query_logger,
+                auto_index_min_filters=settings.pre_aggregations_auto_index_min_filters,
             )
             # Register pre-aggregations from schema
             register_pre_aggregations()
@@ -177,8 +315,12 @@ async def lifespan(app: FastAPI):
             pre_aggregation_scheduler = PreAggregationScheduler(
                 pre_aggregation_manager,
                 connector,
+                refresh_key_store=RefreshKeyStore(settings.pre_aggregations_refresh_key_path),
+                max_concurrency=settings.pre_aggregations_refresh_concurrency,
+                startup_jitter_seconds=settings.pre_aggregations_refresh_startup_jitter,
+                interval_jitter=settings.pre_aggregations_refresh_interval_jitter,
+                admission_controller=admission_controller,
             )
-            await pre_aggregation_scheduler.start()
             print("Pre-aggregations enabled")
         except Exception as e:
             print(f"Warning: Pre-aggregations not available: {e}")
@@ -197,11 +339,58 @@ async def lifespan(app: FastAPI):
         query_logger=query_logger,
         pre_aggregation_manager=pre_aggregation_manager,
         metrics_collector=metrics_collector,
+        admission_controller=admission_controller,
+        query_timeout=settings.query_timeout_seconds,
+        tracer=tracer,
     )
+
+    # Slow statements are recorded, with their plans, from the SQL callbacks
+    slow_query_handler = None
+    if settings.slow_query_log_enabled:
+        slow_query_log = SlowQueryLog(max_entries=settings.slow_query_max_entries)
+        slow_query_handler = SlowQueryCallbackHandler(
+            slow_query_log,
+            connector=connector if settings.slow_query_explain else None,
+            threshold_ms=settings.slow_query_threshold_ms,
+            explain_interval=settings.slow_query_explain_interval,
+            max_explains_per_minute=settings.slow_query_max_explains_per_minute,
+            admission_controller=admission_controller,
+        )
+        query_engine.callback_manager.add_callback(slow_query_handler)
     
+    # Callback handlers run in the background instead of in each request
+    if settings.callback_event_bus_enabled:
+        event_bus = EventBus(
+            max_size=settings.callback_event_bus_max_size,
+            overflow_policy=settings.callback_event_bus_overflow_policy,
+            sample_rate=settings.callback_event_bus_sample_rate,
+        )
+        event_bus.start()
+        query_engine.callback_manager.event_bus = event_bus
+
     # Store query_engine in app state for GraphQL
     app.state.query_engine = query_engine
 
+    # Long-running queries continue as jobs clients can poll
+    result_store = None
+    if settings.query_job_result_path:
+        try:
+            from semantic_layer.storage.parquet_storage import ParquetStorage
+            result_store = ParquetStorage(settings.query_job_result_path)
+        except ImportError as e:
+            print(f"Warning: Parquet job results not available, keeping them in memory: {e}")
+    query_job_manager = QueryJobManager(
+        query_engine,
+        result_store=result_store,
+        result_ttl=settings.query_job_result_ttl,
+        max_jobs=settings.query_job_max_jobs,
+    )
+
+    # Start refreshing pre-aggregations once refresh callbacks are available
+    if pre_aggregation_scheduler:
+        pre_aggregation_scheduler.callback_manager = query_engine.callback_manager
+        await pre_aggregation_scheduler.start()
+
     # Add GraphQL router if available
     try:
         graphql_router = create_graphql_router(query_engine)
@@ -235,6 +424,14 @@ async def lifespan(app: FastAPI):
     # Shutdown
     if pre_aggregation_scheduler:
         await pre_aggregation_scheduler.stop()
+    if event_bus:
+        await event_bus.stop()
+    if slow_query_handler:
+        await slow_query_handler.flush()
+    if query_log_sink:
+        await query_log_sink.stop()
+    if tracer:
+        await tracer.processor.stop()
     await connector.disconnect()
     if cache and hasattr(cache, "disconnect"):
         await cache.disconnect()
@@ -273,6 +470,8 @@ def create_app() -> FastAPI:
         order_by: list[Dict[str, Any]] = []
         limit: int | None = None
         offset: int | None = None
+        totals: bool = False  # Add a grand total row
+        subtotals: bool = False  # Add subtotal rows rolling up the dimensions
 
     # Error handler
     @app.exception_handler(SemanticLayerError)
@@ -283,6 +482,23 @@ def create_app() -> FastAPI:
             detail={"message": exc.message, "details": exc.details},
         )
 
+    @app.exception_handler(OverloadedError)
+    async def overloaded_error_handler(request: Request, exc: OverloadedError):
+        """Reject requests while the query queue is full."""
+        return JSONResponse(
+            status_code=429,
+            content={"detail": {"message": exc.message, "details": exc.details}},
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+
+    @app.exception_handler(QueryTimeoutError)
+    async def query_timeout_error_handler(request: Request, exc: QueryTimeoutError):
+        """Report queries that ran past their deadline."""
+        return JSONResponse(
+            status_code=504,
+            content={"detail": {"message": exc.message, "details": exc.details}},
+        )
+
     # Health check
     @app.get("/health")
     async def health_check():
@@ -293,6 +509,10 @@ def create_app() -> FastAPI:
     @app.post("/api/v1/query")
     async def query(
         request: Union[QueryRequest, List[QueryRequest]],
+        http_request: Request,
+        continue_wait: Optional[float] = None,
+        timeout: Optional[float] = None,
+        timings: bool = False,
         security_context: Optional[SecurityContext] = Depends(get_security_context),
     ):
         """Execute a semantic query or multiple queries (blending query).
@@ -300,43 +520,154 @@ def create_app() -> FastAPI:
         Supports:
         - Single query: {"dimensions": [...], "measures": [...]}
         - Blending query: [{"dimensions": [...]}, {"measures": [...]}]
+
+        Blended queries run concurrently, at most as many at once as the
+        database pool has connections. A query that fails is reported as
+        {"error": {...}} in its slot without failing the others.
+
+        The X-Query-Priority header (interactive, background or refresh;
+        default interactive) sets the admission class. When the query queue
+        is full the request is rejected with 429 and a Retry-After header.
+
+        A single query still running after ``continue_wait`` seconds
+        (default: the query_continue_wait_seconds setting) keeps running as
+        a job; the response is 202 with its job_id, to poll at
+        /api/v1/jobs/{job_id}. Submitting the same query again attaches to
+        the running job.
+
+        Queries that are not continued as jobs must finish within
+        ``timeout`` seconds (default: the query_timeout_seconds setting), or
+        the request fails with 504. They are cancelled, on the database as
+        well, when the client disconnects.
+
+        The Server-Timing header breaks the request down into stages (parse,
+        optimize, pre_aggregation, cache, compile, queue, database, decode,
+        format, encode); with ``timings=true`` the breakdown is also returned
+        as meta.timings.
+
+        With tracing enabled, the request is traced as a span with a child
+        per stage, continuing the trace of an incoming traceparent header.
         """
+        with traced_request(http_request, "/api/v1/query") as span:
+            with collect_timings() as stage_timings:
+                result = await run_query(
+                    request, http_request, continue_wait, timeout, security_context
+                )
+            if not isinstance(result, Response):
+                result = timed_response(result, stage_timings, include_timings=timings)
+            if span is not None:
+                span.set_attribute("http.status_code", result.status_code)
+            return result
+
+    async def run_query(
+        request: Union[QueryRequest, List[QueryRequest]],
+        http_request: Request,
+        continue_wait: Optional[float],
+        timeout: Optional[float],
+        security_context: Optional[SecurityContext],
+    ) -> Union[Dict[str, Any], Response]:
+        """Execute the queries of a query request."""
         if query_engine is None:
             raise HTTPException(status_code=503, detail="Query engine not initialized")
 
         from semantic_layer.query.parser import QueryParser
 
+        priority = http_request.headers.get("X-Query-Priority", PRIORITY_INTERACTIVE).lower()
+
         # Check if array (blending query)
         if isinstance(request, list):
-            # Blending query - execute multiple queries
-            results = []
-            for query_req in request:
-                # Check authorization for each query
-                if security_context:
-                    await check_authorization(query_req, "query", "execute")
-                
-                # Parse and execute each query
-                query_obj = QueryParser.parse(query_req.dict())
-                user_context = security_context.to_dict() if security_context else None
-                result = await query_engine.execute(query_obj, user_context=user_context)
-                results.append(result)
+            # Blending query - one authorization check covers every query
+            if security_context:
+                await check_authorization(http_request, "query", "execute")
+            user_context = security_context.to_dict() if security_context else None
+
+            results: List[Optional[Dict[str, Any]]] = [None] * len(request)
+            parsed = []
+            for index, query_req in enumerate(request):
+                try:
+                    with stage("parse"):
+                        parsed.append((index, QueryParser.parse(query_req.dict())))
+                except (SemanticLayerError, ValueError) as e:
+                    results[index] = {"error": {"message": str(e), "details": {}}}
+
+            executed = await run_while_connected(
+                http_request,
+                query_engine.execute_many(
+                    [query_obj for _, query_obj in parsed],
+                    user_context=user_context,
+                    priority=priority,
+                    timeout=timeout,
+                ),
+            )
+            for (index, _), result in zip(parsed, executed):
+                results[index] = result
             
             # Return array of results
-            return {"data": results, "blending_query": True}
+            return {
+                "data": results,
+                "blending_query": True,
+                "error_count": sum(1 for result in results if "error" in result),
+            }
         
         # Single query (regular or compare date range)
         # Check authorization
         if security_context:
-            await check_authorization(request, "query", "execute")
+            await check_authorization(http_request, "query", "execute")
 
         # Parse request
-        query_obj = QueryParser.parse(request.dict())
+        with stage("parse"):
+            query_obj = QueryParser.parse(request.dict())
 
         # Execute query with security context
         user_context = security_context.to_dict() if security_context else None
-        result = await query_engine.execute(query_obj, user_context=user_context)
+        wait_seconds = continue_wait
+        if wait_seconds is None:
+            wait_seconds = get_settings().query_continue_wait_seconds
+        if query_job_manager is None or wait_seconds <= 0:
+            return await run_while_connected(
+                http_request,
+                query_engine.execute(
+                    query_obj, user_context=user_context, priority=priority, timeout=timeout
+                ),
+            )
+
+        job = await query_job_manager.execute(
+            query_obj, user_context, wait_seconds=wait_seconds, priority=priority
+        )
+        if job.status == JobStatus.COMPLETED:
+            return await query_job_manager.get_result(job)
+        if job.status == JobStatus.FAILED:
+            raise job.exception
+        return JSONResponse(status_code=202, content={"error": "Continue wait", **job.to_dict()})
+
+    @app.get("/api/v1/jobs/{job_id}")
+    async def get_query_job(
+        job_id: str,
+        http_request: Request,
+        wait: float = 0,
+        security_context: Optional[SecurityContext] = Depends(get_security_context),
+    ):
+        """Get the status of a query job, and its result once completed.
+
+        ``wait`` long-polls: the response is held for up to that many
+        seconds (capped by query_job_max_wait_seconds) until the job ends.
+        """
+        if query_job_manager is None:
+            raise HTTPException(status_code=503, detail="Query jobs not available")
+        if security_context:
+            await check_authorization(http_request, "query", "execute")
 
-        return result
+        job = query_job_manager.get(job_id)
+        user_id = security_context.user_id if security_context else None
+        if job is None or job.user_id != user_id:
+            raise HTTPException(status_code=404, detail=f"Query job '{job_id}' not found")
+
+        max_wait = get_settings().query_job_max_wait_seconds
+        await query_job_manager.wait(job_id, min(max(wait, 0), max_wait))
+        response = job.to_dict()
+        if job.status == JobStatus.COMPLETED:
+            response["result"] = await query_job_manager.get_result(job)
+        return response
 
     # Schema endpoint
     @app.get("/api/v1/schema")
@@ -393,6 +724,24 @@ def create_app() -> FastAPI:
             return {"logs": query_logger.get_logs(limit=limit)}
         return {"logs": []}
 
+    @app.get("/api/v1/slow-queries")
+    async def get_slow_queries(
+        request: Request,
+        limit: int = 50,
+        security_context: Optional[SecurityContext] = Depends(get_security_context),
+    ):
+        """Get slow queries grouped by fingerprint, most total database time first.
+
+        Each group has its count and timings, its latest statement with its
+        parameters, and the latest EXPLAIN plan captured.
+        """
+        if security_context:
+            await check_authorization(request, "logs", "read")
+
+        if slow_query_log:
+            return {"slow_queries": slow_query_log.group_by_fingerprint(limit=limit)}
+        return {"slow_queries": []}
+
     # Reload schema endpoint
     @app.post("/api/v1/reload")
     async def reload_schema_endpoint(
@@ -416,9 +765,12 @@ def create_app() -> FastAPI:
         if security_context:
             await check_authorization(request, "metrics", "read")
         
-        if metrics_collector:
-            return metrics_collector.get_stats()
-        return {}
+        stats = metrics_collector.get_stats() if metrics_collector else {}
+        if event_bus:
+            stats["callback_events"] = event_bus.get_stats()
+        if tracer:
+            stats["tracing"] = tracer.processor.get_stats()
+        return stats
 
     # Pre-aggregations endpoints
     @app.get("/api/v1/pre-aggregations")
@@ -445,6 +797,38 @@ def create_app() -> FastAPI:
             ]
         }
 
+    @app.get("/api/v1/pre-aggregations/recommendations")
+    async def recommend_pre_aggregations(
+        request: Request,
+        limit: int = 10,
+        log_window: int = 10000,
+        min_queries: int = 2,
+        estimate_sizes: bool = False,
+        security_context: Optional[SecurityContext] = Depends(get_security_context),
+    ):
+        """Recommend pre-aggregations from the query log."""
+        if security_context:
+            await check_authorization(request, "pre_aggregations", "read")
+        
+        if not query_logger:
+            return {"recommendations": [], "yaml": ""}
+        
+        existing = []
+        if pre_aggregation_manager:
+            existing = list(pre_aggregation_manager._definitions.values())
+        advisor = PreAggregationAdvisor(
+            schema,
+            connector=connector if estimate_sizes else None,
+            existing=existing,
+            min_queries=min_queries,
+            max_proposals=limit,
+        )
+        proposals = await advisor.recommend(query_logger.get_logs(limit=log_window))
+        return {
+            "recommendations": [proposal.to_dict() for proposal in proposals],
+            "yaml": proposals_to_yaml(proposals),
+        }
+
     @app.post("/api/v1/pre-aggregations/{name}/refresh")
     async def refresh_pre_aggregation(
         name: str,
@@ -464,5 +848,32 @@ def create_app() -> FastAPI:
         except ValueError as e:
             raise HTTPException(status_code=404, detail=str(e))
 
+    @app.get("/api/v1/admin/queries")
+    async def list_active_queries(
+        request: Request,
+        security_context: Optional[SecurityContext] = Depends(get_security_context),
+    ):
+        """List the queries queued for or running on the database."""
+        if security_context:
+            await check_authorization(request, "admin", "read")
+        if query_engine is None:
+            raise HTTPException(status_code=503, detail="Query engine not initialized")
+        return {"queries": [active.to_dict() for active in query_engine.active_queries.list()]}
+
+    @app.delete("/api/v1/admin/queries/{query_id}")
+    async def kill_active_query(
+        query_id: str,
+        request: Request,
+        security_context: Optional[SecurityContext] = Depends(get_security_context),
+    ):
+        """Kill a running query; it is cancelled on the database as well."""
+        if security_context:
+            await check_authorization(request, "admin", "write")
+        if query_engine is None:
+            raise HTTPException(status_code=503, detail="Query engine not initialized")
+        if not query_engine.active_queries.kill(query_id):
+            raise HTTPException(status_code=404, detail=f"Active query '{query_id}' not found")
+        return {"status": "killed", "query_id": query_id}
+
     return app
 
@@ -40,8 +40,11 @@ class CacheKeyGenerator:
                 {"dimension": o.dimension, "direction": o.direction}
                 for o in query.order_by
             ],
+            "time_dimensions": [td.model_dump() for td in query.time_dimensions],
+            "grouping_sets": query.get_grouping_sets(),
             "limit": query.limit,
             "offset": query.offset,
+            "ctes": query.ctes,
             "user_context": user_context or {},
             "model_version": model_version,
         }
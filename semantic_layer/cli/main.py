@@ -1,5 +1,7 @@
 """Main CLI entry point."""
 
+import json
+
 import click
 from pathlib import Path
 
@@ -87,6 +89,96 @@ def test(path: str):
         exit(1)
 
 
+def _load_log_entries(path: Path) -> list:
+    """Load query log entries from a JSON or JSON Lines file.
+
+    JSON files may hold a list of entries or the ``/api/v1/logs`` response.
+    """
+    text = path.read_text()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(data, dict):
+        return data.get("logs", [])
+    return data
+
+
+@cli.command("recommend-pre-aggregations")
+@click.argument("path", type=click.Path(exists=True))
+@click.argument("logs", type=click.Path(exists=True))
+@click.option("--limit", default=10, help="Maximum number of proposals")
+@click.option("--min-queries", default=2, help="Minimum logged queries a proposal must answer")
+@click.option("--estimate-sizes", is_flag=True, help="Count candidate rows in the database")
+def recommend_pre_aggregations(
+    path: str, logs: str, limit: int, min_queries: int, estimate_sizes: bool
+):
+    """Recommend pre-aggregations from a query log export."""
+    import asyncio
+    from semantic_layer.pre_aggregations.advisor import PreAggregationAdvisor, proposals_to_yaml
+    from semantic_layer.pre_aggregations.base import PreAggregationDefinition
+
+    try:
+        path_obj = Path(path)
+        if path_obj.is_file():
+            schema = SchemaLoader.load_from_file(path_obj)
+        else:
+            schema = SchemaLoader.load_from_directory(path_obj)
+        entries = _load_log_entries(Path(logs))
+    except Exception as e:
+        click.echo(f"❌ Error: {e}", err=True)
+        exit(1)
+
+    existing = [
+        PreAggregationDefinition(
+            name=pre_agg["name"],
+            cube=cube_name,
+            dimensions=pre_agg.get("dimensions", []),
+            measures=pre_agg.get("measures", []),
+            time_dimension=pre_agg.get("time_dimension"),
+            granularity=pre_agg.get("granularity"),
+        )
+        for cube_name, cube in schema.cubes.items()
+        for pre_agg in (cube.pre_aggregations or [])
+    ]
+
+    async def run():
+        connector = None
+        if estimate_sizes:
+            from semantic_layer.config import get_settings
+            from semantic_layer.drivers import PostgresDriver
+            from semantic_layer.drivers.base_driver import ConnectionConfig
+
+            connector = PostgresDriver(ConnectionConfig(url=get_settings().database_url_async))
+            await connector.connect()
+        try:
+            advisor = PreAggregationAdvisor(
+                schema,
+                connector=connector,
+                existing=existing,
+                min_queries=min_queries,
+                max_proposals=limit,
+            )
+            return await advisor.recommend(entries)
+        finally:
+            if connector:
+                await connector.disconnect()
+
+    proposals = asyncio.run(run())
+    if not proposals:
+        click.echo("No pre-aggregations to recommend", err=True)
+        return
+
+    for rank, proposal in enumerate(proposals, 1):
+        size = f", ~{proposal.estimated_rows} rows" if proposal.estimated_rows is not None else ""
+        click.echo(
+            f"# {rank}. {proposal.definition.name}: {proposal.query_count} queries, "
+            f"{proposal.total_time_ms:.0f} ms{size}",
+            err=True,
+        )
+    click.echo(proposals_to_yaml(proposals))
+
+
 if __name__ == "__main__":
     cli()
 
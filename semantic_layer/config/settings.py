@@ -1,7 +1,7 @@
 """Application settings and configuration."""
 
 from functools import lru_cache
-from typing import Optional
+from typing import Dict, Optional
 from urllib.parse import quote_plus
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -67,6 +67,71 @@ class Settings(BaseSettings):
 
     # Pre-aggregations Configuration
     pre_aggregations_enabled: bool = True
+    pre_aggregations_refresh_key_path: Optional[str] = (
+        "./storage/pre_aggregations/refresh_keys.json"
+    )
+    pre_aggregations_refresh_concurrency: int = 2  # Keep well below database_pool_size
+    pre_aggregations_refresh_startup_jitter: float = 30.0  # Seconds to spread first builds over
+    pre_aggregations_refresh_interval_jitter: float = 0.1  # Fraction of each refresh interval
+    # Logged filters before a dimension is indexed
+    pre_aggregations_auto_index_min_filters: int = 10
+
+    # Query Admission Configuration
+    query_queue_enabled: bool = True
+    query_queue_max_depth: int = 100  # Queued queries before rejecting with 429
+    query_queue_tenant_weights: Dict[str, float] = {}  # Share of the pool per tenant (default 1)
+    query_concurrency_limit: str = "fixed"  # fixed, aimd or gradient
+    query_concurrency_min: int = 1  # Lowest limit an adaptive limit shrinks to
+    # Highest adaptive limit; default pool size + overflow
+    query_concurrency_max: Optional[int] = None
+
+    # Query Log Configuration
+    query_log_max_entries: int = 10000  # Entries kept in memory for /api/v1/logs
+    query_log_stdout: bool = False  # Print each entry to stdout, on the request path
+    query_log_path: Optional[str] = None  # Directory for rotating gzip JSONL files; none if unset
+    query_log_max_file_bytes: int = 64 * 1024 * 1024  # Compressed size at which a file is rotated
+    query_log_max_files: int = 20  # Files kept before the oldest is deleted
+    # Fraction of successful cache hits written to files
+    query_log_cache_hit_sample_rate: float = 1.0
+
+    # Callback Event Bus Configuration
+    # Run callback handlers in the background, off the request path
+    callback_event_bus_enabled: bool = True
+    callback_event_bus_max_size: int = 10000  # Events buffered before the overflow policy applies
+    callback_event_bus_overflow_policy: str = "drop_oldest"  # drop_oldest, drop_newest or sample
+    # Fraction of events the sample policy keeps under pressure
+    callback_event_bus_sample_rate: float = 0.1
+
+    # Tracing Configuration
+    tracing_enabled: bool = False  # Record OpenTelemetry-compatible spans of each query
+    tracing_exporter: str = "otlp"  # otlp, file or memory
+    # OTLP/HTTP collector; spans go to /v1/traces
+    tracing_otlp_endpoint: str = "http://localhost:4318"
+    tracing_file_path: Optional[str] = None  # JSONL file spans are appended to by the file exporter
+    tracing_service_name: str = "semanticquark"  # service.name the spans are reported under
+    # Fraction of new traces recorded; incoming traceparent flags win
+    tracing_sample_rate: float = 1.0
+
+    # Slow Query Log Configuration
+    slow_query_log_enabled: bool = True  # Record statements slower than the threshold
+    slow_query_threshold_ms: float = 1000.0  # Database time above which a statement is slow
+    slow_query_max_entries: int = 1000  # Slow queries kept in memory
+    # Capture plans with EXPLAIN ANALYZE (runs the statement again)
+    slow_query_explain: bool = False
+    # Seconds before a fingerprint's plan is captured again
+    slow_query_explain_interval: float = 600.0
+    slow_query_max_explains_per_minute: int = 6  # Plans captured per minute across fingerprints
+
+    # Query Job Configuration
+    # Default query deadline, enforced down to the database
+    query_timeout_seconds: Optional[float] = None
+    # Return a job ID for queries running longer; 0 always waits
+    query_continue_wait_seconds: float = 0.0
+    query_job_max_wait_seconds: float = 30.0  # Longest long-poll on a job
+    query_job_result_ttl: int = 3600  # Seconds finished jobs and their results are kept
+    query_job_max_jobs: int = 1000  # Jobs kept at once; submissions beyond get 429
+    # Directory for Parquet result files; in memory if unset
+    query_job_result_path: Optional[str] = None
 
     @computed_field
     def effective_database_url(self) -> str:
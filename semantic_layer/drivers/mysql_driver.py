@@ -1,5 +1,7 @@
 """MySQL connector implementation."""
 
+import asyncio
+import weakref
 from typing import Any, Dict, List, Optional
 
 try:
@@ -12,6 +14,12 @@ except ImportError:
 from typing import Optional, Dict, Any
 from semantic_layer.drivers.base_driver import BaseDriver, ConnectionConfig
 from semantic_layer.exceptions import ExecutionError
+from semantic_layer.monitoring.timings import stage
+from semantic_layer.utils.deadlines import remaining_seconds
+
+
+# Longest wait for a connection to send KILL QUERY on
+KILL_QUERY_TIMEOUT_SECONDS = 5.0
 
 
 class MySQLDriver(BaseDriver):
@@ -39,6 +47,8 @@ class MySQLDriver(BaseDriver):
             )
         super().__init__(config)
         self._pool: Optional[Any] = None
+        # Pooled connections a statement left a max_execution_time on
+        self._limited_connections: "weakref.WeakSet[Any]" = weakref.WeakSet()
     
     def initialize(self, config: Dict[str, Any]) -> None:
         """Initialize driver from config dict (PluginInterface method).
@@ -89,15 +99,48 @@ class MySQLDriver(BaseDriver):
             self._pool = None
 
     async def execute_query(self, sql: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-        """Execute SQL query and return results."""
+        """Execute SQL query and return results.
+
+        SELECTs are bounded by the current request deadline through
+        max_execution_time. If the calling task is cancelled, the statement
+        is stopped with KILL QUERY from another connection.
+        """
         if not self._pool:
             raise ExecutionError("Not connected to database")
 
+        remaining = remaining_seconds()
         async with self._pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                await cursor.execute(sql, params)
-                results = await cursor.fetchall()
-                return [dict(row) for row in results]
+                if remaining is not None:
+                    max_execution_ms = max(1, int(remaining * 1000))
+                    await cursor.execute(f"SET SESSION max_execution_time = {max_execution_ms}")
+                    self._limited_connections.add(conn)
+                elif conn in self._limited_connections:
+                    # 0 lifts the limit a previous statement set on this connection
+                    await cursor.execute("SET SESSION max_execution_time = 0")
+                    self._limited_connections.discard(conn)
+                try:
+                    await cursor.execute(sql, params)
+                    results = await cursor.fetchall()
+                except asyncio.CancelledError:
+                    await self._kill_query(conn.thread_id())
+                    # The connection is mid-statement; keep it out of the pool
+                    conn.close()
+                    raise
+                with stage("decode"):
+                    return [dict(row) for row in results]
+
+    async def _kill_query(self, thread_id: int) -> None:
+        """Stop the statement running on another connection."""
+        async def kill() -> None:
+            async with self._pool.acquire() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(f"KILL QUERY {int(thread_id)}")
+
+        try:
+            await asyncio.wait_for(kill(), KILL_QUERY_TIMEOUT_SECONDS)
+        except Exception as e:
+            print(f"Warning: Failed to kill MySQL query on connection {thread_id}: {e}")
 
     async def test_connection(self) -> bool:
         """Test database connection."""
@@ -8,7 +8,9 @@ from sqlalchemy.orm import sessionmaker
 
 from typing import Optional, Dict, Any
 from semantic_layer.drivers.base_driver import BaseDriver, ConnectionConfig
-from semantic_layer.exceptions import ExecutionError
+from semantic_layer.exceptions import ExecutionError, QueryTimeoutError
+from semantic_layer.monitoring.timings import stage
+from semantic_layer.utils.deadlines import remaining_seconds
 
 
 class PostgresDriver(BaseDriver):
@@ -78,7 +80,12 @@ class PostgresDriver(BaseDriver):
                 self.session_factory = None
 
     async def execute_query(self, sql: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-        """Execute a SQL query and return results."""
+        """Execute a SQL query and return results.
+
+        The statement is bounded by the current request deadline through
+        statement_timeout. Cancelling the calling task makes asyncpg send a
+        cancel request, so the statement stops on the server as well.
+        """
         if not self.engine:
             await self.connect()
 
@@ -86,12 +93,21 @@ class PostgresDriver(BaseDriver):
             # Use asyncpg directly for better performance
             conn = await asyncpg.connect(self.config.url.replace("+asyncpg", "").replace("postgresql://", "postgresql://"))
             try:
+                remaining = remaining_seconds()
+                if remaining is not None:
+                    await conn.execute(f"SET statement_timeout = {max(1, int(remaining * 1000))}")
                 rows = await conn.fetch(sql)
                 # Convert rows to list of dicts
-                results = [dict(row) for row in rows]
+                with stage("decode"):
+                    results = [dict(row) for row in rows]
                 return results
             finally:
                 await conn.close()
+        except asyncpg.exceptions.QueryCanceledError as e:
+            # statement_timeout fired before the engine's own deadline did
+            raise QueryTimeoutError(
+                f"Query did not finish within its deadline: {str(e)}", details={"sql": sql}
+            ) from e
         except Exception as e:
             raise ExecutionError(f"Query execution failed: {str(e)}", details={"sql": sql}) from e
 
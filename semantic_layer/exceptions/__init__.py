@@ -7,6 +7,9 @@ from semantic_layer.exceptions.base import (
     QueryError,
     ExecutionError,
     ValidationError,
+    OverloadedError,
+    QueryTimeoutError,
+    QueryCancelledError,
 )
 
 __all__ = [
@@ -16,5 +19,8 @@ __all__ = [
     "QueryError",
     "ExecutionError",
     "ValidationError",
+    "OverloadedError",
+    "QueryTimeoutError",
+    "QueryCancelledError",
 ]
 
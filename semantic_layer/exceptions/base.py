@@ -39,3 +39,22 @@ class ExecutionError(SemanticLayerError):
 
     pass
 
+
+class QueryTimeoutError(ExecutionError):
+    """Query did not finish before its deadline."""
+
+    pass
+
+
+class QueryCancelledError(ExecutionError):
+    """Query was cancelled while running."""
+
+    pass
+
+
+class OverloadedError(SemanticLayerError):
+    """Request rejected because the server is saturated."""
+
+    def __init__(self, message: str, retry_after: int = 1, details: dict | None = None):
+        super().__init__(message, details)
+        self.retry_after = retry_after
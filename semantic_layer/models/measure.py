@@ -1,16 +1,21 @@
 """Measure model definition."""
 
-from typing import Literal, Optional
+from typing import Any, Dict, Literal, Optional
 
-from pydantic import Field
+from pydantic import Field, field_validator, model_validator
 
 from semantic_layer.models.base import BaseModelDefinition
+from semantic_layer.utils.sketches import hll_sketch_sql, quantile_sketch_sql
+from semantic_layer.utils.time_windows import UNBOUNDED, parse_trailing
 
 
 class Measure(BaseModelDefinition):
     """Represents a measure in a cube."""
 
-    type: Literal["number", "count", "sum", "avg", "min", "max", "countDistinct", "calculated"] = Field(
+    type: Literal[
+        "number", "count", "sum", "avg", "min", "max", "countDistinct", "countDistinctApprox",
+        "percentile", "median", "calculated"
+    ] = Field(
         default="number", description="Aggregation type"
     )
     sql: str = Field(..., description="SQL expression for the measure")
@@ -18,6 +23,50 @@ class Measure(BaseModelDefinition):
     # Calculated measure support
     expression: Optional[str] = Field(None, description="SQL expression for calculated measure")
     formula: Optional[str] = Field(None, description="Formula for calculated measure (e.g., 'orders.revenue / orders.count')")
+    percentile: Optional[float] = Field(
+        None, description="Quantile (0-1) of a percentile measure, e.g. 0.95"
+    )
+    rolling_window: Optional[Dict[str, Any]] = Field(
+        None,
+        description=(
+            "Window over time buckets, e.g. {'trailing': '7 day'}; "
+            "'unbounded' for a running total"
+        ),
+    )
+
+    @field_validator("percentile")
+    @classmethod
+    def validate_percentile(cls, v: Optional[float]) -> Optional[float]:
+        """Validate percentile is a fraction."""
+        if v is not None and not 0 <= v <= 1:
+            raise ValueError(f"percentile must be between 0 and 1, got {v}")
+        return v
+
+    @field_validator("rolling_window")
+    @classmethod
+    def validate_rolling_window(cls, v: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Validate the trailing window and default it to unbounded."""
+        if v is None:
+            return v
+        window = dict(v)
+        window["trailing"] = str(window.get("trailing") or UNBOUNDED)
+        parse_trailing(window["trailing"])
+        return window
+
+    @model_validator(mode="after")
+    def validate_percentile_set(self) -> "Measure":
+        """Validate a percentile measure names the quantile it estimates."""
+        if self.type == "percentile" and self.percentile is None:
+            raise ValueError(f"Percentile measure '{self.name}' must set percentile")
+        return self
+
+    def get_quantile(self) -> float:
+        """Get the quantile a percentile or median measure estimates."""
+        if self.type == "median":
+            return 0.5
+        if self.percentile is None:
+            raise ValueError(f"Percentile measure '{self.name}' requires 'percentile'")
+        return self.percentile
 
     def get_sql_expression(self, table_alias: str = "") -> str:
         """Get SQL expression for this measure with aggregation."""
@@ -38,6 +87,12 @@ class Measure(BaseModelDefinition):
             return f"COUNT({sql_expr})"
         elif self.type == "countDistinct":
             return f"COUNT(DISTINCT {sql_expr})"
+        elif self.type == "countDistinctApprox":
+            # Returns a HyperLogLog sketch; the engine estimates the count
+            return hll_sketch_sql(sql_expr)
+        elif self.type in ("percentile", "median"):
+            # Returns a quantile sketch; the engine estimates the quantile
+            return quantile_sketch_sql(sql_expr)
         elif self.type == "sum":
             return f"SUM({sql_expr})"
         elif self.type == "avg":
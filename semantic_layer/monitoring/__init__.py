@@ -2,25 +2,50 @@
 
 # Legacy imports (backward compatibility)
 from semantic_layer.monitoring.logging import QueryLogger
+from semantic_layer.monitoring.log_sink import JSONLLogSink, read_query_log
 from semantic_layer.monitoring.metrics import MetricsCollector
+from semantic_layer.monitoring.slow_queries import SlowQueryLog
+from semantic_layer.monitoring.tracing import (
+    BatchSpanProcessor,
+    FileSpanExporter,
+    InMemorySpanExporter,
+    OTLPSpanExporter,
+    Span,
+    TraceContext,
+    Tracer,
+)
 
 # New callback-based system
 from semantic_layer.monitoring.callbacks import BaseQueryCallback
 from semantic_layer.monitoring.callback_manager import CallbackManager
+from semantic_layer.monitoring.event_bus import EventBus
 
 # Built-in handlers
 from semantic_layer.monitoring.handlers import (
     LoggingCallbackHandler,
     MetricsCallbackHandler,
+    SlowQueryCallbackHandler,
 )
 
 __all__ = [
     # Legacy
     "QueryLogger",
+    "JSONLLogSink",
+    "read_query_log",
     "MetricsCollector",
+    "SlowQueryLog",
+    "Tracer",
+    "TraceContext",
+    "Span",
+    "BatchSpanProcessor",
+    "InMemorySpanExporter",
+    "FileSpanExporter",
+    "OTLPSpanExporter",
     # New callback system
     "BaseQueryCallback",
     "CallbackManager",
+    "EventBus",
     "LoggingCallbackHandler",
     "MetricsCallbackHandler",
+    "SlowQueryCallbackHandler",
 ]
@@ -1,9 +1,11 @@
 """Callback manager for handling multiple callback handlers."""
 
+import logging
 from typing import Any, List, Optional
 from uuid import UUID, uuid4
 
 from semantic_layer.monitoring.callbacks import BaseQueryCallback
+from semantic_layer.monitoring.event_bus import EventBus
 
 
 class CallbackManager:
@@ -11,15 +13,26 @@ class CallbackManager:
     
     This class coordinates the execution of multiple callback handlers,
     allowing users to chain together different monitoring solutions.
+
+    With an ``event_bus``, events are queued and handlers run in the
+    background, off the request path. Handlers with ``run_inline`` or
+    ``raise_error`` set still run synchronously, in the request.
     """
 
-    def __init__(self, callbacks: Optional[List[BaseQueryCallback]] = None):
+    def __init__(
+        self,
+        callbacks: Optional[List[BaseQueryCallback]] = None,
+        event_bus: Optional[EventBus] = None,
+    ):
         """Initialize callback manager.
         
         Args:
             callbacks: List of callback handlers to manage
+            event_bus: Optional bus dispatching events in the background;
+                without one every handler runs inline
         """
         self.callbacks: List[BaseQueryCallback] = callbacks or []
+        self.event_bus = event_bus
 
     def add_callback(self, callback: BaseQueryCallback) -> None:
         """Add a callback handler.
@@ -42,6 +55,27 @@ class CallbackManager:
         """Clear all callback handlers."""
         self.callbacks.clear()
 
+    def _dispatch(self, event: str, ignore: Optional[str], /, **kwargs: Any) -> None:
+        """Send an event to every callback not ignoring it.
+
+        Args:
+            event: Callback method to call
+            ignore: Callback property that, when true, skips the callback
+        """
+        for callback in self.callbacks:
+            if ignore and getattr(callback, ignore):
+                continue
+            if self.event_bus is not None and not (callback.run_inline or callback.raise_error):
+                self.event_bus.publish(callback, event, kwargs)
+                continue
+            try:
+                getattr(callback, event)(**kwargs)
+            except Exception as e:
+                if callback.raise_error:
+                    raise
+                # Log error but continue with other callbacks
+                logging.warning(f"Callback {callback.__class__.__name__} failed: {e}")
+
     async def on_query_start(
         self,
         serialized: dict,
@@ -69,24 +103,17 @@ class CallbackManager:
         if run_id is None:
             run_id = uuid4()
 
-        for callback in self.callbacks:
-            if not callback.ignore_queries:
-                try:
-                    callback.on_query_start(
-                        serialized=serialized,
-                        inputs=inputs,
-                        run_id=run_id,
-                        parent_run_id=parent_run_id,
-                        tags=tags,
-                        metadata=metadata,
-                        **kwargs,
-                    )
-                except Exception as e:
-                    if callback.raise_error:
-                        raise
-                    # Log error but continue with other callbacks
-                    import logging
-                    logging.warning(f"Callback {callback.__class__.__name__} failed: {e}")
+        self._dispatch(
+            "on_query_start",
+            "ignore_queries",
+            serialized=serialized,
+            inputs=inputs,
+            run_id=run_id,
+            parent_run_id=parent_run_id,
+            tags=tags,
+            metadata=metadata,
+            **kwargs,
+        )
 
         return run_id
 
@@ -105,20 +132,14 @@ class CallbackManager:
             run_id: Unique identifier for this query run
             parent_run_id: Optional parent run ID
         """
-        for callback in self.callbacks:
-            if not callback.ignore_queries:
-                try:
-                    callback.on_query_end(
-                        outputs=outputs,
-                        run_id=run_id,
-                        parent_run_id=parent_run_id,
-                        **kwargs,
-                    )
-                except Exception as e:
-                    if callback.raise_error:
-                        raise
-                    import logging
-                    logging.warning(f"Callback {callback.__class__.__name__} failed: {e}")
+        self._dispatch(
+            "on_query_end",
+            "ignore_queries",
+            outputs=outputs,
+            run_id=run_id,
+            parent_run_id=parent_run_id,
+            **kwargs,
+        )
 
     async def on_query_error(
         self,
@@ -135,20 +156,14 @@ class CallbackManager:
             run_id: Unique identifier for this query run
             parent_run_id: Optional parent run ID
         """
-        for callback in self.callbacks:
-            if not callback.ignore_errors:
-                try:
-                    callback.on_query_error(
-                        error=error,
-                        run_id=run_id,
-                        parent_run_id=parent_run_id,
-                        **kwargs,
-                    )
-                except Exception as e:
-                    if callback.raise_error:
-                        raise
-                    import logging
-                    logging.warning(f"Callback {callback.__class__.__name__} failed: {e}")
+        self._dispatch(
+            "on_query_error",
+            "ignore_errors",
+            error=error,
+            run_id=run_id,
+            parent_run_id=parent_run_id,
+            **kwargs,
+        )
 
     async def on_cache_hit(
         self,
@@ -165,20 +180,14 @@ class CallbackManager:
             run_id: Unique identifier for this query run
             parent_run_id: Optional parent run ID
         """
-        for callback in self.callbacks:
-            if not callback.ignore_cache:
-                try:
-                    callback.on_cache_hit(
-                        cache_key=cache_key,
-                        run_id=run_id,
-                        parent_run_id=parent_run_id,
-                        **kwargs,
-                    )
-                except Exception as e:
-                    if callback.raise_error:
-                        raise
-                    import logging
-                    logging.warning(f"Callback {callback.__class__.__name__} failed: {e}")
+        self._dispatch(
+            "on_cache_hit",
+            "ignore_cache",
+            cache_key=cache_key,
+            run_id=run_id,
+            parent_run_id=parent_run_id,
+            **kwargs,
+        )
 
     async def on_cache_miss(
         self,
@@ -195,20 +204,14 @@ class CallbackManager:
             run_id: Unique identifier for this query run
             parent_run_id: Optional parent run ID
         """
-        for callback in self.callbacks:
-            if not callback.ignore_cache:
-                try:
-                    callback.on_cache_miss(
-                        cache_key=cache_key,
-                        run_id=run_id,
-                        parent_run_id=parent_run_id,
-                        **kwargs,
-                    )
-                except Exception as e:
-                    if callback.raise_error:
-                        raise
-                    import logging
-                    logging.warning(f"Callback {callback.__class__.__name__} failed: {e}")
+        self._dispatch(
+            "on_cache_miss",
+            "ignore_cache",
+            cache_key=cache_key,
+            run_id=run_id,
+            parent_run_id=parent_run_id,
+            **kwargs,
+        )
 
     async def on_pre_agg_used(
         self,
@@ -229,22 +232,16 @@ class CallbackManager:
             run_id: Unique identifier for this query run
             parent_run_id: Optional parent run ID
         """
-        for callback in self.callbacks:
-            if not callback.ignore_pre_agg:
-                try:
-                    callback.on_pre_agg_used(
-                        pre_agg_name=pre_agg_name,
-                        dimensions=dimensions,
-                        measures=measures,
-                        run_id=run_id,
-                        parent_run_id=parent_run_id,
-                        **kwargs,
-                    )
-                except Exception as e:
-                    if callback.raise_error:
-                        raise
-                    import logging
-                    logging.warning(f"Callback {callback.__class__.__name__} failed: {e}")
+        self._dispatch(
+            "on_pre_agg_used",
+            "ignore_pre_agg",
+            pre_agg_name=pre_agg_name,
+            dimensions=dimensions,
+            measures=measures,
+            run_id=run_id,
+            parent_run_id=parent_run_id,
+            **kwargs,
+        )
 
     async def on_pre_agg_skipped(
         self,
@@ -261,20 +258,77 @@ class CallbackManager:
             run_id: Unique identifier for this query run
             parent_run_id: Optional parent run ID
         """
-        for callback in self.callbacks:
-            if not callback.ignore_pre_agg:
-                try:
-                    callback.on_pre_agg_skipped(
-                        reason=reason,
-                        run_id=run_id,
-                        parent_run_id=parent_run_id,
-                        **kwargs,
-                    )
-                except Exception as e:
-                    if callback.raise_error:
-                        raise
-                    import logging
-                    logging.warning(f"Callback {callback.__class__.__name__} failed: {e}")
+        self._dispatch(
+            "on_pre_agg_skipped",
+            "ignore_pre_agg",
+            reason=reason,
+            run_id=run_id,
+            parent_run_id=parent_run_id,
+            **kwargs,
+        )
+
+    async def on_pre_agg_refreshed(
+        self,
+        pre_agg_name: str,
+        duration_ms: float,
+        row_count: Optional[int],
+        *,
+        run_id: Optional[UUID] = None,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Fire on_pre_agg_refreshed on all callbacks.
+        
+        Args:
+            pre_agg_name: Name of the pre-aggregation
+            duration_ms: Time taken to build the pre-aggregation
+            row_count: Rows in the rebuilt pre-aggregation (None if unknown)
+            run_id: Optional run ID (will generate if not provided)
+            parent_run_id: Optional parent run ID
+        """
+        if run_id is None:
+            run_id = uuid4()
+
+        self._dispatch(
+            "on_pre_agg_refreshed",
+            "ignore_pre_agg",
+            pre_agg_name=pre_agg_name,
+            duration_ms=duration_ms,
+            row_count=row_count,
+            run_id=run_id,
+            parent_run_id=parent_run_id,
+            **kwargs,
+        )
+
+    async def on_pre_agg_refresh_error(
+        self,
+        pre_agg_name: str,
+        error: BaseException,
+        *,
+        run_id: Optional[UUID] = None,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Fire on_pre_agg_refresh_error on all callbacks.
+        
+        Args:
+            pre_agg_name: Name of the pre-aggregation
+            error: The exception that occurred
+            run_id: Optional run ID (will generate if not provided)
+            parent_run_id: Optional parent run ID
+        """
+        if run_id is None:
+            run_id = uuid4()
+
+        self._dispatch(
+            "on_pre_agg_refresh_error",
+            "ignore_pre_agg",
+            pre_agg_name=pre_agg_name,
+            error=error,
+            run_id=run_id,
+            parent_run_id=parent_run_id,
+            **kwargs,
+        )
 
     async def on_sql_generated(
         self,
@@ -293,21 +347,15 @@ class CallbackManager:
             run_id: Unique identifier for this query run
             parent_run_id: Optional parent run ID
         """
-        for callback in self.callbacks:
-            if not callback.ignore_sql:
-                try:
-                    callback.on_sql_generated(
-                        sql=sql,
-                        execution_time_ms=execution_time_ms,
-                        run_id=run_id,
-                        parent_run_id=parent_run_id,
-                        **kwargs,
-                    )
-                except Exception as e:
-                    if callback.raise_error:
-                        raise
-                    import logging
-                    logging.warning(f"Callback {callback.__class__.__name__} failed: {e}")
+        self._dispatch(
+            "on_sql_generated",
+            "ignore_sql",
+            sql=sql,
+            execution_time_ms=execution_time_ms,
+            run_id=run_id,
+            parent_run_id=parent_run_id,
+            **kwargs,
+        )
 
     async def on_custom_event(
         self,
@@ -328,19 +376,14 @@ class CallbackManager:
             parent_run_id: Optional parent run ID
             metadata: Optional metadata dictionary
         """
-        for callback in self.callbacks:
-            try:
-                callback.on_custom_event(
-                    name=name,
-                    data=data,
-                    run_id=run_id,
-                    parent_run_id=parent_run_id,
-                    metadata=metadata,
-                    **kwargs,
-                )
-            except Exception as e:
-                if callback.raise_error:
-                    raise
-                import logging
-                logging.warning(f"Callback {callback.__class__.__name__} failed: {e}")
+        self._dispatch(
+            "on_custom_event",
+            None,
+            name=name,
+            data=data,
+            run_id=run_id,
+            parent_run_id=parent_run_id,
+            metadata=metadata,
+            **kwargs,
+        )
 
@@ -19,6 +19,9 @@ class BaseQueryCallback(ABC):
     raise_error: bool = False
     """Whether to raise errors if callback execution fails."""
 
+    run_inline: bool = False
+    """Whether to run in the request even when events go through an event bus."""
+
     # Filtering properties
     @property
     def ignore_queries(self) -> bool:
@@ -177,6 +180,46 @@ class BaseQueryCallback(ABC):
         """
         pass
 
+    def on_pre_agg_refreshed(
+        self,
+        pre_agg_name: str,
+        duration_ms: float,
+        row_count: Optional[int],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Called when a pre-aggregation refresh completes.
+        
+        Args:
+            pre_agg_name: Name of the pre-aggregation
+            duration_ms: Time taken to build the pre-aggregation
+            row_count: Rows in the rebuilt pre-aggregation (None if unknown)
+            run_id: Unique identifier for this refresh run
+            parent_run_id: Parent run ID if this is a nested run
+        """
+        pass
+
+    def on_pre_agg_refresh_error(
+        self,
+        pre_agg_name: str,
+        error: BaseException,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Called when a pre-aggregation refresh fails.
+        
+        Args:
+            pre_agg_name: Name of the pre-aggregation
+            error: The exception that occurred
+            run_id: Unique identifier for this refresh run
+            parent_run_id: Parent run ID if this is a nested run
+        """
+        pass
+
     # SQL Events
     def on_sql_generated(
         self,
@@ -0,0 +1,154 @@
+"""Asynchronous, batched dispatch of callback events."""
+
+import asyncio
+import logging
+import random
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from semantic_layer.exceptions import ConfigurationError
+from semantic_layer.monitoring.callbacks import BaseQueryCallback
+
+
+# What happens to events published while the buffer is under pressure
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DROP_NEWEST = "drop_newest"
+OVERFLOW_SAMPLE = "sample"
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_SAMPLE)
+
+DEFAULT_MAX_SIZE = 10000
+DEFAULT_BATCH_SIZE = 100
+
+# Fill level from which the sample policy starts sampling
+SAMPLE_THRESHOLD = 0.5
+
+
+class EventBus:
+    """Bounded ring buffer of callback events drained by a background task.
+
+    Publishing only appends to the buffer, so handlers no longer run inside
+    the request. The drain task dispatches events in batches of
+    ``batch_size``, yielding to the event loop between batches.
+
+    Under pressure events are dropped according to ``overflow_policy``:
+
+    - ``drop_oldest``: a full buffer discards its oldest event
+    - ``drop_newest``: a full buffer discards the new event
+    - ``sample``: past half full, only ``sample_rate`` of new events are
+      kept; a full buffer discards the new event
+    """
+
+    def __init__(
+        self,
+        max_size: int = DEFAULT_MAX_SIZE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        overflow_policy: str = OVERFLOW_DROP_OLDEST,
+        sample_rate: float = 0.1,
+    ):
+        """Initialize the event bus.
+
+        Args:
+            max_size: Events held before the overflow policy applies
+            batch_size: Events dispatched before yielding to the event loop
+            overflow_policy: drop_oldest, drop_newest or sample
+            sample_rate: Fraction of events kept by the sample policy
+
+        Raises:
+            ConfigurationError: If the overflow policy is unknown
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ConfigurationError(
+                f"Unknown overflow policy '{overflow_policy}', "
+                f"expected one of {', '.join(OVERFLOW_POLICIES)}"
+            )
+        self.max_size = max(1, max_size)
+        self.batch_size = max(1, batch_size)
+        self.overflow_policy = overflow_policy
+        self.sample_rate = sample_rate
+        self._buffer: Deque[Tuple[BaseQueryCallback, str, Dict[str, Any]]] = deque()
+        # Set when events arrive; created with the drain task, on its loop
+        self._ready: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.published = 0
+        self.dispatched = 0
+        self.dropped = 0
+
+    @property
+    def pending(self) -> int:
+        """Number of events waiting to be dispatched."""
+        return len(self._buffer)
+
+    def publish(self, callback: BaseQueryCallback, event: str, kwargs: Dict[str, Any]) -> bool:
+        """Queue ``callback.<event>(**kwargs)`` for the drain task.
+
+        Returns:
+            True if the event was queued, False if it was dropped
+        """
+        self.published += 1
+        size = len(self._buffer)
+        if self.overflow_policy == OVERFLOW_SAMPLE and size >= self.max_size * SAMPLE_THRESHOLD:
+            if size >= self.max_size or random.random() >= self.sample_rate:
+                self.dropped += 1
+                return False
+        elif size >= self.max_size:
+            self.dropped += 1
+            if self.overflow_policy == OVERFLOW_DROP_NEWEST:
+                return False
+            self._buffer.popleft()
+
+        self._buffer.append((callback, event, kwargs))
+        if self._ready is not None:
+            self._ready.set()
+        return True
+
+    def start(self) -> None:
+        """Start draining events in the background."""
+        if self._task is None or self._task.done():
+            self._ready = asyncio.Event()
+            self._task = asyncio.create_task(self._drain())
+
+    async def stop(self) -> None:
+        """Dispatch the remaining events and stop the drain task."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Dispatch every queued event now."""
+        while self._buffer:
+            self._dispatch_batch()
+            await asyncio.sleep(0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get event counts."""
+        return {
+            "pending": self.pending,
+            "published": self.published,
+            "dispatched": self.dispatched,
+            "dropped": self.dropped,
+        }
+
+    async def _drain(self) -> None:
+        """Dispatch events as they arrive."""
+        while True:
+            if not self._buffer:
+                await self._ready.wait()
+            self._ready.clear()
+            while self._buffer:
+                self._dispatch_batch()
+                await asyncio.sleep(0)
+
+    def _dispatch_batch(self) -> None:
+        """Dispatch up to ``batch_size`` events."""
+        for _ in range(min(self.batch_size, len(self._buffer))):
+            callback, event, kwargs = self._buffer.popleft()
+            try:
+                getattr(callback, event)(**kwargs)
+            except Exception as e:
+                logging.warning(f"Callback {callback.__class__.__name__} failed: {e}")
+            self.dispatched += 1
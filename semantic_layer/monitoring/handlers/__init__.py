@@ -2,9 +2,11 @@
 
 from semantic_layer.monitoring.handlers.logging_handler import LoggingCallbackHandler
 from semantic_layer.monitoring.handlers.metrics_handler import MetricsCallbackHandler
+from semantic_layer.monitoring.handlers.slow_query_handler import SlowQueryCallbackHandler
 
 __all__ = [
     "LoggingCallbackHandler",
     "MetricsCallbackHandler",
+    "SlowQueryCallbackHandler",
 ]
 
@@ -23,6 +23,12 @@ class MetricsCallbackHandler(BaseQueryCallback):
         """
         self.metrics_collector = metrics_collector or MetricsCollector(enabled=enabled)
 
+    @staticmethod
+    def _cube(query: Optional[Any]) -> Optional[str]:
+        """Get the cube of a query's first member."""
+        members = (query.measures + query.dimensions) if query is not None else []
+        return members[0].split(".")[0] if members else None
+
     def on_query_end(
         self,
         outputs: Dict[str, Any],
@@ -32,13 +38,13 @@ class MetricsCallbackHandler(BaseQueryCallback):
         **kwargs: Any,
     ) -> None:
         """Record successful query metrics."""
-        execution_time_ms = outputs.get("meta", {}).get("execution_time_ms", 0)
-        cache_hit = outputs.get("meta", {}).get("cache_hit", False)
-
+        meta = outputs.get("meta", {})
         self.metrics_collector.record_query(
-            execution_time_ms=execution_time_ms,
-            cache_hit=cache_hit,
+            execution_time_ms=meta.get("execution_time_ms", 0),
+            cache_hit=meta.get("cache_hit", False),
             error=False,
+            cube=self._cube(kwargs.get("query")),
+            pre_agg_used=meta.get("pre_aggregation_used", False),
         )
 
     def on_query_error(
@@ -56,6 +62,7 @@ class MetricsCallbackHandler(BaseQueryCallback):
             execution_time_ms=execution_time_ms,
             cache_hit=False,
             error=True,
+            cube=self._cube(kwargs.get("query")),
         )
 
     def on_cache_hit(
@@ -82,6 +89,39 @@ class MetricsCallbackHandler(BaseQueryCallback):
         # Metrics are recorded in on_query_end, but we can track here too
         pass
 
+    def on_pre_agg_refreshed(
+        self,
+        pre_agg_name: str,
+        duration_ms: float,
+        row_count: Optional[int],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Record pre-aggregation refresh metrics."""
+        self.metrics_collector.record_pre_agg_refresh(
+            pre_agg_name,
+            duration_ms=duration_ms,
+            row_count=row_count,
+        )
+
+    def on_pre_agg_refresh_error(
+        self,
+        pre_agg_name: str,
+        error: BaseException,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Record pre-aggregation refresh failure."""
+        self.metrics_collector.record_pre_agg_refresh(
+            pre_agg_name,
+            duration_ms=kwargs.get("duration_ms", 0),
+            error=True,
+        )
+
     def get_stats(self):
         """Get current statistics from the underlying MetricsCollector."""
         return self.metrics_collector.get_stats()
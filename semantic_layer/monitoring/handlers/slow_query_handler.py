@@ -0,0 +1,182 @@
+"""Slow query callback handler."""
+
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Set
+from uuid import UUID
+
+from semantic_layer.exceptions import OverloadedError
+from semantic_layer.monitoring.callbacks import BaseQueryCallback
+from semantic_layer.monitoring.slow_queries import SlowQueryLog
+from semantic_layer.orchestrator.admission import PRIORITY_REFRESH
+
+
+# EXPLAIN prefix per driver dialect; other dialects get a plain EXPLAIN
+EXPLAIN_PREFIXES = {
+    "postgresql": "EXPLAIN (ANALYZE, BUFFERS) ",
+    "mysql": "EXPLAIN ANALYZE ",
+}
+
+# Fingerprints remembered for the per-fingerprint EXPLAIN interval
+MAX_TRACKED_FINGERPRINTS = 1000
+
+
+class SlowQueryCallbackHandler(BaseQueryCallback):
+    """Records statements whose database time exceeds a threshold.
+
+    Each slow statement goes into a SlowQueryLog with its fingerprint and
+    parameters. When a connector is given, its plan is captured with
+    EXPLAIN (ANALYZE, BUFFERS on PostgreSQL) in a background task. Since
+    EXPLAIN ANALYZE runs the statement again, captures are rate-limited:
+    at most one per fingerprint every ``explain_interval`` seconds, one
+    at a time per fingerprint, and ``max_explains_per_minute`` overall.
+    With an admission controller, captures also queue for a database slot
+    at refresh priority, behind interactive queries, and are skipped when
+    the queue is full.
+    """
+
+    def __init__(
+        self,
+        slow_query_log: Optional[SlowQueryLog] = None,
+        connector: Optional[Any] = None,
+        threshold_ms: float = 1000.0,
+        explain_interval: float = 600.0,
+        max_explains_per_minute: int = 6,
+        explain_timeout: float = 60.0,
+        admission_controller: Optional[Any] = None,
+    ):
+        """Initialize slow query callback handler.
+
+        Args:
+            slow_query_log: Log the slow queries go into (creates one if not provided)
+            connector: Database connector plans are captured with; none are without one
+            threshold_ms: Database time above which a statement is slow
+            explain_interval: Seconds before a fingerprint's plan is captured again
+            max_explains_per_minute: Plans captured per minute across fingerprints
+            explain_timeout: Seconds an EXPLAIN may wait and run
+            admission_controller: Optional queue captures wait in for a
+                database slot (see AdmissionController)
+        """
+        self.slow_query_log = slow_query_log or SlowQueryLog()
+        self.connector = connector
+        self.threshold_ms = threshold_ms
+        self.explain_interval = explain_interval
+        self.max_explains_per_minute = max_explains_per_minute
+        self.explain_timeout = explain_timeout
+        self.admission_controller = admission_controller
+        self._last_explained: "OrderedDict[str, float]" = OrderedDict()
+        self._recent_explains: Deque[float] = deque()
+        self._explaining: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def ignore_queries(self) -> bool:
+        """Only SQL events are needed."""
+        return True
+
+    @property
+    def ignore_cache(self) -> bool:
+        """Only SQL events are needed."""
+        return True
+
+    @property
+    def ignore_pre_agg(self) -> bool:
+        """Only SQL events are needed."""
+        return True
+
+    @property
+    def ignore_errors(self) -> bool:
+        """Only SQL events are needed."""
+        return True
+
+    def on_sql_generated(
+        self,
+        sql: str,
+        execution_time_ms: float,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Record the statement if it was slow, and capture its plan."""
+        if execution_time_ms < self.threshold_ms:
+            return
+        query = kwargs.get("query")
+        cubes = None
+        if query is not None:
+            cubes = sorted({member.split(".")[0] for member in query.measures + query.dimensions})
+        entry = self.slow_query_log.record(
+            sql,
+            execution_time_ms,
+            params=kwargs.get("params"),
+            cubes=cubes,
+            run_id=str(run_id),
+        )
+        if not self._may_explain(entry["fingerprint"]):
+            entry["plan_status"] = "skipped"
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            entry["plan_status"] = "skipped"
+            return
+        self._explaining.add(entry["fingerprint"])
+        # A fresh context: the EXPLAIN must not inherit the query's deadline or trace
+        task = contextvars.Context().run(loop.create_task, self._explain(entry))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self) -> None:
+        """Wait for the plans being captured."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _may_explain(self, fingerprint: str) -> bool:
+        """Check the rate limits, counting a capture when allowed."""
+        if self.connector is None or fingerprint in self._explaining:
+            return False
+        now = time.monotonic()
+        last = self._last_explained.get(fingerprint)
+        if last is not None and now - last < self.explain_interval:
+            return False
+        while self._recent_explains and now - self._recent_explains[0] >= 60:
+            self._recent_explains.popleft()
+        if len(self._recent_explains) >= self.max_explains_per_minute:
+            return False
+        self._recent_explains.append(now)
+        self._last_explained[fingerprint] = now
+        self._last_explained.move_to_end(fingerprint)
+        while len(self._last_explained) > MAX_TRACKED_FINGERPRINTS:
+            self._last_explained.popitem(last=False)
+        return True
+
+    async def _explain(self, entry: Dict[str, Any]) -> None:
+        """Capture the plan of a slow statement into its entry."""
+        prefix = EXPLAIN_PREFIXES.get(getattr(self.connector, "dialect", None), "EXPLAIN ")
+        try:
+            rows = await asyncio.wait_for(self._run(prefix + entry["sql"]), self.explain_timeout)
+            entry["plan"] = self._plan_lines(rows)
+            entry["plan_status"] = "captured"
+        except OverloadedError:
+            # The database is saturated; its queries come first
+            entry["plan_status"] = "skipped"
+        except Exception as e:
+            entry["plan_status"] = "failed"
+            entry["plan_error"] = str(e) or type(e).__name__
+            print(f"Warning: Failed to capture plan of slow query {entry['fingerprint']}: {e}")
+        finally:
+            self._explaining.discard(entry["fingerprint"])
+
+    async def _run(self, sql: str) -> List[Dict[str, Any]]:
+        """Run an EXPLAIN, in a refresh-priority slot when queries are admitted."""
+        if self.admission_controller is None:
+            return await self.connector.execute_query(sql)
+        async with self.admission_controller.admit(PRIORITY_REFRESH):
+            return await self.connector.execute_query(sql)
+
+    @staticmethod
+    def _plan_lines(rows: List[Dict[str, Any]]) -> List[str]:
+        """Get the plan's text lines from EXPLAIN result rows."""
+        return [" | ".join(str(value) for value in row.values()) for row in rows]
@@ -0,0 +1,171 @@
+"""Rotating, compressed JSONL files of query log entries."""
+
+import asyncio
+import gzip
+import json
+import random
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Union
+
+
+FILE_PREFIX = "query-log-"
+FILE_SUFFIX = ".jsonl.gz"
+
+DEFAULT_MAX_FILE_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_FILES = 20
+DEFAULT_MAX_PENDING = 10000
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+
+class JSONLLogSink:
+    """Writes query log entries to rotating gzip-compressed JSONL files.
+
+    ``write`` only queues the entry; a background task writes queued
+    entries in batches from a worker thread, so logging adds no file I/O to
+    a query. At most ``max_pending`` entries wait to be written; beyond
+    that the oldest are dropped.
+
+    A file is closed once it reaches ``max_file_bytes`` (compressed) and
+    only the newest ``max_files`` files are kept. Successful cache hits are
+    kept with probability ``cache_hit_sample_rate``; kept entries carry a
+    ``sample_rate`` field so readers can weight them back up.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+        max_files: int = DEFAULT_MAX_FILES,
+        cache_hit_sample_rate: float = 1.0,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+    ):
+        """Initialize the sink.
+
+        Args:
+            directory: Directory the log files are written to
+            max_file_bytes: Size at which a file is rotated
+            max_files: Files kept; older ones are deleted
+            cache_hit_sample_rate: Fraction of successful cache hits kept
+            max_pending: Entries queued before the oldest are dropped
+            batch_size: Entries written per batch
+            flush_interval: Seconds between writes of a partial batch
+        """
+        self.directory = Path(directory)
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max(1, max_files)
+        self.cache_hit_sample_rate = cache_hit_sample_rate
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._pending: Deque[Dict[str, Any]] = deque(maxlen=max(1, max_pending))
+        self._current: Optional[Path] = None
+        # Serializes writer threads, e.g. a cancelled batch and the final flush
+        self._file_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.sampled_out = 0
+        self.dropped = 0
+
+    def write(self, entry: Dict[str, Any]) -> None:
+        """Queue an entry to be written."""
+        sampled = self.cache_hit_sample_rate < 1
+        if sampled and entry.get("cache_hit") and entry.get("status") == "success":
+            if random.random() >= self.cache_hit_sample_rate:
+                self.sampled_out += 1
+                return
+            entry = {**entry, "sample_rate": self.cache_hit_sample_rate}
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+        self._pending.append(entry)
+
+    def start(self) -> None:
+        """Start writing queued entries in the background."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Write the queued entries and stop the background task."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Write every queued entry now."""
+        while self._pending:
+            size = min(self.batch_size, len(self._pending))
+            batch = [self._pending.popleft() for _ in range(size)]
+            await asyncio.to_thread(self._write_batch, batch)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get entry counts."""
+        return {
+            "pending": len(self._pending),
+            "written": self.written,
+            "sampled_out": self.sampled_out,
+            "dropped": self.dropped,
+        }
+
+    async def _run(self) -> None:
+        """Write batches as they fill, or every ``flush_interval`` seconds."""
+        while True:
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._pending) < self.batch_size and time.monotonic() < deadline:
+                await asyncio.sleep(min(0.05, self.flush_interval))
+            try:
+                await self.flush()
+            except OSError as e:
+                print(f"Warning: Failed to write query log: {e}")
+
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        """Append entries to the current file, rotating it when full."""
+        lines = "".join(json.dumps(entry, default=str) + "\n" for entry in batch)
+        with self._file_lock:
+            # Each batch is its own gzip member; readers see one continuous stream
+            with gzip.open(self._current_file(), "at", encoding="utf-8") as f:
+                f.write(lines)
+            self.written += len(batch)
+
+    def _current_file(self) -> Path:
+        """Get the file to append to, starting a new one when needed."""
+        if (
+            self._current is None
+            or not self._current.exists()
+            or self._current.stat().st_size >= self.max_file_bytes
+        ):
+            self.directory.mkdir(parents=True, exist_ok=True)
+            stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+            name = f"{FILE_PREFIX}{stamp}-{time.time_ns() % 1_000_000_000:09d}{FILE_SUFFIX}"
+            self._current = self.directory / name
+            existing = log_files(self.directory)
+            for old in existing[:max(0, len(existing) - (self.max_files - 1))]:
+                old.unlink(missing_ok=True)
+        return self._current
+
+
+def log_files(directory: Union[str, Path]) -> List[Path]:
+    """Get the query log files in a directory, oldest first."""
+    return sorted(Path(directory).glob(f"{FILE_PREFIX}*{FILE_SUFFIX}"))
+
+
+def read_query_log(path: Union[str, Path]) -> Iterator[Dict[str, Any]]:
+    """Read the entries of a query log file, or of every file in a directory.
+
+    The entries have the QueryLogger format, so they can be replayed, e.g.
+    fed to PreAggregationAdvisor.recommend.
+    """
+    path = Path(path)
+    for file in log_files(path) if path.is_dir() else [path]:
+        with gzip.open(file, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
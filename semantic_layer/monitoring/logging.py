@@ -2,18 +2,45 @@
 
 import json
 import time
-from typing import Any, Dict, Optional
+from collections import deque
+from itertools import islice
+from typing import Any, Deque, Dict, Optional
 
 from semantic_layer.query.query import Query, LogicalFilter, QueryFilter
 
 
+# Entries kept in memory for /api/v1/logs
+DEFAULT_MAX_ENTRIES = 10000
+
+
 class QueryLogger:
-    """Logs queries for monitoring and debugging."""
+    """Logs queries for monitoring and debugging.
+
+    The latest ``max_entries`` entries are kept in a ring buffer. Entries
+    are also handed to ``sink`` (e.g. JSONLLogSink), which must queue them
+    without blocking. With ``echo``, entries are also printed to stdout;
+    the print is synchronous, so it is off by default.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        sink: Optional[Any] = None,
+        echo: bool = False,
+    ):
+        """Initialize query logger.
 
-    def __init__(self, enabled: bool = True):
-        """Initialize query logger."""
+        Args:
+            enabled: Whether queries are logged
+            max_entries: Entries kept in memory
+            sink: Optional destination with a non-blocking write(entry)
+            echo: Whether entries are printed to stdout
+        """
         self.enabled = enabled
-        self._logs: list[Dict[str, Any]] = []
+        self.sink = sink
+        self.echo = echo
+        self._logs: Deque[Dict[str, Any]] = deque(maxlen=max(1, max_entries))
 
     def log_query(
         self,
@@ -35,6 +62,9 @@ class QueryLogger:
             "dimensions": query.dimensions,
             "measures": query.measures,
             "filters": [self._serialize_filter(f) for f in query.filters],
+            "time_dimensions": [
+                td.model_dump(exclude_none=True) for td in query.time_dimensions
+            ],
             "execution_time_ms": execution_time_ms,
             "cache_hit": cache_hit,
             "sql": sql,
@@ -43,7 +73,10 @@ class QueryLogger:
         }
 
         self._logs.append(log_entry)
-        self._print_log(log_entry)
+        if self.sink is not None:
+            self.sink.write(log_entry)
+        if self.echo:
+            self._print_log(log_entry)
 
     def _generate_query_id(self, query: Query) -> str:
         """Generate a unique ID for the query."""
@@ -75,11 +108,14 @@ class QueryLogger:
 
     def _print_log(self, log_entry: Dict[str, Any]) -> None:
         """Print log entry (can be replaced with proper logging)."""
-        print(json.dumps(log_entry, indent=2))
+        # One line per entry: pretty-printing costs more and breaks line-based collectors
+        print(json.dumps(log_entry, default=str))
 
     def get_logs(self, limit: int = 100) -> list[Dict[str, Any]]:
-        """Get recent logs."""
-        return self._logs[-limit:]
+        """Get recent logs, oldest first."""
+        if limit <= 0:
+            return []
+        return list(islice(reversed(self._logs), limit))[::-1]
 
     def clear_logs(self) -> None:
         """Clear all logs."""
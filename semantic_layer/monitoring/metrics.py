@@ -2,7 +2,9 @@
 
 import time
 from collections import defaultdict
-from typing import Dict, List
+from typing import Any, Dict, Optional, Tuple
+
+from semantic_layer.monitoring.histogram import LatencyHistogram
 
 try:
     from prometheus_client import Counter, Histogram, Gauge
@@ -14,8 +16,39 @@ except ImportError:
     Gauge = None
 
 
+# Histogram buckets in seconds, fine-grained below 100ms where most
+# semantic queries (cache and pre-aggregation hits) finish
+QUERY_DURATION_BUCKETS = [
+    0.001, 0.0025, 0.005, 0.01, 0.02, 0.035, 0.05, 0.075, 0.1,
+    0.15, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+]
+
+# Labels of the query latency series
+LATENCY_LABELS = ("cube", "cache_hit", "pre_agg_used", "tenant")
+
+# Latency series kept before new label sets are folded into one
+MAX_LATENCY_SERIES = 1000
+OVERFLOW_LABEL = "_other"
+
+# Prometheus metrics by name; they are process-wide, so every collector
+# shares them instead of registering the same name twice
+_prometheus_metrics: Dict[str, Any] = {}
+
+
+def _prometheus_metric(metric_type, name: str, documentation: str, labelnames=(), **kwargs):
+    """Get a Prometheus metric, creating it on first use."""
+    if name not in _prometheus_metrics:
+        _prometheus_metrics[name] = metric_type(name, documentation, labelnames, **kwargs)
+    return _prometheus_metrics[name]
+
+
 class MetricsCollector:
-    """Collects metrics for monitoring."""
+    """Collects metrics for monitoring.
+
+    Query latency is kept in constant-memory streaming histograms, overall
+    and per label set (cube, cache_hit, pre_agg_used, tenant), each over
+    sliding 1m, 5m and 1h windows as well as all time.
+    """
 
     def __init__(self, enabled: bool = True):
         """Initialize metrics collector."""
@@ -24,51 +57,113 @@ class MetricsCollector:
         self._cache_hits = 0
         self._cache_misses = 0
         self._error_count = 0
-        self._query_times: List[float] = []
+        self._latency = LatencyHistogram()
+        self._latency_series: Dict[Tuple[str, ...], LatencyHistogram] = {}
+        self._pre_agg_refreshes: Dict[str, Dict[str, any]] = {}
+        self._admission: Dict[str, any] = {
+            "limit": None, "in_flight": 0, "queue_depth": 0, "rejections": {}
+        }
+        # Count and total milliseconds of each query stage
+        self._stages: Dict[str, Dict[str, float]] = {}
         
         if PROMETHEUS_AVAILABLE and enabled:
-            self.query_counter = Counter(
+            self.query_counter = _prometheus_metric(
+                Counter,
                 "semanticquark_queries_total",
                 "Total number of queries",
                 ["status"]
             )
-            self.query_duration = Histogram(
+            self.query_duration = _prometheus_metric(
+                Histogram,
                 "semanticquark_query_duration_seconds",
                 "Query execution duration",
-                buckets=[0.1, 0.5, 1.0, 2.0, 5.0, 10.0]
+                list(LATENCY_LABELS),
+                buckets=QUERY_DURATION_BUCKETS
             )
-            self.cache_hit_counter = Counter(
+            self.cache_hit_counter = _prometheus_metric(
+                Counter,
                 "semanticquark_cache_hits_total",
                 "Total cache hits"
             )
-            self.cache_miss_counter = Counter(
+            self.cache_miss_counter = _prometheus_metric(
+                Counter,
                 "semanticquark_cache_misses_total",
                 "Total cache misses"
             )
-            self.error_counter = Counter(
+            self.error_counter = _prometheus_metric(
+                Counter,
                 "semanticquark_errors_total",
                 "Total errors",
                 ["error_type"]
             )
+            self.concurrency_limit_gauge = _prometheus_metric(
+                Gauge,
+                "semanticquark_concurrency_limit",
+                "Database statements currently allowed to run at once"
+            )
+            self.in_flight_gauge = _prometheus_metric(
+                Gauge,
+                "semanticquark_queries_in_flight",
+                "Database statements running"
+            )
+            self.queue_depth_gauge = _prometheus_metric(
+                Gauge,
+                "semanticquark_query_queue_depth",
+                "Database statements waiting for a slot"
+            )
+            self.rejection_counter = _prometheus_metric(
+                Counter,
+                "semanticquark_admission_rejections_total",
+                "Queries rejected because the queue was full",
+                ["priority"]
+            )
+            self.stage_duration = _prometheus_metric(
+                Histogram,
+                "semanticquark_query_stage_duration_seconds",
+                "Time spent in each stage of a query",
+                ["stage"],
+                buckets=[0.0001, 0.0005] + QUERY_DURATION_BUCKETS
+            )
         else:
             self.query_counter = None
             self.query_duration = None
             self.cache_hit_counter = None
             self.cache_miss_counter = None
             self.error_counter = None
+            self.concurrency_limit_gauge = None
+            self.in_flight_gauge = None
+            self.queue_depth_gauge = None
+            self.rejection_counter = None
+            self.stage_duration = None
 
-    def record_query(self, execution_time_ms: float, cache_hit: bool = False, error: bool = False) -> None:
-        """Record a query execution."""
+    def record_query(
+        self,
+        execution_time_ms: float,
+        cache_hit: bool = False,
+        error: bool = False,
+        cube: Optional[str] = None,
+        pre_agg_used: bool = False,
+        tenant: Optional[str] = None,
+    ) -> None:
+        """Record a query execution.
+
+        Args:
+            execution_time_ms: Query duration
+            cache_hit: Whether the result came from the cache
+            error: Whether the query failed
+            cube: Cube the query is about
+            pre_agg_used: Whether a pre-aggregation answered the query
+            tenant: Tenant the query ran for
+        """
         if not self.enabled:
             return
         
         self._query_count += 1
         execution_time_s = execution_time_ms / 1000.0
-        self._query_times.append(execution_time_s)
-        
-        # Keep only last 1000 query times
-        if len(self._query_times) > 1000:
-            self._query_times = self._query_times[-1000:]
+        labels = (cube or "", str(cache_hit).lower(), str(pre_agg_used).lower(), tenant or "")
+        labels, series = self._latency_for(labels)
+        self._latency.record(execution_time_ms)
+        series.record(execution_time_ms)
         
         if cache_hit:
             self._cache_hits += 1
@@ -89,7 +184,80 @@ class MetricsCollector:
             self.query_counter.labels(status=status).inc()
         
         if self.query_duration:
-            self.query_duration.observe(execution_time_s)
+            self.query_duration.labels(*labels).observe(execution_time_s)
+
+    def _latency_for(
+        self, labels: Tuple[str, ...]
+    ) -> Tuple[Tuple[str, ...], LatencyHistogram]:
+        """Get the latency series of a label set.
+
+        Returns:
+            (labels, series); the labels are folded into the overflow label
+            set once MAX_LATENCY_SERIES series exist, and are the ones to
+            export so Prometheus stays within the same bound
+        """
+        series = self._latency_series.get(labels)
+        if series is None:
+            if len(self._latency_series) >= MAX_LATENCY_SERIES:
+                labels = (OVERFLOW_LABEL,) * len(LATENCY_LABELS)
+                series = self._latency_series.get(labels)
+            if series is None:
+                series = self._latency_series[labels] = LatencyHistogram()
+        return labels, series
+
+    def record_pre_agg_refresh(
+        self,
+        name: str,
+        duration_ms: float,
+        row_count: Optional[int] = None,
+        error: bool = False,
+    ) -> None:
+        """Record a pre-aggregation refresh."""
+        if not self.enabled:
+            return
+        
+        stats = self._pre_agg_refreshes.setdefault(
+            name, {"refreshes": 0, "errors": 0, "last_duration_ms": None, "last_row_count": None}
+        )
+        if error:
+            stats["errors"] += 1
+            return
+        stats["refreshes"] += 1
+        stats["last_duration_ms"] = duration_ms
+        stats["last_row_count"] = row_count
+
+    def record_admission(self, limit: int, in_flight: int, queue_depth: int) -> None:
+        """Record the concurrency limit and load of the admission queue."""
+        if not self.enabled:
+            return
+
+        self._admission.update(limit=limit, in_flight=in_flight, queue_depth=queue_depth)
+        if self.concurrency_limit_gauge:
+            self.concurrency_limit_gauge.set(limit)
+            self.in_flight_gauge.set(in_flight)
+            self.queue_depth_gauge.set(queue_depth)
+
+    def record_admission_rejection(self, priority: str) -> None:
+        """Record a query rejected by a full admission queue."""
+        if not self.enabled:
+            return
+
+        rejections = self._admission["rejections"]
+        rejections[priority] = rejections.get(priority, 0) + 1
+        if self.rejection_counter:
+            self.rejection_counter.labels(priority=priority).inc()
+
+    def record_stages(self, stages: Dict[str, float]) -> None:
+        """Record the milliseconds a query spent in each stage."""
+        if not self.enabled:
+            return
+
+        for name, duration_ms in stages.items():
+            stats = self._stages.setdefault(name, {"count": 0, "total_ms": 0.0})
+            stats["count"] += 1
+            stats["total_ms"] += duration_ms
+            if self.stage_duration:
+                self.stage_duration.labels(stage=name).observe(duration_ms / 1000.0)
 
     def get_stats(self) -> Dict[str, any]:
         """Get current statistics."""
@@ -97,25 +265,26 @@ class MetricsCollector:
         if self._query_count > 0:
             cache_hit_rate = (self._cache_hits / self._query_count) * 100
         
-        avg_time = 0.0
-        p95_time = 0.0
-        p99_time = 0.0
-        if self._query_times:
-            sorted_times = sorted(self._query_times)
-            avg_time = sum(sorted_times) / len(sorted_times)
-            p95_idx = int(len(sorted_times) * 0.95)
-            p99_idx = int(len(sorted_times) * 0.99)
-            p95_time = sorted_times[p95_idx] if p95_idx < len(sorted_times) else sorted_times[-1]
-            p99_time = sorted_times[p99_idx] if p99_idx < len(sorted_times) else sorted_times[-1]
-        
+        latency = self._latency.total.summary()
         return {
             "total_queries": self._query_count,
             "cache_hits": self._cache_hits,
             "cache_misses": self._cache_misses,
             "cache_hit_rate": cache_hit_rate,
             "errors": self._error_count,
-            "avg_execution_time_ms": avg_time * 1000,
-            "p95_execution_time_ms": p95_time * 1000,
-            "p99_execution_time_ms": p99_time * 1000,
+            "avg_execution_time_ms": latency["avg"],
+            "p95_execution_time_ms": latency["p95"],
+            "p99_execution_time_ms": latency["p99"],
+            "latency_ms": self._latency.summary(),
+            "latency_ms_by_labels": [
+                {**dict(zip(LATENCY_LABELS, labels)), **series.summary()}
+                for labels, series in self._latency_series.items()
+            ],
+            "pre_aggregation_refreshes": self._pre_agg_refreshes,
+            "admission": self._admission,
+            "stages": {
+                name: {"count": stats["count"], "avg_ms": stats["total_ms"] / stats["count"]}
+                for name, stats in self._stages.items()
+            },
         }
 
@@ -0,0 +1,142 @@
+"""Slow query log, grouped by query fingerprint."""
+
+import hashlib
+import re
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+
+# Slow queries kept in memory
+DEFAULT_MAX_ENTRIES = 1000
+
+# Fields of a group's latest query
+LATEST_KEYS = ("timestamp", "sql", "params", "database_time_ms")
+
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.])\d+(?:\.\d+)?(?![\w.])")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def fingerprint_sql(sql: str) -> Tuple[str, str, List[Any]]:
+    """Reduce a statement to its shape.
+
+    String and number literals become ``?`` (IN lists of them a single
+    ``IN (?+)``), so statements differing only in their values share a
+    fingerprint. The literals are returned as the statement's parameters,
+    in order.
+
+    Returns:
+        (fingerprint, normalized SQL, parameters)
+    """
+    params: List[Any] = []
+
+    def replace_string(match: "re.Match[str]") -> str:
+        params.append(match.group(0)[1:-1].replace("''", "'"))
+        return "?"
+
+    def replace_number(match: "re.Match[str]") -> str:
+        text = match.group(0)
+        params.append(float(text) if "." in text else int(text))
+        return "?"
+
+    normalized = _COMMENT_RE.sub(" ", sql)
+    normalized = _STRING_RE.sub(replace_string, normalized)
+    normalized = _NUMBER_RE.sub(replace_number, normalized)
+    normalized = _WHITESPACE_RE.sub(" ", normalized).strip()
+    normalized = _IN_LIST_RE.sub("IN (?+)", normalized)
+    fingerprint = hashlib.sha256(normalized.lower().encode("utf-8")).hexdigest()[:16]
+    return fingerprint, normalized, params
+
+
+class SlowQueryLog:
+    """Keeps the latest ``max_entries`` slow queries in a ring buffer."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """Initialize the log.
+
+        Args:
+            max_entries: Slow queries kept; older ones are dropped
+        """
+        self._entries: Deque[Dict[str, Any]] = deque(maxlen=max(1, max_entries))
+
+    def record(
+        self,
+        sql: str,
+        database_time_ms: float,
+        params: Optional[Any] = None,
+        cubes: Optional[List[str]] = None,
+        run_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Record a slow query.
+
+        Args:
+            sql: Statement sent to the database
+            database_time_ms: Time the database took
+            params: Bound parameters; defaults to the statement's literals
+            cubes: Cubes the query was about
+            run_id: Callback run ID of the query
+
+        Returns:
+            The entry, whose ``plan`` is filled in once captured
+        """
+        fingerprint, normalized, literals = fingerprint_sql(sql)
+        entry = {
+            "timestamp": time.time(),
+            "fingerprint": fingerprint,
+            "normalized_sql": normalized,
+            "sql": sql,
+            "params": params if params is not None else literals,
+            "cubes": cubes or [],
+            "database_time_ms": round(database_time_ms, 2),
+            "run_id": run_id,
+            "plan": None,
+            "plan_status": "pending",
+        }
+        self._entries.append(entry)
+        return entry
+
+    def get_entries(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Get the latest slow queries, newest first."""
+        return list(reversed(self._entries))[:limit]
+
+    def group_by_fingerprint(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Summarize slow queries per fingerprint, most total time first.
+
+        Each group carries its latest query and the latest plan captured.
+        """
+        groups: Dict[str, Dict[str, Any]] = {}
+        for entry in self._entries:
+            group = groups.get(entry["fingerprint"])
+            if group is None:
+                group = groups[entry["fingerprint"]] = {
+                    "fingerprint": entry["fingerprint"],
+                    "normalized_sql": entry["normalized_sql"],
+                    "cubes": entry["cubes"],
+                    "count": 0,
+                    "total_time_ms": 0.0,
+                    "max_time_ms": 0.0,
+                    "first_seen": entry["timestamp"],
+                    "last_seen": entry["timestamp"],
+                    "latest": None,
+                    "plan": None,
+                }
+            group["count"] += 1
+            group["total_time_ms"] += entry["database_time_ms"]
+            group["max_time_ms"] = max(group["max_time_ms"], entry["database_time_ms"])
+            group["last_seen"] = entry["timestamp"]
+            group["latest"] = {key: entry[key] for key in LATEST_KEYS}
+            if entry["plan"] is not None:
+                group["plan"] = {"captured_at": entry["timestamp"], "lines": entry["plan"]}
+
+        summaries = sorted(groups.values(), key=lambda group: group["total_time_ms"], reverse=True)
+        for group in summaries:
+            group["total_time_ms"] = round(group["total_time_ms"], 2)
+            group["avg_time_ms"] = round(group["total_time_ms"] / group["count"], 2)
+        return summaries[:limit]
+
+    def clear(self) -> None:
+        """Forget every slow query."""
+        self._entries.clear()
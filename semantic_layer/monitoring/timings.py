@@ -0,0 +1,106 @@
+"""Per-stage latency breakdown of a request."""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+from semantic_layer.monitoring.tracing import trace_span
+
+
+class StageTimings:
+    """Milliseconds spent in each stage of a request.
+
+    Stages are timed with ``stage()``; a stage nested in another is
+    subtracted from the outer one, so the stages add up to the time they
+    cover rather than counting it twice.
+    """
+
+    def __init__(self):
+        """Initialize empty timings."""
+        self._stages: Dict[str, float] = {}
+
+    def add(self, name: str, duration_ms: float) -> None:
+        """Add time to a stage."""
+        self._stages[name] = self._stages.get(name, 0.0) + duration_ms
+
+    def get(self, name: str) -> float:
+        """Get the time spent in a stage, in milliseconds."""
+        return self._stages.get(name, 0.0)
+
+    def merge(self, other: "StageTimings") -> None:
+        """Add another set of timings to these."""
+        for name, duration_ms in other._stages.items():
+            self.add(name, duration_ms)
+
+    def to_dict(self) -> Dict[str, float]:
+        """Get the stages, in the order they first ran."""
+        return {name: round(duration_ms, 2) for name, duration_ms in self._stages.items()}
+
+    def server_timing(self) -> str:
+        """Format the stages as a Server-Timing header value."""
+        return ", ".join(
+            f"{name};dur={duration_ms:.2f}" for name, duration_ms in self._stages.items()
+        )
+
+
+# Timings of the current request or query, if they are being collected
+_timings: ContextVar[Optional[StageTimings]] = ContextVar("stage_timings", default=None)
+
+# Innermost open stage as [time spent in nested stages]; tasks get their own
+_open_stage: ContextVar[Optional[List[float]]] = ContextVar("open_stage", default=None)
+
+
+def current_timings() -> Optional[StageTimings]:
+    """Get the timings being collected, or None."""
+    return _timings.get()
+
+
+@contextmanager
+def collect_timings() -> Iterator[StageTimings]:
+    """Collect the stages timed in the block.
+
+    When nested in another collection, the stages are also added to the
+    outer timings once the block ends.
+    """
+    timings = StageTimings()
+    parent = _timings.get()
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+        if parent is not None:
+            parent.merge(timings)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the block as stage ``name`` of the current timings (if any).
+
+    Inside a trace, the stage is also recorded as a span.
+    """
+    with trace_span(name):
+        with _timed_stage(name):
+            yield
+
+
+@contextmanager
+def _timed_stage(name: str) -> Iterator[None]:
+    """Add the time spent in the block to stage ``name``."""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    parent = _open_stage.get()
+    nested = [0.0]
+    token = _open_stage.set(nested)
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration_ms = (time.perf_counter() - start_time) * 1000
+        _open_stage.reset(token)
+        timings.add(name, duration_ms - nested[0])
+        if parent is not None:
+            parent[0] += duration_ms
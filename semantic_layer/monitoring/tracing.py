@@ -1,49 +1,492 @@
-"""Distributed tracing utilities."""
+"""Distributed tracing compatible with OpenTelemetry.
 
-from typing import Dict, Any, Optional
-import uuid
-from datetime import datetime
+Spans follow the W3C trace context (``traceparent`` header) and are
+exported in the OTLP/HTTP JSON format, so any OpenTelemetry collector can
+receive them without the OpenTelemetry SDK being installed.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import secrets
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Mapping, Optional, Union
+
+from semantic_layer.exceptions import ConfigurationError
+
+
+TRACEPARENT_HEADER = "traceparent"
+_TRACEPARENT_RE = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# OTLP span status codes
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# OTLP span kinds
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+
+DEFAULT_SERVICE_NAME = "semanticquark"
+DEFAULT_MAX_QUEUE_SIZE = 2048
+DEFAULT_BATCH_SIZE = 512
+DEFAULT_SCHEDULE_DELAY = 1.0
 
 
 class TraceContext:
-    """Trace context for distributed tracing."""
-    
-    def __init__(self, trace_id: Optional[str] = None, span_id: Optional[str] = None):
+    """Trace and parent span a new span belongs to (W3C trace context)."""
+
+    def __init__(
+        self, trace_id: Optional[str] = None, span_id: Optional[str] = None, sampled: bool = True
+    ):
         """Initialize trace context."""
-        self.trace_id = trace_id or str(uuid.uuid4())
-        self.span_id = span_id or str(uuid.uuid4())
-        self.start_time = datetime.utcnow()
-    
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.span_id = span_id
+        self.sampled = sampled
+
+    @classmethod
+    def from_headers(cls, headers: Mapping[str, str]) -> Optional["TraceContext"]:
+        """Read the context from a ``traceparent`` header, if valid."""
+        match = _TRACEPARENT_RE.match((headers.get(TRACEPARENT_HEADER) or "").strip().lower())
+        if not match:
+            return None
+        version, trace_id, span_id, flags = match.groups()
+        if version == "ff" or trace_id == "0" * 32 or span_id == "0" * 16:
+            return None
+        return cls(trace_id, span_id, sampled=bool(int(flags, 16) & 1))
+
+    def to_traceparent(self) -> str:
+        """Format the context as a ``traceparent`` header value."""
+        return f"00-{self.trace_id}-{self.span_id or '0' * 16}-{'01' if self.sampled else '00'}"
+
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary."""
-        return {
-            "trace_id": self.trace_id,
-            "span_id": self.span_id,
-            "start_time": self.start_time.isoformat(),
+        return {"trace_id": self.trace_id, "span_id": self.span_id, "sampled": self.sampled}
+
+
+class Span:
+    """A timed operation within a trace."""
+
+    def __init__(
+        self,
+        tracer: "Tracer",
+        name: str,
+        trace_id: str,
+        parent_span_id: Optional[str] = None,
+        kind: int = SPAN_KIND_INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+    ):
+        """Start a span."""
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status_code = STATUS_UNSET
+        self.status_message: Optional[str] = None
+        self.start_time_ns = time.time_ns()
+        self.end_time_ns: Optional[int] = None
+
+    @property
+    def context(self) -> TraceContext:
+        """Context for spans (or services) called from this span."""
+        return TraceContext(self.trace_id, self.span_id)
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Set an attribute; None values are skipped."""
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        """Set several attributes."""
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def record_exception(self, error: BaseException) -> None:
+        """Mark the span as failed."""
+        self.status_code = STATUS_ERROR
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    def end(self) -> None:
+        """End the span and hand it to the tracer's processor."""
+        if self.end_time_ns is not None:
+            return
+        self.end_time_ns = time.time_ns()
+        self.tracer.processor.on_end(self)
+
+    @property
+    def duration_ms(self) -> float:
+        """Duration of an ended span, in milliseconds."""
+        return ((self.end_time_ns or time.time_ns()) - self.start_time_ns) / 1e6
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Convert to an OTLP JSON span."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_time_ns),
+            "endTimeUnixNano": str(self.end_time_ns or self.start_time_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()
+            ],
+            "status": {"code": self.status_code},
         }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        if self.status_message:
+            span["status"]["message"] = self.status_message
+        return span
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    """Convert an attribute value to an OTLP AnyValue."""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(item) for item in value]}}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(spans: List[Span], service_name: str = DEFAULT_SERVICE_NAME) -> Dict[str, Any]:
+    """Build an OTLP/HTTP JSON export request for spans."""
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        {"key": "service.name", "value": {"stringValue": service_name}}
+                    ]
+                },
+                "scopeSpans": [
+                    {
+                        "scope": {"name": "semanticquark"},
+                        "spans": [span.to_otlp() for span in spans],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+class SpanExporter(ABC):
+    """Destination of finished spans."""
+
+    @abstractmethod
+    async def export(self, spans: List[Span]) -> None:
+        """Export a batch of spans."""
+
+    async def shutdown(self) -> None:
+        """Release the exporter's resources."""
+
+
+class InMemorySpanExporter(SpanExporter):
+    """Keeps exported spans in a list, for tests and local debugging."""
+
+    def __init__(self):
+        """Initialize the exporter."""
+        self.spans: List[Span] = []
+
+    async def export(self, spans: List[Span]) -> None:
+        """Keep the spans."""
+        self.spans.extend(spans)
+
+
+class FileSpanExporter(SpanExporter):
+    """Appends spans to a file, one OTLP JSON span per line."""
+
+    def __init__(self, path: Union[str, Path]):
+        """Initialize the exporter.
+
+        Args:
+            path: File the spans are appended to
+        """
+        self.path = Path(path)
+
+    async def export(self, spans: List[Span]) -> None:
+        """Append the spans to the file."""
+        lines = "".join(json.dumps(span.to_otlp()) + "\n" for span in spans)
+        await asyncio.to_thread(self._append, lines)
+
+    def _append(self, lines: str) -> None:
+        """Write lines at the end of the file."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+class OTLPSpanExporter(SpanExporter):
+    """Sends spans to an OpenTelemetry collector over OTLP/HTTP (JSON)."""
+
+    def __init__(
+        self,
+        endpoint: str = "http://localhost:4318",
+        service_name: str = DEFAULT_SERVICE_NAME,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 10.0,
+    ):
+        """Initialize the exporter.
+
+        Args:
+            endpoint: Collector base URL; spans are posted to /v1/traces
+            service_name: service.name resource attribute
+            headers: Extra request headers, e.g. for authentication
+            timeout: Request timeout in seconds
+
+        Raises:
+            ConfigurationError: If httpx is not installed
+        """
+        try:
+            import httpx
+        except ImportError as e:
+            raise ConfigurationError(
+                "OTLP export requires httpx. Install with: pip install semanticquark[utilities]"
+            ) from e
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self._client = httpx.AsyncClient(headers=headers, timeout=timeout)
+
+    async def export(self, spans: List[Span]) -> None:
+        """Post the spans to the collector."""
+        response = await self._client.post(self.url, json=otlp_payload(spans, self.service_name))
+        response.raise_for_status()
+
+    async def shutdown(self) -> None:
+        """Close the HTTP client."""
+        await self._client.aclose()
+
+
+class BatchSpanProcessor:
+    """Queues finished spans and exports them in batches in the background.
+
+    At most ``max_queue_size`` spans wait for export; beyond that the
+    oldest are dropped rather than slowing down requests.
+    """
+
+    def __init__(
+        self,
+        exporter: SpanExporter,
+        max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        schedule_delay: float = DEFAULT_SCHEDULE_DELAY,
+    ):
+        """Initialize the processor.
+
+        Args:
+            exporter: Where spans are exported to
+            max_queue_size: Spans queued before the oldest are dropped
+            batch_size: Spans per export
+            schedule_delay: Seconds between exports of a partial batch
+        """
+        self.exporter = exporter
+        self.batch_size = max(1, batch_size)
+        self.schedule_delay = schedule_delay
+        self._queue: Deque[Span] = deque(maxlen=max(1, max_queue_size))
+        self._task: Optional[asyncio.Task] = None
+        self.exported = 0
+        self.dropped = 0
+
+    def on_end(self, span: Span) -> None:
+        """Queue a finished span."""
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+        self._queue.append(span)
+
+    def start(self) -> None:
+        """Start exporting in the background."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Export the queued spans, stop, and shut the exporter down."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        await self.exporter.shutdown()
+
+    async def flush(self) -> None:
+        """Export every queued span now."""
+        while self._queue:
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            try:
+                await self.exporter.export(batch)
+                self.exported += len(batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                print(f"Warning: Failed to export {len(batch)} spans: {e}")
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get span counts."""
+        return {"pending": len(self._queue), "exported": self.exported, "dropped": self.dropped}
+
+    async def _run(self) -> None:
+        """Export batches as they fill, or every ``schedule_delay`` seconds."""
+        while True:
+            deadline = time.monotonic() + self.schedule_delay
+            while len(self._queue) < self.batch_size and time.monotonic() < deadline:
+                await asyncio.sleep(min(0.05, self.schedule_delay))
+            await self.flush()
+
+
+# Span the current code runs in; tasks inherit it
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+# Whether the current code runs in a trace that was not sampled, so that
+# no span below it starts a trace of its own
+_unsampled: ContextVar[bool] = ContextVar("unsampled_trace", default=False)
+
+
+def current_span() -> Optional[Span]:
+    """Get the span the current code runs in, or None outside a trace."""
+    return _current_span.get()
+
+
+@contextmanager
+def _as_current(span: Span) -> Iterator[Span]:
+    """Make ``span`` current for the block, ending it afterwards."""
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
 
 
 class Tracer:
-    """Distributed tracing."""
-    
-    @staticmethod
-    def start_trace(operation: str) -> TraceContext:
-        """Start a new trace."""
-        return TraceContext()
-    
-    @staticmethod
-    def end_trace(context: TraceContext, metadata: Optional[Dict[str, Any]] = None):
-        """End a trace."""
-        end_time = datetime.utcnow()
-        duration = (end_time - context.start_time).total_seconds()
-        
-        trace_data = {
-            **context.to_dict(),
-            "end_time": end_time.isoformat(),
-            "duration_seconds": duration,
-            "metadata": metadata or {},
-        }
-        
-        # In production, would send to tracing backend (Jaeger, Zipkin, etc.)
-        return trace_data
+    """Creates spans and hands finished ones to a processor.
+
+    Root spans are sampled with probability ``sample_rate``, unless an
+    incoming trace context has already decided.
+    """
+
+    def __init__(
+        self,
+        processor: Optional[BatchSpanProcessor] = None,
+        service_name: str = DEFAULT_SERVICE_NAME,
+        sample_rate: float = 1.0,
+    ):
+        """Initialize the tracer.
+
+        Args:
+            processor: Processor exporting finished spans (default: one
+                keeping them in memory)
+            service_name: Name the spans are reported under
+            sample_rate: Fraction of new traces recorded
+        """
+        self.processor = processor or BatchSpanProcessor(InMemorySpanExporter())
+        self.service_name = service_name
+        self.sample_rate = sample_rate
+
+    @contextmanager
+    def start_span(
+        self,
+        name: str,
+        context: Optional[TraceContext] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+        kind: int = SPAN_KIND_INTERNAL,
+    ) -> Iterator[Optional[Span]]:
+        """Run the block in a new span.
+
+        The span is a child of ``context`` (e.g. read from request headers),
+        else of the current span, else the root of a new trace. Yields None
+        when the trace is not sampled, and for every span started within an
+        unsampled trace without a context of its own.
+        """
+        parent = current_span()
+        if context is None and parent is not None:
+            span = Span(self, name, parent.trace_id, parent.span_id, kind, attributes)
+        elif context is None and _unsampled.get():
+            yield None
+            return
+        else:
+            sampled = context.sampled if context is not None else random.random() < self.sample_rate
+            if not sampled:
+                token = _unsampled.set(True)
+                try:
+                    yield None
+                finally:
+                    _unsampled.reset(token)
+                return
+            context = context or TraceContext()
+            span = Span(self, name, context.trace_id, context.span_id, kind, attributes)
+        with _as_current(span):
+            yield span
+
+    def start_trace(self, operation: str) -> Span:
+        """Start a root span, to be ended with end_trace."""
+        return Span(self, operation, TraceContext().trace_id)
+
+    def end_trace(self, span: Span, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """End a span started with start_trace."""
+        span.set_attributes(metadata or {})
+        span.end()
+        return span.to_otlp()
+
+
+@contextmanager
+def trace_span(
+    name: str, tracer: Optional[Tracer] = None, attributes: Optional[Dict[str, Any]] = None
+) -> Iterator[Optional[Span]]:
+    """Run the block in a child of the current span.
+
+    Without a current span, a new trace is started with ``tracer``, unless
+    the block runs within an unsampled trace; without a tracer either,
+    nothing is traced and None is yielded.
+    """
+    parent = current_span()
+    if parent is not None:
+        tracer = parent.tracer
+    if tracer is None:
+        yield None
+        return
+    with tracer.start_span(name, attributes=attributes) as span:
+        yield span
+
+
+def sql_hash(sql: str) -> str:
+    """Short stable hash identifying a SQL statement in span attributes."""
+    return hashlib.sha256(sql.encode("utf-8")).hexdigest()[:16]
+
+
+def create_exporter(
+    kind: str,
+    otlp_endpoint: str = "http://localhost:4318",
+    file_path: Optional[str] = None,
+    service_name: str = DEFAULT_SERVICE_NAME,
+) -> SpanExporter:
+    """Create a span exporter by name (otlp, file or memory).
 
+    Raises:
+        ConfigurationError: If the kind is unknown or misconfigured
+    """
+    if kind == "otlp":
+        return OTLPSpanExporter(otlp_endpoint, service_name=service_name)
+    if kind == "file":
+        if not file_path:
+            raise ConfigurationError("The file span exporter needs a file path")
+        return FileSpanExporter(file_path)
+    if kind == "memory":
+        return InMemorySpanExporter()
+    raise ConfigurationError(f"Unknown span exporter '{kind}', expected otlp, file or memory")
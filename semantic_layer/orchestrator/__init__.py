@@ -1,9 +1,32 @@
 """Query orchestration and execution."""
 
 from semantic_layer.orchestrator.orchestrator import QueryEngine
+from semantic_layer.orchestrator.admission import AdmissionController
+from semantic_layer.orchestrator.limits import (
+    AIMDLimit,
+    ConcurrencyLimit,
+    FixedLimit,
+    GradientLimit,
+)
+from semantic_layer.orchestrator.jobs import QueryJob, QueryJobManager
+from semantic_layer.orchestrator.active_queries import ActiveQuery, ActiveQueryRegistry
 from semantic_layer.orchestrator.execution_plan import ExecutionPlan
 from semantic_layer.orchestrator.pipeline import QueryPipeline
 from semantic_layer.orchestrator.metrics import QueryMetrics
 
-__all__ = ["QueryEngine", "ExecutionPlan", "QueryPipeline", "QueryMetrics"]
+__all__ = [
+    "QueryEngine",
+    "AdmissionController",
+    "ConcurrencyLimit",
+    "FixedLimit",
+    "AIMDLimit",
+    "GradientLimit",
+    "QueryJob",
+    "QueryJobManager",
+    "ActiveQuery",
+    "ActiveQueryRegistry",
+    "ExecutionPlan",
+    "QueryPipeline",
+    "QueryMetrics",
+]
 
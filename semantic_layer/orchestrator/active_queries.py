@@ -0,0 +1,83 @@
+"""Registry of queries running against the database."""
+
+import asyncio
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class ActiveQuery:
+    """A statement queued for or running on the database."""
+
+    def __init__(
+        self,
+        sql: str,
+        task: Optional[asyncio.Task],
+        user_id: Optional[str] = None,
+        tenant_id: Optional[str] = None,
+    ):
+        self.id = uuid.uuid4().hex
+        self.sql = sql
+        self.task = task
+        self.user_id = user_id
+        self.tenant_id = tenant_id
+        self.state = "queued"
+        self.started_at = time.time()
+        self.killed = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Describe the query for the admin API."""
+        return {
+            "query_id": self.id,
+            "state": self.state,
+            "sql": self.sql,
+            "user_id": self.user_id,
+            "tenant_id": self.tenant_id,
+            "started_at": self.started_at,
+            "elapsed_ms": round((time.time() - self.started_at) * 1000, 2),
+        }
+
+
+class ActiveQueryRegistry:
+    """Tracks running statements so they can be listed and killed.
+
+    Killing a query cancels the task executing it; drivers turn the
+    cancellation into a cancel request on the database.
+    """
+
+    def __init__(self):
+        self._queries: Dict[str, ActiveQuery] = {}
+
+    @contextmanager
+    def track(
+        self, sql: str, user_id: Optional[str] = None, tenant_id: Optional[str] = None
+    ) -> Iterator[ActiveQuery]:
+        """Register the current task's statement for the duration of the block."""
+        active = ActiveQuery(sql, asyncio.current_task(), user_id=user_id, tenant_id=tenant_id)
+        self._queries[active.id] = active
+        try:
+            yield active
+        finally:
+            self._queries.pop(active.id, None)
+
+    def list(self) -> List[ActiveQuery]:
+        """Get the active queries, oldest first."""
+        return sorted(self._queries.values(), key=lambda active: active.started_at)
+
+    def get(self, query_id: str) -> Optional[ActiveQuery]:
+        """Get an active query by ID."""
+        return self._queries.get(query_id)
+
+    def kill(self, query_id: str) -> bool:
+        """Cancel an active query.
+
+        Returns:
+            True if the query was active and has been cancelled
+        """
+        active = self._queries.get(query_id)
+        if active is None or active.task is None or active.task.done():
+            return False
+        active.killed = True
+        active.task.cancel()
+        return True
@@ -0,0 +1,227 @@
+"""Admission control in front of the database driver."""
+
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from semantic_layer.exceptions import OverloadedError, QueryError, QueryTimeoutError
+from semantic_layer.orchestrator.limits import ConcurrencyLimit, FixedLimit
+
+
+# Priority classes, most urgent first
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BACKGROUND = "background"
+PRIORITY_REFRESH = "refresh"
+PRIORITY_CLASSES = (PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND, PRIORITY_REFRESH)
+
+DEFAULT_MAX_QUEUE_DEPTH = 100
+
+# Assumed statement duration until one has been measured
+DEFAULT_HOLD_MS = 1000.0
+
+# Weight of the latest statement in the average statement duration
+HOLD_SMOOTHING = 0.2
+
+# Failures that signal an overloaded database rather than a bad query
+DROP_ERRORS = (
+    asyncio.TimeoutError,
+    asyncio.CancelledError,
+    ConnectionError,
+    OSError,
+    QueryTimeoutError,
+)
+
+
+def is_drop(error: BaseException) -> bool:
+    """Check whether a failure signals an overloaded database.
+
+    Drivers wrap their failures in ExecutionError, so the error's cause
+    chain is searched for a drop as well.
+    """
+    seen = set()
+    current: Optional[BaseException] = error
+    while current is not None and id(current) not in seen:
+        if isinstance(current, DROP_ERRORS):
+            return True
+        seen.add(id(current))
+        current = current.__cause__ or current.__context__
+    return False
+
+
+class AdmissionController:
+    """Bounded, prioritized queue for database slots.
+
+    At most ``limit.limit`` statements run at once; an adaptive limit
+    (see limits.py) moves with the latency and drops it observes. Others
+    wait in a queue of at most ``max_queue_depth`` entries; beyond that,
+    requests are rejected at once with OverloadedError and a retry-after
+    hint instead of piling up. Waiting statements are served by priority class first
+    (interactive, then background, then refresh). Within a class, tenants
+    share slots in proportion to their weight (start-time fair queuing), so
+    one tenant's burst cannot starve another.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 10,
+        max_queue_depth: int = DEFAULT_MAX_QUEUE_DEPTH,
+        tenant_weights: Optional[Dict[str, float]] = None,
+        limit: Optional[ConcurrencyLimit] = None,
+        metrics_collector: Optional[Any] = None,
+    ):
+        """Initialize the controller.
+
+        Args:
+            max_concurrency: Statements running at once, usually the pool
+                size; ignored when ``limit`` is given
+            max_queue_depth: Statements allowed to wait before rejecting
+            tenant_weights: Share of each tenant within a class (default 1)
+            limit: Optional (adaptive) concurrency limit
+            metrics_collector: Optional MetricsCollector the limit, load and
+                rejections are reported to
+        """
+        self.limit = limit or FixedLimit(max_concurrency)
+        self.metrics_collector = metrics_collector
+        self.max_queue_depth = max(0, max_queue_depth)
+        self.tenant_weights = tenant_weights or {}
+        self.running = 0
+        self._waiting = 0
+        # (class rank, start tag, sequence, class, future)
+        self._queue: List[Tuple[int, float, int, str, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._virtual_time: Dict[str, float] = {priority: 0.0 for priority in PRIORITY_CLASSES}
+        # Finish tag of each (class, tenant)'s latest queued statement
+        self._tenant_finish: Dict[Tuple[str, Optional[str]], float] = {}
+        self._hold_ms: Optional[float] = None
+
+    @property
+    def max_concurrency(self) -> int:
+        """Statements currently allowed to run at once."""
+        return self.limit.limit
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of statements waiting for a slot."""
+        return self._waiting
+
+    def retry_after(self) -> int:
+        """Estimate in seconds when a rejected request could be admitted."""
+        hold_ms = self._hold_ms if self._hold_ms is not None else DEFAULT_HOLD_MS
+        drain_ms = hold_ms * (self._waiting + 1) / self.max_concurrency
+        return max(1, math.ceil(drain_ms / 1000))
+
+    async def acquire(
+        self, priority: str = PRIORITY_INTERACTIVE, tenant_id: Optional[str] = None
+    ) -> float:
+        """Wait for a slot.
+
+        Returns:
+            Time spent waiting, in milliseconds
+
+        Raises:
+            QueryError: If the priority class is unknown
+            OverloadedError: If the queue is full
+        """
+        if priority not in PRIORITY_CLASSES:
+            raise QueryError(
+                f"Unknown priority '{priority}', expected one of {', '.join(PRIORITY_CLASSES)}"
+            )
+        if self.running < self.max_concurrency and not self._waiting:
+            self.running += 1
+            self._report()
+            return 0.0
+        if self._waiting >= self.max_queue_depth:
+            retry_after = self.retry_after()
+            if self.metrics_collector:
+                self.metrics_collector.record_admission_rejection(priority)
+            raise OverloadedError(
+                "Too many queries are queued, retry later",
+                retry_after=retry_after,
+                details={"queue_depth": self._waiting, "retry_after": retry_after},
+            )
+
+        start_time = time.perf_counter()
+        weight = max(float(self.tenant_weights.get(tenant_id, 1.0)), 1e-6)
+        key = (priority, tenant_id)
+        start_tag = max(self._virtual_time[priority], self._tenant_finish.get(key, 0.0))
+        self._tenant_finish[key] = start_tag + 1 / weight
+
+        future = asyncio.get_running_loop().create_future()
+        rank = PRIORITY_CLASSES.index(priority)
+        heapq.heappush(self._queue, (rank, start_tag, next(self._sequence), priority, future))
+        self._waiting += 1
+        self._report()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was granted just as the wait was cancelled
+                self.release()
+            else:
+                self._waiting -= 1
+                self._report()
+            raise
+        return (time.perf_counter() - start_time) * 1000
+
+    def release(self, hold_ms: Optional[float] = None, dropped: bool = False) -> None:
+        """Free a slot and admit waiting statements the limit now allows.
+
+        Args:
+            hold_ms: How long the slot was held; updates the limit and the
+                retry-after estimate (no sample if None)
+            dropped: Whether the statement timed out or lost its connection
+        """
+        if hold_ms is not None:
+            self.limit.on_sample(hold_ms, self.running, dropped)
+            if self._hold_ms is None:
+                self._hold_ms = hold_ms
+            else:
+                self._hold_ms += HOLD_SMOOTHING * (hold_ms - self._hold_ms)
+
+        self.running -= 1
+        while self._queue and self.running < self.max_concurrency:
+            _, start_tag, _, priority, future = heapq.heappop(self._queue)
+            if future.cancelled():
+                continue
+            self._waiting -= 1
+            self._virtual_time[priority] = start_tag
+            self.running += 1
+            future.set_result(None)
+
+        if not self._waiting:
+            # Nobody is waiting, so no tenant is owed anything
+            self._tenant_finish.clear()
+        self._report()
+
+    def _report(self) -> None:
+        """Export the limit and load."""
+        if self.metrics_collector:
+            self.metrics_collector.record_admission(
+                limit=self.max_concurrency, in_flight=self.running, queue_depth=self._waiting
+            )
+
+    @asynccontextmanager
+    async def admit(
+        self, priority: str = PRIORITY_INTERACTIVE, tenant_id: Optional[str] = None
+    ) -> AsyncIterator[float]:
+        """Hold a slot for the duration of the block.
+
+        Yields:
+            Time spent waiting for the slot, in milliseconds
+        """
+        wait_ms = await self.acquire(priority, tenant_id)
+        start_time = time.perf_counter()
+        try:
+            yield wait_ms
+        except BaseException as e:
+            if is_drop(e):
+                self.release((time.perf_counter() - start_time) * 1000, dropped=True)
+            else:
+                # A failing query says nothing about database load
+                self.release()
+            raise
+        self.release((time.perf_counter() - start_time) * 1000)
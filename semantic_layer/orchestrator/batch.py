@@ -0,0 +1,157 @@
+"""Fusion of batched queries that can share one scan."""
+
+import copy
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from semantic_layer.exceptions import SemanticLayerError
+from semantic_layer.query.query import Query
+from semantic_layer.sql.builder import GROUPING_SET_COLUMN, SQLBuilder
+
+
+class FusedQuery:
+    """One query answering several queries of a batch."""
+
+    def __init__(self, query: Query, members: List[Tuple[int, Query]], grouping: bool = False):
+        self.query = query
+        # (position in the batch, original query)
+        self.members = members
+        # Whether members are told apart by their grouping set
+        self.grouping = grouping
+
+    @property
+    def fused(self) -> bool:
+        """Whether more than one query is answered."""
+        return len(self.members) > 1
+
+    def split(self, result: Dict[str, Any]) -> List[Tuple[int, Dict[str, Any]]]:
+        """Split the fused result into one result per member query."""
+        if not self.fused:
+            return [(self.members[0][0], result)]
+
+        split_results = []
+        for position, query in self.members:
+            columns = [dim_path.replace(".", "_") for dim_path in query.dimensions]
+            columns += [
+                f"{td.dimension.replace('.', '_')}_{td.granularity}"
+                for td in query.time_dimensions if td.granularity
+            ]
+            columns += [meas_path.replace(".", "_") for meas_path in query.measures]
+            wanted = None
+            if self.grouping:
+                members = sorted(self._grouping_set(query))
+                wanted = [sorted(s) for s in self.query.grouping_sets].index(members)
+
+            rows = [
+                {column: row.get(column) for column in columns}
+                for row in result.get("data", [])
+                if wanted is None or row.get(GROUPING_SET_COLUMN) == wanted
+            ]
+            meta = copy.deepcopy(result.get("meta", {}))
+            meta["query"] = {
+                "dimensions": query.dimensions,
+                "measures": query.measures,
+                "filters": [f.dict() for f in query.filters],
+            }
+            meta["row_count"] = len(rows)
+            meta["fused_queries"] = len(self.members)
+            if "approximate" in meta:
+                meta["approximate"] = {
+                    path: bounds
+                    for path, bounds in meta["approximate"].items()
+                    if path in query.measures
+                }
+            split_results.append((position, {"data": rows, "meta": meta}))
+        return split_results
+
+    @staticmethod
+    def _grouping_set(query: Query) -> List[str]:
+        """Get the members a query groups by."""
+        time_dimensions = [td.dimension for td in query.time_dimensions if td.granularity]
+        return list(query.dimensions) + time_dimensions
+
+
+class BatchPlanner:
+    """Groups batched queries that can be answered by one SQL statement.
+
+    Queries fuse when they read the same cubes with the same filters and
+    time dimensions, and have no ordering, paging, HAVING, CTEs or compare
+    ranges. Queries grouping by the same members become one query selecting
+    every measure; otherwise the union of their dimensions is grouped by
+    GROUPING SETS and rows are told apart by their set.
+    """
+
+    def __init__(self, sql_builder: SQLBuilder):
+        """Initialize the planner.
+
+        Args:
+            sql_builder: Builder used to resolve the cubes a query reads
+        """
+        self.sql_builder = sql_builder
+
+    def plan(self, queries: List[Query]) -> List[FusedQuery]:
+        """Group a batch of queries; every query ends up in exactly one group."""
+        groups: Dict[str, List[Tuple[int, Query]]] = {}
+        plans: List[Any] = []
+        for position, query in enumerate(queries):
+            key = self.fusion_key(query)
+            if key is None:
+                plans.append([(position, query)])
+            elif key in groups:
+                groups[key].append((position, query))
+            else:
+                groups[key] = [(position, query)]
+                plans.append(groups[key])
+        return [self._fuse(members) for members in plans]
+
+    @staticmethod
+    def plan_unfused(queries: List[Query]) -> List[FusedQuery]:
+        """Put every query in a group of its own."""
+        return [FusedQuery(query, [(position, query)]) for position, query in enumerate(queries)]
+
+    def fusion_key(self, query: Query) -> Optional[str]:
+        """Get the key of queries this one can fuse with, or None."""
+        if (
+            query.order_by or query.limit or query.offset or query.measure_filters or query.ctes
+            or query.get_grouping_sets() is not None
+            or any(td.compare_date_range for td in query.time_dimensions)
+            or self.sql_builder.get_rolling_measures(query)
+        ):
+            return None
+        try:
+            cubes = sorted(self.sql_builder._get_required_cubes(query))
+        except SemanticLayerError:
+            return None
+        return json.dumps(
+            {
+                "cubes": cubes,
+                "filters": [f.model_dump() for f in query.filters],
+                "time_dimensions": [td.model_dump() for td in query.time_dimensions],
+            },
+            sort_keys=True,
+            default=str,
+        )
+
+    @staticmethod
+    def _fuse(members: List[Tuple[int, Query]]) -> FusedQuery:
+        """Build the query answering all members."""
+        first = members[0][1]
+        if len(members) == 1:
+            return FusedQuery(first, members)
+
+        measures = list(dict.fromkeys(m for _, query in members for m in query.measures))
+        sets = [FusedQuery._grouping_set(query) for _, query in members]
+        if all(sorted(grouping_set) == sorted(sets[0]) for grouping_set in sets):
+            return FusedQuery(first.model_copy(update={"measures": measures}), members)
+
+        dimensions = list(dict.fromkeys(d for _, query in members for d in query.dimensions))
+        grouping_sets: List[List[str]] = []
+        for grouping_set in sets:
+            if sorted(grouping_set) not in [sorted(existing) for existing in grouping_sets]:
+                grouping_sets.append(grouping_set)
+        fused = first.model_copy(update={
+            "dimensions": dimensions,
+            "measures": measures,
+            "grouping_sets": grouping_sets,
+        })
+        return FusedQuery(fused, members, grouping=True)
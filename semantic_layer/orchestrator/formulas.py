@@ -0,0 +1,223 @@
+"""Formula measures evaluated after aggregation.
+
+A formula such as ``orders.revenue / orders.count`` is planned as its base
+measures, which are fetched like any other measure (and so can be served by
+a rollup), and the arithmetic is applied column by column to the aggregated
+rows afterwards.
+"""
+
+import ast
+import operator
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from semantic_layer.exceptions import ModelError, QueryError
+from semantic_layer.models.schema import Schema
+from semantic_layer.query.query import LogicalFilter, Query
+
+
+_BINARY_OPERATORS: Dict[type, Callable[[Any, Any], Any]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+
+_UNARY_OPERATORS: Dict[type, Callable[[Any], Any]] = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+
+def _apply(op: Callable[..., Any], *values: Any) -> Any:
+    """Apply an operator with SQL NULL semantics; division by zero is NULL."""
+    if any(value is None for value in values):
+        return None
+    if any(isinstance(value, float) for value in values):
+        values = tuple(float(value) if isinstance(value, Decimal) else value for value in values)
+    try:
+        return op(*values)
+    except ZeroDivisionError:
+        return None
+
+
+class CompiledFormula:
+    """A formula measure compiled to arithmetic over base measure columns."""
+
+    def __init__(self, measure_path: str, tree: ast.AST, references: List[str]):
+        self.measure_path = measure_path
+        self.tree = tree
+        # Base measure paths the formula reads, in first-use order
+        self.references = references
+
+    def evaluate(self, results: List[Dict[str, Any]]) -> List[Any]:
+        """Evaluate the formula for every row at once."""
+        columns = {
+            path: [row.get(path.replace(".", "_")) for row in results]
+            for path in self.references
+        }
+        return self._evaluate(self.tree, columns, len(results))
+
+    def _evaluate(self, node: ast.AST, columns: Dict[str, List[Any]], size: int) -> List[Any]:
+        """Evaluate a node into one value per row."""
+        if isinstance(node, ast.Constant):
+            return [node.value] * size
+        if isinstance(node, ast.UnaryOp):
+            op = _UNARY_OPERATORS[type(node.op)]
+            return [_apply(op, value) for value in self._evaluate(node.operand, columns, size)]
+        if isinstance(node, ast.BinOp):
+            op = _BINARY_OPERATORS[type(node.op)]
+            left = self._evaluate(node.left, columns, size)
+            right = self._evaluate(node.right, columns, size)
+            return [_apply(op, a, b) for a, b in zip(left, right)]
+        # Measure references were replaced by Name nodes holding their path
+        return columns[node.id]
+
+
+class FormulaPlan:
+    """A query rewritten to fetch base measures, and the formulas to apply."""
+
+    def __init__(self, query: Query, formulas: List[CompiledFormula], hidden: List[str]):
+        self.query = query
+        self.formulas = formulas
+        # Base measures fetched only for formulas; dropped from the results
+        self.hidden = hidden
+
+    def apply(self, results: List[Dict[str, Any]]) -> None:
+        """Compute formula columns in place and drop the hidden base columns."""
+        for formula in self.formulas:
+            column = formula.measure_path.replace(".", "_")
+            for row, value in zip(results, formula.evaluate(results)):
+                row[column] = value
+        hidden_columns = [path.replace(".", "_") for path in self.hidden]
+        for row in results:
+            for column in hidden_columns:
+                row.pop(column, None)
+
+
+class FormulaPlanner:
+    """Resolves formula measures into the base measures they aggregate.
+
+    Formulas are parsed as arithmetic (``+ - * /``, parentheses, numeric
+    constants) over measure references, either ``cube.measure`` or a bare
+    measure name of the same cube. Formulas referencing other formulas are
+    expanded. Formulas that are not plain arithmetic over measures (e.g. raw
+    SQL), or that the query orders or filters by, stay in SQL.
+    """
+
+    def __init__(self, schema: Schema):
+        """Initialize the planner.
+
+        Args:
+            schema: Schema containing cube definitions
+        """
+        self.schema = schema
+
+    def plan(self, query: Query) -> FormulaPlan:
+        """Rewrite a query's formula measures into their base measures.
+
+        Args:
+            query: Query to plan
+
+        Returns:
+            Plan holding the rewritten query; the query itself if no
+            formula can be evaluated after aggregation
+        """
+        in_sql = self._members_needed_in_sql(query)
+        formulas: List[CompiledFormula] = []
+        measures: List[str] = []
+        for meas_path in query.measures:
+            formula = None if meas_path in in_sql else self.compile(meas_path)
+            if formula is None:
+                measures.append(meas_path)
+                continue
+            formulas.append(formula)
+            measures.extend(formula.references)
+
+        if not formulas:
+            return FormulaPlan(query, [], [])
+
+        measures = list(dict.fromkeys(measures))
+        hidden = [path for path in measures if path not in query.measures]
+        return FormulaPlan(query.model_copy(update={"measures": measures}), formulas, hidden)
+
+    def compile(self, meas_path: str) -> Optional[CompiledFormula]:
+        """Compile a formula measure, or None if it must be computed in SQL."""
+        references: List[str] = []
+        tree = self._expand(meas_path, references, set())
+        if tree is None or not references:
+            return None
+        return CompiledFormula(meas_path, tree, references)
+
+    def _expand(
+        self, meas_path: str, references: List[str], expanding: Set[str]
+    ) -> Optional[ast.AST]:
+        """Parse a measure's formula, inlining nested formulas."""
+        try:
+            cube, meas_name = self.schema.get_cube_for_measure(meas_path)
+            measure = cube.get_measure(meas_name)
+        except ModelError:
+            return None
+        if not measure.formula:
+            return None
+        if meas_path in expanding:
+            raise QueryError(f"Formula of measure '{meas_path}' references itself")
+
+        try:
+            tree = ast.parse(measure.formula, mode="eval").body
+        except SyntaxError:
+            return None
+        return self._resolve(tree, cube.name, references, expanding | {meas_path})
+
+    def _resolve(
+        self, node: ast.AST, cube_name: str, references: List[str], expanding: Set[str]
+    ) -> Optional[ast.AST]:
+        """Validate a formula node and replace measure references by their path."""
+        if isinstance(node, ast.Constant):
+            is_number = isinstance(node.value, (int, float)) and not isinstance(node.value, bool)
+            return node if is_number else None
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+            operand = self._resolve(node.operand, cube_name, references, expanding)
+            return None if operand is None else ast.UnaryOp(op=node.op, operand=operand)
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+            left = self._resolve(node.left, cube_name, references, expanding)
+            right = self._resolve(node.right, cube_name, references, expanding)
+            if left is None or right is None:
+                return None
+            return ast.BinOp(left=left, op=node.op, right=right)
+
+        if isinstance(node, ast.Name):
+            path = f"{cube_name}.{node.id}"
+        elif isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name):
+            path = f"{node.value.id}.{node.attr}"
+        else:
+            return None
+        return self._reference(path, references, expanding)
+
+    def _reference(
+        self, path: str, references: List[str], expanding: Set[str]
+    ) -> Optional[ast.AST]:
+        """Resolve a measure reference to a base measure or a nested formula."""
+        try:
+            cube, meas_name = self.schema.get_cube_for_measure(path)
+            measure = cube.get_measure(meas_name)
+        except ModelError:
+            return None
+        if measure.formula:
+            return self._expand(path, references, expanding)
+        if path not in references:
+            references.append(path)
+        return ast.Name(id=path, ctx=ast.Load())
+
+    @staticmethod
+    def _members_needed_in_sql(query: Query) -> Set[str]:
+        """Get members the database must compute to order or filter by."""
+        members = {order.dimension for order in query.order_by if hasattr(order, "dimension")}
+        pending = list(query.measure_filters)
+        while pending:
+            filter_obj = pending.pop()
+            if isinstance(filter_obj, LogicalFilter):
+                pending.extend(filter_obj.or_ or filter_obj.and_ or [])
+            else:
+                members.add(filter_obj.dimension or filter_obj.member)
+        return members
@@ -0,0 +1,251 @@
+"""Long-running queries executed as background jobs."""
+
+import asyncio
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from semantic_layer.exceptions import OverloadedError
+from semantic_layer.orchestrator.admission import PRIORITY_INTERACTIVE
+from semantic_layer.orchestrator.orchestrator import QueryEngine
+from semantic_layer.query.query import Query
+from semantic_layer.scheduling.jobs import JobStatus
+
+
+# How long finished jobs and their results are kept
+DEFAULT_RESULT_TTL_SECONDS = 3600
+
+# Jobs kept at once, running or finished
+DEFAULT_MAX_JOBS = 1000
+
+
+class QueryJob:
+    """A query running (or finished) in the background."""
+
+    def __init__(self, key: str, query: Query, user_id: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.query = query
+        self.user_id = user_id
+        self.status = JobStatus.PENDING
+        self.error: Optional[str] = None
+        # Exception the query failed with, to re-raise to a waiting client
+        self.exception: Optional[Exception] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        # Result held in memory when there is no result store
+        self.result: Optional[Dict[str, Any]] = None
+        # Result metadata when the rows are in the result store
+        self.meta: Optional[Dict[str, Any]] = None
+        # Whether a client was handed the job ID to poll; jobs that finish
+        # while their submitter waits are not kept
+        self.detached = False
+
+    @property
+    def done(self) -> bool:
+        """Whether the job has finished, successfully or not."""
+        return self.status in (JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Describe the job for API responses."""
+        job = {
+            "job_id": self.id,
+            "status": self.status.value,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+        if self.error:
+            job["error"] = self.error
+        return job
+
+
+class QueryJobManager:
+    """Runs queries as jobs that clients can wait on, poll and re-attach to.
+
+    A submitted query runs in the background whether or not anyone waits
+    for it. Submitting a query that is still running with the same user
+    context returns the existing job instead of running it again; finished
+    jobs are never reused, so results stay subject to the engine's cache.
+    A query that finishes within ``execute``'s wait is returned without
+    keeping a job. Jobs whose ID was handed out are kept ``result_ttl``
+    seconds after finishing, with their rows in ``result_store`` (e.g.
+    ParquetStorage) when given and in memory otherwise. At most
+    ``max_jobs`` jobs are kept; the oldest finished ones make room, and
+    OverloadedError is raised when all of them are still running.
+    """
+
+    def __init__(
+        self,
+        query_engine: QueryEngine,
+        result_store: Optional[Any] = None,
+        result_ttl: int = DEFAULT_RESULT_TTL_SECONDS,
+        max_jobs: int = DEFAULT_MAX_JOBS,
+    ):
+        """Initialize the job manager.
+
+        Args:
+            query_engine: Engine executing the queries
+            result_store: Optional storage with async store/retrieve/delete
+                for result rows
+            result_ttl: Seconds finished jobs are kept
+            max_jobs: Jobs kept at once, running or finished
+        """
+        self.query_engine = query_engine
+        self.result_store = result_store
+        self.result_ttl = result_ttl
+        self.max_jobs = max(1, max_jobs)
+        self._jobs: Dict[str, QueryJob] = {}
+        # Job ID of each query key
+        self._by_key: Dict[str, str] = {}
+
+    def submit(
+        self,
+        query: Query,
+        user_context: Optional[Dict[str, Any]] = None,
+        priority: str = PRIORITY_INTERACTIVE,
+    ) -> QueryJob:
+        """Start a query in the background, or attach to the same running query.
+
+        Raises:
+            OverloadedError: If ``max_jobs`` jobs are running
+        """
+        job = self._submit(query, user_context, priority)
+        job.detached = True
+        return job
+
+    async def execute(
+        self,
+        query: Query,
+        user_context: Optional[Dict[str, Any]] = None,
+        wait_seconds: float = 0,
+        priority: str = PRIORITY_INTERACTIVE,
+    ) -> QueryJob:
+        """Submit a query and wait up to ``wait_seconds`` for it to finish.
+
+        Returns:
+            The job; if it has not finished, its ID can be polled
+
+        Raises:
+            OverloadedError: If ``max_jobs`` jobs are running
+        """
+        job = self._submit(query, user_context, priority)
+        if wait_seconds > 0:
+            # asyncio.wait does not cancel the job when the wait times out
+            await asyncio.wait({job.task}, timeout=wait_seconds)
+        if not job.done:
+            job.detached = True
+        return job
+
+    async def wait(self, job_id: str, timeout: float = 0) -> Optional[QueryJob]:
+        """Wait up to ``timeout`` seconds for a job to finish (long-poll).
+
+        Returns:
+            The job, finished or not, or None if it does not exist
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if not job.done and timeout > 0:
+            # asyncio.wait does not cancel the job when the client gives up
+            await asyncio.wait({job.task}, timeout=timeout)
+        return job
+
+    def get(self, job_id: str) -> Optional[QueryJob]:
+        """Get a job by ID."""
+        self._expire()
+        return self._jobs.get(job_id)
+
+    async def get_result(self, job: QueryJob) -> Optional[Dict[str, Any]]:
+        """Get the result of a completed job, or None if it has none."""
+        if job.status != JobStatus.COMPLETED:
+            return None
+        if job.result is not None:
+            return job.result
+        if self.result_store is None:
+            return None
+        rows = await self.result_store.retrieve(job.id)
+        if rows is None:
+            return None
+        return {"data": rows, "meta": job.meta}
+
+    async def _run(
+        self, job: QueryJob, user_context: Optional[Dict[str, Any]], priority: str
+    ) -> None:
+        """Execute a job's query and keep its result."""
+        job.status = JobStatus.RUNNING
+        try:
+            result = await self.query_engine.execute(
+                job.query, user_context=user_context, priority=priority
+            )
+            if job.detached and self.result_store is not None and result.get("data"):
+                await self.result_store.store(job.id, result["data"])
+                job.meta = result.get("meta", {})
+            else:
+                job.result = result
+            job.status = JobStatus.COMPLETED
+        except asyncio.CancelledError:
+            job.status = JobStatus.CANCELLED
+            raise
+        except Exception as e:
+            job.status = JobStatus.FAILED
+            job.exception = e
+            job.error = getattr(e, "message", str(e))
+            print(f"Query job {job.id} failed: {job.error}")
+        finally:
+            job.finished_at = time.time()
+            if self._by_key.get(job.key) == job.id:
+                del self._by_key[job.key]
+            if not job.detached:
+                # Its submitter is still waiting and takes the result from the job
+                self._jobs.pop(job.id, None)
+
+    def _submit(
+        self,
+        query: Query,
+        user_context: Optional[Dict[str, Any]],
+        priority: str,
+    ) -> QueryJob:
+        """Attach to the same running query, or start a new job."""
+        self._expire()
+        key = self.query_engine.cache_key_generator.generate(query, user_context)
+        job = self._jobs.get(self._by_key.get(key, ""))
+        if job is not None and not job.done:
+            return job
+
+        self._make_room()
+        user_id = user_context.get("user_id") if user_context else None
+        job = QueryJob(key, query, user_id=user_id)
+        self._jobs[job.id] = job
+        self._by_key[key] = job.id
+        job.task = asyncio.create_task(self._run(job, user_context, priority))
+        return job
+
+    def _make_room(self) -> None:
+        """Forget the oldest finished jobs until another one fits.
+
+        Raises:
+            OverloadedError: If every kept job is still running
+        """
+        for job_id, job in list(self._jobs.items()):
+            if len(self._jobs) < self.max_jobs:
+                return
+            if job.done:
+                self._forget(job)
+        if len(self._jobs) >= self.max_jobs:
+            raise OverloadedError(
+                f"Too many query jobs running (limit {self.max_jobs})", retry_after=1
+            )
+
+    def _forget(self, job: QueryJob) -> None:
+        """Drop a finished job and its stored rows."""
+        del self._jobs[job.id]
+        if self.result_store is not None and job.meta is not None:
+            asyncio.ensure_future(self.result_store.delete(job.id))
+
+    def _expire(self) -> None:
+        """Forget jobs that finished more than ``result_ttl`` seconds ago."""
+        cutoff = time.time() - self.result_ttl
+        for job in list(self._jobs.values()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                self._forget(job)
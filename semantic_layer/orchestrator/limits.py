@@ -0,0 +1,157 @@
+"""Concurrency limits for the admission queue."""
+
+import math
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from semantic_layer.exceptions import ConfigurationError
+
+
+class ConcurrencyLimit(ABC):
+    """Number of statements allowed to run at once."""
+
+    @property
+    @abstractmethod
+    def limit(self) -> int:
+        """Current limit."""
+        pass
+
+    def on_sample(self, rtt_ms: float, in_flight: int, dropped: bool = False) -> None:
+        """Update the limit from a finished statement.
+
+        Args:
+            rtt_ms: How long the statement ran
+            in_flight: Statements running when it finished, itself included
+            dropped: Whether it timed out or lost its connection
+        """
+        pass
+
+
+class FixedLimit(ConcurrencyLimit):
+    """Limit that never changes."""
+
+    def __init__(self, limit: int):
+        self._limit = max(1, limit)
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+
+class AIMDLimit(ConcurrencyLimit):
+    """Additive-increase, multiplicative-decrease limit.
+
+    The limit grows by one after each statement finishing within
+    ``timeout_ms`` while at least half the limit is in use, and is cut by
+    ``backoff_ratio`` after a statement that was slower or dropped.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 10,
+        min_limit: int = 1,
+        max_limit: int = 200,
+        backoff_ratio: float = 0.9,
+        timeout_ms: float = 5000.0,
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.backoff_ratio = min(max(backoff_ratio, 0.1), 0.99)
+        self.timeout_ms = timeout_ms
+        self._limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def on_sample(self, rtt_ms: float, in_flight: int, dropped: bool = False) -> None:
+        if dropped or rtt_ms > self.timeout_ms:
+            self._limit = max(self.min_limit, math.floor(self._limit * self.backoff_ratio))
+        elif in_flight * 2 >= self._limit:
+            self._limit = min(self.max_limit, self._limit + 1)
+
+
+class GradientLimit(ConcurrencyLimit):
+    """Limit following the ratio of long-term to recent latency.
+
+    While recent latency stays near the long-term average the limit grows
+    by about its square root (the queue the database is allowed to build);
+    as recent latency rises above ``rtt_tolerance`` times the average the
+    limit shrinks, by at most half. Dropped statements count as the worst
+    gradient. Changes are smoothed, and the limit does not grow while less
+    than half of it is in use.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 10,
+        min_limit: int = 1,
+        max_limit: int = 200,
+        smoothing: float = 0.2,
+        rtt_tolerance: float = 1.5,
+        short_window: int = 10,
+        long_window: int = 600,
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.smoothing = min(max(smoothing, 0.01), 1.0)
+        self.rtt_tolerance = max(rtt_tolerance, 1.0)
+        self.short_window = max(1, short_window)
+        self.long_window = max(self.short_window, long_window)
+        self._limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self._short_rtt: Optional[float] = None
+        self._long_rtt: Optional[float] = None
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def on_sample(self, rtt_ms: float, in_flight: int, dropped: bool = False) -> None:
+        if self._short_rtt is None:
+            self._short_rtt = self._long_rtt = max(rtt_ms, 1e-3)
+        else:
+            self._short_rtt += (rtt_ms - self._short_rtt) / self.short_window
+            self._long_rtt += (rtt_ms - self._long_rtt) / self.long_window
+            # Let the baseline recover faster after a long slow period
+            if self._long_rtt / max(self._short_rtt, 1e-3) > 2:
+                self._long_rtt *= 0.95
+
+        if not dropped and in_flight * 2 < self._limit:
+            return
+
+        if dropped:
+            gradient = 0.5
+        else:
+            ratio = self.rtt_tolerance * self._long_rtt / max(self._short_rtt, 1e-3)
+            gradient = max(0.5, min(1.0, ratio))
+        new_limit = self._limit * gradient + math.sqrt(self._limit)
+        new_limit = self._limit * (1 - self.smoothing) + new_limit * self.smoothing
+        self._limit = min(self.max_limit, max(self.min_limit, new_limit))
+
+
+LIMIT_TYPES = {
+    "fixed": FixedLimit,
+    "aimd": AIMDLimit,
+    "gradient": GradientLimit,
+}
+
+
+def create_limit(
+    kind: str, initial_limit: int, min_limit: int = 1, max_limit: Optional[int] = None
+) -> ConcurrencyLimit:
+    """Create a concurrency limit by name (fixed, aimd or gradient).
+
+    Raises:
+        ConfigurationError: If the kind is unknown
+    """
+    if kind not in LIMIT_TYPES:
+        raise ConfigurationError(
+            f"Unknown concurrency limit '{kind}', expected one of {', '.join(LIMIT_TYPES)}"
+        )
+    if kind == "fixed":
+        return FixedLimit(initial_limit)
+    return LIMIT_TYPES[kind](
+        initial_limit=initial_limit,
+        min_limit=min_limit,
+        max_limit=max_limit or initial_limit * 4,
+    )
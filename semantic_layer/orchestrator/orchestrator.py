@@ -1,26 +1,54 @@
 """Query engine - orchestrates query execution."""
 
+import asyncio
 import time
-from typing import Any, Dict, List, Optional
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from uuid import UUID
 
 from semantic_layer.auth.base import SecurityContext
 from semantic_layer.cache.base import BaseCache
 from semantic_layer.cache.key_generator import CacheKeyGenerator
 from semantic_layer.drivers.base_driver import BaseDriver
-from semantic_layer.exceptions import ExecutionError
+from semantic_layer.exceptions import (
+    ExecutionError,
+    OverloadedError,
+    QueryCancelledError,
+    QueryError,
+    QueryTimeoutError,
+    SemanticLayerError,
+)
+from semantic_layer.orchestrator.active_queries import ActiveQuery, ActiveQueryRegistry
+from semantic_layer.orchestrator.admission import PRIORITY_INTERACTIVE, AdmissionController
+from semantic_layer.orchestrator.batch import BatchPlanner
+from semantic_layer.orchestrator.formulas import FormulaPlanner
 from semantic_layer.monitoring.callback_manager import CallbackManager
 from semantic_layer.monitoring.callbacks import BaseQueryCallback
 from semantic_layer.monitoring.handlers.logging_handler import LoggingCallbackHandler
 from semantic_layer.monitoring.handlers.metrics_handler import MetricsCallbackHandler
 from semantic_layer.monitoring.logging import QueryLogger
 from semantic_layer.monitoring.metrics import MetricsCollector
+from semantic_layer.monitoring.timings import collect_timings, current_timings, stage
+from semantic_layer.monitoring.tracing import Tracer, current_span, sql_hash, trace_span
 from semantic_layer.models.schema import Schema
 from semantic_layer.pre_aggregations.manager import PreAggregationManager
 from semantic_layer.query.query import Query, QueryTimeDimension
 from semantic_layer.sql.optimizer import QueryOptimizer
 from semantic_layer.sql.builder import SQLBuilder
 from semantic_layer.result.formatter import ResultFormatter
+from semantic_layer.utils.deadlines import deadline, remaining_seconds
+from semantic_layer.utils.sketches import (
+    ESTIMATED_MEASURE_TYPES,
+    ROLLUP_ONLY_MEASURE_TYPES,
+    finalize_estimate,
+)
+
+
+# Concurrent queries of one batch when the connector has no pool size
+DEFAULT_MAX_CONCURRENCY = 10
+
+# Errors raised to callers as they are rather than wrapped in ExecutionError
+PASSTHROUGH_ERRORS = (OverloadedError, QueryTimeoutError, QueryCancelledError)
 
 
 class QueryEngine:
@@ -37,6 +65,10 @@ class QueryEngine:
         metrics_collector: Optional[MetricsCollector] = None,
         callbacks: Optional[List[BaseQueryCallback]] = None,
         callback_manager: Optional[CallbackManager] = None,
+        max_concurrency: Optional[int] = None,
+        admission_controller: Optional[AdmissionController] = None,
+        query_timeout: Optional[float] = None,
+        tracer: Optional[Tracer] = None,
     ):
         """Initialize query engine.
         
@@ -50,16 +82,33 @@ class QueryEngine:
             metrics_collector: Optional MetricsCollector (for backward compatibility)
             callbacks: Optional list of callback handlers (new callback-based approach)
             callback_manager: Optional CallbackManager (if you want to provide your own)
+            max_concurrency: Maximum queries of one batch run at once; defaults
+                to the connector's pool size
+            admission_controller: Optional queue statements wait in for a
+                database slot; without one they go straight to the connector
+            query_timeout: Default deadline of a query in seconds (None: no limit)
+            tracer: Optional tracer queries start a trace with when they
+                do not run inside one already
         """
         self.schema = schema
         self.connector = connector
         self.cache = cache
         self.cache_ttl = cache_ttl
         self.pre_aggregation_manager = pre_aggregation_manager
-        self.sql_builder = SQLBuilder(schema)
+        self.sql_builder = SQLBuilder(schema, dialect=getattr(connector, "dialect", "postgresql"))
         self.result_formatter = ResultFormatter()
         self.cache_key_generator = CacheKeyGenerator()
         self.query_optimizer = QueryOptimizer()
+        self.formula_planner = FormulaPlanner(schema)
+        self.batch_planner = BatchPlanner(self.sql_builder)
+        if max_concurrency is None:
+            config = getattr(connector, "config", None)
+            max_concurrency = getattr(config, "pool_size", None) or DEFAULT_MAX_CONCURRENCY
+        self.max_concurrency = max_concurrency
+        self.admission_controller = admission_controller
+        self.query_timeout = query_timeout
+        self.tracer = tracer
+        self.active_queries = ActiveQueryRegistry()
         
         # Backward compatibility: Support old query_logger and metrics_collector
         self.query_logger = query_logger
@@ -75,16 +124,137 @@ class QueryEngine:
             default_callbacks = []
             if query_logger:
                 default_callbacks.append(LoggingCallbackHandler(query_logger=query_logger))
-            if metrics_collector:
-                default_callbacks.append(MetricsCallbackHandler(metrics_collector=metrics_collector))
+            # A given metrics_collector is recorded into directly (with
+            # labels); a callback handler on it would count queries twice
             
             # If no callbacks provided at all, create default ones
-            if not default_callbacks:
+            if not default_callbacks and not metrics_collector:
                 default_callbacks.append(LoggingCallbackHandler())
                 default_callbacks.append(MetricsCallbackHandler())
             
             self.callback_manager = CallbackManager(default_callbacks)
 
+    def _logs_directly(self) -> bool:
+        """Whether runs are logged here rather than by a LoggingCallbackHandler.
+
+        A handler on the same logger already logs every run; logging it
+        here as well would write each run twice.
+        """
+        if self.query_logger is None:
+            return False
+        return not any(
+            isinstance(callback, LoggingCallbackHandler)
+            and callback.query_logger is self.query_logger
+            for callback in self.callback_manager.callbacks
+        )
+
+    @staticmethod
+    def _metric_labels(
+        query: Query, user_context: Optional[Dict[str, Any]]
+    ) -> Dict[str, Optional[str]]:
+        """Get the cube and tenant a query's metrics are labelled with."""
+        members = query.measures + query.dimensions + [td.dimension for td in query.time_dimensions]
+        return {
+            "cube": members[0].split(".")[0] if members else None,
+            "tenant": user_context.get("tenant_id") if user_context else None,
+        }
+
+    @staticmethod
+    def _span_attributes(query: Query) -> Dict[str, Any]:
+        """Get the attributes a query's span starts with."""
+        members = query.measures + query.dimensions + [td.dimension for td in query.time_dimensions]
+        return {"semanticquark.cubes": sorted({member.split(".")[0] for member in members})}
+
+    async def _run_statement(
+        self, sql: str, priority: str, user_context: Optional[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], float, float]:
+        """Run a statement within the current deadline, registered as active.
+
+        Returns:
+            (rows, queue wait in ms, database time in ms)
+        """
+        user_id = user_context.get("user_id") if user_context else None
+        tenant_id = user_context.get("tenant_id") if user_context else None
+        remaining = remaining_seconds()
+        if remaining is not None and remaining <= 0:
+            raise QueryTimeoutError("Query deadline passed before it could run")
+
+        with self.active_queries.track(sql, user_id=user_id, tenant_id=tenant_id) as active:
+            try:
+                return await asyncio.wait_for(
+                    self._admit_and_run(sql, priority, tenant_id, active), remaining
+                )
+            except asyncio.TimeoutError as e:
+                raise QueryTimeoutError(
+                    f"Query did not finish within its deadline of {remaining:.1f}s",
+                    details={"query_id": active.id},
+                ) from e
+            except asyncio.CancelledError:
+                if not active.killed:
+                    raise
+                # Killed through the registry: fail this query instead of its caller
+                task = asyncio.current_task()
+                if task is not None and hasattr(task, "uncancel"):
+                    task.uncancel()
+                raise QueryCancelledError("Query was cancelled", details={"query_id": active.id})
+
+    async def _admit_and_run(
+        self, sql: str, priority: str, tenant_id: Optional[str], active: ActiveQuery
+    ) -> Tuple[List[Dict[str, Any]], float, float]:
+        """Wait for a database slot and run a statement."""
+        async with self._admit(priority, tenant_id) as queue_wait_ms:
+            active.state = "running"
+            timings = current_timings()
+            if timings is not None:
+                timings.add("queue", queue_wait_ms)
+            sql_start_time = time.time()
+            with stage("database"):
+                results = await self.connector.execute_query(sql)
+            return results, queue_wait_ms, (time.time() - sql_start_time) * 1000
+
+    @asynccontextmanager
+    async def _admit(self, priority: str, tenant_id: Optional[str]) -> AsyncIterator[float]:
+        """Hold a database slot for the block, yielding the queue wait in ms."""
+        if self.admission_controller is None:
+            yield 0.0
+            return
+        async with self.admission_controller.admit(priority, tenant_id) as queue_wait_ms:
+            yield queue_wait_ms
+
+    def _check_rollup_only_measures(self, query: Query) -> None:
+        """Reject measures that are only served from a materialized rollup.
+
+        Raises:
+            QueryError: If the query has a percentile or median measure
+        """
+        for meas_path in query.measures:
+            cube, meas_name = self.schema.get_cube_for_measure(meas_path)
+            measure = cube.get_measure(meas_name)
+            if measure.type in ROLLUP_ONLY_MEASURE_TYPES:
+                raise QueryError(
+                    f"Measure '{meas_path}' of type '{measure.type}' is only served from "
+                    f"a pre-aggregation; define a rollup that contains it"
+                )
+
+    def _finalize_estimates(self, query: Query, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Replace sketches returned for approximate measures with their estimates.
+
+        Returns:
+            Error bounds of the estimated measures, keyed by measure path
+        """
+        approximate = {}
+        for meas_path in query.measures:
+            cube, meas_name = self.schema.get_cube_for_measure(meas_path)
+            measure = cube.get_measure(meas_name)
+            if measure.type not in ESTIMATED_MEASURE_TYPES:
+                continue
+            column = meas_path.replace(".", "_")
+            for row in results:
+                if column in row:
+                    row[column] = finalize_estimate(measure, row[column])
+            approximate[meas_path] = dict(ESTIMATED_MEASURE_TYPES[measure.type])
+        return approximate
+
     def _transform_compare_date_range(self, query: Query) -> list[Query]:
         """Transform compare date range query into multiple queries.
         
@@ -140,23 +310,158 @@ class QueryEngine:
         
         return queries
 
+    def _can_scan_compare_once(
+        self,
+        query: Query,
+        period_queries: List[Query],
+        user_context: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """Check whether a compareDateRange query can be run as one statement.
+
+        Paging applies per period and rolling windows need per-period
+        ranges, so those run one query per period, as do periods a rollup
+        can answer.
+        """
+        if query.limit or query.offset or self.sql_builder.get_rolling_measures(query):
+            return False
+        if self.pre_aggregation_manager:
+            security_context = SecurityContext(**user_context) if user_context else None
+            planned = [self.formula_planner.plan(q).query for q in period_queries]
+            if any(
+                self.pre_aggregation_manager.find_matching_pre_aggregation(
+                    q, security_context=security_context, record_hit=False
+                )
+                for q in planned
+            ):
+                return False
+        return True
+
+    async def execute_many(
+        self,
+        queries: List[Query],
+        user_context: Optional[Dict[str, Any]] = None,
+        max_concurrency: Optional[int] = None,
+        fuse: bool = True,
+        priority: str = PRIORITY_INTERACTIVE,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Execute independent queries concurrently.
+
+        Queries that can share a scan are first fused into one query (see
+        BatchPlanner) whose rows are split back per query; if a fused query
+        fails, its queries run on their own. At most ``max_concurrency``
+        queries (default: the engine's limit) run at once, so a batch cannot
+        take every pooled connection. A failing query does not fail the batch,
+        except when admission rejects one: OverloadedError is raised as is
+        (the rest of the batch is cancelled) so the caller can back off.
+
+        Args:
+            queries: Queries to execute
+            user_context: User context applied to every query
+            max_concurrency: Optional lower limit for this batch
+            fuse: Whether to fuse queries sharing a scan
+            priority: Admission priority class of the queries
+            timeout: Deadline of the whole batch in seconds (default: the
+                engine's query timeout)
+
+        Returns:
+            One entry per query, in order: its result, or
+            ``{"error": {"message": ..., "details": ...}}`` if it failed
+        """
+        limit = min(max_concurrency or self.max_concurrency, self.max_concurrency)
+        semaphore = asyncio.Semaphore(max(1, limit))
+        results: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+
+        async def run(query: Query) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    return await self.execute(query, user_context=user_context, priority=priority)
+                except OverloadedError:
+                    raise
+                except SemanticLayerError as e:
+                    return {"error": {"message": e.message, "details": e.details}}
+
+        async def gather_all(coroutines: List[Any]) -> List[Any]:
+            # Unlike a bare gather, the others are cancelled when one fails
+            tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+            try:
+                return await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+
+        async def run_group(group) -> None:
+            if group.fused:
+                fused_result = await run(group.query)
+                if "error" not in fused_result:
+                    for position, result in group.split(fused_result):
+                        results[position] = result
+                    return
+            members = await gather_all([run(query) for _, query in group.members])
+            for (position, _), result in zip(group.members, members):
+                results[position] = result
+
+        if fuse:
+            groups = self.batch_planner.plan(queries)
+        else:
+            groups = self.batch_planner.plan_unfused(queries)
+        with deadline(timeout if timeout is not None else self.query_timeout):
+            await gather_all([run_group(group) for group in groups])
+        return results
+
     async def execute(
-        self, query: Query, user_context: Optional[Dict[str, Any]] = None
+        self,
+        query: Query,
+        user_context: Optional[Dict[str, Any]] = None,
+        priority: str = PRIORITY_INTERACTIVE,
+        timeout: Optional[float] = None,
     ) -> Dict[str, Any]:
         """Execute a semantic query and return formatted results.
         
         If the query has compare_date_range, it will be transformed into
         multiple queries and results will be combined.
+
+        ``priority`` is the admission class (interactive, background or
+        refresh) its statements queue under. OverloadedError is raised as is
+        when the admission queue is full.
+
+        The query must finish within ``timeout`` seconds (default: the
+        engine's query timeout), or QueryTimeoutError is raised and its
+        statement is cancelled on the database. A statement killed through
+        ``active_queries`` raises QueryCancelledError.
         """
+        with deadline(timeout if timeout is not None else self.query_timeout):
+            return await self._execute(query, user_context, priority)
+
+    async def _execute(
+        self, query: Query, user_context: Optional[Dict[str, Any]], priority: str
+    ) -> Dict[str, Any]:
+        """Execute a semantic query within the current deadline."""
         start_time = time.time()
         cache_hit = False
+        # Once set, failures are logged by the single queries themselves
+        dispatched = False
 
         try:
             # Check for compare date range and transform if needed
             queries = self._transform_compare_date_range(query)
-            
+            scan_once = len(queries) > 1 and self._can_scan_compare_once(
+                query, queries, user_context
+            )
+            dispatched = True
+
             # If multiple queries (compare date range), execute all and combine
             if len(queries) > 1:
+                if scan_once:
+                    # One statement labels each row with its period
+                    result = await self._execute_single_query(
+                        query, user_context, start_time, priority
+                    )
+                    result["meta"]["compare_date_range"] = True
+                    return result
+
                 # Find original compare_date_range from original query
                 original_compare_date_range = None
                 for td in query.time_dimensions:
@@ -164,23 +469,31 @@ class QueryEngine:
                         original_compare_date_range = td.compare_date_range
                         break
                 
-                results_list = []
-                for q in queries:
-                    result = await self._execute_single_query(q, user_context, start_time)
-                    results_list.append(result)
+                results_list = await asyncio.gather(*[
+                    self._execute_single_query(q, user_context, start_time, priority)
+                    for q in queries
+                ])
                 
                 # Combine results with period indicators
                 combined_data = []
+                combined_totals = []
                 for idx, result in enumerate(results_list):
-                    for row in result.get("data", []):
-                        # Add period indicator
-                        if original_compare_date_range and idx < len(original_compare_date_range):
-                            date_range = original_compare_date_range[idx]
-                            row["_compareDateRange"] = f"{date_range[0]} to {date_range[1]}"
-                        combined_data.append(row)
+                    for rows, combined in (
+                        (result.get("data", []), combined_data),
+                        (result.get("totals", []), combined_totals),
+                    ):
+                        for row in rows:
+                            # Add period indicator
+                            if (
+                                original_compare_date_range
+                                and idx < len(original_compare_date_range)
+                            ):
+                                date_range = original_compare_date_range[idx]
+                                row["_compareDateRange"] = f"{date_range[0]} to {date_range[1]}"
+                            combined.append(row)
                 
                 # Return combined result
-                return {
+                combined_result = {
                     "data": combined_data,
                     "meta": {
                         "query": {
@@ -193,40 +506,70 @@ class QueryEngine:
                         "compare_date_range": True,
                     }
                 }
+                if query.totals or query.subtotals:
+                    combined_result["totals"] = combined_totals
+                return combined_result
             
             # Single query execution
             single_query = queries[0]
-            return await self._execute_single_query(single_query, user_context, start_time)
+            return await self._execute_single_query(
+                single_query, user_context, start_time, priority
+            )
             
         except Exception as e:
             execution_time = (time.time() - start_time) * 1000
             
             # Log error
-            user_id = user_context.get("user_id") if user_context else None
-            self.query_logger.log_query(
-                query=query,
-                execution_time_ms=execution_time,
-                cache_hit=False,
-                error=str(e),
-                user_id=user_id,
-            )
+            if self.query_logger and not dispatched:
+                user_id = user_context.get("user_id") if user_context else None
+                self.query_logger.log_query(
+                    query=query,
+                    execution_time_ms=execution_time,
+                    cache_hit=False,
+                    error=str(e),
+                    user_id=user_id,
+                )
             
             # Record error metrics
-            self.metrics_collector.record_query(
-                execution_time_ms=execution_time,
-                cache_hit=False,
-                error=True,
-            )
+            if self.metrics_collector:
+                self.metrics_collector.record_query(
+                    execution_time_ms=execution_time,
+                    cache_hit=False,
+                    error=True,
+                    **self._metric_labels(query, user_context),
+                )
             
+            if isinstance(e, PASSTHROUGH_ERRORS):
+                raise
             raise ExecutionError(
                 f"Query execution failed: {str(e)}",
                 details={"execution_time_ms": execution_time},
             ) from e
 
     async def _execute_single_query(
-        self, query: Query, user_context: Optional[Dict[str, Any]] = None, start_time: Optional[float] = None
+        self,
+        query: Query,
+        user_context: Optional[Dict[str, Any]] = None,
+        start_time: Optional[float] = None,
+        priority: str = PRIORITY_INTERACTIVE,
+    ) -> Dict[str, Any]:
+        """Execute a single query (internal method), timing and tracing its stages."""
+        query_span = trace_span("query", self.tracer, self._span_attributes(query))
+        with collect_timings() as timings, query_span:
+            try:
+                return await self._execute_timed_query(query, user_context, start_time, priority)
+            finally:
+                if self.metrics_collector:
+                    self.metrics_collector.record_stages(timings.to_dict())
+
+    async def _execute_timed_query(
+        self,
+        query: Query,
+        user_context: Optional[Dict[str, Any]],
+        start_time: Optional[float],
+        priority: str,
     ) -> Dict[str, Any]:
-        """Execute a single query (internal method)."""
+        """Execute a single query, timing each stage into the current timings."""
         if start_time is None:
             start_time = time.time()
         cache_hit = False
@@ -245,48 +588,83 @@ class QueryEngine:
                 metadata={"user_id": user_context.get("user_id") if user_context else None},
             )
 
-            # Optimize query
-            query = self.query_optimizer.optimize(query)
+            with stage("optimize"):
+                # Optimize query
+                query = self.query_optimizer.optimize(query)
+                self.sql_builder.check_estimated_measures(query)
+                # Formulas are computed from their base measures after aggregation
+                formula_plan = self.formula_planner.plan(query)
+                base_query = formula_plan.query
             
-            # Check for pre-aggregation match
-            pre_agg_used = False
-            pre_agg_table = None
-            pre_agg = None
-            if self.pre_aggregation_manager:
-                pre_agg = self.pre_aggregation_manager.find_matching_pre_aggregation(query)
-                if pre_agg and self.pre_aggregation_manager.storage:
-                    # Check if pre-aggregation exists
-                    exists = await self.pre_aggregation_manager.storage.exists(pre_agg)
-                    if exists:
-                        # Get pre-aggregation table name
-                        pre_agg_table = await self.pre_aggregation_manager.storage.get_table_name(pre_agg)
-                        pre_agg_used = True
-                        await self.callback_manager.on_pre_agg_used(
-                            pre_agg_name=pre_agg.name,
-                            dimensions=query.dimensions,
-                            measures=query.measures,
-                            run_id=run_id,
-                        )
+                # Convert user_context to SecurityContext if provided
+                security_context = None
+                if user_context:
+                    security_context = SecurityContext(**user_context)
+
+            with stage("pre_aggregation"):
+                # Check for pre-aggregation match
+                pre_agg_used = False
+                pre_agg_table = None
+                pre_agg = None
+                # Rollups are not matched against compareDateRange periods
+                is_compare = any(td.compare_date_range for td in query.time_dimensions)
+                if self.pre_aggregation_manager and not is_compare:
+                    pre_agg = self.pre_aggregation_manager.find_matching_pre_aggregation(
+                        base_query, security_context=security_context
+                    )
+                    if pre_agg and self.pre_aggregation_manager.storage:
+                        # Check if pre-aggregation exists
+                        exists = await self.pre_aggregation_manager.storage.exists(pre_agg)
+                        if exists:
+                            # Get pre-aggregation table name
+                            storage = self.pre_aggregation_manager.storage
+                            pre_agg_table = await storage.get_table_name(pre_agg)
+                            pre_agg_used = True
+                            await self.callback_manager.on_pre_agg_used(
+                                pre_agg_name=pre_agg.name,
+                                dimensions=base_query.dimensions,
+                                measures=base_query.measures,
+                                run_id=run_id,
+                            )
+                        else:
+                            await self.callback_manager.on_pre_agg_skipped(
+                                reason="pre_aggregation_not_exists",
+                                run_id=run_id,
+                            )
                     else:
                         await self.callback_manager.on_pre_agg_skipped(
-                            reason="pre_aggregation_not_exists",
+                            reason="no_match",
                             run_id=run_id,
                         )
-                else:
-                    await self.callback_manager.on_pre_agg_skipped(
-                        reason="no_match",
-                        run_id=run_id,
-                    )
+                if not pre_agg_used:
+                    self._check_rollup_only_measures(base_query)
             
             # Check cache first
             cache_key = None
             if self.cache:
-                cache_key = self.cache_key_generator.generate(query, user_context)
-                cached_result = await self.cache.get(cache_key)
+                with stage("cache"):
+                    cache_key = self.cache_key_generator.generate(query, user_context)
+                    cached_result = await self.cache.get(cache_key)
                 if cached_result is not None:
                     cache_hit = True
                     cached_result["meta"]["cache_hit"] = True
                     cached_result["meta"]["execution_time_ms"] = (time.time() - start_time) * 1000
+                    span = current_span()
+                    if span is not None:
+                        span.set_attributes({
+                            "semanticquark.cache_hit": True,
+                            "semanticquark.pre_aggregation_used": cached_result["meta"].get(
+                                "pre_aggregation_used", False
+                            ),
+                            "semanticquark.row_count": len(cached_result.get("data", [])),
+                        })
+                    if self.metrics_collector:
+                        self.metrics_collector.record_query(
+                            execution_time_ms=cached_result["meta"]["execution_time_ms"],
+                            cache_hit=True,
+                            pre_agg_used=cached_result["meta"].get("pre_aggregation_used", False),
+                            **self._metric_labels(query, user_context),
+                        )
                     await self.callback_manager.on_cache_hit(
                         cache_key=cache_key,
                         run_id=run_id,
@@ -304,70 +682,64 @@ class QueryEngine:
                         run_id=run_id,
                     )
 
-            # Convert user_context to SecurityContext if provided
-            security_context = None
-            if user_context:
-                security_context = SecurityContext(**user_context)
-            
-            # Apply CTEs from query to SQLBuilder BEFORE building SQL
-            # Clear any existing CTEs from previous queries first
-            if not hasattr(self.sql_builder, 'with_queries'):
-                self.sql_builder.with_queries = []
-            self.sql_builder.with_queries.clear()
-            
-            # Add CTEs from current query
-            for cte in query.ctes:
-                self.sql_builder.add_with_query(cte["alias"], cte["query"])
-            
             # Generate SQL from semantic query with security context
+            # (CTEs are read from the query, not shared builder state)
             # If pre-aggregation is available, use it
-            if pre_agg_used and pre_agg_table:
-                # Modify query to use pre-aggregation table
-                # Temporarily override the cube's table
-                cube = self.schema.get_cube(pre_agg.cube)
-                original_table = cube.table
-                cube.table = pre_agg_table
-                try:
-                    sql = self.sql_builder.build(query, security_context=security_context)
-                finally:
-                    # Restore original table
-                    cube.table = original_table
-            else:
-                sql = self.sql_builder.build(query, security_context=security_context)
-            
-            # Clear CTEs after building SQL (for next query)
-            # Reset the with_queries list for the next query
-            if hasattr(self.sql_builder, 'with_queries'):
-                self.sql_builder.with_queries.clear()
+            with stage("compile"):
+                if pre_agg_used and pre_agg_table:
+                    sql = await self.pre_aggregation_manager.build_query_sql(
+                        pre_agg, base_query, security_context=security_context
+                    )
+                else:
+                    sql = self.sql_builder.build(base_query, security_context=security_context)
 
-            # Execute query
-            sql_start_time = time.time()
-            results = await self.connector.execute_query(sql)
-            sql_execution_time = (time.time() - sql_start_time) * 1000
+            # Execute query once admitted; queue wait is kept apart from database time
+            results, queue_wait_ms, sql_execution_time = await self._run_statement(
+                sql, priority, user_context
+            )
+            with stage("format"):
+                approximate = self._finalize_estimates(base_query, results)
+                formula_plan.apply(results)
 
             # Fire on_sql_generated callback
             await self.callback_manager.on_sql_generated(
                 sql=sql,
                 execution_time_ms=sql_execution_time,
                 run_id=run_id,
+                query=query,
             )
 
             # Format results
             execution_time = (time.time() - start_time) * 1000  # Convert to milliseconds
-            formatted_results = self.result_formatter.format(results, query, execution_time)
+            with stage("format"):
+                formatted_results = self.result_formatter.format(results, query, execution_time)
 
             # Add SQL to metadata for debugging
             formatted_results["meta"]["sql"] = sql
             formatted_results["meta"]["cache_hit"] = False
             formatted_results["meta"]["pre_aggregation_used"] = pre_agg_used
+            formatted_results["meta"]["queue_wait_ms"] = round(queue_wait_ms, 2)
+            formatted_results["meta"]["database_time_ms"] = round(sql_execution_time, 2)
             formatted_results["meta"]["query_cost"] = self.query_optimizer.estimate_cost(query)
+            if approximate:
+                formatted_results["meta"]["approximate"] = approximate
+
+            span = current_span()
+            if span is not None:
+                span.set_attributes({
+                    "semanticquark.cache_hit": False,
+                    "semanticquark.pre_aggregation_used": pre_agg_used,
+                    "semanticquark.pre_aggregation": pre_agg.name if pre_agg_used else None,
+                    "semanticquark.row_count": len(results),
+                    "semanticquark.sql_hash": sql_hash(sql),
+                })
 
             # Store in cache
             if self.cache and not cache_hit and cache_key:
                 await self.cache.set(cache_key, formatted_results, ttl=self.cache_ttl)
 
             # Backward compatibility: Use old loggers if provided
-            if self.query_logger:
+            if self._logs_directly():
                 user_id = user_context.get("user_id") if user_context else None
                 self.query_logger.log_query(
                     query=query,
@@ -382,6 +754,8 @@ class QueryEngine:
                     execution_time_ms=execution_time,
                     cache_hit=cache_hit,
                     error=False,
+                    pre_agg_used=pre_agg_used,
+                    **self._metric_labels(query, user_context),
                 )
 
             # Fire on_query_end callback
@@ -397,7 +771,7 @@ class QueryEngine:
             execution_time = (time.time() - start_time) * 1000
             
             # Backward compatibility: Use old loggers if provided
-            if self.query_logger:
+            if self._logs_directly():
                 user_id = user_context.get("user_id") if user_context else None
                 self.query_logger.log_query(
                     query=query,
@@ -412,6 +786,7 @@ class QueryEngine:
                     execution_time_ms=execution_time,
                     cache_hit=False,
                     error=True,
+                    **self._metric_labels(query, user_context),
                 )
             
             # Fire on_query_error callback
@@ -423,6 +798,8 @@ class QueryEngine:
                     query=query,
                 )
             
+            if isinstance(e, PASSTHROUGH_ERRORS):
+                raise
             raise ExecutionError(
                 f"Query execution failed: {str(e)}",
                 details={"execution_time_ms": execution_time},
@@ -4,6 +4,8 @@ from semantic_layer.pre_aggregations.base import BasePreAggregation, PreAggregat
 from semantic_layer.pre_aggregations.manager import PreAggregationManager
 from semantic_layer.pre_aggregations.storage import DatabasePreAggregation
 from semantic_layer.pre_aggregations.scheduler import PreAggregationScheduler
+from semantic_layer.pre_aggregations.refresh_keys import RefreshKeyStore
+from semantic_layer.pre_aggregations.advisor import PreAggregationAdvisor, PreAggregationProposal
 
 __all__ = [
     "BasePreAggregation",
@@ -11,5 +13,8 @@ __all__ = [
     "PreAggregationManager",
     "DatabasePreAggregation",
     "PreAggregationScheduler",
+    "RefreshKeyStore",
+    "PreAggregationAdvisor",
+    "PreAggregationProposal",
 ]
 
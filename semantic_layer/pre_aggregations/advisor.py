@@ -0,0 +1,311 @@
+"""Pre-aggregation recommendations derived from the query log."""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+from semantic_layer.drivers.base_driver import BaseDriver as BaseConnector
+from semantic_layer.exceptions import ModelError
+from semantic_layer.models.schema import Schema
+from semantic_layer.pre_aggregations.base import PreAggregationDefinition, get_filter_members
+from semantic_layer.pre_aggregations.manager import PreAggregationManager
+from semantic_layer.query.query import LogicalFilter, Query, QueryFilter, QueryTimeDimension
+
+
+# Rollups only speed up date ranges when stored per day (see matches_query)
+DATE_RANGE_GRANULARITY = "day"
+
+
+class PreAggregationProposal:
+    """A recommended pre-aggregation and the query time it would cover."""
+
+    def __init__(
+        self,
+        definition: PreAggregationDefinition,
+        query_count: int,
+        total_time_ms: float,
+        estimated_rows: Optional[int] = None,
+        source_rows: Optional[int] = None,
+    ):
+        self.definition = definition
+        self.query_count = query_count
+        self.total_time_ms = total_time_ms
+        self.estimated_rows = estimated_rows
+        self.source_rows = source_rows
+
+    @property
+    def size_ratio(self) -> Optional[float]:
+        """Rollup rows per source row, if both were estimated."""
+        if self.estimated_rows is None or not self.source_rows:
+            return None
+        return self.estimated_rows / self.source_rows
+
+    @property
+    def score(self) -> float:
+        """Covered query time, discounted by how little the rollup shrinks data."""
+        ratio = self.size_ratio
+        if ratio is None:
+            return self.total_time_ms
+        return self.total_time_ms * max(0.0, 1.0 - ratio)
+
+    def to_yaml_dict(self) -> Dict[str, Any]:
+        """Get the definition as it would appear under a cube's pre_aggregations."""
+        entry: Dict[str, Any] = {
+            "name": self.definition.name,
+            "dimensions": self.definition.get_plain_dimensions(),
+            "measures": list(self.definition.measures),
+        }
+        if self.definition.time_dimension:
+            entry["time_dimension"] = self.definition.time_dimension
+            entry["granularity"] = self.definition.granularity
+        return entry
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the proposal."""
+        return {
+            "cube": self.definition.cube,
+            "definition": self.to_yaml_dict(),
+            "query_count": self.query_count,
+            "total_time_ms": round(self.total_time_ms, 2),
+            "estimated_rows": self.estimated_rows,
+            "source_rows": self.source_rows,
+            "score": round(self.score, 2),
+        }
+
+
+def proposals_to_yaml(proposals: List[PreAggregationProposal]) -> str:
+    """Render proposals as cube YAML fragments, grouped by cube."""
+    cubes: Dict[str, List[Dict[str, Any]]] = {}
+    for proposal in proposals:
+        cubes.setdefault(proposal.definition.cube, []).append(proposal.to_yaml_dict())
+    document = {
+        "cubes": [
+            {"name": cube_name, "pre_aggregations": entries}
+            for cube_name, entries in cubes.items()
+        ]
+    }
+    return yaml.safe_dump(document, sort_keys=False)
+
+
+class PreAggregationAdvisor:
+    """Recommends pre-aggregations that would serve the most query time.
+
+    Logged queries are grouped by cube, dimensions (including filtered ones),
+    time dimension and granularity. Each group becomes a candidate rollup
+    holding every measure its queries used. Candidates are then picked
+    greedily by the database time of the logged queries they could answer,
+    so a later proposal only counts queries the earlier ones do not cover.
+    When a connector is given, each candidate's size is estimated and
+    rollups that barely shrink the source table are dropped.
+    """
+
+    def __init__(
+        self,
+        schema: Schema,
+        connector: Optional[BaseConnector] = None,
+        existing: Optional[List[PreAggregationDefinition]] = None,
+        min_queries: int = 2,
+        max_proposals: int = 10,
+        max_size_ratio: float = 0.5,
+    ):
+        """Initialize the advisor.
+
+        Args:
+            schema: Schema containing cube definitions
+            connector: Optional database connector used to estimate sizes
+            existing: Pre-aggregations already defined; queries they answer
+                are not counted
+            min_queries: Minimum logged queries a proposal must answer
+            max_proposals: Maximum number of proposals
+            max_size_ratio: Maximum rollup rows per source row
+        """
+        self.schema = schema
+        self.connector = connector
+        self.existing = existing or []
+        self.min_queries = min_queries
+        self.max_proposals = max_proposals
+        self.max_size_ratio = max_size_ratio
+        # Only used for its matching logic; nothing is registered or built
+        self._matcher = PreAggregationManager(schema, connector)
+
+    async def recommend(self, log_entries: List[Dict[str, Any]]) -> List[PreAggregationProposal]:
+        """Recommend pre-aggregations for the logged queries.
+
+        Args:
+            log_entries: Entries as produced by QueryLogger
+
+        Returns:
+            Proposals, best first
+        """
+        workload: List[Tuple[Query, float]] = []
+        for entry in log_entries:
+            if entry.get("status") == "error" or entry.get("cache_hit"):
+                continue
+            query = self.parse_log_entry(entry)
+            if query is None:
+                continue
+            if any(self._matcher.can_serve(defn, query) for defn in self.existing):
+                continue
+            workload.append((query, float(entry.get("execution_time_ms") or 0.0)))
+
+        candidates = self._build_candidates([query for query, _ in workload])
+        sized: List[PreAggregationProposal] = []
+        for definition in candidates:
+            covered = self._covered(definition, workload, range(len(workload)))
+            if len(covered) < self.min_queries:
+                continue
+            proposal = PreAggregationProposal(definition, 0, 0.0)
+            await self._estimate_size(proposal)
+            ratio = proposal.size_ratio
+            if ratio is not None and ratio > self.max_size_ratio:
+                continue
+            sized.append(proposal)
+
+        # Greedy cover: each round takes the rollup with the most uncovered time
+        remaining = set(range(len(workload)))
+        proposals: List[PreAggregationProposal] = []
+        while sized and remaining and len(proposals) < self.max_proposals:
+            best = None
+            best_covered: List[int] = []
+            for proposal in sized:
+                covered = self._covered(proposal.definition, workload, remaining)
+                proposal.query_count = len(covered)
+                proposal.total_time_ms = sum(workload[i][1] for i in covered)
+                if len(covered) < self.min_queries:
+                    continue
+                if best is None or proposal.score > best.score:
+                    best, best_covered = proposal, covered
+            if best is None:
+                break
+            proposals.append(best)
+            sized.remove(best)
+            remaining -= set(best_covered)
+
+        return proposals
+
+    def parse_log_entry(self, entry: Dict[str, Any]) -> Optional[Query]:
+        """Rebuild the query from a log entry, or None if it cannot be parsed."""
+        try:
+            return Query(
+                dimensions=entry.get("dimensions") or [],
+                measures=entry.get("measures") or [],
+                filters=[self._parse_filter(f) for f in entry.get("filters") or []],
+                time_dimensions=[
+                    QueryTimeDimension(**td) for td in entry.get("time_dimensions") or []
+                ],
+            )
+        except (ValueError, TypeError, KeyError):
+            return None
+
+    def _parse_filter(self, data: Dict[str, Any]):
+        """Rebuild a filter serialized by QueryLogger."""
+        for key in ("or", "and"):
+            if key in data:
+                return LogicalFilter(**{key: [self._parse_filter(f) for f in data[key]]})
+        return QueryFilter(
+            dimension=data["dimension"],
+            operator=data["operator"],
+            values=data.get("values") or [],
+        )
+
+    def candidate_for(self, query: Query) -> Optional[PreAggregationDefinition]:
+        """Get the smallest rollup that could answer a query, if any."""
+        members = set(query.dimensions) | set(query.measures)
+        members |= {td.dimension for td in query.time_dimensions}
+        cube_names = {member.split(".", 1)[0] for member in members if "." in member}
+        if len(cube_names) != 1 or not query.measures:
+            return None
+        cube_name = cube_names.pop()
+
+        time_dimensions = [td for td in query.time_dimensions if td.granularity or td.date_range]
+        if len(time_dimensions) > 1:
+            return None
+        time_dimension = granularity = None
+        if time_dimensions:
+            td = time_dimensions[0]
+            time_dimension = td.dimension.split(".", 1)[1]
+            granularity = DATE_RANGE_GRANULARITY if td.date_range else td.granularity
+
+        dimensions = set(query.dimensions) | get_filter_members(query.filters)
+        definition = PreAggregationDefinition(
+            name="candidate",
+            cube=cube_name,
+            dimensions=sorted(dim.split(".", 1)[1] for dim in dimensions),
+            measures=sorted(meas.split(".", 1)[1] for meas in query.measures),
+            time_dimension=time_dimension,
+            granularity=granularity,
+        )
+        try:
+            if not self._matcher.can_serve(definition, query):
+                return None
+        except ModelError:
+            return None
+        return definition
+
+    def _build_candidates(self, queries: List[Query]) -> List[PreAggregationDefinition]:
+        """Group queries by rollup shape and merge their measures."""
+        groups: Dict[tuple, PreAggregationDefinition] = {}
+        for query in queries:
+            candidate = self.candidate_for(query)
+            if candidate is None:
+                continue
+            key = (
+                candidate.cube,
+                tuple(candidate.dimensions),
+                candidate.time_dimension,
+                candidate.granularity,
+            )
+            if key in groups:
+                merged = set(groups[key].measures) | set(candidate.measures)
+                groups[key].measures = sorted(merged)
+            else:
+                groups[key] = candidate
+
+        taken = {definition.name for definition in self.existing}
+        for definition in groups.values():
+            definition.name = self._unique_name(definition, taken)
+            taken.add(definition.name)
+        return list(groups.values())
+
+    @staticmethod
+    def _unique_name(definition: PreAggregationDefinition, taken: set) -> str:
+        """Name a proposal after its cube, dimensions and granularity."""
+        parts = [definition.cube]
+        if definition.dimensions:
+            parts.append("by_" + "_".join(definition.dimensions))
+        if definition.granularity:
+            parts.append(definition.granularity)
+        name = "_".join(parts)
+        candidate, suffix = name, 2
+        while candidate in taken:
+            candidate, suffix = f"{name}_{suffix}", suffix + 1
+        return candidate
+
+    def _covered(
+        self,
+        definition: PreAggregationDefinition,
+        workload: List[Tuple[Query, float]],
+        indexes,
+    ) -> List[int]:
+        """Get the workload positions a rollup could answer."""
+        return [i for i in indexes if self._matcher.can_serve(definition, workload[i][0])]
+
+    async def _estimate_size(self, proposal: PreAggregationProposal) -> None:
+        """Count the rows a rollup and its source table would have."""
+        if not self.connector:
+            return
+        definition = proposal.definition
+        try:
+            rollup_sql = self._matcher.sql_builder.build(definition.to_query())
+            cube = self.schema.get_cube(definition.cube)
+            rows = await self.connector.execute_query(
+                f"SELECT COUNT(*) AS row_count FROM ({rollup_sql}) AS candidate"
+            )
+            source = await self.connector.execute_query(
+                f"SELECT COUNT(*) AS row_count FROM {cube.table}"
+            )
+        except Exception as e:
+            print(f"Warning: Failed to estimate size of {definition.name}: {e}")
+            return
+        proposal.estimated_rows = rows[0]["row_count"] if rows else None
+        proposal.source_rows = source[0]["row_count"] if source else None
@@ -1,10 +1,51 @@
 """Base pre-aggregation interface."""
 
+import re
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set
 
 from semantic_layer.models.cube import Cube
-from semantic_layer.query.query import Query
+from semantic_layer.query.query import LogicalFilter, Query, QueryTimeDimension
+
+
+# Time granularities from finest to coarsest
+GRANULARITY_ORDER = ["second", "minute", "hour", "day", "week", "month", "quarter", "year"]
+
+# Date range bounds a day-level rollup can answer exactly
+_DATE_ONLY = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+# Prefix of rollup dimensions holding row filter columns (e.g. rls_tenant_id)
+SECURITY_DIMENSION_PREFIX = "rls_"
+
+
+def get_filter_members(filters: List[Any]) -> Set[str]:
+    """Collect the members referenced by (possibly nested) query filters."""
+    members: Set[str] = set()
+    for filter_obj in filters:
+        if isinstance(filter_obj, LogicalFilter):
+            members |= get_filter_members(filter_obj.or_ or filter_obj.and_ or [])
+        else:
+            member = filter_obj.dimension or filter_obj.member
+            if member:
+                members.add(member)
+    return members
+
+
+def is_granularity_derivable(source: str, target: str) -> bool:
+    """Check whether buckets of one granularity can be rolled up into another.
+
+    Weeks do not nest into months, quarters or years, so week buckets can only
+    serve week queries; every other finer granularity nests into coarser ones.
+    """
+    source = source.lower()
+    target = target.lower()
+    if source not in GRANULARITY_ORDER or target not in GRANULARITY_ORDER:
+        return False
+    if source == target:
+        return True
+    if "week" in (source, target) and source not in ("second", "minute", "hour", "day"):
+        return False
+    return GRANULARITY_ORDER.index(source) < GRANULARITY_ORDER.index(target)
 
 
 class PreAggregationDefinition:
@@ -19,6 +60,10 @@ class PreAggregationDefinition:
         time_dimension: Optional[str] = None,
         granularity: Optional[str] = None,
         refresh_key: Optional[Dict[str, Any]] = None,
+        depends_on: Optional[List[str]] = None,
+        lambda_mode: bool = False,
+        indexes: Optional[Any] = None,
+        security_columns: Optional[List[str]] = None,
     ):
         self.name = name
         self.cube = cube
@@ -27,44 +72,204 @@ class PreAggregationDefinition:
         self.time_dimension = time_dimension
         self.granularity = granularity
         self.refresh_key = refresh_key or {}
+        # Names of pre-aggregations that must be built before this one
+        self.depends_on = depends_on or []
+        # Serve sealed buckets from the rollup and newer rows from the raw table
+        self.lambda_mode = lambda_mode
+        self.indexes = self._normalize_indexes(indexes)
+        # Cube table columns the row filter reads; stored so RLS can be applied
+        self.security_columns = security_columns or []
+
+    @staticmethod
+    def _normalize_indexes(indexes: Optional[Any]) -> List[Dict[str, Any]]:
+        """Normalize index definitions to a list of {"name", "columns"}.
+
+        Accepts a mapping of index name to ``{"columns": [...]}`` or a list of
+        such dicts with an optional ``name``.
+        """
+        if not indexes:
+            return []
+        if isinstance(indexes, dict):
+            indexes = [{"name": name, **(spec or {})} for name, spec in indexes.items()]
+        normalized = []
+        for i, spec in enumerate(indexes):
+            columns = spec.get("columns") or []
+            if isinstance(columns, str):
+                columns = [columns]
+            if columns:
+                name = spec.get("name") or f"index_{i}"
+                normalized.append({"name": name, "columns": list(columns)})
+        return normalized
+
+    def get_plain_dimensions(self) -> List[str]:
+        """Get dimensions stored as-is (the bucketed time dimension excluded)."""
+        dimensions = [
+            dim for dim in self.dimensions
+            if not (self.granularity and dim == self.time_dimension)
+        ]
+        if self.time_dimension and not self.granularity and self.time_dimension not in dimensions:
+            dimensions.append(self.time_dimension)
+        return dimensions
+
+    def get_security_dimensions(self) -> List[str]:
+        """Get the rollup dimensions holding the row filter columns."""
+        return [f"{SECURITY_DIMENSION_PREFIX}{column}" for column in self.security_columns]
+
+    def get_dimension_column(self, dimension: str) -> str:
+        """Get the rollup column holding a dimension."""
+        return f"{self.cube}_{dimension}"
+
+    def get_time_column(self) -> Optional[str]:
+        """Get the rollup column holding the time bucket."""
+        if not self.time_dimension or not self.granularity:
+            return None
+        return f"{self.cube}_{self.time_dimension}_{self.granularity}"
+
+    def get_measure_column(self, measure: str) -> str:
+        """Get the rollup column holding a measure."""
+        return f"{self.cube}_{measure}"
+
+    def to_query(self) -> Query:
+        """Build the query that materializes this pre-aggregation."""
+        time_dimensions = []
+        if self.time_dimension and self.granularity:
+            time_dimensions.append(
+                QueryTimeDimension(
+                    dimension=f"{self.cube}.{self.time_dimension}",
+                    granularity=self.granularity,
+                )
+            )
+        return Query(
+            dimensions=[
+                f"{self.cube}.{dim}"
+                for dim in self.get_plain_dimensions() + self.get_security_dimensions()
+            ],
+            measures=[f"{self.cube}.{meas}" for meas in self.measures],
+            time_dimensions=time_dimensions,
+        )
+
+    def covers(self, other: "PreAggregationDefinition") -> bool:
+        """Check whether another pre-aggregation can be computed from this one.
+
+        Only the shape is compared; whether the measures can be re-aggregated
+        depends on their types and is checked by the manager.
+        """
+        if other.cube != self.cube:
+            return False
+        if not set(other.get_plain_dimensions()).issubset(self.get_plain_dimensions()):
+            return False
+        if not set(other.measures).issubset(self.measures):
+            return False
+        if other.time_dimension and other.granularity:
+            if self.time_dimension != other.time_dimension or not self.granularity:
+                return False
+            if not is_granularity_derivable(self.granularity, other.granularity):
+                return False
+        return True
 
     def matches_query(self, query: Query) -> bool:
-        """Check if this pre-aggregation matches a query."""
-        # Check if query uses this cube
-        query_cubes = set()
-        for dim in query.dimensions:
-            cube_name = dim.split(".")[0]
-            query_cubes.add(cube_name)
-        for meas in query.measures:
-            cube_name = meas.split(".")[0]
-            query_cubes.add(cube_name)
-        
-        if self.cube not in query_cubes:
+        """Check if this pre-aggregation can answer a query.
+
+        The query may only reference this cube; its dimensions, filtered
+        dimensions and measures must be stored in the rollup and its time
+        granularity must roll up from the rollup's one. Whether the measures
+        can be re-aggregated is checked by the manager.
+        """
+        if query.ctes:
+            return False
+
+        prefix = f"{self.cube}."
+        members = (
+            set(query.dimensions)
+            | set(query.measures)
+            | {td.dimension for td in query.time_dimensions}
+            | get_filter_members(query.filters)
+            | get_filter_members(query.measure_filters)
+            | {order.dimension for order in query.order_by}
+        )
+        if any(not member.startswith(prefix) for member in members):
             return False
+
+        plain_dimensions = set(self.get_plain_dimensions())
         
-        # Check if query dimensions are subset of pre-aggregation dimensions
-        query_dims = {dim.split(".")[1] for dim in query.dimensions if dim.startswith(f"{self.cube}.")}
-        if not query_dims.issubset(set(self.dimensions)):
+        # Check if query dimensions and filters are subset of pre-aggregation dimensions
+        query_dims = {dim[len(prefix):] for dim in query.dimensions}
+        filter_dims = {member[len(prefix):] for member in get_filter_members(query.filters)}
+        if not (query_dims | filter_dims).issubset(plain_dimensions):
             return False
         
         # Check if query measures are subset of pre-aggregation measures
-        query_meas = {meas.split(".")[1] for meas in query.measures if meas.startswith(f"{self.cube}.")}
+        query_meas = {meas[len(prefix):] for meas in query.measures}
+        query_meas |= {member[len(prefix):] for member in get_filter_members(query.measure_filters)}
         if not query_meas.issubset(set(self.measures)):
             return False
-        
-        return True
+
+        order_members = {order.dimension[len(prefix):] for order in query.order_by}
+        orderable = plain_dimensions | set(self.measures) | {self.time_dimension}
+        if not order_members.issubset(orderable):
+            return False
+
+        granular_time_dimensions = 0
+        for td in query.time_dimensions:
+            if td.dimension[len(prefix):] != self.time_dimension or not self.granularity:
+                return False
+            if td.granularity:
+                granular_time_dimensions += 1
+                if not is_granularity_derivable(self.granularity, td.granularity):
+                    return False
+            if td.date_range and not self._can_filter_date_range(td.date_range):
+                return False
+
+        return granular_time_dimensions <= 1
+
+    def _can_filter_date_range(self, date_range: List[str]) -> bool:
+        """Check whether a date range can be applied to the time buckets.
+
+        Only whole days can be filtered, on day buckets: the range then
+        selects complete buckets and the end date includes its whole day.
+        """
+        if self.granularity != "day":
+            return False
+        return all(isinstance(bound, str) and _DATE_ONLY.match(bound) for bound in date_range)
+
+    def groups_like(self, query: Query) -> bool:
+        """Check whether a query groups exactly like the rollup rows."""
+        if self.security_columns:
+            # Rows are split further by the row filter columns
+            return False
+        prefix = f"{self.cube}."
+        query_dims = {dim[len(prefix):] for dim in query.dimensions}
+        granularities = [td.granularity for td in query.time_dimensions if td.granularity]
+        expected = [self.granularity] if self.granularity else []
+        return query_dims == set(self.get_plain_dimensions()) and granularities == expected
 
 
 class BasePreAggregation(ABC):
     """Base interface for pre-aggregation storage."""
 
     @abstractmethod
-    async def create(self, definition: PreAggregationDefinition, sql: str) -> None:
-        """Create pre-aggregation table/view."""
+    async def create(
+        self,
+        definition: PreAggregationDefinition,
+        sql: str,
+        indexes: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        """Create pre-aggregation table/view.
+
+        Args:
+            definition: Pre-aggregation definition
+            sql: Query producing the rollup rows
+            indexes: Indexes to build, as {"name", "columns"} with rollup columns
+        """
         pass
 
     @abstractmethod
-    async def refresh(self, definition: PreAggregationDefinition, sql: str) -> None:
+    async def refresh(
+        self,
+        definition: PreAggregationDefinition,
+        sql: str,
+        indexes: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
         """Refresh pre-aggregation data."""
         pass
 
@@ -78,3 +283,7 @@ class BasePreAggregation(ABC):
         """Get table name for pre-aggregation."""
         pass
 
+    async def count_rows(self, definition: PreAggregationDefinition) -> Optional[int]:
+        """Count rows in a pre-aggregation (None if not supported)."""
+        return None
+
@@ -1,13 +1,34 @@
 """Pre-aggregation manager."""
 
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 
 from semantic_layer.drivers.base_driver import BaseDriver as BaseConnector
+from semantic_layer.exceptions import ModelError
 from semantic_layer.models.cube import Cube
 from semantic_layer.models.schema import Schema
-from semantic_layer.pre_aggregations.base import BasePreAggregation, PreAggregationDefinition
-from semantic_layer.query.query import Query
+from semantic_layer.monitoring.logging import QueryLogger
+from semantic_layer.auth.base import SecurityContext
+from semantic_layer.pre_aggregations.base import (
+    GRANULARITY_ORDER,
+    BasePreAggregation,
+    PreAggregationDefinition,
+    get_filter_members,
+)
+from semantic_layer.pre_aggregations.rollup import (
+    build_merge_schema,
+    build_rollup_schema,
+    build_source_schema,
+    is_additive,
+    without_rolling_windows,
+)
+from semantic_layer.query.query import Query, QueryFilter
+from semantic_layer.security.rls import RLSFilter
 from semantic_layer.sql.builder import SQLBuilder
+from semantic_layer.utils.sketches import ESTIMATED_MEASURE_TYPES, SKETCH_DIALECTS
+
+
+# Number of recent query log entries used to learn filtered dimensions
+INDEX_LEARNING_LOG_WINDOW = 1000
 
 
 class PreAggregationManager:
@@ -18,44 +39,393 @@ class PreAggregationManager:
         schema: Schema,
         connector: BaseConnector,
         storage: Optional[BasePreAggregation] = None,
+        query_logger: Optional[QueryLogger] = None,
+        auto_index_min_filters: int = 10,
+        max_auto_indexes: int = 3,
     ):
-        """Initialize pre-aggregation manager."""
+        """Initialize pre-aggregation manager.
+
+        Args:
+            schema: Schema containing cube definitions
+            connector: Database connector
+            storage: Optional storage for materialized rollups
+            query_logger: Optional query log used to learn filtered dimensions
+            auto_index_min_filters: Filter count from which a rollup dimension
+                gets an index of its own
+            max_auto_indexes: Maximum learned indexes per rollup
+        """
         self.schema = schema
         self.connector = connector
         self.storage = storage
-        self.sql_builder = SQLBuilder(schema)
+        self.query_logger = query_logger
+        self.auto_index_min_filters = auto_index_min_filters
+        self.max_auto_indexes = max_auto_indexes
+        self.dialect = getattr(connector, "dialect", "postgresql")
+        self.sql_builder = SQLBuilder(schema, dialect=self.dialect)
         self._definitions: Dict[str, PreAggregationDefinition] = {}
+        self._hit_counts: Dict[str, int] = {}
+        # Latest materialized time bucket of each lambda rollup
+        self._high_water_marks: Dict[str, Optional[str]] = {}
 
     def register(self, definition: PreAggregationDefinition) -> None:
-        """Register a pre-aggregation definition."""
+        """Register a pre-aggregation definition.
+
+        Rollups of cubes with row-level security also store the columns the
+        row filter reads, so they can serve queries of every tenant.
+        Rollups of sketch measures are skipped on dialects without sketches.
+        """
+        if self.dialect not in SKETCH_DIALECTS and self._has_sketch_measures(definition):
+            print(
+                f"Warning: Skipping pre-aggregation {definition.name}: its sketch measures "
+                f"are not supported on {self.dialect}"
+            )
+            return
+        if not definition.security_columns and definition.cube in self.schema.cubes:
+            cube = self.schema.get_cube(definition.cube)
+            definition.security_columns = RLSFilter.get_row_filter_columns(cube)
         self._definitions[definition.name] = definition
 
-    def find_matching_pre_aggregation(self, query: Query) -> Optional[PreAggregationDefinition]:
-        """Find a pre-aggregation that matches the query."""
+    def _has_sketch_measures(self, definition: PreAggregationDefinition) -> bool:
+        """Check whether a definition stores measures estimated from sketches."""
+        cube = self.schema.cubes.get(definition.cube)
+        if cube is None:
+            return False
+        return any(
+            name in cube.measures and cube.measures[name].type in ESTIMATED_MEASURE_TYPES
+            for name in definition.measures
+        )
+
+    def find_matching_pre_aggregation(
+        self,
+        query: Query,
+        security_context: Optional[SecurityContext] = None,
+        record_hit: bool = True,
+    ) -> Optional[PreAggregationDefinition]:
+        """Find a pre-aggregation that matches the query.
+
+        Under row-level security only rollups storing the row filter columns
+        match; the filter then selects the tenant's rows of the rollup.
+        Pass ``record_hit=False`` when only checking, so hit counts stay
+        accurate.
+        """
         for definition in self._definitions.values():
-            if definition.matches_query(query):
+            if not self.can_secure(definition, security_context):
+                continue
+            if self.can_serve(definition, query):
+                if record_hit:
+                    self._hit_counts[definition.name] = self._hit_counts.get(definition.name, 0) + 1
                 return definition
         return None
 
+    def can_serve(self, definition: PreAggregationDefinition, query: Query) -> bool:
+        """Check whether a pre-aggregation can answer a query."""
+        return definition.matches_query(query) and self._can_serve_measures(definition, query)
+
+    def can_secure(
+        self,
+        definition: PreAggregationDefinition,
+        security_context: Optional[SecurityContext],
+    ) -> bool:
+        """Check whether a rollup can apply the row filter for a security context."""
+        try:
+            cube = self.schema.get_cube(definition.cube)
+        except ModelError:
+            return False
+        if RLSFilter.apply_rls_filter(cube, security_context) is None:
+            return True
+        return bool(definition.security_columns)
+
+    def _can_serve_measures(self, definition: PreAggregationDefinition, query: Query) -> bool:
+        """Check whether the query's measures can be computed from the rollup.
+
+        Additive measures can always be re-aggregated. Other measures are only
+        served when the query groups exactly like the rollup rows, and never
+        from lambda rollups, whose partial results have to be merged. Rolling
+        windows are computed over the rollup's buckets, but not over lambda
+        rollups. Grouping sets re-aggregate rollup rows, so they need additive
+        measures.
+        """
+        try:
+            cube = self.schema.get_cube(definition.cube)
+            names = {member.split(".", 1)[1] for member in query.measures}
+            names |= {
+                member.split(".", 1)[1] for member in get_filter_members(query.measure_filters)
+            }
+            measures = [cube.get_measure(name) for name in names]
+            all_additive = all(is_additive(measure) for measure in measures)
+        except ModelError:
+            return False
+
+        if definition.lambda_mode:
+            if not all_additive or any(measure.rolling_window for measure in measures):
+                return False
+            if query.get_grouping_sets() is not None:
+                return False
+            # Ordering happens after merging, on selected members only
+            selected = set(query.dimensions) | set(query.measures)
+            selected |= {td.dimension for td in query.time_dimensions if td.granularity}
+            return all(order.dimension in selected for order in query.order_by)
+        if query.get_grouping_sets() is not None:
+            return all_additive
+        return all_additive or definition.groups_like(query)
+
+    def get_hit_count(self, name: str) -> int:
+        """Get how many queries a pre-aggregation has matched."""
+        return self._hit_counts.get(name, 0)
+
+    def get_dependencies(self, definition: PreAggregationDefinition) -> List[str]:
+        """Get names of registered pre-aggregations that must be built first.
+
+        This includes explicit ``depends_on`` entries and the parent rollup
+        the definition is derived from.
+        """
+        dependencies = [
+            name for name in definition.depends_on
+            if name in self._definitions and name != definition.name
+        ]
+        parent = self.find_parent(definition)
+        if parent and parent.name not in dependencies:
+            dependencies.append(parent.name)
+        return dependencies
+
+    def find_parent(
+        self, definition: PreAggregationDefinition
+    ) -> Optional[PreAggregationDefinition]:
+        """Find the smallest registered rollup this definition can be derived from.
+
+        A parent must have a superset of the dimensions and measures and a time
+        granularity that rolls up into the definition's one, and all measures
+        of the definition must be additive. Among definitions of the same shape
+        only the one with the lowest name is used as a parent, so derivation
+        never forms a cycle.
+        """
+        try:
+            cube = self.schema.get_cube(definition.cube)
+            if not all(is_additive(cube.get_measure(name)) for name in definition.measures):
+                return None
+        except ModelError:
+            return None
+
+        candidates = []
+        for other in self._definitions.values():
+            if other.name == definition.name or not other.covers(definition):
+                continue
+            if definition.covers(other) and other.name > definition.name:
+                continue
+            candidates.append(other)
+
+        if not candidates:
+            return None
+
+        def size_key(candidate: PreAggregationDefinition):
+            # Fewer dimensions and coarser buckets mean fewer rows to scan
+            if candidate.granularity in GRANULARITY_ORDER:
+                rank = GRANULARITY_ORDER.index(candidate.granularity)
+            else:
+                rank = len(GRANULARITY_ORDER)
+            return (
+                len(candidate.get_plain_dimensions()),
+                -rank,
+                len(candidate.measures),
+                candidate.name,
+            )
+
+        return min(candidates, key=size_key)
+
+    def depends_on(self, name: str, target: str) -> bool:
+        """Check whether a pre-aggregation depends (transitively) on another."""
+        seen = set()
+        stack = [name]
+        while stack:
+            current = self._definitions.get(stack.pop())
+            if current is None or current.name in seen:
+                continue
+            seen.add(current.name)
+            dependencies = self.get_dependencies(current)
+            if target in dependencies:
+                return True
+            stack.extend(dependencies)
+        return False
+
     async def build_pre_aggregation_sql(self, definition: PreAggregationDefinition) -> str:
-        """Build SQL for creating pre-aggregation."""
-        # Create a query from the pre-aggregation definition
-        dimensions = [f"{definition.cube}.{dim}" for dim in definition.dimensions]
-        measures = [f"{definition.cube}.{meas}" for meas in definition.measures]
-        
-        from semantic_layer.query.query import Query as QueryObj
-        query = QueryObj(
-            dimensions=dimensions,
-            measures=measures,
-            filters=[],
-            order_by=[],
-        )
+        """Build SQL for creating pre-aggregation.
+
+        If a materialized parent rollup covers the definition, the SQL reads
+        from the parent table instead of scanning the raw cube table.
+        """
+        parent = self.find_parent(definition)
+        if parent and self.storage and await self.storage.exists(parent):
+            table_name = await self.storage.get_table_name(parent)
+            cube = self.schema.get_cube(parent.cube)
+            rollup_schema = without_rolling_windows(build_rollup_schema(cube, parent, table_name))
+            print(f"Building pre-aggregation {definition.name} from {parent.name}")
+            return SQLBuilder(rollup_schema).build(definition.to_query())
         
         # Generate SQL
-        sql = self.sql_builder.build(query)
+        if definition.security_columns:
+            cube = self.schema.get_cube(definition.cube)
+            source_schema = build_source_schema(cube, definition)
+        else:
+            source_schema = self.schema
+        sql = SQLBuilder(without_rolling_windows(source_schema)).build(definition.to_query())
         
         return sql
 
+    async def build_query_sql(
+        self,
+        definition: PreAggregationDefinition,
+        query: Query,
+        security_context: Optional[SecurityContext] = None,
+    ) -> str:
+        """Build SQL answering a matched query from a materialized rollup.
+
+        For lambda rollups, buckets before the high-water mark are read from
+        the rollup and newer rows are aggregated from the raw table; both
+        parts are combined with UNION ALL and merged by an outer query.
+        """
+        table_name = await self.storage.get_table_name(definition)
+        cube = self.schema.get_cube(definition.cube)
+        rollup_schema = build_rollup_schema(
+            cube, definition, table_name, exact=definition.groups_like(query)
+        )
+        # The rollup's row filter only renders when the cube's own one applies
+        rollup_security = security_context
+        if RLSFilter.apply_rls_filter(cube, security_context) is None:
+            rollup_security = None
+        if not definition.lambda_mode:
+            return SQLBuilder(rollup_schema).build(query, security_context=rollup_security)
+
+        high_water_mark = await self.get_high_water_mark(definition)
+        if high_water_mark is None:
+            # Nothing materialized yet, everything is live
+            return SQLBuilder(self.schema).build(query, security_context=security_context)
+
+        # Partial results: no ordering, paging or HAVING before merging
+        measure_filter_measures = [
+            member for member in sorted(get_filter_members(query.measure_filters))
+            if member not in query.measures
+        ]
+        partial_query = query.model_copy(update={
+            "measures": query.measures + measure_filter_measures,
+            "measure_filters": [],
+            "order_by": [],
+            "limit": None,
+            "offset": None,
+        })
+        time_member = f"{definition.cube}.{definition.time_dimension}"
+        rollup_query = partial_query.model_copy(update={
+            "filters": partial_query.filters + [
+                QueryFilter(member=time_member, operator="lt", values=[high_water_mark])
+            ],
+        })
+        live_query = partial_query.model_copy(update={
+            "filters": partial_query.filters + [
+                QueryFilter(member=time_member, operator="gte", values=[high_water_mark])
+            ],
+        })
+        rollup_sql = SQLBuilder(rollup_schema).build(rollup_query, security_context=rollup_security)
+        live_sql = SQLBuilder(self.schema).build(live_query, security_context=security_context)
+
+        # Filters were applied to both parts; only the grouping is redone
+        merge_query = query.model_copy(update={
+            "filters": [],
+            "time_dimensions": [
+                td.model_copy(update={"date_range": None})
+                for td in query.time_dimensions if td.granularity
+            ],
+        })
+        merge_schema = build_merge_schema(cube, partial_query, f"{rollup_sql} UNION ALL {live_sql}")
+        return SQLBuilder(merge_schema).build(merge_query)
+
+    async def get_high_water_mark(self, definition: PreAggregationDefinition) -> Optional[str]:
+        """Get the latest time bucket materialized in a rollup.
+
+        The last bucket may still be filling up, so lambda queries read it
+        (and everything after it) from the raw table.
+        """
+        if definition.name in self._high_water_marks:
+            return self._high_water_marks[definition.name]
+
+        table_name = await self.storage.get_table_name(definition)
+        sql = f"SELECT MAX({definition.get_time_column()}) AS high_water_mark FROM {table_name}"
+        results = await self.connector.execute_query(sql)
+        value = results[0].get("high_water_mark") if results else None
+        if value is not None:
+            value = value.isoformat() if hasattr(value, "isoformat") else str(value)
+        self._high_water_marks[definition.name] = value
+        return value
+
+    def get_indexes(self, definition: PreAggregationDefinition) -> List[Dict[str, Any]]:
+        """Get the indexes to build on a rollup, with rollup column names.
+
+        These are the indexes declared in the definition, one leading with the
+        row filter columns, one on the time bucket, and one per rollup
+        dimension that recent queries filter on frequently. Indexes on the
+        same columns are only built once.
+        """
+        indexes: List[Dict[str, Any]] = []
+        seen = set()
+
+        def add(name: str, columns: List[str]) -> None:
+            if columns and tuple(columns) not in seen:
+                seen.add(tuple(columns))
+                indexes.append({"name": name, "columns": columns})
+
+        for index in definition.indexes:
+            add(index["name"], [self._get_rollup_column(definition, c) for c in index["columns"]])
+
+        time_column = definition.get_time_column()
+        security_dimensions = definition.get_security_dimensions()
+        if security_dimensions:
+            # Each tenant's rows are contiguous in the index, ordered by time
+            columns = [definition.get_dimension_column(dim) for dim in security_dimensions]
+            add("security", columns + ([time_column] if time_column else []))
+        if time_column:
+            add("time", [time_column])
+
+        for dimension in self.get_frequently_filtered_dimensions(definition):
+            add(f"filter_{dimension}", [definition.get_dimension_column(dimension)])
+
+        return indexes
+
+    def get_frequently_filtered_dimensions(self, definition: PreAggregationDefinition) -> List[str]:
+        """Get rollup dimensions that recent queries filter on most often."""
+        if not self.query_logger:
+            return []
+
+        plain_dimensions = set(definition.get_plain_dimensions())
+        counts: Dict[str, int] = {}
+        for entry in self.query_logger.get_logs(limit=INDEX_LEARNING_LOG_WINDOW):
+            for member in self._get_logged_filter_members(entry.get("filters") or []):
+                cube_name, _, dimension = member.partition(".")
+                if cube_name == definition.cube and dimension in plain_dimensions:
+                    counts[dimension] = counts.get(dimension, 0) + 1
+
+        frequent = sorted(
+            (dim for dim, count in counts.items() if count >= self.auto_index_min_filters),
+            key=lambda dim: (-counts[dim], dim),
+        )
+        return frequent[:self.max_auto_indexes]
+
+    def _get_logged_filter_members(self, filters: List[Dict[str, Any]]) -> set:
+        """Collect members from serialized (possibly nested) log filters."""
+        members = set()
+        for filter_entry in filters:
+            nested = filter_entry.get("or") or filter_entry.get("and")
+            if nested:
+                members |= self._get_logged_filter_members(nested)
+            elif filter_entry.get("dimension"):
+                members.add(filter_entry["dimension"])
+        return members
+
+    @staticmethod
+    def _get_rollup_column(definition: PreAggregationDefinition, member: str) -> str:
+        """Map a member named in an index definition to its rollup column."""
+        name = member.split(".", 1)[1] if "." in member else member
+        if name == definition.time_dimension and definition.granularity:
+            return definition.get_time_column()
+        return definition.get_dimension_column(name)
+
     async def create_pre_aggregation(self, definition: PreAggregationDefinition) -> None:
         """Create a pre-aggregation."""
         if not self.storage:
@@ -65,7 +435,8 @@ class PreAggregationManager:
         sql = await self.build_pre_aggregation_sql(definition)
         
         # Create pre-aggregation
-        await self.storage.create(definition, sql)
+        await self.storage.create(definition, sql, indexes=self.get_indexes(definition))
+        self._high_water_marks.pop(definition.name, None)
 
     async def refresh_pre_aggregation(self, definition: PreAggregationDefinition) -> None:
         """Refresh a pre-aggregation."""
@@ -76,5 +447,6 @@ class PreAggregationManager:
         sql = await self.build_pre_aggregation_sql(definition)
         
         # Refresh pre-aggregation
-        await self.storage.refresh(definition, sql)
+        await self.storage.refresh(definition, sql, indexes=self.get_indexes(definition))
+        self._high_water_marks.pop(definition.name, None)
 
@@ -0,0 +1,66 @@
+"""Persistence for pre-aggregation refresh key values."""
+
+import json
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class RefreshKeyStore:
+    """Stores the last-seen refresh key value of each pre-aggregation.
+
+    Values are kept in memory and, when a path is given, written to a JSON
+    file so that a restart does not rebuild rollups whose source is unchanged.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """Initialize refresh key store.
+
+        Args:
+            path: Optional JSON file used to persist values across restarts
+        """
+        self.path = Path(path) if path else None
+        self._values: Dict[str, Optional[str]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        """Load persisted values, ignoring a missing or unreadable file."""
+        if not self.path or not self.path.exists():
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self._values = {str(k): v for k, v in data.items()}
+        except (OSError, ValueError) as e:
+            print(f"Warning: Failed to load refresh keys from {self.path}: {e}")
+
+    def _save(self) -> None:
+        """Write values to disk atomically."""
+        if not self.path:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(self._values, f, sort_keys=True)
+            tmp_path.replace(self.path)
+        except OSError as e:
+            print(f"Warning: Failed to persist refresh keys to {self.path}: {e}")
+
+    def has(self, name: str) -> bool:
+        """Check whether a value was recorded for a pre-aggregation."""
+        return name in self._values
+
+    def get(self, name: str) -> Optional[str]:
+        """Get the last-seen refresh key value for a pre-aggregation."""
+        return self._values.get(name)
+
+    def set(self, name: str, value: Optional[str]) -> None:
+        """Record the refresh key value a pre-aggregation was built with."""
+        self._values[name] = value
+        self._save()
+
+    def clear(self) -> None:
+        """Forget all stored values."""
+        self._values.clear()
+        self._save()
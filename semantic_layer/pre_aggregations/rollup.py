@@ -0,0 +1,222 @@
+"""Virtual cubes that read from materialized pre-aggregation tables."""
+
+from typing import Any, Dict, Optional
+
+from semantic_layer.models.cube import Cube
+from semantic_layer.models.dimension import Dimension
+from semantic_layer.models.measure import Measure
+from semantic_layer.models.schema import Schema
+from semantic_layer.pre_aggregations.base import PreAggregationDefinition
+from semantic_layer.query.query import Query
+from semantic_layer.security.rls import RLSFilter
+from semantic_layer.utils.sketches import hll_merge_sql, quantile_merge_sql
+
+
+# How each additive measure type is re-aggregated from a rollup column
+ROLLUP_MEASURE_TYPES = {
+    "count": "sum",
+    "sum": "sum",
+    "min": "min",
+    "max": "max",
+}
+
+
+# How each sketch measure type merges the sketches stored in a rollup column
+ROLLUP_SKETCH_MERGES = {
+    "countDistinctApprox": hll_merge_sql,
+    "percentile": quantile_merge_sql,
+    "median": quantile_merge_sql,
+}
+
+
+def is_additive(measure: Measure) -> bool:
+    """Check whether a measure can be re-aggregated from partial aggregates."""
+    return measure.type in ROLLUP_MEASURE_TYPES or measure.type in ROLLUP_SKETCH_MERGES
+
+
+def _merged_measure(name: str, source: Measure, column: str) -> Measure:
+    """Build a measure re-aggregating partial values of an additive measure."""
+    if source.type in ROLLUP_SKETCH_MERGES:
+        merge = ROLLUP_SKETCH_MERGES[source.type]
+        return Measure(
+            name=name,
+            type="calculated",
+            sql=column,
+            expression=merge(f"{{CUBE}}.{column}"),
+            format=source.format,
+        )
+    return Measure(
+        name=name,
+        type=ROLLUP_MEASURE_TYPES[source.type],
+        sql=column,
+        format=source.format,
+        rolling_window=source.rolling_window,
+    )
+
+
+def without_rolling_windows(schema: Schema) -> Schema:
+    """Get a schema whose rolling-window measures return per-bucket values.
+
+    Rollups store these, so windows can later be computed over any range.
+    """
+    cubes = {}
+    for name, cube in schema.cubes.items():
+        measures = {
+            meas_name: (
+                measure.model_copy(update={"rolling_window": None})
+                if measure.rolling_window
+                else measure
+            )
+            for meas_name, measure in cube.measures.items()
+        }
+        cubes[name] = cube.model_copy(update={"measures": measures})
+    return Schema(cubes=cubes)
+
+
+def build_rollup_cube(
+    cube: Cube,
+    definition: PreAggregationDefinition,
+    table_name: str,
+    exact: bool = False,
+) -> Cube:
+    """Build a cube whose members read the columns of a materialized rollup.
+
+    Dimensions point at their rollup columns and additive measures are
+    re-aggregated (partial counts are summed), so SQLBuilder can query the
+    rollup exactly like the original cube. Non-additive measures are left out
+    unless the query groups exactly like the rollup.
+
+    Args:
+        cube: Cube the pre-aggregation was defined on
+        definition: Pre-aggregation definition
+        table_name: Table holding the materialized rollup
+        exact: Whether each result row maps to exactly one rollup row, so that
+            non-additive measures can be read as they are
+
+    Returns:
+        Cube with the same name as the original, backed by the rollup table
+    """
+    dimensions = {}
+    for name in definition.get_plain_dimensions():
+        source = cube.get_dimension(name)
+        dimensions[name] = Dimension(
+            name=name,
+            type=source.type,
+            sql=definition.get_dimension_column(name),
+            format=source.format,
+        )
+
+    time_column = definition.get_time_column()
+    if time_column:
+        dimensions[definition.time_dimension] = Dimension(
+            name=definition.time_dimension,
+            type="time",
+            sql=time_column,
+        )
+
+    for name in definition.get_security_dimensions():
+        dimensions[name] = Dimension(
+            name=name,
+            type="string",
+            sql=definition.get_dimension_column(name),
+        )
+
+    measures = {}
+    for name in definition.measures:
+        source = cube.get_measure(name)
+        column = definition.get_measure_column(name)
+        if is_additive(source):
+            measures[name] = _merged_measure(name, source, column)
+        elif exact:
+            # One rollup row per group; MAX just picks its value
+            measures[name] = Measure(name=name, type="max", sql=column, format=source.format)
+
+    return Cube(
+        name=cube.name,
+        table=table_name,
+        dimensions=dimensions,
+        measures=measures,
+        security=_build_rollup_security(cube, definition),
+    )
+
+
+def _build_rollup_security(
+    cube: Cube, definition: PreAggregationDefinition
+) -> Optional[Dict[str, Any]]:
+    """Point the cube's row filter at the rollup columns holding its inputs."""
+    row_filter = RLSFilter.get_row_filter_template(cube)
+    if not row_filter or not definition.security_columns:
+        return None
+
+    security_dimensions = zip(definition.security_columns, definition.get_security_dimensions())
+    columns = {
+        column: definition.get_dimension_column(dimension)
+        for column, dimension in security_dimensions
+    }
+    return {"row_filter": RLSFilter.rename_row_filter_columns(row_filter, columns)}
+
+
+def build_source_schema(cube: Cube, definition: PreAggregationDefinition) -> Schema:
+    """Build a single-cube schema exposing the row filter columns as dimensions.
+
+    Materializing ``definition.to_query()`` against it stores each column
+    the cube's row filter reads, so the filter can later be applied to the
+    rollup rows.
+    """
+    dimensions = dict(cube.dimensions)
+    for column, name in zip(definition.security_columns, definition.get_security_dimensions()):
+        dimensions[name] = Dimension(name=name, type="string", sql=column)
+    return Schema(cubes={cube.name: cube.model_copy(update={"dimensions": dimensions})})
+
+
+def build_rollup_schema(
+    cube: Cube,
+    definition: PreAggregationDefinition,
+    table_name: str,
+    exact: bool = False,
+) -> Schema:
+    """Build a single-cube schema over a materialized rollup."""
+    return Schema(cubes={cube.name: build_rollup_cube(cube, definition, table_name, exact)})
+
+
+def build_merge_schema(cube: Cube, query: Query, source_sql: str) -> Schema:
+    """Build a schema that re-aggregates partial results of a query.
+
+    ``source_sql`` must return the columns SQLBuilder generates for ``query``
+    (e.g. a UNION ALL of the rollup part and the live part). Its dimensions
+    and time buckets are grouped again and additive measures merged, so the
+    original query can be run on top of it to get the final result.
+
+    Args:
+        cube: Cube the query is defined on
+        query: Query whose partial results are merged
+        source_sql: SQL returning the partial results
+
+    Returns:
+        Single-cube schema reading from ``source_sql``
+    """
+    prefix = f"{cube.name}."
+    dimensions = {}
+    for dim_path in query.dimensions:
+        name = dim_path[len(prefix):]
+        dimensions[name] = Dimension(
+            name=name,
+            type=cube.get_dimension(name).type,
+            sql=dim_path.replace(".", "_"),
+        )
+    for td in query.time_dimensions:
+        if td.granularity:
+            name = td.dimension[len(prefix):]
+            dimensions[name] = Dimension(
+                name=name,
+                type="time",
+                sql=f"{td.dimension.replace('.', '_')}_{td.granularity}",
+            )
+
+    measures = {}
+    for meas_path in query.measures:
+        name = meas_path[len(prefix):]
+        measures[name] = _merged_measure(name, cube.get_measure(name), meas_path.replace(".", "_"))
+
+    merged = Cube(name=cube.name, table=f"({source_sql})", dimensions=dimensions, measures=measures)
+    return Schema(cubes={cube.name: merged})
@@ -1,70 +1,379 @@
 """Pre-aggregation scheduler for background jobs."""
 
 import asyncio
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+import itertools
+import random
+import time
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from semantic_layer.drivers.base_driver import BaseDriver as BaseConnector
-from semantic_layer.models.schema import Schema
+from semantic_layer.monitoring.callback_manager import CallbackManager
+from semantic_layer.orchestrator.admission import PRIORITY_REFRESH, AdmissionController
+from semantic_layer.pre_aggregations.base import PreAggregationDefinition
 from semantic_layer.pre_aggregations.manager import PreAggregationManager
-from semantic_layer.pre_aggregations.storage import DatabasePreAggregation
+from semantic_layer.pre_aggregations.refresh_keys import RefreshKeyStore
+
+
+# How often refresh_key.sql checks run when no "every" is given
+DEFAULT_REFRESH_KEY_CHECK_SECONDS = 60
+
+# How often the dispatcher looks for refreshes that are due
+DISPATCH_TICK_SECONDS = 1.0
 
 
 class PreAggregationScheduler:
-    """Schedules pre-aggregation refreshes."""
+    """Schedules pre-aggregation refreshes.
+
+    All refreshes go through one priority queue drained by a fixed pool of
+    workers, so background builds never use more than ``max_concurrency``
+    connections. A dispatcher enqueues definitions as they come due:
+
+    - definitions with only ``refresh_key.every`` are rebuilt on that interval;
+    - definitions with ``refresh_key.sql`` are checked instead: the keys of all
+      definitions due in the same tick are evaluated in a single round trip and
+      only rollups whose key changed since the last build are rebuilt.
+
+    First runs are spread over ``startup_jitter_seconds`` and every interval is
+    randomized by ``interval_jitter`` so that schedules do not line up. Queued
+    refreshes are ordered by query hit count, and a definition is held back
+    until the pre-aggregations it depends on have been built.
+    """
 
     def __init__(
         self,
         manager: PreAggregationManager,
         connector: BaseConnector,
+        refresh_key_store: Optional[RefreshKeyStore] = None,
+        max_concurrency: int = 2,
+        startup_jitter_seconds: float = 30.0,
+        interval_jitter: float = 0.1,
+        callback_manager: Optional[CallbackManager] = None,
+        admission_controller: Optional[AdmissionController] = None,
     ):
-        """Initialize scheduler."""
+        """Initialize scheduler.
+
+        Args:
+            manager: Pre-aggregation manager holding the definitions
+            connector: Database connector used for refresh key checks
+            refresh_key_store: Store for last-seen refresh key values
+                (in-memory only if not provided)
+            max_concurrency: Maximum number of refreshes running at once
+            startup_jitter_seconds: First runs are spread randomly over this window
+            interval_jitter: Fraction by which each refresh interval is randomized
+            callback_manager: Optional callbacks notified of refresh results
+            admission_controller: Optional queue shared with queries; builds
+                wait in it under the refresh priority class
+        """
         self.manager = manager
         self.connector = connector
+        self.refresh_key_store = refresh_key_store or RefreshKeyStore()
+        self.max_concurrency = max(1, max_concurrency)
+        self.startup_jitter_seconds = max(0.0, startup_jitter_seconds)
+        self.interval_jitter = min(max(0.0, interval_jitter), 1.0)
+        self.callback_manager = callback_manager
+        self.admission_controller = admission_controller
         self._running = False
         self._tasks: Dict[str, asyncio.Task] = {}
+        self._waiters: Set[asyncio.Task] = set()
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+        self._intervals: Dict[str, float] = {}
+        self._next_run: Dict[str, float] = {}
+        # Names that are queued or running, with an event set once they finish
+        self._pending: Dict[str, asyncio.Event] = {}
+        # Refresh key values to store once the matching refresh succeeds
+        self._pending_keys: Dict[str, Optional[str]] = {}
 
     async def start(self) -> None:
         """Start the scheduler."""
         self._running = True
+        now = time.monotonic()
         # Schedule all registered pre-aggregations
         for name, definition in self.manager._definitions.items():
-            await self._schedule_pre_aggregation(definition)
+            interval = self._get_interval(definition)
+            if not interval:
+                continue
+            self._intervals[name] = interval
+            self._next_run[name] = now + random.uniform(0, self.startup_jitter_seconds)
+
+        for i in range(self.max_concurrency):
+            self._tasks[f"__worker_{i}__"] = asyncio.create_task(self._worker())
+        self._tasks["__dispatcher__"] = asyncio.create_task(self._dispatch_loop())
 
     async def stop(self) -> None:
         """Stop the scheduler."""
         self._running = False
         # Cancel all tasks
-        for task in self._tasks.values():
+        tasks = list(self._tasks.values()) + list(self._waiters)
+        for task in tasks:
             task.cancel()
-        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        await asyncio.gather(*tasks, return_exceptions=True)
         self._tasks.clear()
+        self._waiters.clear()
 
-    async def _schedule_pre_aggregation(self, definition) -> None:
-        """Schedule a pre-aggregation refresh."""
+    def _get_interval(self, definition: PreAggregationDefinition) -> Optional[float]:
+        """Get the refresh (or refresh key check) interval of a definition."""
         refresh_key = definition.refresh_key or {}
         every = refresh_key.get("every")
-        
-        if not every:
-            return
-        
-        # Parse refresh interval (e.g., "1 hour", "30 minutes")
-        interval_seconds = self._parse_interval(every)
-        if not interval_seconds:
-            return
-        
-        async def refresh_loop():
-            while self._running:
-                try:
-                    await self.manager.refresh_pre_aggregation(definition)
-                    print(f"Refreshed pre-aggregation: {definition.name}")
-                except Exception as e:
-                    print(f"Error refreshing pre-aggregation {definition.name}: {e}")
-                
-                await asyncio.sleep(interval_seconds)
-        
-        task = asyncio.create_task(refresh_loop())
-        self._tasks[definition.name] = task
+        interval = self._parse_interval(every) if every else None
+        if refresh_key.get("sql"):
+            return interval or DEFAULT_REFRESH_KEY_CHECK_SECONDS
+        return interval
+
+    def _jittered(self, interval: float) -> float:
+        """Randomize an interval by the configured jitter fraction."""
+        return interval * (1 + random.uniform(-self.interval_jitter, self.interval_jitter))
+
+    async def _dispatch_loop(self) -> None:
+        """Periodically enqueue refreshes that are due."""
+        while self._running:
+            try:
+                await self.dispatch_due()
+            except Exception as e:
+                print(f"Error scheduling pre-aggregation refreshes: {e}")
+
+            await asyncio.sleep(DISPATCH_TICK_SECONDS)
+
+    async def dispatch_due(self, now: Optional[float] = None) -> List[str]:
+        """Enqueue all definitions whose next run is due.
+
+        Returns:
+            Names of the pre-aggregations that were enqueued
+        """
+        now = time.monotonic() if now is None else now
+        keyed: List[PreAggregationDefinition] = []
+        enqueued = []
+
+        for name, next_run in list(self._next_run.items()):
+            definition = self.manager._definitions.get(name)
+            if next_run > now or definition is None or name in self._pending:
+                continue
+            self._next_run[name] = now + self._jittered(self._intervals[name])
+            if definition.refresh_key.get("sql"):
+                keyed.append(definition)
+            elif self.enqueue(definition):
+                enqueued.append(name)
+
+        if keyed:
+            for definition, value in await self.find_changed_definitions(keyed):
+                if self.enqueue(definition):
+                    self._pending_keys[definition.name] = value
+                    enqueued.append(definition.name)
+
+        return enqueued
+
+    def enqueue(self, definition: PreAggregationDefinition) -> bool:
+        """Add a refresh to the queue unless it is already queued or running.
+
+        Returns:
+            True if the refresh was enqueued
+        """
+        if definition.name in self._pending:
+            return False
+        self._pending[definition.name] = asyncio.Event()
+        self._put(definition)
+        return True
+
+    def _put(self, definition: PreAggregationDefinition) -> None:
+        """Put a definition on the queue, most-queried first."""
+        priority = -self.manager.get_hit_count(definition.name)
+        self._queue.put_nowait((priority, next(self._sequence), definition))
+
+    async def _worker(self) -> None:
+        """Take refreshes off the queue and run them."""
+        while self._running:
+            _, _, definition = await self._queue.get()
+            try:
+                blocking = self._pending_dependencies(definition)
+                if blocking:
+                    # Wait outside the worker pool so dependencies can run
+                    waiter = asyncio.create_task(self._requeue_after(definition, blocking))
+                    self._waiters.add(waiter)
+                    waiter.add_done_callback(self._waiters.discard)
+                    continue
+                await self._run_refresh(definition)
+            except Exception as e:
+                print(f"Error refreshing pre-aggregation {definition.name}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _pending_dependencies(self, definition: PreAggregationDefinition) -> List[asyncio.Event]:
+        """Get events of dependencies that are still queued or running."""
+        events = []
+        for name in self.manager.get_dependencies(definition):
+            if name not in self._pending:
+                continue
+            # Ignore cyclic dependencies instead of waiting forever
+            if self.manager.depends_on(name, definition.name):
+                continue
+            events.append(self._pending[name])
+        return events
+
+    async def _requeue_after(
+        self, definition: PreAggregationDefinition, events: List[asyncio.Event]
+    ) -> None:
+        """Put a definition back on the queue once its dependencies finished."""
+        await asyncio.gather(*(event.wait() for event in events))
+        self._put(definition)
+
+    async def _run_refresh(
+        self, definition: PreAggregationDefinition, raise_errors: bool = False
+    ) -> bool:
+        """Build a pre-aggregation within the concurrency limit and report it.
+
+        Returns:
+            True if the refresh succeeded
+        """
+        name = definition.name
+        start_time = time.perf_counter()
+        try:
+            async with self._slots:
+                if self.admission_controller:
+                    async with self.admission_controller.admit(PRIORITY_REFRESH):
+                        await self._refresh(definition)
+                else:
+                    await self._refresh(definition)
+                row_count = await self._count_rows(definition)
+        except Exception as e:
+            duration_ms = (time.perf_counter() - start_time) * 1000
+            self._pending_keys.pop(name, None)
+            print(f"Error refreshing pre-aggregation {name}: {e}")
+            if self.callback_manager:
+                await self.callback_manager.on_pre_agg_refresh_error(
+                    name, e, duration_ms=duration_ms
+                )
+            if raise_errors:
+                raise
+            return False
+        finally:
+            event = self._pending.pop(name, None)
+            if event:
+                event.set()
+
+        duration_ms = (time.perf_counter() - start_time) * 1000
+        if name in self._pending_keys:
+            self.refresh_key_store.set(name, self._pending_keys.pop(name))
+        print(f"Refreshed pre-aggregation: {name} ({duration_ms:.0f} ms, {row_count} rows)")
+        if self.callback_manager:
+            await self.callback_manager.on_pre_agg_refreshed(name, duration_ms, row_count)
+        return True
+
+    async def check_refresh_keys(self, definitions: List[PreAggregationDefinition]) -> List[str]:
+        """Rebuild the definitions whose refresh key changed.
+
+        A rollup is also built when it does not exist yet, regardless of its
+        stored key value.
+
+        Returns:
+            Names of the pre-aggregations that were rebuilt
+        """
+        refreshed = []
+        for definition, value in await self.find_changed_definitions(definitions):
+            self._pending_keys[definition.name] = value
+            if await self._run_refresh(definition):
+                refreshed.append(definition.name)
+        return refreshed
+
+    async def find_changed_definitions(
+        self, definitions: List[PreAggregationDefinition]
+    ) -> List[Tuple[PreAggregationDefinition, Optional[str]]]:
+        """Find definitions whose refresh key changed or whose rollup is missing.
+
+        Returns:
+            Pairs of definition and its current refresh key value
+        """
+        async with self._slots:
+            values = await self.evaluate_refresh_keys(definitions)
+        changed = []
+
+        for definition in definitions:
+            if definition.name not in values:
+                # Key could not be evaluated; keep the existing rollup
+                continue
+            value = values[definition.name]
+            if (
+                self.refresh_key_store.has(definition.name)
+                and value == self.refresh_key_store.get(definition.name)
+            ):
+                if await self._is_materialized(definition):
+                    continue
+            changed.append((definition, value))
+
+        return changed
+
+    async def evaluate_refresh_keys(
+        self, definitions: List[PreAggregationDefinition]
+    ) -> Dict[str, Optional[str]]:
+        """Evaluate refresh_key.sql for all definitions in one round trip.
+
+        Each key query becomes a scalar subquery of a single SELECT. If the
+        batch fails (e.g. one key query is broken), keys are evaluated one by
+        one so that a single bad definition does not block the others.
+
+        Returns:
+            Mapping of pre-aggregation name to its serialized key value.
+            Definitions whose key could not be evaluated are omitted.
+        """
+        if not definitions:
+            return {}
+
+        columns = [
+            f"({self._clean_refresh_key_sql(d.refresh_key['sql'])}) AS refresh_key_{i}"
+            for i, d in enumerate(definitions)
+        ]
+        batch_sql = "SELECT " + ", ".join(columns)
+
+        try:
+            rows = await self.connector.execute_query(batch_sql)
+            row = rows[0] if rows else {}
+            return {
+                d.name: self._serialize_refresh_key(row.get(f"refresh_key_{i}"))
+                for i, d in enumerate(definitions)
+            }
+        except Exception as e:
+            if len(definitions) == 1:
+                print(f"Error evaluating refresh key for {definitions[0].name}: {e}")
+                return {}
+
+        values: Dict[str, Optional[str]] = {}
+        for definition in definitions:
+            values.update(await self.evaluate_refresh_keys([definition]))
+        return values
+
+    @staticmethod
+    def _clean_refresh_key_sql(sql: str) -> str:
+        """Strip whitespace and trailing semicolons so the SQL can be nested."""
+        return sql.strip().rstrip(";").strip()
+
+    @staticmethod
+    def _serialize_refresh_key(value: Any) -> Optional[str]:
+        """Serialize a refresh key value for comparison and persistence."""
+        if value is None:
+            return None
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        return str(value)
+
+    async def _is_materialized(self, definition: PreAggregationDefinition) -> bool:
+        """Check whether the rollup table for a definition exists."""
+        if not self.manager.storage:
+            return True
+        return await self.manager.storage.exists(definition)
+
+    async def _count_rows(self, definition: PreAggregationDefinition) -> Optional[int]:
+        """Count rows in the rollup table for a definition."""
+        if not self.manager.storage:
+            return None
+        return await self.manager.storage.count_rows(definition)
+
+    async def _refresh(self, definition: PreAggregationDefinition) -> None:
+        """Build a pre-aggregation, creating it first if it does not exist."""
+        if not await self._is_materialized(definition):
+            await self.manager.create_pre_aggregation(definition)
+        else:
+            await self.manager.refresh_pre_aggregation(definition)
 
     def _parse_interval(self, interval_str: str) -> Optional[int]:
         """Parse interval string to seconds."""
@@ -91,5 +400,5 @@ class PreAggregationScheduler:
             raise ValueError(f"Pre-aggregation '{name}' not found")
         
         definition = self.manager._definitions[name]
-        await self.manager.refresh_pre_aggregation(definition)
+        await self._run_refresh(definition, raise_errors=True)
 
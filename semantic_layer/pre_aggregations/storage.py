@@ -1,6 +1,8 @@
 """Pre-aggregation storage implementation."""
 
-from typing import Optional
+import asyncio
+import uuid
+from typing import Any, Dict, List, Optional
 
 from semantic_layer.drivers.base_driver import BaseDriver as BaseConnector
 from semantic_layer.exceptions import ExecutionError
@@ -47,30 +49,77 @@ class DatabasePreAggregation(BasePreAggregation):
         except Exception:
             return False
 
-    async def create(self, definition: PreAggregationDefinition, sql: str) -> None:
+    async def create(
+        self,
+        definition: PreAggregationDefinition,
+        sql: str,
+        indexes: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
         """Create pre-aggregation table."""
         await self._ensure_schema()
-        table_name = await self.get_table_name(definition)
-        
-        # Create table from query result
-        create_sql = f"CREATE TABLE IF NOT EXISTS {table_name} AS {sql}"
-        
-        try:
-            await self.connector.execute_query(create_sql)
-        except Exception as e:
-            raise ExecutionError(f"Failed to create pre-aggregation: {str(e)}") from e
+        await self._build_and_swap(definition, sql, indexes or [])
 
-    async def refresh(self, definition: PreAggregationDefinition, sql: str) -> None:
+    async def refresh(
+        self,
+        definition: PreAggregationDefinition,
+        sql: str,
+        indexes: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
         """Refresh pre-aggregation data."""
+        await self._build_and_swap(definition, sql, indexes or [])
+
+    async def _build_and_swap(
+        self,
+        definition: PreAggregationDefinition,
+        sql: str,
+        indexes: List[Dict[str, Any]],
+    ) -> None:
+        """Build the rollup in a staging table, index it and swap it in.
+
+        Readers keep using the previous table until the swap, which drops it
+        and renames the staging table in a single statement. Index names carry
+        the build id so they never clash with the indexes being replaced.
+        """
+        table = f"{definition.cube}_{definition.name}"
         table_name = await self.get_table_name(definition)
-        
-        # Truncate and repopulate
-        truncate_sql = f"TRUNCATE TABLE {table_name}"
-        insert_sql = f"INSERT INTO {table_name} {sql}"
-        
+        build_id = uuid.uuid4().hex[:8]
+        staging_table = f"{table}_{build_id}"
+        staging_name = f"{self.schema_name}.{staging_table}"
+
         try:
-            await self.connector.execute_query(truncate_sql)
-            await self.connector.execute_query(insert_sql)
+            await self.connector.execute_query(f"CREATE TABLE {staging_name} AS {sql}")
+            await asyncio.gather(*(
+                self.connector.execute_query(
+                    f"CREATE INDEX {self._index_name(table, index['name'], build_id)} "
+                    f"ON {staging_name} ({', '.join(index['columns'])})"
+                )
+                for index in indexes
+            ))
+            await self.connector.execute_query(
+                f"DO $$ BEGIN "
+                f"DROP TABLE IF EXISTS {table_name}; "
+                f"ALTER TABLE {staging_name} RENAME TO {table}; "
+                f"END $$"
+            )
         except Exception as e:
-            raise ExecutionError(f"Failed to refresh pre-aggregation: {str(e)}") from e
+            try:
+                await self.connector.execute_query(f"DROP TABLE IF EXISTS {staging_name}")
+            except Exception:
+                pass
+            raise ExecutionError(f"Failed to build pre-aggregation: {str(e)}") from e
+
+    @staticmethod
+    def _index_name(table: str, index_name: str, build_id: str) -> str:
+        """Get an index name that fits PostgreSQL's 63 character limit."""
+        return f"{table}_{index_name}"[:50] + f"_{build_id}"
 
+    async def count_rows(self, definition: PreAggregationDefinition) -> Optional[int]:
+        """Count rows in pre-aggregation table."""
+        table_name = await self.get_table_name(definition)
+        try:
+            results = await self.connector.execute_query(
+                f"SELECT COUNT(*) AS row_count FROM {table_name}"
+            )
+            return int(results[0]["row_count"]) if results else None
+        except Exception:
+            return None
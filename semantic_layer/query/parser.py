@@ -113,6 +113,8 @@ class QueryParser:
                 limit=limit,
                 offset=offset,
                 ctes=ctes,
+                totals=bool(request_data.get("totals", False)),
+                subtotals=bool(request_data.get("subtotals", False)),
             )
 
             query.validate()
@@ -315,6 +315,42 @@ class Query(BaseModel):
         default_factory=list,
         description="Common Table Expressions (CTEs) - [{'alias': str, 'query': str}]"
     )
+    grouping_sets: Optional[List[List[str]]] = Field(
+        None,
+        description=(
+            "Groupings of dimensions (and time dimensions) to aggregate by, "
+            "each row labelled with its set index"
+        ),
+    )
+    totals: bool = Field(False, description="Also return a grand total row")
+    subtotals: bool = Field(
+        False,
+        description="Also return subtotal rows rolling up the grouped members from last to first",
+    )
+
+    def get_grouped_members(self) -> List[str]:
+        """Get the dimensions and time dimensions with a granularity, in grouping order."""
+        time_dimensions = [td.dimension for td in self.time_dimensions if td.granularity]
+        return list(self.dimensions) + time_dimensions
+
+    def get_grouping_sets(self) -> Optional[List[List[str]]]:
+        """Get the grouping sets to aggregate by, or None for a plain GROUP BY.
+
+        Subtotals group by every prefix of the grouped members, as ROLLUP
+        does, and totals add the empty set. The detail set comes first.
+        """
+        if self.grouping_sets is not None:
+            grouping_sets = [list(grouping_set) for grouping_set in self.grouping_sets]
+        elif self.subtotals:
+            members = self.get_grouped_members()
+            grouping_sets = [members[:size] for size in range(len(members), -1, -1)]
+        elif self.totals:
+            grouping_sets = [self.get_grouped_members()]
+        else:
+            return None
+        if self.totals and [] not in grouping_sets:
+            grouping_sets.append([])
+        return grouping_sets
 
     def validate(self) -> None:
         """Validate the query."""
@@ -2,9 +2,13 @@
 
 from datetime import date, datetime
 from decimal import Decimal
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
 from semantic_layer.query.query import Query
+from semantic_layer.sql.builder import GROUPING_SET_COLUMN
+
+# Members a total row is grouped by; empty for the grand total
+TOTAL_MEMBERS_COLUMN = "_totalOf"
 
 
 class ResultFormatter:
@@ -37,7 +41,13 @@ class ResultFormatter:
                 normalized_row[normalized_key] = ResultFormatter._serialize_value(value)
             normalized_results.append(normalized_row)
 
-        return {
+        totals = None
+        if query.totals or query.subtotals:
+            normalized_results, totals = ResultFormatter._split_totals(
+                normalized_results, query.get_grouping_sets()
+            )
+
+        formatted = {
             "data": normalized_results,
             "meta": {
                 "query": {
@@ -49,4 +59,29 @@ class ResultFormatter:
                 "row_count": len(normalized_results),
             },
         }
+        if totals is not None:
+            formatted["totals"] = totals
+        return formatted
+
+    @staticmethod
+    def _split_totals(
+        results: List[Dict[str, Any]], grouping_sets: List[List[str]]
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Split detail rows from subtotal and total rows.
+
+        Rows of the first grouping set are the detail rows; the others are
+        labelled with the members they are grouped by.
+
+        Returns:
+            (detail rows, total rows)
+        """
+        detail, totals = [], []
+        for row in results:
+            set_index = row.pop(GROUPING_SET_COLUMN, 0) or 0
+            if set_index == 0:
+                detail.append(row)
+            else:
+                row[TOTAL_MEMBERS_COLUMN] = list(grouping_sets[set_index])
+                totals.append(row)
+        return detail, totals
 
@@ -1,11 +1,19 @@
 """Row-Level Security (RLS) implementation."""
 
-from typing import Any, Dict, Optional
+import re
+from typing import Any, Dict, List, Optional
 
 from semantic_layer.auth.base import SecurityContext
 from semantic_layer.models.cube import Cube
 
 
+# Row filter applied to cubes with a user_id dimension and no explicit filter
+DEFAULT_ROW_FILTER = "{CUBE}.user_id = '{USER_CONTEXT.user_id}'"
+
+# Columns a row filter reads from the cube table, e.g. {CUBE}.tenant_id
+_CUBE_COLUMN = re.compile(r"\{CUBE\}\.(\w+)")
+
+
 class RLSFilter:
     """Row-Level Security filter."""
 
@@ -23,24 +31,64 @@ class RLSFilter:
         if cube.security:
             row_filter = cube.security.get("row_filter", "")
             if row_filter:
-                # Replace placeholders with actual values
-                filter_sql = row_filter.replace("{CUBE}", table_alias)
-                if security_context.user_id:
-                    filter_sql = filter_sql.replace("{USER_CONTEXT.user_id}", str(security_context.user_id))
-                if security_context.tenant_id:
-                    filter_sql = filter_sql.replace("{USER_CONTEXT.tenant_id}", str(security_context.tenant_id))
-                # Replace roles if needed
-                if security_context.roles:
-                    roles_str = "', '".join(security_context.roles)
-                    filter_sql = filter_sql.replace("{USER_CONTEXT.roles}", f"('{roles_str}')")
-                return filter_sql
+                return RLSFilter.render_row_filter(row_filter, security_context, table_alias)
         
         # Default RLS: If cube has user_id column and context has user_id, filter by user
         # This is a simplified example - in production, you'd have proper RLS definitions
         if security_context and security_context.user_id:
             # Try to apply default RLS if cube has user_id dimension
             if "user_id" in cube.dimensions:
-                return f"{table_alias}.user_id = '{security_context.user_id}'"
+                return RLSFilter.render_row_filter(
+                    DEFAULT_ROW_FILTER, security_context, table_alias
+                )
         
         return None
 
+    @staticmethod
+    def render_row_filter(
+        row_filter: str,
+        security_context: SecurityContext,
+        table_alias: str = "t0",
+    ) -> str:
+        """Replace the placeholders of a row filter template."""
+        filter_sql = row_filter.replace("{CUBE}", table_alias)
+        if security_context.user_id:
+            filter_sql = filter_sql.replace("{USER_CONTEXT.user_id}", str(security_context.user_id))
+        if security_context.tenant_id:
+            filter_sql = filter_sql.replace(
+                "{USER_CONTEXT.tenant_id}", str(security_context.tenant_id)
+            )
+        # Replace roles if needed
+        if security_context.roles:
+            roles_str = "', '".join(security_context.roles)
+            filter_sql = filter_sql.replace("{USER_CONTEXT.roles}", f"('{roles_str}')")
+        return filter_sql
+
+    @staticmethod
+    def get_row_filter_template(cube: Cube) -> Optional[str]:
+        """Get the row filter template that may apply to a cube."""
+        if cube.security and cube.security.get("row_filter"):
+            return cube.security["row_filter"]
+        if "user_id" in cube.dimensions:
+            return DEFAULT_ROW_FILTER
+        return None
+
+    @staticmethod
+    def get_row_filter_columns(cube: Cube) -> List[str]:
+        """Get the cube table columns referenced by its row filter."""
+        row_filter = RLSFilter.get_row_filter_template(cube)
+        if not row_filter:
+            return []
+        columns: List[str] = []
+        for column in _CUBE_COLUMN.findall(row_filter):
+            if column not in columns:
+                columns.append(column)
+        return columns
+
+    @staticmethod
+    def rename_row_filter_columns(row_filter: str, columns: Dict[str, str]) -> str:
+        """Rewrite the {CUBE} columns of a row filter template, e.g. for a rollup."""
+        return _CUBE_COLUMN.sub(
+            lambda match: "{CUBE}." + columns.get(match.group(1), match.group(1)),
+            row_filter,
+        )
@@ -6,10 +6,37 @@ from typing import Dict, List, Optional, Set, Tuple
 from semantic_layer.auth.base import SecurityContext
 from semantic_layer.exceptions import ModelError, QueryError
 from semantic_layer.models.cube import Cube
+from semantic_layer.models.measure import Measure
 from semantic_layer.models.relationship import Relationship
 from semantic_layer.models.schema import Schema
-from semantic_layer.query.query import Query, LogicalFilter
+from semantic_layer.query.query import Query, LogicalFilter, QueryFilter
 from semantic_layer.security.rls import RLSFilter
+from semantic_layer.utils.sketches import ESTIMATED_MEASURE_TYPES, SKETCH_DIALECTS
+from semantic_layer.utils.time_windows import (
+    GRANULARITY_INTERVALS,
+    interval_sql,
+    parse_trailing,
+    shift_back,
+    window_seconds,
+)
+
+
+# Column labelling each row of a compareDateRange query with its period
+COMPARE_PERIOD_COLUMN = "_compareDateRange"
+
+# Column holding the index of the grouping set a row belongs to
+GROUPING_SET_COLUMN = "_grouping_set"
+
+# Position of a row within its grouping set, for paging the detail rows
+GROUPING_ROW_COLUMN = "_grouping_row"
+
+# Window function accumulating each measure type over time buckets
+ROLLING_WINDOW_FUNCTIONS = {
+    "count": "SUM",
+    "sum": "SUM",
+    "min": "MIN",
+    "max": "MAX",
+}
 
 
 class JoinInfo:
@@ -31,9 +58,15 @@ class JoinInfo:
 class SQLBuilder:
     """Builds SQL queries from semantic queries."""
 
-    def __init__(self, schema: Schema):
-        """Initialize SQL builder with schema."""
+    def __init__(self, schema: Schema, dialect: str = "postgresql"):
+        """Initialize SQL builder with schema.
+
+        Args:
+            schema: Schema containing cube definitions
+            dialect: SQL dialect of the database the queries run on
+        """
         self.schema = schema
+        self.dialect = dialect
         self.with_queries: List[Dict[str, str]] = []  # List of CTEs: [{"alias": str, "query": str}]
         # Build relationship graph for path finding (similar to Cube.js JoinGraph)
         self._relationship_graph: Dict[str, Dict[str, Relationship]] = {}
@@ -43,12 +76,32 @@ class SQLBuilder:
         self, query: Query, security_context: Optional[SecurityContext] = None
     ) -> str:
         """Build SQL query from semantic query."""
+        if self.get_rolling_measures(query):
+            return self._build_rolling_windows(query, security_context)
+        if any(td.compare_date_range for td in query.time_dimensions):
+            return self._build_compare_date_range(query, security_context)
+        return self._build_grouped(query, security_context)
+
+    def _build_grouped(
+        self,
+        query: Query,
+        security_context: Optional[SecurityContext] = None,
+        compare_periods: Optional[Tuple[str, List[List[str]]]] = None,
+    ) -> str:
+        """Build a single grouped SELECT for a semantic query.
+
+        ``compare_periods`` (time dimension, date ranges) joins the rows to
+        the ranges they fall in and groups by period as well.
+        """
         # Determine which cubes we need
         required_cubes = self._get_required_cubes(query)
 
         if not required_cubes:
             raise QueryError("No cubes found for query")
 
+        self.check_estimated_measures(query)
+        grouping_sets = query.get_grouping_sets()
+
         # Build join plan
         primary_cube_name = list(required_cubes)[0]
         cube_aliases = self._build_join_plan(primary_cube_name, required_cubes)
@@ -68,6 +121,9 @@ class SQLBuilder:
                 primary_key_dimension_path = f"{primary_cube_name}.{dim_name}"
                 break
 
+        # SQL of each grouped member, for GROUPING SETS
+        member_sql: Dict[str, str] = {}
+
         # Add dimensions
         for dim_path in query.dimensions:
             cube, dim_name = self.schema.get_cube_for_dimension(dim_path)
@@ -81,6 +137,7 @@ class SQLBuilder:
                 primary_key_dimension_sql = dim_sql
             
             group_by_parts.append(dim_sql)
+            member_sql[dim_path] = dim_sql
 
         # Add time dimensions
         for td in query.time_dimensions:
@@ -93,6 +150,7 @@ class SQLBuilder:
                 alias = f"{td.dimension.replace('.', '_')}_{td.granularity}"
                 select_parts.append(f"{dim_sql} AS {alias}")
                 group_by_parts.append(dim_sql)
+                member_sql[td.dimension] = dim_sql
 
         # Add measures
         for meas_path in query.measures:
@@ -102,12 +160,24 @@ class SQLBuilder:
             meas_sql = measure.get_sql_expression(table_alias)
             select_parts.append(f"{meas_sql} AS {meas_path.replace('.', '_')}")
 
+        grouping_set_index = None
+        if grouping_sets is not None:
+            grouping_set_index = self._build_grouping_set_index(grouping_sets, member_sql)
+            select_parts.append(f"{grouping_set_index} AS {GROUPING_SET_COLUMN}")
+
+        if compare_periods:
+            select_parts.append(f'compare_periods.period_label AS "{COMPARE_PERIOD_COLUMN}"')
+            group_by_parts.extend(["compare_periods.period_index", "compare_periods.period_label"])
+
         # Build FROM and JOIN clauses
         primary_cube = self.schema.get_cube(primary_cube_name)
         primary_alias = cube_aliases[primary_cube_name]
         from_clause = f"FROM {primary_cube.table} AS {primary_alias}"
         
         join_clauses = self._build_join_clauses(primary_cube_name, required_cubes, cube_aliases)
+        if compare_periods:
+            period_join = self._build_compare_periods_join(compare_periods, cube_aliases)
+            join_clauses = " ".join(filter(None, [join_clauses, period_join]))
 
         # Build WHERE clause
         where_conditions = []
@@ -175,7 +245,19 @@ class SQLBuilder:
         )
         
         group_by_clause = ""
-        if group_by_parts and not skip_group_by:
+        if grouping_sets is not None:
+            # Every set is split by period as well
+            period_parts = []
+            if compare_periods:
+                period_parts = ["compare_periods.period_index", "compare_periods.period_label"]
+            grouping_set_parts = [
+                "("
+                + ", ".join([member_sql[member] for member in grouping_set] + period_parts)
+                + ")"
+                for grouping_set in grouping_sets
+            ]
+            group_by_clause = f"GROUP BY GROUPING SETS ({', '.join(grouping_set_parts)})"
+        elif group_by_parts and not skip_group_by:
             group_by_clause = "GROUP BY " + ", ".join(group_by_parts)
 
         # Build HAVING clause for measure filters
@@ -202,8 +284,15 @@ class SQLBuilder:
 
         # Build ORDER BY clause
         order_by_clause = ""
+        order_parts = []
+        if compare_periods:
+            # Periods come one after the other, in the order they were given
+            order_parts.append("compare_periods.period_index")
+        if grouping_sets is not None:
+            # Detail rows come before the subtotals and totals rolling them up
+            order_parts.append(GROUPING_SET_COLUMN)
+        query_order_parts = []
         if query.order_by:
-            order_parts = []
             for order in query.order_by:
                 # Ensure order is a QueryOrderBy object with dimension attribute
                 if not hasattr(order, 'dimension'):
@@ -229,9 +318,10 @@ class SQLBuilder:
                 
                 if order_sql:
                     direction = order.direction.upper()
-                    order_parts.append(f"{order_sql} {direction}")
-            if order_parts:
-                order_by_clause = "ORDER BY " + ", ".join(order_parts)
+                    query_order_parts.append(f"{order_sql} {direction}")
+        order_parts.extend(query_order_parts)
+        if order_parts:
+            order_by_clause = "ORDER BY " + ", ".join(order_parts)
 
         # Build LIMIT and OFFSET
         limit_clause = ""
@@ -241,7 +331,33 @@ class SQLBuilder:
                 limit_clause += f" OFFSET {query.offset}"
 
         # Build WITH clause (CTEs)
-        with_clause = self._build_with_clause()
+        with_clause = self._build_with_clause(query.ctes)
+
+        if grouping_set_index is not None and query.limit:
+            # Page the detail rows only, so subtotals and totals are always returned
+            window_order = ", ".join(query_order_parts) or "1"
+            select_parts.append(
+                f"ROW_NUMBER() OVER (PARTITION BY {grouping_set_index} ORDER BY {window_order}) "
+                f"AS {GROUPING_ROW_COLUMN}"
+            )
+            inner_sql = " ".join(filter(None, [
+                "SELECT",
+                ", ".join(select_parts),
+                from_clause,
+                join_clauses,
+                where_clause,
+                group_by_clause,
+                having_clause,
+            ]))
+            columns = [part.rsplit(" AS ", 1)[1] for part in select_parts[:-1]]
+            first_row = (query.offset or 0) + 1
+            last_row = (query.offset or 0) + query.limit
+            return (
+                f"{with_clause}SELECT {', '.join(columns)} FROM ({inner_sql}) AS grouped "
+                f"WHERE {GROUPING_SET_COLUMN} <> 0 "
+                f"OR {GROUPING_ROW_COLUMN} BETWEEN {first_row} AND {last_row} "
+                f"ORDER BY {GROUPING_SET_COLUMN}, {GROUPING_ROW_COLUMN}"
+            )
 
         # Assemble SQL
         sql_parts = [
@@ -269,14 +385,21 @@ class SQLBuilder:
         """
         self.with_queries.append({"alias": alias, "query": query})
     
-    def _build_with_clause(self) -> str:
-        """Build WITH clause from CTEs."""
-        if not self.with_queries:
+    def _build_with_clause(self, query_ctes: Optional[List[Dict[str, str]]] = None) -> str:
+        """Build WITH clause from CTEs added to the builder and the query's own.
+
+        The query's CTEs are read per build, so one builder can serve
+        concurrent queries without sharing CTE state.
+        """
+        ctes = list(self.with_queries)
+        aliases = {cte["alias"] for cte in ctes}
+        ctes.extend(cte for cte in query_ctes or [] if cte["alias"] not in aliases)
+        if not ctes:
             return ""
         
         cte_definitions = [
             f"{cte['alias']} AS ({cte['query']})"
-            for cte in self.with_queries
+            for cte in ctes
         ]
         newline = '\n'
         comma_newline = ',\n'
@@ -590,6 +713,278 @@ class SQLBuilder:
             join_condition=join_condition,
         )
 
+    @staticmethod
+    def _build_grouping_set_index(
+        grouping_sets: List[List[str]], member_sql: Dict[str, str]
+    ) -> str:
+        """Build the expression numbering the grouping set of each row.
+
+        GROUPING() sets one bit per member aggregated away, most significant
+        first, which identifies the set.
+        """
+        for grouping_set in grouping_sets:
+            unknown = [member for member in grouping_set if member not in member_sql]
+            if unknown:
+                raise QueryError(
+                    f"Grouping set members {unknown} must be query dimensions "
+                    "or time dimensions with a granularity"
+                )
+        members = list(member_sql)
+        if not members:
+            return "0"
+        cases = []
+        for index, grouping_set in enumerate(grouping_sets):
+            mask = 0
+            for position, member in enumerate(members):
+                if member not in grouping_set:
+                    mask |= 1 << (len(members) - 1 - position)
+            cases.append(f"WHEN {mask} THEN {index}")
+        return f"CASE GROUPING({', '.join(member_sql[m] for m in members)}) {' '.join(cases)} END"
+
+    def _build_compare_date_range(
+        self, query: Query, security_context: Optional[SecurityContext] = None
+    ) -> str:
+        """Build SQL answering every period of a compareDateRange in one scan.
+
+        The rows of the union of the ranges are read once and joined to a
+        VALUES list of the periods, so a row in overlapping ranges counts in
+        each of them. Rows are labelled with their period and returned
+        period by period.
+        """
+        td = next(td for td in query.time_dimensions if td.compare_date_range)
+        ranges = td.compare_date_range
+        if len(ranges) < 1 or any(len(date_range) < 1 for date_range in ranges):
+            raise QueryError("compareDateRange requires at least one date range")
+
+        # Narrow the scan to the span of all periods
+        span = [min(date_range[0] for date_range in ranges)]
+        if all(len(date_range) >= 2 for date_range in ranges):
+            span.append(max(date_range[1] for date_range in ranges))
+        scan_td = td.model_copy(update={"date_range": span, "compare_date_range": None})
+        scan_query = query.model_copy(update={
+            "time_dimensions": [
+                scan_td if other is td else other for other in query.time_dimensions
+            ],
+        })
+        return self._build_grouped(
+            scan_query, security_context, compare_periods=(td.dimension, ranges)
+        )
+
+    def _build_compare_periods_join(
+        self, compare_periods: Tuple[str, List[List[str]]], cube_aliases: Dict[str, str]
+    ) -> str:
+        """Join rows to the compareDateRange periods containing them."""
+        dimension_path, ranges = compare_periods
+        cube, dim_name = self.schema.get_cube_for_dimension(dimension_path)
+        dim_sql = cube.get_dimension(dim_name).get_sql_expression(cube_aliases[cube.name])
+
+        def timestamp(value: Optional[str]) -> str:
+            if value is None:
+                return "CAST(NULL AS timestamp)"
+            return "TIMESTAMP '" + str(value).replace("'", "''") + "'"
+
+        rows = []
+        for index, date_range in enumerate(ranges):
+            start = date_range[0]
+            end = date_range[1] if len(date_range) >= 2 else None
+            label = f"{start} to {end}" if end is not None else str(start)
+            escaped_label = label.replace("'", "''")
+            rows.append(f"({index}, {timestamp(start)}, {timestamp(end)}, '{escaped_label}')")
+        return (
+            f"JOIN (VALUES {', '.join(rows)}) "
+            "AS compare_periods(period_index, period_start, period_end, period_label) "
+            f"ON {dim_sql} >= compare_periods.period_start "
+            f"AND (compare_periods.period_end IS NULL OR {dim_sql} <= compare_periods.period_end)"
+        )
+
+    def get_rolling_measures(self, query: Query) -> List[str]:
+        """Get the query's measures that are windowed over time buckets."""
+        rolling = []
+        for meas_path in query.measures:
+            try:
+                cube, meas_name = self.schema.get_cube_for_measure(meas_path)
+                measure = cube.get_measure(meas_name)
+            except ModelError:
+                continue
+            if measure.rolling_window:
+                rolling.append(meas_path)
+        return rolling
+
+    def _build_rolling_windows(
+        self, query: Query, security_context: Optional[SecurityContext] = None
+    ) -> str:
+        """Build SQL for a query with rolling-window or cumulative measures.
+
+        The query is aggregated once per time bucket, with its date range
+        widened by the longest trailing window so the first buckets see their
+        full window. Window functions then accumulate the per-bucket values,
+        and only buckets in the requested range are returned.
+        """
+        granular = [td for td in query.time_dimensions if td.granularity]
+        if len(granular) != 1:
+            raise QueryError(
+                "Rolling window measures require exactly one time dimension with a granularity"
+            )
+        if query.get_grouping_sets() is not None:
+            raise QueryError(
+                "Rolling window measures cannot be combined with totals, subtotals or grouping sets"
+            )
+        td = granular[0]
+        time_alias = f"{td.dimension.replace('.', '_')}_{td.granularity}"
+        bucket_amount, bucket_unit = GRANULARITY_INTERVALS.get(td.granularity, (1, "day"))
+
+        windows = {}
+        widest: Optional[tuple] = None
+        unbounded = False
+        for meas_path in self.get_rolling_measures(query):
+            cube, meas_name = self.schema.get_cube_for_measure(meas_path)
+            measure = cube.get_measure(meas_name)
+            if measure.type not in ROLLING_WINDOW_FUNCTIONS:
+                raise QueryError(
+                    f"Rolling window measure '{meas_path}' must be of type "
+                    f"{', '.join(ROLLING_WINDOW_FUNCTIONS)}, got '{measure.type}'"
+                )
+            trailing = parse_trailing(measure.rolling_window["trailing"])
+            if trailing is None:
+                unbounded = True
+                frame = "RANGE BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW"
+            else:
+                if window_seconds(*trailing) < window_seconds(bucket_amount, bucket_unit):
+                    raise QueryError(
+                        f"Trailing window of '{meas_path}' is shorter than one {td.granularity}"
+                    )
+                if widest is None or window_seconds(*trailing) > window_seconds(*widest):
+                    widest = trailing
+                # The current bucket counts as the first one of the window
+                offset = f"({interval_sql(*trailing)} - {interval_sql(bucket_amount, bucket_unit)})"
+                frame = f"RANGE BETWEEN {offset} PRECEDING AND CURRENT ROW"
+            windows[meas_path] = (ROLLING_WINDOW_FUNCTIONS[measure.type], frame)
+
+        # Aggregate per bucket, over the range plus the window before it
+        start = td.date_range[0] if td.date_range else None
+        inner_filters = list(query.filters)
+        inner_td = td
+        if start and (unbounded or widest):
+            if unbounded:
+                inner_td = td.model_copy(update={"date_range": None})
+                if len(td.date_range) >= 2:
+                    inner_filters.append(
+                        QueryFilter(member=td.dimension, operator="lte", values=[td.date_range[1]])
+                    )
+            else:
+                widened = [shift_back(start, *widest)] + list(td.date_range[1:])
+                inner_td = td.model_copy(update={"date_range": widened})
+        inner_query = query.model_copy(update={
+            "filters": inner_filters,
+            "time_dimensions": [
+                inner_td if other is td else other for other in query.time_dimensions
+            ],
+            "measure_filters": [],
+            "order_by": [],
+            "limit": None,
+            "offset": None,
+        })
+        inner_sql = self._build_grouped(inner_query, security_context)
+
+        partition_by = [dim_path.replace(".", "_") for dim_path in query.dimensions]
+        partition_by += [
+            f"{other.dimension.replace('.', '_')}_{other.granularity}"
+            for other in query.time_dimensions if other.granularity and other is not td
+        ]
+        over = f"ORDER BY {time_alias} {{frame}}"
+        if partition_by:
+            over = f"PARTITION BY {', '.join(partition_by)} {over}"
+
+        columns = partition_by + [time_alias]
+        for meas_path in query.measures:
+            alias = meas_path.replace(".", "_")
+            if meas_path in windows:
+                function, frame = windows[meas_path]
+                columns.append(f"{function}({alias}) OVER ({over.format(frame=frame)}) AS {alias}")
+            else:
+                columns.append(alias)
+
+        # Window functions run after WHERE, so buckets are filtered outside
+        where_conditions = []
+        if start:
+            escaped = str(start).replace("'", "''")
+            where_conditions.append(
+                f"{time_alias} >= DATE_TRUNC('{td.granularity}', TIMESTAMP '{escaped}')"
+            )
+        for filter_obj in query.measure_filters:
+            if isinstance(filter_obj, LogicalFilter):
+                raise QueryError(
+                    "Logical measure filters are not supported with rolling window measures"
+                )
+            alias = (filter_obj.dimension or filter_obj.member).replace(".", "_")
+            where_conditions.append(filter_obj.to_sql_condition(alias, dimension_type="number"))
+
+        order_parts = []
+        time_aliases = {
+            other.dimension: f"{other.dimension.replace('.', '_')}_{other.granularity}"
+            for other in query.time_dimensions if other.granularity
+        }
+        selected = set(query.dimensions) | set(query.measures)
+        for order in query.order_by:
+            if not hasattr(order, "dimension"):
+                continue
+            if order.dimension in time_aliases:
+                order_parts.append(f"{time_aliases[order.dimension]} {order.direction.upper()}")
+            elif order.dimension in selected:
+                order_parts.append(f"{order.dimension.replace('.', '_')} {order.direction.upper()}")
+
+        sql_parts = [
+            f"SELECT * FROM (SELECT {', '.join(columns)} FROM ({inner_sql}) AS rolling_base) "
+            "AS rolling",
+            "WHERE " + " AND ".join(where_conditions) if where_conditions else "",
+            "ORDER BY " + ", ".join(order_parts) if order_parts else "",
+        ]
+        if query.limit:
+            sql_parts.append(f"LIMIT {query.limit}")
+            if query.offset:
+                sql_parts.append(f"OFFSET {query.offset}")
+        return " ".join(filter(None, sql_parts))
+
+    def check_estimated_measures(self, query: Query) -> None:
+        """Reject ordering and HAVING on measures estimated after the query runs.
+
+        Their SQL returns a sketch, which can neither be compared nor sorted.
+        Dialects that cannot build sketches reject these measures altogether.
+        """
+        if self.dialect not in SKETCH_DIALECTS:
+            for member in query.measures:
+                measure = self._find_measure(member)
+                if measure is not None and measure.type in ESTIMATED_MEASURE_TYPES:
+                    raise QueryError(
+                        f"Measure '{member}' of type '{measure.type}' is not supported "
+                        f"on {self.dialect}; its sketch needs PostgreSQL"
+                    )
+
+        members = [order.dimension for order in query.order_by if hasattr(order, "dimension")]
+        pending = list(query.measure_filters)
+        while pending:
+            filter_obj = pending.pop()
+            if isinstance(filter_obj, LogicalFilter):
+                pending.extend(filter_obj.or_ or filter_obj.and_ or [])
+            else:
+                members.append(filter_obj.dimension or filter_obj.member)
+
+        for member in members:
+            measure = self._find_measure(member)
+            if measure is not None and measure.type in ESTIMATED_MEASURE_TYPES:
+                raise QueryError(
+                    f"Measure '{member}' of type '{measure.type}' is estimated after the "
+                    f"query runs and cannot be used in order_by or measure_filters"
+                )
+
+    def _find_measure(self, member: str) -> Optional[Measure]:
+        """Get the measure a member path refers to, or None if it is not one."""
+        try:
+            cube, meas_name = self.schema.get_cube_for_measure(member)
+            return cube.get_measure(meas_name)
+        except Exception:
+            return None
+
     def _get_required_cubes(self, query: Query) -> Set[str]:
         """Get set of cube names required for this query."""
         cubes: Set[str] = set()
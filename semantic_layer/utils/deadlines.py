@@ -0,0 +1,37 @@
+"""Request deadlines carried from the API down to the database drivers."""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+
+# Monotonic time by which the current request must finish
+_deadline: ContextVar[Optional[float]] = ContextVar("query_deadline", default=None)
+
+
+@contextmanager
+def deadline(timeout: Optional[float]) -> Iterator[None]:
+    """Run the block with a deadline ``timeout`` seconds from now.
+
+    An enclosing, earlier deadline still applies. Tasks started in the
+    block inherit the deadline.
+    """
+    if timeout is None:
+        yield
+        return
+    until = time.monotonic() + timeout
+    current = _deadline.get()
+    token = _deadline.set(until if current is None else min(current, until))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_seconds() -> Optional[float]:
+    """Get the seconds left before the current deadline, or None without one."""
+    until = _deadline.get()
+    if until is None:
+        return None
+    return max(0.0, until - time.monotonic())
@@ -0,0 +1,217 @@
+"""Mergeable sketches for approximate measures.
+
+A HyperLogLog sketch is built in SQL as a ``bytea`` of one byte per
+register, holding the highest rank (1 + trailing zeros of the hash) seen in
+that register. It is folded from a fixed-size bitmap with one bit per
+(register, rank) pair, OR-ed together with ``bit_or``, so building it holds
+the same 8 KB per group however many rows the group has. The element-wise
+maximum of such arrays is again a sketch of
+the union, so sketches stored in pre-aggregations can be merged across rows
+and granularities. The cardinality estimate is computed in-process.
+
+A quantile sketch is a DDSketch: values fall into logarithmic buckets whose
+bounds differ by a constant ratio, so any value reported from a bucket is
+within a fixed relative error of the true one. The sketch is a sparse
+``jsonb`` object of bucket counts, built by grouping the bucket of each row
+collected with ``array_agg``. That holds every row of a group in memory, so
+on a raw table it costs as much as an exact ``PERCENTILE_CONT``; quantile
+sketches are therefore only built when materializing rollups, and queries
+are answered by merging the stored sketches. Sketches merge by adding the
+counts bucket by bucket; quantiles are read in-process.
+
+Sketches are built with PostgreSQL functions; other dialects reject
+measures estimated from them.
+"""
+
+import json
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Dialects whose SQL can build sketches
+SKETCH_DIALECTS = {"postgresql"}
+
+# 2^10 registers give a standard error of about 3.25%
+HLL_PRECISION = 10
+HLL_REGISTERS = 1 << HLL_PRECISION
+HLL_RELATIVE_ERROR = 1.04 / math.sqrt(HLL_REGISTERS)
+# Highest rank of a 64-bit hash once the register bits are taken off
+HLL_MAX_RANK = 64 - HLL_PRECISION + 1
+# (register, rank) pairs are packed as register * HLL_RANK_BASE + rank
+HLL_RANK_BASE = 64
+# Bits of the bitmap a sketch is folded from, one per (register, rank) pair
+HLL_BITMAP_BITS = HLL_REGISTERS * HLL_RANK_BASE
+
+# Bucket bounds grow by QUANTILE_GAMMA, giving 1% relative error on values
+QUANTILE_RELATIVE_ERROR = 0.01
+QUANTILE_GAMMA = (1 + QUANTILE_RELATIVE_ERROR) / (1 - QUANTILE_RELATIVE_ERROR)
+# Bucket exponents are clamped to +-QUANTILE_MAX_EXPONENT (about 1e-12..1e12)
+QUANTILE_MAX_EXPONENT = 1400
+# Bucket indexes: 0 holds zeros, then positive and negative values
+_POSITIVE_OFFSET = QUANTILE_MAX_EXPONENT + 1
+_NEGATIVE_OFFSET = 3 * QUANTILE_MAX_EXPONENT + 2
+
+# Measure types whose SQL returns a sketch that is estimated in-process
+ESTIMATED_MEASURE_TYPES = {
+    "countDistinctApprox": {"sketch": "hll", "relative_error": round(HLL_RELATIVE_ERROR, 4)},
+    "percentile": {"sketch": "ddsketch", "relative_error": QUANTILE_RELATIVE_ERROR},
+    "median": {"sketch": "ddsketch", "relative_error": QUANTILE_RELATIVE_ERROR},
+}
+
+# Measure types only served from rollups, as their sketches are costly to build
+ROLLUP_ONLY_MEASURE_TYPES = {"percentile", "median"}
+
+
+def hll_sketch_sql(value_sql: str) -> str:
+    """Get the aggregate building a HyperLogLog sketch of distinct values.
+
+    Each row sets the bit of its (register, rank) pair in a bitmap; the
+    bitmaps are OR-ed with ``bit_or``, a fixed-size aggregate state, and the
+    highest rank set per register is written as one byte each.
+    """
+    value_hash = f"hashtextextended(CAST({value_sql} AS text), 0)"
+    remaining = f"({value_hash} >> {HLL_PRECISION})"
+    rank = (
+        f"CASE WHEN {remaining} = 0 THEN {HLL_MAX_RANK} "
+        f"ELSE LEAST({HLL_MAX_RANK}, 1 + "
+        f"CAST(ROUND(LOG(2, CAST({remaining} & -{remaining} AS numeric))) AS integer)) END"
+    )
+    code = f"({value_hash} & {HLL_REGISTERS - 1}) * {HLL_RANK_BASE} + {rank}"
+    bit = f"CAST(B'1' AS bit({HLL_BITMAP_BITS})) >> CAST({code} AS integer)"
+    # Position of the last bit set in the register's slice, counted from its end
+    last_set = (
+        f"strpos(reverse(CAST(substring(bitmap.bits FROM registers.register * "
+        f"{HLL_RANK_BASE} + 1 FOR {HLL_RANK_BASE}) AS text)), '1')"
+    )
+    return (
+        f"(SELECT decode(string_agg(lpad(to_hex("
+        f"COALESCE({HLL_RANK_BASE} - NULLIF({last_set}, 0), 0)), 2, '0'), '' "
+        f"ORDER BY registers.register), 'hex') "
+        f"FROM (SELECT bit_or({bit}) AS bits) AS bitmap "
+        f"CROSS JOIN generate_series(0, {HLL_REGISTERS - 1}) AS registers(register))"
+    )
+
+
+def hll_merge_sql(sketch_sql: str) -> str:
+    """Get the aggregate merging HyperLogLog sketches (highest rank per register)."""
+    return (
+        f"(SELECT decode(string_agg(lpad(to_hex(ranks.rank), 2, '0'), '' "
+        f"ORDER BY ranks.register), 'hex') "
+        f"FROM (SELECT registers.register, "
+        f"MAX(get_byte(sketches.sketch, registers.register)) AS rank "
+        f"FROM unnest(array_agg({sketch_sql})) AS sketches(sketch) "
+        f"CROSS JOIN generate_series(0, {HLL_REGISTERS - 1}) AS registers(register) "
+        f"WHERE sketches.sketch IS NOT NULL GROUP BY registers.register) AS ranks)"
+    )
+
+
+def _sketch_registers(sketch: Any) -> bytes:
+    """Get the register bytes of a HyperLogLog sketch."""
+    if isinstance(sketch, str):
+        # bytea in PostgreSQL's hex text format
+        return bytes.fromhex(sketch[2:] if sketch.startswith("\\x") else sketch)
+    return bytes(sketch)
+
+
+def hll_estimate(sketch: Any) -> int:
+    """Estimate the number of distinct values in a HyperLogLog sketch."""
+    if sketch is None:
+        return 0
+    registers = _sketch_registers(sketch)
+    if len(registers) != HLL_REGISTERS:
+        raise ValueError(f"Expected {HLL_REGISTERS} registers, got {len(registers)}")
+
+    inverse_sum = sum(2.0 ** -rank for rank in registers)
+    empty_registers = registers.count(0)
+    alpha = 0.7213 / (1 + 1.079 / HLL_REGISTERS)
+    estimate = alpha * HLL_REGISTERS * HLL_REGISTERS / inverse_sum
+    if estimate <= 2.5 * HLL_REGISTERS and empty_registers:
+        # Linear counting is more accurate for small cardinalities
+        estimate = HLL_REGISTERS * math.log(HLL_REGISTERS / empty_registers)
+    return int(round(estimate))
+
+
+def quantile_sketch_sql(value_sql: str) -> str:
+    """Get the aggregate building a quantile sketch of numeric values.
+
+    The bucket of each row is collected with ``array_agg`` and counted, so
+    memory grows with the rows of a group; this is only run to build rollups.
+    """
+    value = f"CAST({value_sql} AS double precision)"
+    exponent = (
+        f"LEAST({QUANTILE_MAX_EXPONENT}, GREATEST(-{QUANTILE_MAX_EXPONENT}, "
+        f"CAST(CEIL(LN(ABS({value})) / LN({QUANTILE_GAMMA!r})) AS integer)))"
+    )
+    index = (
+        f"CASE WHEN {value} IS NULL THEN NULL "
+        f"WHEN {value} = 0 THEN 0 "
+        f"WHEN {value} > 0 THEN {_POSITIVE_OFFSET} + {exponent} "
+        f"ELSE {_NEGATIVE_OFFSET} + {exponent} END"
+    )
+    return (
+        f"(SELECT jsonb_object_agg(buckets.bucket, buckets.total) "
+        f"FROM (SELECT bucket, COUNT(*) AS total "
+        f"FROM unnest(array_agg({index})) AS indexes(bucket) "
+        f"WHERE bucket IS NOT NULL GROUP BY bucket) AS buckets)"
+    )
+
+
+def quantile_merge_sql(sketch_sql: str) -> str:
+    """Get the aggregate merging quantile sketches (counts added per bucket)."""
+    return (
+        f"(SELECT jsonb_object_agg(buckets.bucket, buckets.total) "
+        f"FROM (SELECT CAST(entries.key AS integer) AS bucket, "
+        f"SUM(CAST(entries.value AS bigint)) AS total "
+        f"FROM unnest(array_agg({sketch_sql})) AS sketches(sketch) "
+        f"CROSS JOIN LATERAL jsonb_each_text(sketches.sketch) AS entries(key, value) "
+        f"GROUP BY 1) AS buckets)"
+    )
+
+
+def quantile_bucket_counts(sketch: Any) -> Dict[int, int]:
+    """Get the bucket counts of a quantile sketch."""
+    if isinstance(sketch, (str, bytes)):
+        # jsonb as returned by drivers without a JSON codec
+        sketch = json.loads(sketch)
+    return {int(index): int(count) for index, count in sketch.items() if int(count)}
+
+
+def _bucket_value(index: int) -> float:
+    """Get the value reported for a bucket (its relative-error midpoint)."""
+    if index == 0:
+        return 0.0
+    if index >= _NEGATIVE_OFFSET - QUANTILE_MAX_EXPONENT:
+        sign, exponent = -1.0, index - _NEGATIVE_OFFSET
+    else:
+        sign, exponent = 1.0, index - _POSITIVE_OFFSET
+    return sign * 2 * QUANTILE_GAMMA ** exponent / (QUANTILE_GAMMA + 1)
+
+
+def quantile_estimate(sketch: Any, quantile: float) -> Optional[float]:
+    """Estimate a quantile (0..1) from a quantile sketch."""
+    if sketch is None:
+        return None
+    buckets: List[Tuple[float, int]] = sorted(
+        (_bucket_value(index), count) for index, count in quantile_bucket_counts(sketch).items()
+    )
+    total = sum(count for _, count in buckets)
+    if not total:
+        return None
+
+    rank = quantile * (total - 1)
+    seen = 0
+    for value, count in buckets:
+        seen += count
+        if seen > rank:
+            return value
+    return buckets[-1][0]
+
+
+def finalize_estimate(measure: Any, value: Any) -> Optional[Any]:
+    """Turn a sketch returned by the database into the measure's value."""
+    if measure.type == "countDistinctApprox":
+        return hll_estimate(value)
+    if measure.type in ("percentile", "median"):
+        return quantile_estimate(value, measure.get_quantile())
+    return value
+
@@ -0,0 +1,79 @@
+"""Trailing time windows of rolling-window measures."""
+
+import re
+from datetime import date, datetime, timedelta
+from typing import Optional, Tuple
+
+
+# Interval units PostgreSQL understands, and their approximate length in seconds
+WINDOW_UNIT_SECONDS = {
+    "second": 1,
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+    "week": 7 * 86400,
+    "month": 30 * 86400,
+    "year": 365 * 86400,
+}
+
+# One time bucket of each granularity, as an interval
+GRANULARITY_INTERVALS = {
+    "second": (1, "second"),
+    "minute": (1, "minute"),
+    "hour": (1, "hour"),
+    "day": (1, "day"),
+    "week": (1, "week"),
+    "month": (1, "month"),
+    "quarter": (3, "month"),
+    "year": (1, "year"),
+}
+
+UNBOUNDED = "unbounded"
+
+_WINDOW = re.compile(r"^\s*(\d+)\s+([a-z]+?)s?\s*$")
+
+
+def parse_trailing(trailing: str) -> Optional[Tuple[int, str]]:
+    """Parse a trailing window such as ``7 day`` or ``3 months``.
+
+    Returns:
+        (amount, unit), or None for an unbounded (cumulative) window
+
+    Raises:
+        ValueError: If the window cannot be parsed
+    """
+    if str(trailing).strip().lower() == UNBOUNDED:
+        return None
+    match = _WINDOW.match(str(trailing).lower())
+    if not match or match.group(2) not in WINDOW_UNIT_SECONDS or int(match.group(1)) < 1:
+        raise ValueError(
+            f"Invalid trailing window '{trailing}', expected e.g. '7 day' or 'unbounded'"
+        )
+    return int(match.group(1)), match.group(2)
+
+
+def interval_sql(amount: int, unit: str) -> str:
+    """Render an interval literal."""
+    return f"INTERVAL '{amount} {unit}'"
+
+
+def window_seconds(amount: int, unit: str) -> int:
+    """Get the approximate length of an interval, for comparisons."""
+    return amount * WINDOW_UNIT_SECONDS[unit]
+
+
+def shift_back(timestamp: str, amount: int, unit: str) -> str:
+    """Move an ISO date or timestamp back by an interval, keeping its format."""
+    date_only = len(timestamp) == 10
+    moment = datetime.fromisoformat(timestamp)
+    if unit in ("month", "year"):
+        months = amount * (12 if unit == "year" else 1)
+        month_index = moment.year * 12 + moment.month - 1 - months
+        year, month = divmod(month_index, 12)
+        # Clamp e.g. March 31st to the last day of February
+        next_month = date(year + (month + 1) // 12, (month + 1) % 12 + 1, 1)
+        last_day = (next_month - timedelta(days=1)).day
+        moment = moment.replace(year=year, month=month + 1, day=min(moment.day, last_day))
+    else:
+        moment -= timedelta(seconds=window_seconds(amount, unit))
+    return moment.date().isoformat() if date_only else moment.isoformat()
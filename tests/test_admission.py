@@ -0,0 +1,161 @@
+"""Tests for the query admission queue."""
+
+import asyncio
+
+import pytest
+
+from semantic_layer.exceptions import OverloadedError
+from semantic_layer.models.cube import Cube
+from semantic_layer.models.dimension import Dimension
+from semantic_layer.models.measure import Measure
+from semantic_layer.models.schema import Schema
+from semantic_layer.monitoring.metrics import MetricsCollector
+from semantic_layer.orchestrator import AdmissionController, QueryEngine
+from semantic_layer.query.query import Query
+
+
+async def admitted_order(controller, requests):
+    """Queue requests behind a held slot and return the order they are admitted in."""
+    order = []
+    await controller.acquire()
+
+    async def request(label, priority, tenant_id):
+        await controller.acquire(priority, tenant_id)
+        order.append(label)
+        controller.release()
+
+    tasks = []
+    for label, priority, tenant_id in requests:
+        tasks.append(asyncio.create_task(request(label, priority, tenant_id)))
+        await asyncio.sleep(0)
+    controller.release()
+    await asyncio.gather(*tasks)
+    return order
+
+
+class TestAdmissionController:
+    """Test priority classes, tenant fairness and backpressure."""
+
+    @pytest.mark.asyncio
+    async def test_interactive_goes_before_background_and_refresh(self):
+        order = await admitted_order(AdmissionController(max_concurrency=1), [
+            ("refresh", "refresh", None),
+            ("background", "background", None),
+            ("interactive", "interactive", None),
+        ])
+
+        assert order == ["interactive", "background", "refresh"]
+
+    @pytest.mark.asyncio
+    async def test_tenants_share_slots_by_weight(self):
+        controller = AdmissionController(max_concurrency=1, tenant_weights={"b": 2})
+        order = await admitted_order(controller, [
+            ("a1", "interactive", "a"),
+            ("a2", "interactive", "a"),
+            ("a3", "interactive", "a"),
+            ("b1", "interactive", "b"),
+            ("b2", "interactive", "b"),
+        ])
+
+        assert order == ["a1", "b1", "b2", "a2", "a3"]
+
+    @pytest.mark.asyncio
+    async def test_full_queue_rejects_with_retry_after(self):
+        controller = AdmissionController(max_concurrency=1, max_queue_depth=1)
+        await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+
+        with pytest.raises(OverloadedError) as exc_info:
+            await controller.acquire()
+        assert exc_info.value.retry_after >= 1
+
+        controller.release()
+        assert await waiter >= 0
+        controller.release()
+        assert controller.running == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_wait_leaves_the_queue(self):
+        controller = AdmissionController(max_concurrency=1)
+        await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        controller.release()
+
+        assert controller.queue_depth == 0
+        assert controller.running == 0
+
+
+class SlowConnector:
+    """Connector holding its slot briefly."""
+
+    async def execute_query(self, sql, params=None):
+        await asyncio.sleep(0.01)
+        return [{"orders_count": 1}]
+
+
+@pytest.fixture
+def schema():
+    orders = Cube(
+        name="orders",
+        table="orders",
+        dimensions={"status": Dimension(name="status", type="string", sql="status")},
+        measures={"count": Measure(name="count", type="count", sql="id")},
+    )
+    return Schema(cubes={"orders": orders})
+
+
+class TestEngine:
+    """Test queries going through the admission queue."""
+
+    def make_engine(self, schema, controller):
+        return QueryEngine(
+            schema,
+            SlowConnector(),
+            metrics_collector=MetricsCollector(enabled=False),
+            admission_controller=controller,
+        )
+
+    @pytest.mark.asyncio
+    async def test_queue_wait_is_reported_apart_from_database_time(self, schema):
+        engine = self.make_engine(schema, AdmissionController(max_concurrency=1))
+
+        first, second = await asyncio.gather(
+            engine.execute(Query(measures=["orders.count"])),
+            engine.execute(Query(dimensions=["orders.status"], measures=["orders.count"])),
+        )
+
+        assert first["meta"]["queue_wait_ms"] == 0
+        assert second["meta"]["queue_wait_ms"] > 0
+        assert second["meta"]["database_time_ms"] > 0
+
+    @pytest.mark.asyncio
+    async def test_saturated_queue_raises_overloaded(self, schema):
+        engine = self.make_engine(schema, AdmissionController(max_concurrency=1, max_queue_depth=0))
+
+        results = await asyncio.gather(
+            engine.execute(Query(measures=["orders.count"])),
+            engine.execute(Query(dimensions=["orders.status"], measures=["orders.count"])),
+            return_exceptions=True,
+        )
+
+        assert isinstance(results[1], OverloadedError)
+
+    @pytest.mark.asyncio
+    async def test_saturated_queue_fails_the_batch_with_overloaded(self, schema):
+        controller = AdmissionController(max_concurrency=1, max_queue_depth=0)
+        engine = self.make_engine(schema, controller)
+        await controller.acquire()
+
+        with pytest.raises(OverloadedError):
+            await engine.execute_many([
+                Query(measures=["orders.count"]),
+                Query(dimensions=["orders.status"], measures=["orders.count"]),
+            ], fuse=False)
+
+        controller.release()
+        assert controller.running == 0
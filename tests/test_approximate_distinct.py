@@ -0,0 +1,239 @@
+"""Tests for HyperLogLog-backed approximate distinct counts."""
+
+import hashlib
+
+import pytest
+
+from semantic_layer.exceptions import ExecutionError, QueryError
+from semantic_layer.models.cube import Cube
+from semantic_layer.models.dimension import Dimension
+from semantic_layer.models.measure import Measure
+from semantic_layer.models.schema import Schema
+from semantic_layer.monitoring.metrics import MetricsCollector
+from semantic_layer.orchestrator import QueryEngine
+from semantic_layer.pre_aggregations.base import BasePreAggregation, PreAggregationDefinition
+from semantic_layer.pre_aggregations.manager import PreAggregationManager
+from semantic_layer.query.query import Query, QueryOrderBy, QueryTimeDimension
+from semantic_layer.sql.builder import SQLBuilder
+from semantic_layer.utils.sketches import (
+    HLL_BITMAP_BITS,
+    HLL_MAX_RANK,
+    HLL_PRECISION,
+    HLL_RANK_BASE,
+    HLL_RELATIVE_ERROR,
+    HLL_REGISTERS,
+    hll_estimate,
+)
+
+
+def register_ranks(values):
+    """Get the (register, rank) pair of each value."""
+    for value in values:
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+        value_hash = int.from_bytes(digest, "big", signed=True)
+        register = value_hash & (HLL_REGISTERS - 1)
+        remaining = value_hash >> HLL_PRECISION
+        rank = HLL_MAX_RANK
+        if remaining:
+            rank = min(rank, (remaining & -remaining).bit_length())
+        yield register, rank
+
+
+def build_sketch(values):
+    """Build a sketch in-process: the highest rank per register."""
+    ranks = [0] * HLL_REGISTERS
+    for register, rank in register_ranks(values):
+        ranks[register] = max(ranks[register], rank)
+    return bytes(ranks)
+
+
+def fold_bitmap(values):
+    """Build a sketch the way the generated SQL does, from a bitmap of pairs."""
+    bits = ["0"] * HLL_BITMAP_BITS
+    for register, rank in register_ranks(values):
+        bits[register * HLL_RANK_BASE + rank] = "1"
+    ranks = []
+    for register in range(HLL_REGISTERS):
+        seen = "".join(bits[register * HLL_RANK_BASE:(register + 1) * HLL_RANK_BASE])
+        last_set = seen[::-1].find("1") + 1
+        ranks.append(HLL_RANK_BASE - last_set if last_set else 0)
+    return bytes(ranks)
+
+
+def merge(*sketches):
+    """Highest rank per register of sketches."""
+    return bytes(max(ranks) for ranks in zip(*sketches))
+
+
+class FakeConnector:
+    """Connector returning one row with a fixed sketch."""
+
+    def __init__(self, sketch):
+        self.sketch = sketch
+        self.queries = []
+
+    async def execute_query(self, sql, params=None):
+        self.queries.append(sql)
+        return [{"orders_status": "paid", "orders_unique_users": self.sketch}]
+
+
+class FakeStorage(BasePreAggregation):
+    """Storage where every pre-aggregation exists."""
+
+    async def create(self, definition, sql, indexes=None):
+        pass
+
+    async def refresh(self, definition, sql, indexes=None):
+        pass
+
+    async def exists(self, definition):
+        return True
+
+    async def get_table_name(self, definition):
+        return f"pre_aggregations.{definition.cube}_{definition.name}"
+
+
+@pytest.fixture
+def schema():
+    orders = Cube(
+        name="orders",
+        table="orders",
+        dimensions={
+            "status": Dimension(name="status", type="string", sql="status"),
+            "created_at": Dimension(name="created_at", type="time", sql="created_at"),
+        },
+        measures={
+            "unique_users": Measure(name="unique_users", type="countDistinctApprox", sql="user_id"),
+        },
+    )
+    return Schema(cubes={"orders": orders})
+
+
+def daily(name="daily", granularity="day"):
+    return PreAggregationDefinition(
+        name=name,
+        cube="orders",
+        dimensions=["status"],
+        measures=["unique_users"],
+        time_dimension="created_at",
+        granularity=granularity,
+    )
+
+
+def monthly_query(**kwargs):
+    return Query(
+        dimensions=["orders.status"],
+        measures=["orders.unique_users"],
+        time_dimensions=[QueryTimeDimension(dimension="orders.created_at", granularity="month")],
+        **kwargs,
+    )
+
+
+class TestEstimate:
+    """Test the in-process cardinality estimate."""
+
+    @pytest.mark.parametrize("cardinality", [0, 50, 1000, 50000])
+    def test_estimate_is_within_error_bound(self, cardinality):
+        estimate = hll_estimate(build_sketch(range(cardinality)))
+        assert abs(estimate - cardinality) <= max(2, 3 * HLL_RELATIVE_ERROR * cardinality)
+
+    def test_merged_sketches_count_the_union(self):
+        first = build_sketch(range(0, 6000))
+        second = build_sketch(range(4000, 10000))
+
+        estimate = hll_estimate(merge(first, second))
+
+        assert abs(estimate - 10000) <= 3 * HLL_RELATIVE_ERROR * 10000
+
+    def test_null_sketch_is_zero(self):
+        assert hll_estimate(None) == 0
+
+    def test_sketch_is_one_byte_per_register(self):
+        sketch = build_sketch(range(100))
+
+        assert len(sketch) == HLL_REGISTERS
+        assert hll_estimate("\\x" + sketch.hex()) == hll_estimate(sketch)
+
+    def test_bitmap_folds_to_highest_rank_per_register(self):
+        values = list(range(5000))
+
+        assert fold_bitmap(values) == build_sketch(values)
+        assert fold_bitmap([]) == bytes(HLL_REGISTERS)
+
+
+class TestSQL:
+    """Test SQL generated for approximate distinct counts."""
+
+    def test_measure_builds_sketch(self, schema):
+        sql = SQLBuilder(schema).build(Query(measures=["orders.unique_users"]))
+
+        assert "bit_or(CAST(B'1' AS bit(65536)) >> CAST((hashtextextended(CAST(t0.user_id" in sql
+        assert "array_agg" not in sql
+        assert "generate_series(0, 1023)" in sql
+
+    def test_other_dialects_reject_the_measure(self, schema):
+        with pytest.raises(QueryError, match="not supported on mysql"):
+            SQLBuilder(schema, dialect="mysql").build(Query(measures=["orders.unique_users"]))
+
+    def test_other_dialects_skip_sketch_rollups(self, schema):
+        connector = FakeConnector(None)
+        connector.dialect = "mysql"
+        manager = PreAggregationManager(schema, connector)
+        manager.register(daily())
+
+        assert manager.find_matching_pre_aggregation(monthly_query()) is None
+
+    def test_ordering_by_estimate_is_rejected(self, schema):
+        query = Query(
+            measures=["orders.unique_users"],
+            order_by=[QueryOrderBy(dimension="orders.unique_users", direction="desc")],
+        )
+        with pytest.raises(QueryError):
+            SQLBuilder(schema).build(query)
+
+    @pytest.mark.asyncio
+    async def test_rollups_merge_sketches(self, schema):
+        definition = daily()
+        manager = PreAggregationManager(schema, FakeConnector(None), storage=FakeStorage())
+        manager.register(definition)
+
+        assert manager.find_matching_pre_aggregation(monthly_query()) is definition
+        sql = await manager.build_query_sql(definition, monthly_query())
+        assert "FROM unnest(array_agg(t0.orders_unique_users)) AS sketches(sketch)" in sql
+
+    def test_coarser_rollups_derive_from_finer(self, schema):
+        manager = PreAggregationManager(schema, connector=None)
+        daily_rollup, monthly_rollup = daily(), daily("monthly", "month")
+        manager.register(daily_rollup)
+        manager.register(monthly_rollup)
+
+        assert manager.find_parent(monthly_rollup) is daily_rollup
+
+
+class TestEngine:
+    """Test estimates and error bounds in query results."""
+
+    @pytest.mark.asyncio
+    async def test_result_carries_estimate_and_error_bound(self, schema):
+        connector = FakeConnector(build_sketch(range(1000)))
+        engine = QueryEngine(schema, connector, metrics_collector=MetricsCollector(enabled=False))
+
+        result = await engine.execute(monthly_query())
+
+        value = result["data"][0]["orders_unique_users"]
+        assert abs(value - 1000) <= 3 * HLL_RELATIVE_ERROR * 1000
+        assert result["meta"]["approximate"]["orders.unique_users"] == {
+            "sketch": "hll",
+            "relative_error": round(HLL_RELATIVE_ERROR, 4),
+        }
+
+    @pytest.mark.asyncio
+    async def test_ordering_by_estimate_fails_before_execution(self, schema):
+        connector = FakeConnector(None)
+        engine = QueryEngine(schema, connector, metrics_collector=MetricsCollector(enabled=False))
+
+        with pytest.raises(ExecutionError):
+            await engine.execute(monthly_query(
+                order_by=[QueryOrderBy(dimension="orders.unique_users", direction="desc")]
+            ))
+        assert connector.queries == []
@@ -0,0 +1,246 @@
+"""Tests for sketch-backed percentile and median measures."""
+
+import json
+import math
+import random
+
+import pytest
+from pydantic import ValidationError
+
+from semantic_layer.exceptions import ExecutionError
+from semantic_layer.models.cube import Cube
+from semantic_layer.models.dimension import Dimension
+from semantic_layer.models.measure import Measure
+from semantic_layer.models.schema import Schema
+from semantic_layer.monitoring.metrics import MetricsCollector
+from semantic_layer.orchestrator import QueryEngine
+from semantic_layer.pre_aggregations.base import BasePreAggregation, PreAggregationDefinition
+from semantic_layer.pre_aggregations.manager import PreAggregationManager
+from semantic_layer.query.query import Query, QueryTimeDimension
+from semantic_layer.schema.loader import SchemaLoader
+from semantic_layer.sql.builder import SQLBuilder
+from semantic_layer.utils.sketches import (
+    QUANTILE_GAMMA,
+    QUANTILE_MAX_EXPONENT,
+    QUANTILE_RELATIVE_ERROR,
+    quantile_estimate,
+)
+
+
+def build_sketch(values):
+    """Build a sketch in-process the way the generated SQL does."""
+    counts = {}
+    for value in values:
+        if value == 0:
+            index = 0
+        else:
+            exponent = math.ceil(math.log(abs(value)) / math.log(QUANTILE_GAMMA))
+            exponent = max(-QUANTILE_MAX_EXPONENT, min(QUANTILE_MAX_EXPONENT, exponent))
+            offset = QUANTILE_MAX_EXPONENT + 1 if value > 0 else 3 * QUANTILE_MAX_EXPONENT + 2
+            index = offset + exponent
+        counts[str(index)] = counts.get(str(index), 0) + 1
+    return counts
+
+
+def merge(*sketches):
+    """Bucket counts of sketches added up."""
+    merged = {}
+    for sketch in sketches:
+        for index, count in sketch.items():
+            merged[index] = merged.get(index, 0) + count
+    return merged
+
+
+def exact_quantile(values, quantile):
+    ordered = sorted(values)
+    return ordered[int(quantile * (len(ordered) - 1))]
+
+
+class FakeConnector:
+    """Connector returning one row with a fixed sketch."""
+
+    def __init__(self, sketch):
+        self.sketch = sketch
+        self.queries = []
+
+    async def execute_query(self, sql, params=None):
+        self.queries.append(sql)
+        return [{
+            "orders_status": "paid",
+            "orders_p95_amount": self.sketch,
+            "orders_median_amount": self.sketch,
+        }]
+
+
+class FakeStorage(BasePreAggregation):
+    """Storage where every pre-aggregation exists."""
+
+    async def create(self, definition, sql, indexes=None):
+        pass
+
+    async def refresh(self, definition, sql, indexes=None):
+        pass
+
+    async def exists(self, definition):
+        return True
+
+    async def get_table_name(self, definition):
+        return f"pre_aggregations.{definition.cube}_{definition.name}"
+
+
+@pytest.fixture
+def schema():
+    orders = Cube(
+        name="orders",
+        table="orders",
+        dimensions={
+            "status": Dimension(name="status", type="string", sql="status"),
+            "created_at": Dimension(name="created_at", type="time", sql="created_at"),
+        },
+        measures={
+            "p95_amount": Measure(
+                name="p95_amount", type="percentile", percentile=0.95, sql="amount"
+            ),
+            "median_amount": Measure(name="median_amount", type="median", sql="amount"),
+        },
+    )
+    return Schema(cubes={"orders": orders})
+
+
+def daily():
+    return PreAggregationDefinition(
+        name="daily",
+        cube="orders",
+        dimensions=["status"],
+        measures=["p95_amount", "median_amount"],
+        time_dimension="created_at",
+        granularity="day",
+    )
+
+
+def monthly_query():
+    return Query(
+        dimensions=["orders.status"],
+        measures=["orders.p95_amount", "orders.median_amount"],
+        time_dimensions=[QueryTimeDimension(dimension="orders.created_at", granularity="month")],
+    )
+
+
+class TestEstimate:
+    """Test the in-process quantile estimate."""
+
+    @pytest.mark.parametrize("quantile", [0.0, 0.5, 0.9, 0.99, 1.0])
+    def test_estimate_is_within_relative_error(self, quantile):
+        values = [random.Random(7).lognormvariate(3, 1.5) for _ in range(5000)]
+        random.Random(7).shuffle(values)
+
+        estimate = quantile_estimate(build_sketch(values), quantile)
+
+        exact = exact_quantile(values, quantile)
+        assert abs(estimate - exact) <= QUANTILE_RELATIVE_ERROR * exact
+
+    def test_merged_sketches_estimate_the_union(self):
+        rng = random.Random(1)
+        first = [rng.uniform(-50, 100) for _ in range(3000)]
+        second = [rng.uniform(0, 1000) for _ in range(3000)] + [0] * 10
+
+        estimate = quantile_estimate(merge(build_sketch(first), build_sketch(second)), 0.25)
+
+        exact = exact_quantile(first + second, 0.25)
+        assert abs(estimate - exact) <= QUANTILE_RELATIVE_ERROR * abs(exact)
+
+    def test_negative_values_and_empty_sketches(self):
+        assert quantile_estimate(build_sketch([-10, -1, 5]), 0.0) == pytest.approx(-10, rel=0.01)
+        assert quantile_estimate({}, 0.5) is None
+        assert quantile_estimate(None, 0.5) is None
+
+    def test_sketch_is_sparse_and_read_from_json(self):
+        sketch = build_sketch([1] * 1000 + [-5])
+
+        assert len(sketch) == 2
+        assert quantile_estimate(json.dumps(sketch), 0.5) == quantile_estimate(sketch, 0.5)
+
+
+class TestModel:
+    """Test percentile measure definitions."""
+
+    def test_percentile_must_be_a_fraction(self):
+        with pytest.raises(ValueError):
+            Measure(name="p", type="percentile", percentile=95, sql="amount")
+
+    def test_percentile_is_required(self):
+        with pytest.raises(ValidationError, match="must set percentile"):
+            Measure(name="p", type="percentile", sql="amount")
+
+    def test_schema_without_percentile_fails_to_load(self):
+        with pytest.raises(ValidationError, match="must set percentile"):
+            SchemaLoader.load_from_dict(
+                {
+                    "cubes": [
+                        {
+                            "name": "orders",
+                            "table": "orders",
+                            "measures": {"p": {"type": "percentile", "sql": "amount"}},
+                        }
+                    ]
+                }
+            )
+
+
+class TestSQL:
+    """Test SQL generated for percentile measures."""
+
+    def test_measure_builds_sketch(self, schema):
+        sql = SQLBuilder(schema).build(Query(measures=["orders.p95_amount"]))
+
+        assert "SELECT jsonb_object_agg(buckets.bucket, buckets.total)" in sql
+        assert "FROM unnest(array_agg(CASE WHEN CAST(t0.amount AS double precision) IS NULL" in sql
+        assert "LN(ABS(CAST(t0.amount AS double precision)))" in sql
+
+    @pytest.mark.asyncio
+    async def test_rollups_merge_sketches(self, schema):
+        definition = daily()
+        manager = PreAggregationManager(schema, FakeConnector(None), storage=FakeStorage())
+        manager.register(definition)
+
+        assert manager.find_matching_pre_aggregation(monthly_query()) is definition
+        sql = await manager.build_query_sql(definition, monthly_query())
+        assert "FROM unnest(array_agg(t0.orders_p95_amount)) AS sketches(sketch)" in sql
+        assert "FROM unnest(array_agg(t0.orders_median_amount)) AS sketches(sketch)" in sql
+
+
+class TestEngine:
+    """Test estimates and error bounds in query results."""
+
+    @pytest.mark.asyncio
+    async def test_result_carries_estimates_and_error_bound(self, schema):
+        values = list(range(1, 1001))
+        connector = FakeConnector(build_sketch(values))
+        manager = PreAggregationManager(schema, connector, storage=FakeStorage())
+        manager.register(daily())
+        engine = QueryEngine(
+            schema,
+            connector,
+            pre_aggregation_manager=manager,
+            metrics_collector=MetricsCollector(enabled=False),
+        )
+
+        result = await engine.execute(monthly_query())
+
+        assert result["meta"]["pre_aggregation_used"] is True
+        row = result["data"][0]
+        assert row["orders_p95_amount"] == pytest.approx(exact_quantile(values, 0.95), rel=0.01)
+        assert row["orders_median_amount"] == pytest.approx(exact_quantile(values, 0.5), rel=0.01)
+        assert result["meta"]["approximate"]["orders.median_amount"] == {
+            "sketch": "ddsketch",
+            "relative_error": QUANTILE_RELATIVE_ERROR,
+        }
+
+    @pytest.mark.asyncio
+    async def test_raw_table_queries_need_a_rollup(self, schema):
+        connector = FakeConnector(None)
+        engine = QueryEngine(schema, connector, metrics_collector=MetricsCollector(enabled=False))
+
+        with pytest.raises(ExecutionError, match="only served from a pre-aggregation"):
+            await engine.execute(monthly_query())
+        assert connector.queries == []
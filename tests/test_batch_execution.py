@@ -0,0 +1,87 @@
+"""Tests for executing query batches concurrently."""
+
+import asyncio
+
+import pytest
+
+from semantic_layer.models.cube import Cube
+from semantic_layer.models.dimension import Dimension
+from semantic_layer.models.measure import Measure
+from semantic_layer.models.schema import Schema
+from semantic_layer.monitoring.metrics import MetricsCollector
+from semantic_layer.orchestrator import QueryEngine
+from semantic_layer.query.query import Query
+
+
+class SlowConnector:
+    """Connector recording SQL and how many queries ran at once."""
+
+    def __init__(self):
+        self.queries = []
+        self.running = 0
+        self.max_running = 0
+
+    async def execute_query(self, sql, params=None):
+        self.queries.append(sql)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        return [{"orders_count": 1}]
+
+
+@pytest.fixture
+def schema():
+    orders = Cube(
+        name="orders",
+        table="orders",
+        dimensions={"status": Dimension(name="status", type="string", sql="status")},
+        measures={"count": Measure(name="count", type="count", sql="id")},
+    )
+    return Schema(cubes={"orders": orders})
+
+
+def make_engine(schema, connector, **kwargs):
+    return QueryEngine(schema, connector, metrics_collector=MetricsCollector(enabled=False), **kwargs)
+
+
+class TestExecuteMany:
+    """Test bounded concurrency and per-query failures."""
+
+    @pytest.mark.asyncio
+    async def test_queries_run_concurrently_up_to_the_limit(self, schema):
+        connector = SlowConnector()
+        engine = make_engine(schema, connector, max_concurrency=2)
+
+        results = await engine.execute_many([Query(measures=["orders.count"])] * 5, fuse=False)
+
+        assert len(results) == 5
+        assert connector.max_running == 2
+        assert all(result["data"] == [{"orders_count": 1}] for result in results)
+
+    @pytest.mark.asyncio
+    async def test_failures_are_reported_per_query(self, schema):
+        engine = make_engine(schema, SlowConnector())
+
+        results = await engine.execute_many([
+            Query(measures=["orders.count"]),
+            Query(measures=["orders.missing"]),
+        ])
+
+        assert results[0]["data"] == [{"orders_count": 1}]
+        assert "Query execution failed" in results[1]["error"]["message"]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_queries_keep_their_own_ctes(self, schema):
+        connector = SlowConnector()
+        engine = make_engine(schema, connector)
+        queries = [
+            Query(measures=["orders.count"], ctes=[{"alias": f"cte_{i}", "query": f"SELECT {i}"}])
+            for i in range(3)
+        ]
+
+        await engine.execute_many(queries)
+
+        for i, sql in enumerate(sorted(connector.queries)):
+            assert sql.count("AS (SELECT") == 1
+            assert f"cte_{i} AS (SELECT {i})" in sql
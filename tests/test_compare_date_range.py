@@ -0,0 +1,107 @@
+"""Tests for compareDateRange queries."""
+
+import asyncio
+
+import pytest
+
+from semantic_layer.models.cube import Cube
+from semantic_layer.models.dimension import Dimension
+from semantic_layer.models.measure import Measure
+from semantic_layer.models.schema import Schema
+from semantic_layer.monitoring.metrics import MetricsCollector
+from semantic_layer.orchestrator import QueryEngine
+from semantic_layer.query.query import Query, QueryTimeDimension
+from semantic_layer.sql.builder import SQLBuilder
+
+
+class FakeConnector:
+    """Connector recording SQL and how many queries ran at once."""
+
+    def __init__(self, rows=()):
+        self.rows = rows
+        self.queries = []
+        self.running = 0
+        self.max_running = 0
+
+    async def execute_query(self, sql, params=None):
+        self.queries.append(sql)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        return [dict(row) for row in self.rows]
+
+
+@pytest.fixture
+def schema():
+    orders = Cube(
+        name="orders",
+        table="orders",
+        dimensions={
+            "status": Dimension(name="status", type="string", sql="status"),
+            "created_at": Dimension(name="created_at", type="time", sql="created_at"),
+        },
+        measures={"count": Measure(name="count", type="count", sql="id")},
+    )
+    return Schema(cubes={"orders": orders})
+
+
+RANGES = [["2024-01-01", "2024-01-31"], ["2023-01-01", "2023-01-31"]]
+
+
+def compare_query(**kwargs):
+    return Query(
+        dimensions=["orders.status"],
+        measures=["orders.count"],
+        time_dimensions=[QueryTimeDimension(dimension="orders.created_at", compare_date_range=RANGES)],
+        **kwargs,
+    )
+
+
+def make_engine(schema, connector):
+    return QueryEngine(schema, connector, metrics_collector=MetricsCollector(enabled=False))
+
+
+class TestSQL:
+    """Test compiling all periods into one statement."""
+
+    def test_periods_are_joined_and_grouped(self, schema):
+        sql = SQLBuilder(schema).build(compare_query())
+
+        assert sql.count("FROM orders AS t0") == 1
+        assert (
+            "JOIN (VALUES (0, TIMESTAMP '2024-01-01', TIMESTAMP '2024-01-31', '2024-01-01 to 2024-01-31'), "
+            "(1, TIMESTAMP '2023-01-01', TIMESTAMP '2023-01-31', '2023-01-01 to 2023-01-31'))"
+        ) in sql
+        assert "t0.created_at >= '2023-01-01'" in sql and "t0.created_at <= '2024-01-31'" in sql
+        assert 'compare_periods.period_label AS "_compareDateRange"' in sql
+        assert sql.endswith("ORDER BY compare_periods.period_index")
+
+
+class TestEngine:
+    """Test single-scan execution and the concurrent fallback."""
+
+    @pytest.mark.asyncio
+    async def test_compare_runs_one_statement(self, schema):
+        connector = FakeConnector([
+            {"orders_status": "paid", "orders_count": 3, "_compareDateRange": "2024-01-01 to 2024-01-31"},
+        ])
+
+        result = await make_engine(schema, connector).execute(compare_query())
+
+        assert len(connector.queries) == 1
+        assert result["meta"]["compare_date_range"] is True
+        assert result["data"][0]["_compareDateRange"] == "2024-01-01 to 2024-01-31"
+
+    @pytest.mark.asyncio
+    async def test_paged_compare_runs_periods_concurrently(self, schema):
+        connector = FakeConnector([{"orders_status": "paid", "orders_count": 3}])
+
+        result = await make_engine(schema, connector).execute(compare_query(limit=10))
+
+        assert len(connector.queries) == 2
+        assert connector.max_running == 2
+        assert [row["_compareDateRange"] for row in result["data"]] == [
+            "2024-01-01 to 2024-01-31",
+            "2023-01-01 to 2023-01-31",
+        ]
@@ -0,0 +1,127 @@
+"""Tests for adaptive concurrency limits."""
+
+import asyncio
+
+import pytest
+
+from semantic_layer.exceptions import ConfigurationError, ExecutionError, OverloadedError
+from semantic_layer.orchestrator import AdmissionController, AIMDLimit, FixedLimit, GradientLimit
+from semantic_layer.orchestrator.limits import create_limit
+
+
+class RecordingMetrics:
+    """Metrics collector recording what the controller reports."""
+
+    def __init__(self):
+        self.limits = []
+        self.rejections = []
+
+    def record_admission(self, limit, in_flight, queue_depth):
+        self.limits.append(limit)
+
+    def record_admission_rejection(self, priority):
+        self.rejections.append(priority)
+
+
+class TestLimits:
+    """Test how limits react to latency and drops."""
+
+    def test_aimd_grows_when_busy_and_backs_off_on_drops(self):
+        limit = AIMDLimit(initial_limit=10, timeout_ms=100)
+
+        limit.on_sample(20, in_flight=8)
+        assert limit.limit == 11
+        limit.on_sample(20, in_flight=1)
+        assert limit.limit == 11
+        limit.on_sample(20, in_flight=8, dropped=True)
+        assert limit.limit == 9
+        limit.on_sample(500, in_flight=8)
+        assert limit.limit == 8
+
+    def test_gradient_shrinks_as_latency_rises(self):
+        limit = GradientLimit(initial_limit=20, max_limit=100)
+        for _ in range(20):
+            limit.on_sample(10, in_flight=20)
+        grown = limit.limit
+        assert grown > 20
+
+        for _ in range(20):
+            limit.on_sample(100, in_flight=grown)
+        assert limit.limit < grown
+
+    def test_limits_stay_within_bounds(self):
+        limit = AIMDLimit(initial_limit=2, min_limit=2, max_limit=3)
+        for _ in range(5):
+            limit.on_sample(1, in_flight=3)
+        assert limit.limit == 3
+        for _ in range(5):
+            limit.on_sample(1, in_flight=3, dropped=True)
+        assert limit.limit == 2
+
+    def test_create_limit(self):
+        assert isinstance(create_limit("fixed", 5), FixedLimit)
+        assert create_limit("aimd", 5).max_limit == 20
+        with pytest.raises(ConfigurationError):
+            create_limit("vegas", 5)
+
+
+class TestController:
+    """Test the admission queue following its limit."""
+
+    @pytest.mark.asyncio
+    async def test_raised_limit_admits_several_waiters(self):
+        limit = AIMDLimit(initial_limit=1)
+        controller = AdmissionController(limit=limit)
+        await controller.acquire()
+        waiters = [asyncio.create_task(controller.acquire()) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        limit._limit = 3
+        controller.release()
+        await asyncio.gather(*waiters)
+
+        assert controller.running == 2
+
+    @pytest.mark.asyncio
+    async def test_timeouts_lower_the_limit(self):
+        metrics = RecordingMetrics()
+        controller = AdmissionController(limit=AIMDLimit(initial_limit=4), metrics_collector=metrics)
+
+        with pytest.raises(asyncio.TimeoutError):
+            async with controller.admit():
+                raise asyncio.TimeoutError()
+        with pytest.raises(ValueError):
+            async with controller.admit():
+                raise ValueError("bad query")
+
+        assert controller.max_concurrency == 3
+        assert metrics.limits[-1] == 3
+
+    @pytest.mark.asyncio
+    async def test_wrapped_connection_failures_lower_the_limit(self):
+        controller = AdmissionController(limit=AIMDLimit(initial_limit=10))
+
+        for _ in range(5):
+            with pytest.raises(ExecutionError):
+                async with controller.admit():
+                    try:
+                        raise ConnectionRefusedError("connection refused")
+                    except ConnectionRefusedError as e:
+                        raise ExecutionError(f"Query execution failed: {e}") from e
+        with pytest.raises(ExecutionError):
+            async with controller.admit():
+                raise ExecutionError("syntax error")
+
+        assert controller.max_concurrency < 10
+        assert controller.running == 0
+
+    @pytest.mark.asyncio
+    async def test_rejections_are_reported(self):
+        metrics = RecordingMetrics()
+        controller = AdmissionController(max_concurrency=1, max_queue_depth=0, metrics_collector=metrics)
+        await controller.acquire()
+
+        with pytest.raises(OverloadedError):
+            await controller.acquire("background")
+
+        assert metrics.rejections == ["background"]
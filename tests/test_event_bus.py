@@ -0,0 +1,126 @@
+"""Tests for background dispatch of callback events."""
+
+import asyncio
+
+import pytest
+
+from semantic_layer.exceptions import ConfigurationError
+from semantic_layer.monitoring.callback_manager import CallbackManager
+from semantic_layer.monitoring.callbacks import BaseQueryCallback
+from semantic_layer.monitoring.event_bus import EventBus
+
+
+class RecordingCallback(BaseQueryCallback):
+    """Callback recording the cache keys it sees."""
+
+    def __init__(self, run_inline=False, raise_error=False):
+        self.run_inline = run_inline
+        self.raise_error = raise_error
+        self.keys = []
+
+    def on_cache_hit(self, cache_key, *, run_id, parent_run_id=None, **kwargs):
+        if cache_key == "bad":
+            raise RuntimeError("handler failed")
+        self.keys.append(cache_key)
+
+
+def publish(bus, callback, *keys):
+    for key in keys:
+        bus.publish(callback, "on_cache_hit", {"cache_key": key, "run_id": None})
+
+
+class TestEventBus:
+    """Test buffering, overflow and draining."""
+
+    @pytest.mark.asyncio
+    async def test_drain_task_dispatches_in_background(self):
+        bus = EventBus()
+        callback = RecordingCallback()
+        bus.start()
+
+        publish(bus, callback, "a", "b")
+        assert callback.keys == []
+        await asyncio.sleep(0.01)
+
+        assert callback.keys == ["a", "b"]
+        await bus.stop()
+
+    @pytest.mark.asyncio
+    async def test_drop_oldest_keeps_latest_events(self):
+        bus = EventBus(max_size=2)
+        callback = RecordingCallback()
+
+        publish(bus, callback, "a", "b", "c")
+        await bus.flush()
+
+        assert callback.keys == ["b", "c"]
+        assert bus.get_stats()["dropped"] == 1
+
+    @pytest.mark.asyncio
+    async def test_drop_newest_keeps_earliest_events(self):
+        bus = EventBus(max_size=2, overflow_policy="drop_newest")
+        callback = RecordingCallback()
+
+        publish(bus, callback, "a", "b", "c")
+        await bus.flush()
+
+        assert callback.keys == ["a", "b"]
+
+    @pytest.mark.asyncio
+    async def test_sample_policy_thins_events_past_half_full(self):
+        bus = EventBus(max_size=4, overflow_policy="sample", sample_rate=0)
+        callback = RecordingCallback()
+
+        publish(bus, callback, "a", "b", "c", "d")
+        await bus.flush()
+
+        assert callback.keys == ["a", "b"]
+        assert bus.dropped == 2
+
+    @pytest.mark.asyncio
+    async def test_failing_handler_does_not_stop_the_drain(self):
+        bus = EventBus()
+        callback = RecordingCallback()
+
+        publish(bus, callback, "bad", "a")
+        await bus.stop()
+
+        assert callback.keys == ["a"]
+        assert bus.dispatched == 2
+
+    def test_unknown_policy_rejected(self):
+        with pytest.raises(ConfigurationError):
+            EventBus(overflow_policy="block")
+
+
+class TestCallbackManagerWithEventBus:
+    """Test which handlers run inline."""
+
+    @pytest.mark.asyncio
+    async def test_handlers_are_queued_unless_inline(self):
+        bus = EventBus()
+        queued = RecordingCallback()
+        inline = RecordingCallback(run_inline=True)
+        manager = CallbackManager([queued, inline], event_bus=bus)
+
+        await manager.on_cache_hit("k", run_id=None)
+
+        assert inline.keys == ["k"]
+        assert queued.keys == []
+        await bus.flush()
+        assert queued.keys == ["k"]
+
+    @pytest.mark.asyncio
+    async def test_raising_handlers_still_raise_in_the_request(self):
+        manager = CallbackManager([RecordingCallback(raise_error=True)], event_bus=EventBus())
+
+        with pytest.raises(RuntimeError):
+            await manager.on_cache_hit("bad", run_id=None)
+
+    @pytest.mark.asyncio
+    async def test_without_bus_handlers_run_inline(self):
+        callback = RecordingCallback()
+
+        await CallbackManager([callback]).on_cache_hit("k", run_id=None)
+
+        assert callback.keys == ["k"]
@@ -0,0 +1,154 @@
+"""Tests for formula measures evaluated after aggregation."""
+
+from decimal import Decimal
+
+import pytest
+
+from semantic_layer.exceptions import QueryError
+from semantic_layer.models.cube import Cube
+from semantic_layer.models.dimension import Dimension
+from semantic_layer.models.measure import Measure
+from semantic_layer.models.schema import Schema
+from semantic_layer.monitoring.metrics import MetricsCollector
+from semantic_layer.orchestrator import QueryEngine
+from semantic_layer.orchestrator.formulas import FormulaPlanner
+from semantic_layer.pre_aggregations.base import BasePreAggregation, PreAggregationDefinition
+from semantic_layer.pre_aggregations.manager import PreAggregationManager
+from semantic_layer.query.query import Query, QueryFilter, QueryOrderBy, QueryTimeDimension
+
+
+class FakeConnector:
+    """Connector recording SQL and returning fixed rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    async def execute_query(self, sql, params=None):
+        self.queries.append(sql)
+        return [dict(row) for row in self.rows]
+
+
+class FakeStorage(BasePreAggregation):
+    """Storage where every pre-aggregation exists."""
+
+    async def create(self, definition, sql, indexes=None):
+        pass
+
+    async def refresh(self, definition, sql, indexes=None):
+        pass
+
+    async def exists(self, definition):
+        return True
+
+    async def get_table_name(self, definition):
+        return f"pre_aggregations.{definition.cube}_{definition.name}"
+
+
+@pytest.fixture
+def schema():
+    orders = Cube(
+        name="orders",
+        table="orders",
+        dimensions={
+            "status": Dimension(name="status", type="string", sql="status"),
+            "created_at": Dimension(name="created_at", type="time", sql="created_at"),
+        },
+        measures={
+            "count": Measure(name="count", type="count", sql="id"),
+            "revenue": Measure(name="revenue", type="sum", sql="amount"),
+            "average_order": Measure(name="average_order", type="calculated", sql="", formula="orders.revenue / orders.count"),
+            "average_order_cents": Measure(name="average_order_cents", type="number", sql="", formula="average_order * 100"),
+            "raw_ratio": Measure(name="raw_ratio", type="calculated", sql="", formula="SUM(amount) / COUNT(*)"),
+            "loop": Measure(name="loop", type="calculated", sql="", formula="loop + 1"),
+        },
+    )
+    return Schema(cubes={"orders": orders})
+
+
+def ratio_query(measures=("orders.average_order",), **kwargs):
+    return Query(
+        dimensions=["orders.status"],
+        measures=list(measures),
+        time_dimensions=[QueryTimeDimension(dimension="orders.created_at", granularity="month")],
+        **kwargs,
+    )
+
+
+class TestPlanning:
+    """Test rewriting formulas into base measures."""
+
+    def test_formula_is_replaced_by_base_measures(self, schema):
+        plan = FormulaPlanner(schema).plan(ratio_query(["orders.count", "orders.average_order"]))
+
+        assert plan.query.measures == ["orders.count", "orders.revenue"]
+        assert plan.hidden == ["orders.revenue"]
+
+    def test_nested_formulas_are_expanded(self, schema):
+        plan = FormulaPlanner(schema).plan(ratio_query(["orders.average_order_cents"]))
+
+        assert plan.query.measures == ["orders.revenue", "orders.count"]
+
+    def test_sql_formulas_and_sorted_formulas_stay_in_sql(self, schema):
+        planner = FormulaPlanner(schema)
+        sorted_query = ratio_query(order_by=[QueryOrderBy(dimension="orders.average_order", direction="desc")])
+        filtered_query = ratio_query(
+            measure_filters=[QueryFilter(member="orders.average_order", operator="gt", values=["10"])]
+        )
+
+        assert planner.plan(ratio_query(["orders.raw_ratio"])).query.measures == ["orders.raw_ratio"]
+        assert planner.plan(sorted_query).query.measures == ["orders.average_order"]
+        assert planner.plan(filtered_query).query.measures == ["orders.average_order"]
+
+    def test_self_reference_is_rejected(self, schema):
+        with pytest.raises(QueryError):
+            FormulaPlanner(schema).plan(ratio_query(["orders.loop"]))
+
+
+class TestEvaluation:
+    """Test computing formula columns over aggregated rows."""
+
+    def test_ratios_are_computed_per_row(self, schema):
+        plan = FormulaPlanner(schema).plan(ratio_query(["orders.average_order_cents"]))
+        rows = [
+            {"orders_status": "paid", "orders_revenue": Decimal("50.5"), "orders_count": 2},
+            {"orders_status": "new", "orders_revenue": Decimal("10"), "orders_count": 0},
+            {"orders_status": "void", "orders_revenue": None, "orders_count": 3},
+        ]
+
+        plan.apply(rows)
+
+        assert rows == [
+            {"orders_status": "paid", "orders_average_order_cents": Decimal("2525")},
+            {"orders_status": "new", "orders_average_order_cents": None},
+            {"orders_status": "void", "orders_average_order_cents": None},
+        ]
+
+
+class TestEngine:
+    """Test serving formulas through the engine."""
+
+    @pytest.mark.asyncio
+    async def test_rollup_serves_ratio(self, schema):
+        connector = FakeConnector([{"orders_status": "paid", "orders_revenue": 30, "orders_count": 4}])
+        manager = PreAggregationManager(schema, connector, storage=FakeStorage())
+        manager.register(PreAggregationDefinition(
+            name="daily",
+            cube="orders",
+            dimensions=["status"],
+            measures=["count", "revenue"],
+            time_dimension="created_at",
+            granularity="day",
+        ))
+        engine = QueryEngine(
+            schema,
+            connector,
+            pre_aggregation_manager=manager,
+            metrics_collector=MetricsCollector(enabled=False),
+        )
+
+        result = await engine.execute(ratio_query())
+
+        assert result["meta"]["pre_aggregation_used"] is True
+        assert "FROM pre_aggregations.orders_daily AS t0" in connector.queries[-1]
+        assert result["data"] == [{"orders_status": "paid", "orders_average_order": 7.5}]
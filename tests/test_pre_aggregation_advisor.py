@@ -0,0 +1,193 @@
+"""Tests for pre-aggregation recommendations from the query log."""
+
+import json
+
+import pytest
+import yaml
+from click.testing import CliRunner
+
+from semantic_layer.cli.main import cli
+from semantic_layer.models.cube import Cube
+from semantic_layer.models.dimension import Dimension
+from semantic_layer.models.measure import Measure
+from semantic_layer.models.schema import Schema
+from semantic_layer.monitoring.logging import QueryLogger
+from semantic_layer.monitoring.metrics import MetricsCollector
+from semantic_layer.orchestrator import QueryEngine
+from semantic_layer.pre_aggregations.advisor import PreAggregationAdvisor, proposals_to_yaml
+from semantic_layer.pre_aggregations.base import PreAggregationDefinition
+from semantic_layer.query.query import Query, QueryFilter, QueryTimeDimension
+
+
+class CountingConnector:
+    """Connector answering row counts for candidates and source tables."""
+
+    def __init__(self, rollup_rows, source_rows=1000):
+        self.rollup_rows = rollup_rows
+        self.source_rows = source_rows
+
+    async def execute_query(self, sql, params=None):
+        if "AS candidate" in sql:
+            return [{"row_count": self.rollup_rows}]
+        return [{"row_count": self.source_rows}]
+
+
+@pytest.fixture
+def schema():
+    orders = Cube(
+        name="orders",
+        table="orders",
+        dimensions={
+            "status": Dimension(name="status", type="string", sql="status"),
+            "city": Dimension(name="city", type="string", sql="city"),
+            "created_at": Dimension(name="created_at", type="time", sql="created_at"),
+        },
+        measures={
+            "count": Measure(name="count", type="count", sql="id"),
+            "revenue": Measure(name="revenue", type="sum", sql="amount"),
+        },
+    )
+    return Schema(cubes={"orders": orders})
+
+
+def log(queries):
+    """Log (query, execution time) pairs and return the entries."""
+    logger = QueryLogger(enabled=True)
+    logger._print_log = lambda entry: None
+    for query, time_ms in queries:
+        logger.log_query(query, time_ms)
+    return logger.get_logs(limit=1000)
+
+
+def by_status(granularity="month", measure="orders.count"):
+    return Query(
+        dimensions=["orders.status"],
+        measures=[measure],
+        time_dimensions=[QueryTimeDimension(dimension="orders.created_at", granularity=granularity)],
+    )
+
+
+def by_city():
+    return Query(
+        measures=["orders.count"],
+        filters=[QueryFilter(member="orders.city", operator="equals", values=["Berlin"])],
+    )
+
+
+class TestRecommendations:
+    """Test clustering and ranking of candidates."""
+
+    @pytest.mark.asyncio
+    async def test_clusters_are_ranked_by_covered_time(self, schema):
+        entries = log(
+            [(by_status(), 100.0), (by_status(measure="orders.revenue"), 100.0)]
+            + [(by_city(), 50.0)] * 3
+        )
+        proposals = await PreAggregationAdvisor(schema).recommend(entries)
+
+        assert [p.definition.name for p in proposals] == ["orders_by_status_month", "orders_by_city"]
+        first = proposals[0]
+        assert first.definition.measures == ["count", "revenue"]
+        assert first.definition.time_dimension == "created_at"
+        assert (first.query_count, first.total_time_ms) == (2, 200.0)
+        assert proposals[1].definition.dimensions == ["city"]
+
+    @pytest.mark.asyncio
+    async def test_finer_rollup_covers_coarser_queries_once(self, schema):
+        entries = log([(by_status("day"), 10.0)] * 2 + [(by_status("month"), 10.0)] * 2)
+        proposals = await PreAggregationAdvisor(schema).recommend(entries)
+
+        assert [p.definition.granularity for p in proposals] == ["day"]
+        assert proposals[0].query_count == 4
+
+    @pytest.mark.asyncio
+    async def test_rare_and_already_served_queries_are_skipped(self, schema):
+        existing = PreAggregationDefinition(
+            name="daily",
+            cube="orders",
+            dimensions=["status"],
+            measures=["count"],
+            time_dimension="created_at",
+            granularity="day",
+        )
+        entries = log([(by_status(), 100.0)] * 3 + [(by_city(), 50.0)])
+        proposals = await PreAggregationAdvisor(schema, existing=[existing]).recommend(entries)
+
+        assert proposals == []
+
+    @pytest.mark.asyncio
+    async def test_date_ranges_get_daily_rollups(self, schema):
+        query = Query(
+            measures=["orders.count"],
+            time_dimensions=[QueryTimeDimension(
+                dimension="orders.created_at", date_range=["2024-01-01", "2024-01-31"]
+            )],
+        )
+        proposals = await PreAggregationAdvisor(schema).recommend(log([(query, 10.0)] * 2))
+
+        assert proposals[0].definition.granularity == "day"
+
+    @pytest.mark.asyncio
+    async def test_rollups_that_do_not_shrink_data_are_dropped(self, schema):
+        entries = log([(by_status(), 100.0)] * 2)
+
+        small = await PreAggregationAdvisor(schema, CountingConnector(10)).recommend(entries)
+        large = await PreAggregationAdvisor(schema, CountingConnector(900)).recommend(entries)
+
+        assert small[0].estimated_rows == 10
+        assert small[0].score == pytest.approx(200.0 * 0.99)
+        assert large == []
+
+
+    @pytest.mark.asyncio
+    async def test_engine_logs_each_run_once(self, schema):
+        logger = QueryLogger(echo=False)
+        engine = QueryEngine(
+            schema,
+            CountingConnector(rollup_rows=1),
+            query_logger=logger,
+            metrics_collector=MetricsCollector(enabled=False),
+        )
+
+        await engine.execute(by_status())
+        assert len(logger.get_logs()) == 1
+        assert await PreAggregationAdvisor(schema).recommend(logger.get_logs()) == []
+
+        await engine.execute(by_status())
+        proposals = await PreAggregationAdvisor(schema).recommend(logger.get_logs())
+        assert len(logger.get_logs()) == 2
+        assert proposals[0].query_count == 2
+
+
+class TestOutput:
+    """Test YAML output and the CLI command."""
+
+    @pytest.mark.asyncio
+    async def test_yaml_matches_cube_format(self, schema):
+        proposals = await PreAggregationAdvisor(schema).recommend(log([(by_status(), 1.0)] * 2))
+        document = yaml.safe_load(proposals_to_yaml(proposals))
+
+        assert document == {"cubes": [{"name": "orders", "pre_aggregations": [{
+            "name": "orders_by_status_month",
+            "dimensions": ["status"],
+            "measures": ["count"],
+            "time_dimension": "created_at",
+            "granularity": "month",
+        }]}]}
+
+    def test_cli_reads_logs_endpoint_export(self, tmp_path):
+        models = tmp_path / "orders.yaml"
+        models.write_text(yaml.safe_dump({"cubes": [{
+            "name": "orders",
+            "table": "orders",
+            "dimensions": {"status": {"type": "string", "sql": "status"}},
+            "measures": {"count": {"type": "count", "sql": "id"}},
+        }]}))
+        logs = tmp_path / "logs.json"
+        query = Query(dimensions=["orders.status"], measures=["orders.count"])
+        logs.write_text(json.dumps({"logs": log([(query, 5.0)] * 2)}))
+
+        result = CliRunner().invoke(cli, ["recommend-pre-aggregations", str(models), str(logs)])
+
+        assert result.exit_code == 0, result.output
+        assert "name: orders_by_status" in result.output
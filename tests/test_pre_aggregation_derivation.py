@@ -0,0 +1,159 @@
+"""Tests for building coarser pre-aggregations from finer ones."""
+
+import pytest
+
+from semantic_layer.models.cube import Cube
+from semantic_layer.models.dimension import Dimension
+from semantic_layer.models.measure import Measure
+from semantic_layer.models.schema import Schema
+from semantic_layer.pre_aggregations.base import (
+    BasePreAggregation,
+    PreAggregationDefinition,
+    is_granularity_derivable,
+)
+from semantic_layer.pre_aggregations.manager import PreAggregationManager
+
+
+class FakeStorage(BasePreAggregation):
+    """Storage where only the given pre-aggregations exist."""
+
+    def __init__(self, existing=()):
+        self.existing = set(existing)
+
+    async def create(self, definition, sql, indexes=None):
+        self.existing.add(definition.name)
+
+    async def refresh(self, definition, sql, indexes=None):
+        pass
+
+    async def exists(self, definition):
+        return definition.name in self.existing
+
+    async def get_table_name(self, definition):
+        return f"pre_aggregations.{definition.cube}_{definition.name}"
+
+
+@pytest.fixture
+def schema():
+    orders = Cube(
+        name="orders",
+        table="orders",
+        dimensions={
+            "country": Dimension(name="country", type="string", sql="country"),
+            "city": Dimension(name="city", type="string", sql="city"),
+            "created_at": Dimension(name="created_at", type="time", sql="created_at"),
+        },
+        measures={
+            "count": Measure(name="count", type="count", sql="id"),
+            "revenue": Measure(name="revenue", type="sum", sql="amount"),
+            "avg_amount": Measure(name="avg_amount", type="avg", sql="amount"),
+        },
+    )
+    return Schema(cubes={"orders": orders})
+
+
+def make_manager(schema, definitions, existing=()):
+    manager = PreAggregationManager(schema, connector=None, storage=FakeStorage(existing))
+    for definition in definitions:
+        manager.register(definition)
+    return manager
+
+
+def rollup(name, dimensions, measures, granularity=None):
+    return PreAggregationDefinition(
+        name=name,
+        cube="orders",
+        dimensions=dimensions,
+        measures=measures,
+        time_dimension="created_at" if granularity else None,
+        granularity=granularity,
+    )
+
+
+class TestGranularityDerivation:
+    """Test which time buckets nest into which."""
+
+    def test_finer_rolls_into_coarser(self):
+        assert is_granularity_derivable("day", "month")
+        assert is_granularity_derivable("hour", "week")
+        assert is_granularity_derivable("month", "year")
+        assert is_granularity_derivable("day", "day")
+
+    def test_weeks_do_not_nest_into_months(self):
+        assert not is_granularity_derivable("week", "month")
+        assert not is_granularity_derivable("month", "day")
+
+
+class TestFindParent:
+    """Test parent rollup selection."""
+
+    def test_smallest_superset_is_chosen(self, schema):
+        hourly = rollup("hourly", ["country", "city"], ["count", "revenue"], "hour")
+        daily = rollup("daily", ["country", "city"], ["count", "revenue"], "day")
+        monthly = rollup("monthly", ["country"], ["count"], "month")
+        manager = make_manager(schema, [hourly, daily, monthly])
+
+        assert manager.find_parent(monthly) is daily
+        assert manager.find_parent(daily) is hourly
+        assert manager.find_parent(hourly) is None
+        assert manager.get_dependencies(monthly) == ["daily"]
+
+    def test_dimension_subset_is_derived(self, schema):
+        by_city = rollup("by_city", ["country", "city"], ["count"])
+        by_country = rollup("by_country", ["country"], ["count"])
+        manager = make_manager(schema, [by_city, by_country])
+
+        assert manager.find_parent(by_country) is by_city
+        assert manager.find_parent(by_city) is None
+
+    def test_non_additive_measures_are_not_derived(self, schema):
+        daily = rollup("daily", ["country"], ["avg_amount"], "day")
+        monthly = rollup("monthly", ["country"], ["avg_amount"], "month")
+        manager = make_manager(schema, [daily, monthly])
+
+        assert manager.find_parent(monthly) is None
+
+    def test_weekly_rollup_cannot_serve_monthly(self, schema):
+        weekly = rollup("weekly", ["country"], ["count"], "week")
+        monthly = rollup("monthly", ["country"], ["count"], "month")
+        manager = make_manager(schema, [weekly, monthly])
+
+        assert manager.find_parent(monthly) is None
+
+    def test_identical_definitions_do_not_form_a_cycle(self, schema):
+        first = rollup("a_rollup", ["country"], ["count"])
+        second = rollup("b_rollup", ["country"], ["count"])
+        manager = make_manager(schema, [first, second])
+
+        assert manager.find_parent(second) is first
+        assert manager.find_parent(first) is None
+
+
+class TestBuildFromParent:
+    """Test SQL generation for derived rollups."""
+
+    @pytest.mark.asyncio
+    async def test_builds_from_materialized_parent(self, schema):
+        daily = rollup("daily", ["country", "city"], ["count", "revenue"], "day")
+        monthly = rollup("monthly", ["country"], ["count", "revenue"], "month")
+        manager = make_manager(schema, [daily, monthly], existing=["daily"])
+
+        sql = await manager.build_pre_aggregation_sql(monthly)
+
+        assert "FROM pre_aggregations.orders_daily AS t0" in sql
+        assert "t0.orders_country AS orders_country" in sql
+        assert "DATE_TRUNC('month', t0.orders_created_at_day) AS orders_created_at_month" in sql
+        assert "SUM(t0.orders_count) AS orders_count" in sql
+        assert "SUM(t0.orders_revenue) AS orders_revenue" in sql
+
+    @pytest.mark.asyncio
+    async def test_builds_from_raw_table_when_parent_missing(self, schema):
+        daily = rollup("daily", ["country", "city"], ["count"], "day")
+        monthly = rollup("monthly", ["country"], ["count"], "month")
+        manager = make_manager(schema, [daily, monthly])
+
+        sql = await manager.build_pre_aggregation_sql(monthly)
+
+        assert "FROM orders AS t0" in sql
+        assert "COUNT(t0.id) AS orders_count" in sql
+        assert "DATE_TRUNC('month', t0.created_at) AS orders_created_at_month" in sql
@@ -0,0 +1,133 @@
+"""Tests for indexes built on pre-aggregation tables."""
+
+import pytest
+
+from semantic_layer.exceptions import ExecutionError
+from semantic_layer.models.cube import Cube
+from semantic_layer.models.dimension import Dimension
+from semantic_layer.models.measure import Measure
+from semantic_layer.models.schema import Schema
+from semantic_layer.monitoring.logging import QueryLogger
+from semantic_layer.pre_aggregations.base import PreAggregationDefinition
+from semantic_layer.pre_aggregations.manager import PreAggregationManager
+from semantic_layer.pre_aggregations.storage import DatabasePreAggregation
+from semantic_layer.query.query import LogicalFilter, Query, QueryFilter
+
+
+class FakeConnector:
+    """Connector recording SQL, optionally failing on a statement prefix."""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.queries = []
+
+    async def execute_query(self, sql, params=None):
+        self.queries.append(sql)
+        if self.fail_on and sql.startswith(self.fail_on):
+            raise RuntimeError("statement failed")
+        return []
+
+
+@pytest.fixture
+def schema():
+    orders = Cube(
+        name="orders",
+        table="orders",
+        dimensions={
+            "status": Dimension(name="status", type="string", sql="status"),
+            "city": Dimension(name="city", type="string", sql="city"),
+            "created_at": Dimension(name="created_at", type="time", sql="created_at"),
+        },
+        measures={"count": Measure(name="count", type="count", sql="id")},
+    )
+    return Schema(cubes={"orders": orders})
+
+
+def daily(indexes=None):
+    return PreAggregationDefinition(
+        name="daily",
+        cube="orders",
+        dimensions=["status", "city"],
+        measures=["count"],
+        time_dimension="created_at",
+        granularity="day",
+        indexes=indexes,
+    )
+
+
+class TestIndexDefinitions:
+    """Test normalization of declared indexes."""
+
+    def test_mapping_and_list_forms(self):
+        from_mapping = daily(indexes={"by_status": {"columns": ["status", "created_at"]}})
+        from_list = daily(indexes=[{"columns": "city"}])
+
+        assert from_mapping.indexes == [{"name": "by_status", "columns": ["status", "created_at"]}]
+        assert from_list.indexes == [{"name": "index_0", "columns": ["city"]}]
+
+    def test_declared_and_time_indexes_use_rollup_columns(self, schema):
+        manager = PreAggregationManager(schema, connector=None)
+        definition = daily(indexes={"by_status": {"columns": ["orders.status", "created_at"]}})
+
+        assert manager.get_indexes(definition) == [
+            {"name": "by_status", "columns": ["orders_status", "orders_created_at_day"]},
+            {"name": "time", "columns": ["orders_created_at_day"]},
+        ]
+
+
+class TestLearnedIndexes:
+    """Test indexes learned from the query log."""
+
+    def test_frequently_filtered_dimensions_get_indexes(self, schema):
+        logger = QueryLogger(enabled=True)
+        logger._print_log = lambda entry: None
+        city_filter = QueryFilter(member="orders.city", operator="equals", values=["Berlin"])
+        status_filter = QueryFilter(member="orders.status", operator="equals", values=["paid"])
+        for _ in range(3):
+            logger.log_query(Query(measures=["orders.count"], filters=[city_filter]), 1.0)
+        logger.log_query(
+            Query(measures=["orders.count"], filters=[LogicalFilter(**{"or": [status_filter]})]), 1.0
+        )
+        manager = PreAggregationManager(
+            schema, connector=None, query_logger=logger, auto_index_min_filters=3
+        )
+
+        assert manager.get_frequently_filtered_dimensions(daily()) == ["city"]
+        assert {"name": "filter_city", "columns": ["orders_city"]} in manager.get_indexes(daily())
+
+
+class TestBuildAndSwap:
+    """Test building rollups in a staging table."""
+
+    @pytest.mark.asyncio
+    async def test_indexes_are_built_before_swap(self):
+        connector = FakeConnector()
+        storage = DatabasePreAggregation(connector)
+
+        await storage.refresh(
+            daily(), "SELECT 1", indexes=[{"name": "time", "columns": ["orders_created_at_day"]}]
+        )
+
+        create, index, swap = connector.queries
+        staging = create.split()[2]
+        assert staging.startswith("pre_aggregations.orders_daily_")
+        assert index.startswith("CREATE INDEX orders_daily_time_")
+        assert index.endswith(f"ON {staging} (orders_created_at_day)")
+        assert "DROP TABLE IF EXISTS pre_aggregations.orders_daily;" in swap
+        assert f"ALTER TABLE {staging} RENAME TO orders_daily;" in swap
+
+    @pytest.mark.asyncio
+    async def test_failed_build_drops_staging_table(self):
+        connector = FakeConnector(fail_on="CREATE INDEX")
+        storage = DatabasePreAggregation(connector)
+
+        with pytest.raises(ExecutionError):
+            await storage.refresh(daily(), "SELECT 1", indexes=[{"name": "i", "columns": ["c"]}])
+
+        staging = connector.queries[0].split()[2]
+        assert connector.queries[-1] == f"DROP TABLE IF EXISTS {staging}"
+        assert not any(sql.startswith("DO $$") for sql in connector.queries)
+
+    def test_index_names_fit_identifier_limit(self):
+        name = DatabasePreAggregation._index_name("a" * 60, "time", "0123abcd")
+        assert len(name) <= 63
@@ -0,0 +1,187 @@
+"""Tests for refresh_key.sql change detection in the pre-aggregation scheduler."""
+
+import re
+
+import pytest
+
+from semantic_layer.models.cube import Cube
+from semantic_layer.models.dimension import Dimension
+from semantic_layer.models.measure import Measure
+from semantic_layer.models.schema import Schema
+from semantic_layer.pre_aggregations.base import BasePreAggregation, PreAggregationDefinition
+from semantic_layer.pre_aggregations.manager import PreAggregationManager
+from semantic_layer.pre_aggregations.refresh_keys import RefreshKeyStore
+from semantic_layer.pre_aggregations.scheduler import PreAggregationScheduler
+
+
+class FakeConnector:
+    """Connector returning canned refresh key values and recording SQL."""
+
+    def __init__(self, values=None, fail_batch=False):
+        self.values = values or {}
+        self.fail_batch = fail_batch
+        self.queries = []
+
+    async def execute_query(self, sql, params=None):
+        self.queries.append(sql)
+        if self.fail_batch and sql.count("AS refresh_key_") > 1:
+            raise RuntimeError("batch failed")
+        row = {}
+        for key_sql, alias in re.findall(r"\((.*?)\) AS (refresh_key_\d+)", sql):
+            value = self.values[key_sql]
+            if isinstance(value, Exception):
+                raise value
+            row[alias] = value
+        return [row]
+
+
+class FakeStorage(BasePreAggregation):
+    """In-memory storage recording create/refresh calls."""
+
+    def __init__(self):
+        self.tables = set()
+        self.created = []
+        self.refreshed = []
+
+    async def create(self, definition, sql, indexes=None):
+        self.tables.add(definition.name)
+        self.created.append(definition.name)
+
+    async def refresh(self, definition, sql, indexes=None):
+        self.refreshed.append(definition.name)
+
+    async def exists(self, definition):
+        return definition.name in self.tables
+
+    async def get_table_name(self, definition):
+        return f"pre_aggregations.{definition.cube}_{definition.name}"
+
+
+@pytest.fixture
+def schema():
+    orders = Cube(
+        name="orders",
+        table="orders",
+        dimensions={"status": Dimension(name="status", type="string", sql="status")},
+        measures={"count": Measure(name="count", type="count", sql="id")},
+    )
+    return Schema(cubes={"orders": orders})
+
+
+def make_definition(name, key_sql):
+    return PreAggregationDefinition(
+        name=name,
+        cube="orders",
+        dimensions=["status"],
+        measures=["count"],
+        refresh_key={"sql": key_sql, "every": "1 minute"},
+    )
+
+
+def make_scheduler(schema, connector, store=None):
+    storage = FakeStorage()
+    manager = PreAggregationManager(schema, connector, storage=storage)
+    return PreAggregationScheduler(manager, connector, refresh_key_store=store), storage
+
+
+class TestRefreshKeyEvaluation:
+    """Test batched refresh key evaluation."""
+
+    @pytest.mark.asyncio
+    async def test_keys_evaluated_in_single_query(self, schema):
+        connector = FakeConnector({
+            "SELECT MAX(updated_at) FROM orders": "2024-01-01",
+            "SELECT COUNT(*) FROM orders": 10,
+        })
+        scheduler, _ = make_scheduler(schema, connector)
+        definitions = [
+            make_definition("by_status", "SELECT MAX(updated_at) FROM orders;"),
+            make_definition("by_status_count", "SELECT COUNT(*) FROM orders"),
+        ]
+
+        values = await scheduler.evaluate_refresh_keys(definitions)
+
+        assert len(connector.queries) == 1
+        assert "(SELECT MAX(updated_at) FROM orders) AS refresh_key_0" in connector.queries[0]
+        assert "(SELECT COUNT(*) FROM orders) AS refresh_key_1" in connector.queries[0]
+        assert values == {"by_status": "2024-01-01", "by_status_count": "10"}
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_individual_queries(self, schema):
+        connector = FakeConnector(
+            {
+                "SELECT 1": 1,
+                "SELECT broken": RuntimeError("syntax error"),
+            },
+            fail_batch=True,
+        )
+        scheduler, _ = make_scheduler(schema, connector)
+        definitions = [
+            make_definition("good", "SELECT 1"),
+            make_definition("bad", "SELECT broken"),
+        ]
+
+        values = await scheduler.evaluate_refresh_keys(definitions)
+
+        assert values == {"good": "1"}
+        assert len(connector.queries) == 3
+
+
+class TestRefreshKeyChecks:
+    """Test that only changed or missing rollups are rebuilt."""
+
+    @pytest.mark.asyncio
+    async def test_unchanged_key_skips_rebuild(self, schema):
+        connector = FakeConnector({"SELECT MAX(id) FROM orders": 5})
+        scheduler, storage = make_scheduler(schema, connector)
+        definitions = [make_definition("by_status", "SELECT MAX(id) FROM orders")]
+
+        assert await scheduler.check_refresh_keys(definitions) == ["by_status"]
+        assert storage.created == ["by_status"]
+
+        assert await scheduler.check_refresh_keys(definitions) == []
+        assert storage.refreshed == []
+
+        connector.values["SELECT MAX(id) FROM orders"] = 6
+        assert await scheduler.check_refresh_keys(definitions) == ["by_status"]
+        assert storage.refreshed == ["by_status"]
+
+    @pytest.mark.asyncio
+    async def test_missing_table_is_rebuilt(self, schema):
+        connector = FakeConnector({"SELECT MAX(id) FROM orders": 5})
+        store = RefreshKeyStore()
+        store.set("by_status", "5")
+        scheduler, storage = make_scheduler(schema, connector, store)
+        definitions = [make_definition("by_status", "SELECT MAX(id) FROM orders")]
+
+        assert await scheduler.check_refresh_keys(definitions) == ["by_status"]
+        assert storage.created == ["by_status"]
+
+    @pytest.mark.asyncio
+    async def test_null_key_is_compared_like_any_value(self, schema):
+        connector = FakeConnector({"SELECT MAX(id) FROM orders": None})
+        scheduler, storage = make_scheduler(schema, connector)
+        definitions = [make_definition("by_status", "SELECT MAX(id) FROM orders")]
+
+        assert await scheduler.check_refresh_keys(definitions) == ["by_status"]
+        assert await scheduler.check_refresh_keys(definitions) == []
+
+
+class TestRefreshKeyStore:
+    """Test refresh key persistence."""
+
+    def test_values_survive_restart(self, tmp_path):
+        path = tmp_path / "keys" / "refresh_keys.json"
+        store = RefreshKeyStore(str(path))
+        store.set("by_status", "2024-01-01")
+
+        reloaded = RefreshKeyStore(str(path))
+        assert reloaded.has("by_status")
+        assert reloaded.get("by_status") == "2024-01-01"
+
+    def test_unreadable_file_is_ignored(self, tmp_path):
+        path = tmp_path / "refresh_keys.json"
+        path.write_text("not json")
+
+        store = RefreshKeyStore(str(path))
+        assert not store.has("by_status")
@@ -0,0 +1,292 @@
+"""Tests for the concurrency-limited pre-aggregation refresh queue."""
+
+import asyncio
+
+import pytest
+
+from semantic_layer.models.cube import Cube
+from semantic_layer.models.dimension import Dimension
+from semantic_layer.models.measure import Measure
+from semantic_layer.models.schema import Schema
+from semantic_layer.monitoring.callback_manager import CallbackManager
+from semantic_layer.monitoring.callbacks import BaseQueryCallback
+from semantic_layer.pre_aggregations.base import BasePreAggregation, PreAggregationDefinition
+from semantic_layer.pre_aggregations.manager import PreAggregationManager
+from semantic_layer.pre_aggregations.scheduler import PreAggregationScheduler
+from semantic_layer.query.query import Query
+
+
+class FakeConnector:
+    """Connector recording SQL and returning one row of refresh key values."""
+
+    def __init__(self):
+        self.queries = []
+
+    async def execute_query(self, sql, params=None):
+        self.queries.append(sql)
+        return [{f"refresh_key_{i}": 1 for i in range(sql.count("AS refresh_key_"))}]
+
+
+class SlowStorage(BasePreAggregation):
+    """Storage that takes a while to build and tracks concurrency."""
+
+    def __init__(self, delay=0.01, fail=()):
+        self.delay = delay
+        self.fail = set(fail)
+        self.tables = set()
+        self.order = []
+        self.running = 0
+        self.max_running = 0
+
+    async def _build(self, definition):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+            if definition.name in self.fail:
+                raise RuntimeError("build failed")
+            self.tables.add(definition.name)
+            self.order.append(definition.name)
+        finally:
+            self.running -= 1
+
+    async def create(self, definition, sql, indexes=None):
+        await self._build(definition)
+
+    async def refresh(self, definition, sql, indexes=None):
+        await self._build(definition)
+
+    async def exists(self, definition):
+        return definition.name in self.tables
+
+    async def get_table_name(self, definition):
+        return f"pre_aggregations.{definition.cube}_{definition.name}"
+
+    async def count_rows(self, definition):
+        return 42
+
+
+class RecordingCallback(BaseQueryCallback):
+    """Callback recording refresh events."""
+
+    def __init__(self):
+        self.refreshed = []
+        self.errors = []
+
+    def on_pre_agg_refreshed(self, pre_agg_name, duration_ms, row_count, *, run_id, **kwargs):
+        self.refreshed.append((pre_agg_name, row_count))
+
+    def on_pre_agg_refresh_error(self, pre_agg_name, error, *, run_id, **kwargs):
+        self.errors.append((pre_agg_name, str(error)))
+
+
+@pytest.fixture
+def schema():
+    orders = Cube(
+        name="orders",
+        table="orders",
+        dimensions={
+            f"d{i}": Dimension(name=f"d{i}", type="string", sql=f"d{i}") for i in range(6)
+        },
+        measures={
+            "count": Measure(name="count", type="count", sql="id"),
+            "total": Measure(name="total", type="sum", sql="amount"),
+        },
+    )
+    return Schema(cubes={"orders": orders})
+
+
+def make_definition(name, dimension, refresh_key=None, depends_on=None):
+    """Build a definition; give each its own dimension so none is derived from another."""
+    return PreAggregationDefinition(
+        name=name,
+        cube="orders",
+        dimensions=[dimension],
+        measures=["count"],
+        refresh_key=refresh_key,
+        depends_on=depends_on,
+    )
+
+
+def make_scheduler(schema, definitions, storage=None, **kwargs):
+    connector = FakeConnector()
+    manager = PreAggregationManager(schema, connector, storage=storage or SlowStorage())
+    for definition in definitions:
+        manager.register(definition)
+    kwargs.setdefault("startup_jitter_seconds", 0)
+    kwargs.setdefault("interval_jitter", 0)
+    return PreAggregationScheduler(manager, connector, **kwargs)
+
+
+async def wait_idle(scheduler, timeout=2.0):
+    """Wait until no refresh is queued or running."""
+    async def _wait():
+        while scheduler._pending:
+            await asyncio.sleep(0.005)
+    await asyncio.wait_for(_wait(), timeout)
+
+
+class TestRefreshQueue:
+    """Test concurrency cap, priorities and dependencies."""
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_capped(self, schema):
+        definitions = [make_definition(f"rollup_{i}", f"d{i}") for i in range(6)]
+        storage = SlowStorage()
+        scheduler = make_scheduler(schema, definitions, storage, max_concurrency=2)
+        await scheduler.start()
+        try:
+            for definition in definitions:
+                assert scheduler.enqueue(definition)
+            await wait_idle(scheduler)
+        finally:
+            await scheduler.stop()
+
+        assert len(storage.order) == 6
+        assert storage.max_running == 2
+
+    @pytest.mark.asyncio
+    async def test_duplicate_enqueue_is_ignored(self, schema):
+        definition = make_definition("rollup", "d0")
+        scheduler = make_scheduler(schema, [definition])
+
+        assert scheduler.enqueue(definition)
+        assert not scheduler.enqueue(definition)
+
+    @pytest.mark.asyncio
+    async def test_most_queried_rollups_first(self, schema):
+        definitions = [make_definition("cold", "d0"), make_definition("hot", "d1")]
+        storage = SlowStorage()
+        scheduler = make_scheduler(schema, definitions, storage, max_concurrency=1)
+        scheduler.manager.find_matching_pre_aggregation(
+            Query(dimensions=["orders.d1"], measures=["orders.count"])
+        )
+
+        for definition in definitions:
+            scheduler.enqueue(definition)
+        await scheduler.start()
+        try:
+            await wait_idle(scheduler)
+        finally:
+            await scheduler.stop()
+
+        assert storage.order == ["hot", "cold"]
+
+    @pytest.mark.asyncio
+    async def test_dependencies_are_built_first(self, schema):
+        parent = make_definition("daily", "d0")
+        child = make_definition("monthly", "d1", depends_on=["daily"])
+        storage = SlowStorage()
+        scheduler = make_scheduler(schema, [parent, child], storage, max_concurrency=2)
+
+        scheduler.enqueue(child)
+        scheduler.enqueue(parent)
+        await scheduler.start()
+        try:
+            await wait_idle(scheduler)
+        finally:
+            await scheduler.stop()
+
+        assert storage.order == ["daily", "monthly"]
+
+    @pytest.mark.asyncio
+    async def test_cyclic_dependencies_do_not_deadlock(self, schema):
+        first = make_definition("first", "d0", depends_on=["second"])
+        second = make_definition("second", "d1", depends_on=["first"])
+        storage = SlowStorage()
+        scheduler = make_scheduler(schema, [first, second], storage)
+
+        scheduler.enqueue(first)
+        scheduler.enqueue(second)
+        await scheduler.start()
+        try:
+            await wait_idle(scheduler)
+        finally:
+            await scheduler.stop()
+
+        assert sorted(storage.order) == ["first", "second"]
+
+
+class TestDispatch:
+    """Test scheduling of due refreshes."""
+
+    @pytest.mark.asyncio
+    async def test_due_definitions_are_enqueued_with_jittered_interval(self, schema):
+        definitions = [
+            make_definition("hourly", "d0", refresh_key={"every": "1 hour"}),
+            make_definition("manual", "d1"),
+        ]
+        scheduler = make_scheduler(schema, definitions, interval_jitter=0.1)
+        scheduler._running = True
+        now = 1000.0
+        scheduler._next_run = {"hourly": now}
+        scheduler._intervals = {"hourly": 3600}
+
+        assert await scheduler.dispatch_due(now) == ["hourly"]
+        assert now + 3240 <= scheduler._next_run["hourly"] <= now + 3960
+        # Already queued, so not enqueued twice
+        scheduler._next_run["hourly"] = now
+        assert await scheduler.dispatch_due(now) == []
+
+    @pytest.mark.asyncio
+    async def test_startup_jitter_spreads_first_runs(self, schema):
+        definitions = [
+            make_definition(f"rollup_{i}", f"d{i}", refresh_key={"every": "1 hour"})
+            for i in range(5)
+        ]
+        scheduler = make_scheduler(schema, definitions, startup_jitter_seconds=30)
+        await scheduler.start()
+        try:
+            first_runs = list(scheduler._next_run.values())
+        finally:
+            await scheduler.stop()
+
+        assert len(first_runs) == 5
+        assert max(first_runs) - min(first_runs) <= 30
+
+    @pytest.mark.asyncio
+    async def test_keyed_definitions_due_together_share_one_key_query(self, schema):
+        definitions = [
+            make_definition("a", "d0", refresh_key={"sql": "SELECT MAX(id) FROM orders"}),
+            make_definition("b", "d1", refresh_key={"sql": "SELECT COUNT(*) FROM orders"}),
+        ]
+        scheduler = make_scheduler(schema, definitions)
+        scheduler._next_run = {"a": 0.0, "b": 0.0}
+        scheduler._intervals = {"a": 60, "b": 60}
+
+        enqueued = await scheduler.dispatch_due(1.0)
+
+        assert sorted(enqueued) == ["a", "b"]
+        assert len(scheduler.connector.queries) == 1
+
+
+class TestRefreshCallbacks:
+    """Test refresh duration and row count reporting."""
+
+    @pytest.mark.asyncio
+    async def test_refresh_reports_duration_and_rows(self, schema):
+        callback = RecordingCallback()
+        scheduler = make_scheduler(
+            schema,
+            [make_definition("rollup", "d0")],
+            callback_manager=CallbackManager([callback]),
+        )
+
+        await scheduler.refresh_now("rollup")
+
+        assert callback.refreshed == [("rollup", 42)]
+
+    @pytest.mark.asyncio
+    async def test_refresh_error_is_reported(self, schema):
+        callback = RecordingCallback()
+        scheduler = make_scheduler(
+            schema,
+            [make_definition("rollup", "d0")],
+            storage=SlowStorage(fail=["rollup"]),
+            callback_manager=CallbackManager([callback]),
+        )
+
+        with pytest.raises(RuntimeError):
+            await scheduler.refresh_now("rollup")
+
+        assert callback.errors == [("rollup", "build failed")]
@@ -0,0 +1,202 @@
+"""Tests for pre-aggregations serving queries under row-level security."""
+
+from datetime import datetime
+
+import pytest
+
+from semantic_layer.auth.base import SecurityContext
+from semantic_layer.models.cube import Cube
+from semantic_layer.models.dimension import Dimension
+from semantic_layer.models.measure import Measure
+from semantic_layer.models.schema import Schema
+from semantic_layer.monitoring.metrics import MetricsCollector
+from semantic_layer.orchestrator import QueryEngine
+from semantic_layer.pre_aggregations.base import BasePreAggregation, PreAggregationDefinition
+from semantic_layer.pre_aggregations.manager import PreAggregationManager
+from semantic_layer.query.query import Query, QueryTimeDimension
+from semantic_layer.security.rls import RLSFilter
+
+
+class FakeConnector:
+    """Connector recording SQL and returning a fixed high-water mark."""
+
+    def __init__(self):
+        self.queries = []
+
+    async def execute_query(self, sql, params=None):
+        self.queries.append(sql)
+        if "AS high_water_mark" in sql:
+            return [{"high_water_mark": datetime(2024, 3, 10)}]
+        return []
+
+
+class FakeStorage(BasePreAggregation):
+    """Storage where only the given pre-aggregations exist."""
+
+    def __init__(self, existing=()):
+        self.existing = set(existing)
+
+    async def create(self, definition, sql, indexes=None):
+        pass
+
+    async def refresh(self, definition, sql, indexes=None):
+        pass
+
+    async def exists(self, definition):
+        return definition.name in self.existing
+
+    async def get_table_name(self, definition):
+        return f"pre_aggregations.{definition.cube}_{definition.name}"
+
+
+def make_schema(security=None, with_user_id=False):
+    dimensions = {
+        "status": Dimension(name="status", type="string", sql="status"),
+        "created_at": Dimension(name="created_at", type="time", sql="created_at"),
+    }
+    if with_user_id:
+        dimensions["user_id"] = Dimension(name="user_id", type="string", sql="user_id")
+    orders = Cube(
+        name="orders",
+        table="orders",
+        dimensions=dimensions,
+        measures={"count": Measure(name="count", type="count", sql="id")},
+        security=security,
+    )
+    return Schema(cubes={"orders": orders})
+
+
+TENANT_FILTER = {"row_filter": "{CUBE}.tenant_id = '{USER_CONTEXT.tenant_id}'"}
+TENANT = {"user_id": "u1", "tenant_id": "acme"}
+
+
+def rollup(name="daily", granularity="day", lambda_mode=False):
+    return PreAggregationDefinition(
+        name=name,
+        cube="orders",
+        dimensions=["status"],
+        measures=["count"],
+        time_dimension="created_at",
+        granularity=granularity,
+        lambda_mode=lambda_mode,
+    )
+
+
+def make_manager(schema, definitions, existing=(), connector=None):
+    manager = PreAggregationManager(schema, connector or FakeConnector(), storage=FakeStorage(existing))
+    for definition in definitions:
+        manager.register(definition)
+    return manager
+
+
+def monthly_query():
+    return Query(
+        dimensions=["orders.status"],
+        measures=["orders.count"],
+        time_dimensions=[QueryTimeDimension(dimension="orders.created_at", granularity="month")],
+    )
+
+
+class TestRowFilterColumns:
+    """Test detection of the columns a row filter reads."""
+
+    def test_explicit_and_default_filters(self):
+        assert RLSFilter.get_row_filter_columns(make_schema(TENANT_FILTER).get_cube("orders")) == ["tenant_id"]
+        assert RLSFilter.get_row_filter_columns(make_schema(with_user_id=True).get_cube("orders")) == ["user_id"]
+        assert RLSFilter.get_row_filter_columns(make_schema().get_cube("orders")) == []
+
+    def test_registered_rollups_store_filter_columns(self):
+        manager = make_manager(make_schema(TENANT_FILTER), [rollup()])
+        definition = manager._definitions["daily"]
+
+        assert definition.security_columns == ["tenant_id"]
+        assert {"name": "security", "columns": ["orders_rls_tenant_id", "orders_created_at_day"]} in (
+            manager.get_indexes(definition)
+        )
+
+
+class TestMaterialization:
+    """Test that rollups keep the row filter columns."""
+
+    @pytest.mark.asyncio
+    async def test_raw_build_groups_by_tenant(self):
+        manager = make_manager(make_schema(TENANT_FILTER), [rollup()])
+
+        sql = await manager.build_pre_aggregation_sql(manager._definitions["daily"])
+
+        assert "t0.tenant_id AS orders_rls_tenant_id" in sql
+        assert "GROUP BY" in sql and "t0.tenant_id" in sql.split("GROUP BY")[1]
+
+    @pytest.mark.asyncio
+    async def test_derived_build_keeps_tenant_column(self):
+        daily = rollup()
+        monthly = rollup("monthly", "month")
+        manager = make_manager(make_schema(TENANT_FILTER), [daily, monthly], existing=["daily"])
+
+        sql = await manager.build_pre_aggregation_sql(monthly)
+
+        assert "FROM pre_aggregations.orders_daily AS t0" in sql
+        assert "t0.orders_rls_tenant_id AS orders_rls_tenant_id" in sql
+
+
+class TestSecuredServing:
+    """Test routing RLS-constrained queries to the tenant's rows."""
+
+    @pytest.mark.asyncio
+    async def test_tenant_filter_is_applied_to_rollup(self):
+        manager = make_manager(make_schema(TENANT_FILTER), [rollup()])
+        context = SecurityContext(**TENANT)
+
+        definition = manager.find_matching_pre_aggregation(monthly_query(), security_context=context)
+        sql = await manager.build_query_sql(definition, monthly_query(), security_context=context)
+
+        assert "FROM pre_aggregations.orders_daily AS t0" in sql
+        assert "t0.orders_rls_tenant_id = 'acme'" in sql
+
+    @pytest.mark.asyncio
+    async def test_lambda_filters_both_parts(self):
+        definition = rollup(lambda_mode=True)
+        manager = make_manager(make_schema(TENANT_FILTER), [definition])
+        context = SecurityContext(**TENANT)
+
+        sql = await manager.build_query_sql(definition, monthly_query(), security_context=context)
+        rollup_part, live_part = sql.split(" UNION ALL ")
+
+        assert "t0.orders_rls_tenant_id = 'acme'" in rollup_part
+        assert "t0.tenant_id = 'acme'" in live_part
+
+    def test_rollups_without_filter_columns_are_skipped(self):
+        schema = make_schema({"row_filter": "tenant_id = '{USER_CONTEXT.tenant_id}'"})
+        manager = make_manager(schema, [rollup()])
+
+        assert manager.find_matching_pre_aggregation(monthly_query()) is not None
+        assert manager.find_matching_pre_aggregation(
+            monthly_query(), security_context=SecurityContext(**TENANT)
+        ) is None
+
+    @pytest.mark.asyncio
+    async def test_engine_serves_user_slice_with_default_filter(self):
+        schema = make_schema(with_user_id=True)
+        connector = FakeConnector()
+        manager = make_manager(schema, [rollup()], existing=["daily"], connector=connector)
+        engine = QueryEngine(
+            schema,
+            connector,
+            pre_aggregation_manager=manager,
+            metrics_collector=MetricsCollector(enabled=False),
+        )
+
+        result = await engine.execute(monthly_query(), user_context={"user_id": "u1"})
+
+        assert result["meta"]["pre_aggregation_used"] is True
+        assert "t0.orders_rls_user_id = 'u1'" in connector.queries[-1]
+
+    @pytest.mark.asyncio
+    async def test_unsecured_queries_read_all_tenants(self):
+        manager = make_manager(make_schema(with_user_id=True), [rollup()])
+
+        sql = await manager.build_query_sql(
+            manager._definitions["daily"], monthly_query(), security_context=SecurityContext()
+        )
+
+        assert "rls_user_id =" not in sql
@@ -0,0 +1,254 @@
+"""Tests for answering queries from rollups, including lambda rollups."""
+
+from datetime import datetime
+
+import pytest
+
+from semantic_layer.models.cube import Cube
+from semantic_layer.models.dimension import Dimension
+from semantic_layer.models.measure import Measure
+from semantic_layer.models.schema import Schema
+from semantic_layer.monitoring.metrics import MetricsCollector
+from semantic_layer.orchestrator import QueryEngine
+from semantic_layer.pre_aggregations.base import BasePreAggregation, PreAggregationDefinition
+from semantic_layer.pre_aggregations.manager import PreAggregationManager
+from semantic_layer.query.query import Query, QueryFilter, QueryOrderBy, QueryTimeDimension
+
+
+class FakeConnector:
+    """Connector recording SQL and returning a fixed high-water mark."""
+
+    def __init__(self, high_water_mark=datetime(2024, 3, 10)):
+        self.high_water_mark = high_water_mark
+        self.queries = []
+
+    async def execute_query(self, sql, params=None):
+        self.queries.append(sql)
+        if "AS high_water_mark" in sql:
+            return [{"high_water_mark": self.high_water_mark}]
+        return []
+
+
+class FakeStorage(BasePreAggregation):
+    """Storage where every pre-aggregation exists."""
+
+    async def create(self, definition, sql, indexes=None):
+        pass
+
+    async def refresh(self, definition, sql, indexes=None):
+        pass
+
+    async def exists(self, definition):
+        return True
+
+    async def get_table_name(self, definition):
+        return f"pre_aggregations.{definition.cube}_{definition.name}"
+
+
+@pytest.fixture
+def schema():
+    orders = Cube(
+        name="orders",
+        table="orders",
+        dimensions={
+            "status": Dimension(name="status", type="string", sql="status"),
+            "city": Dimension(name="city", type="string", sql="city"),
+            "created_at": Dimension(name="created_at", type="time", sql="created_at"),
+        },
+        measures={
+            "count": Measure(name="count", type="count", sql="id"),
+            "revenue": Measure(name="revenue", type="sum", sql="amount"),
+            "avg_amount": Measure(name="avg_amount", type="avg", sql="amount"),
+        },
+    )
+    customers = Cube(
+        name="customers",
+        table="customers",
+        dimensions={"name": Dimension(name="name", type="string", sql="name")},
+        measures={"count": Measure(name="count", type="count", sql="id")},
+    )
+    return Schema(cubes={"orders": orders, "customers": customers})
+
+
+def daily(lambda_mode=False):
+    return PreAggregationDefinition(
+        name="daily",
+        cube="orders",
+        dimensions=["status"],
+        measures=["count", "revenue", "avg_amount"],
+        time_dimension="created_at",
+        granularity="day",
+        lambda_mode=lambda_mode,
+    )
+
+
+def make_manager(schema, definition, connector=None):
+    manager = PreAggregationManager(schema, connector or FakeConnector(), storage=FakeStorage())
+    manager.register(definition)
+    return manager
+
+
+def monthly_query(**kwargs):
+    return Query(
+        dimensions=["orders.status"],
+        measures=["orders.count"],
+        time_dimensions=[QueryTimeDimension(dimension="orders.created_at", granularity="month")],
+        **kwargs,
+    )
+
+
+class TestMatching:
+    """Test which queries a rollup can answer."""
+
+    def test_coarser_granularity_matches(self, schema):
+        manager = make_manager(schema, daily())
+        assert manager.find_matching_pre_aggregation(monthly_query()) is not None
+
+    def test_other_cubes_do_not_match(self, schema):
+        manager = make_manager(schema, daily())
+        query = Query(dimensions=["customers.name"], measures=["orders.count"])
+        assert manager.find_matching_pre_aggregation(query) is None
+
+    def test_filters_must_be_on_rollup_dimensions(self, schema):
+        manager = make_manager(schema, daily())
+        query = monthly_query(
+            filters=[QueryFilter(member="orders.city", operator="equals", values=["Berlin"])]
+        )
+        assert manager.find_matching_pre_aggregation(query) is None
+
+    def test_date_ranges_must_be_whole_days(self, schema):
+        manager = make_manager(schema, daily())
+        whole_days = Query(
+            measures=["orders.count"],
+            time_dimensions=[QueryTimeDimension(
+                dimension="orders.created_at", date_range=["2024-01-01", "2024-01-31"]
+            )],
+        )
+        partial_day = Query(
+            measures=["orders.count"],
+            time_dimensions=[QueryTimeDimension(
+                dimension="orders.created_at", date_range=["2024-01-01 12:00:00", "2024-01-31"]
+            )],
+        )
+        assert manager.find_matching_pre_aggregation(whole_days) is not None
+        assert manager.find_matching_pre_aggregation(partial_day) is None
+
+    def test_non_additive_measures_need_exact_grouping(self, schema):
+        manager = make_manager(schema, daily())
+        exact = Query(
+            dimensions=["orders.status"],
+            measures=["orders.avg_amount"],
+            time_dimensions=[QueryTimeDimension(dimension="orders.created_at", granularity="day")],
+        )
+        coarser = exact.model_copy(update={"time_dimensions": [
+            QueryTimeDimension(dimension="orders.created_at", granularity="month")
+        ]})
+        assert manager.find_matching_pre_aggregation(exact) is not None
+        assert manager.find_matching_pre_aggregation(coarser) is None
+
+
+class TestRollupSQL:
+    """Test SQL generated against rollup tables."""
+
+    @pytest.mark.asyncio
+    async def test_reads_rollup_columns(self, schema):
+        manager = make_manager(schema, daily())
+        sql = await manager.build_query_sql(daily(), monthly_query())
+
+        assert "FROM pre_aggregations.orders_daily AS t0" in sql
+        assert "SUM(t0.orders_count) AS orders_count" in sql
+        assert "DATE_TRUNC('month', t0.orders_created_at_day) AS orders_created_at_month" in sql
+
+    @pytest.mark.asyncio
+    async def test_exact_match_reads_non_additive_values(self, schema):
+        manager = make_manager(schema, daily())
+        query = Query(
+            dimensions=["orders.status"],
+            measures=["orders.avg_amount"],
+            time_dimensions=[QueryTimeDimension(dimension="orders.created_at", granularity="day")],
+        )
+        sql = await manager.build_query_sql(daily(), query)
+
+        assert "MAX(t0.orders_avg_amount) AS orders_avg_amount" in sql
+
+
+class TestLambdaSQL:
+    """Test the rollup + live UNION ALL for lambda rollups."""
+
+    @pytest.mark.asyncio
+    async def test_unions_rollup_with_live_rows(self, schema):
+        definition = daily(lambda_mode=True)
+        manager = make_manager(schema, definition)
+        query = monthly_query(
+            order_by=[QueryOrderBy(dimension="orders.count", direction="desc")],
+            limit=10,
+        )
+
+        sql = await manager.build_query_sql(definition, query)
+        rollup_part, live_part = sql.split(" UNION ALL ")
+
+        assert "FROM pre_aggregations.orders_daily AS t0" in rollup_part
+        assert "t0.orders_created_at_day < '2024-03-10T00:00:00'" in rollup_part
+        assert "FROM orders AS t0" in live_part
+        assert "t0.created_at >= '2024-03-10T00:00:00'" in live_part
+        assert "ORDER BY" not in rollup_part
+        assert live_part.endswith(
+            "GROUP BY t0.orders_status, DATE_TRUNC('month', t0.orders_created_at_month) "
+            "ORDER BY SUM(t0.orders_count) DESC LIMIT 10"
+        )
+
+    @pytest.mark.asyncio
+    async def test_non_additive_measures_are_not_served(self, schema):
+        manager = make_manager(schema, daily(lambda_mode=True))
+        query = Query(
+            dimensions=["orders.status"],
+            measures=["orders.avg_amount"],
+            time_dimensions=[QueryTimeDimension(dimension="orders.created_at", granularity="day")],
+        )
+        assert manager.find_matching_pre_aggregation(query) is None
+
+    @pytest.mark.asyncio
+    async def test_high_water_mark_is_cached_until_refresh(self, schema):
+        definition = daily(lambda_mode=True)
+        connector = FakeConnector()
+        manager = make_manager(schema, definition, connector)
+
+        await manager.build_query_sql(definition, monthly_query())
+        await manager.build_query_sql(definition, monthly_query())
+        assert sum("high_water_mark" in sql for sql in connector.queries) == 1
+
+        await manager.refresh_pre_aggregation(definition)
+        await manager.build_query_sql(definition, monthly_query())
+        assert sum("high_water_mark" in sql for sql in connector.queries) == 2
+
+    @pytest.mark.asyncio
+    async def test_empty_rollup_is_served_live(self, schema):
+        definition = daily(lambda_mode=True)
+        manager = make_manager(schema, definition, FakeConnector(high_water_mark=None))
+
+        sql = await manager.build_query_sql(definition, monthly_query())
+
+        assert "UNION ALL" not in sql
+        assert "FROM orders AS t0" in sql
+
+
+class TestEngineServing:
+    """Test that the engine serves matched queries from rollups."""
+
+    @pytest.mark.asyncio
+    async def test_engine_uses_rollup(self, schema):
+        connector = FakeConnector()
+        manager = make_manager(schema, daily(), connector)
+        engine = QueryEngine(
+            schema,
+            connector,
+            pre_aggregation_manager=manager,
+            metrics_collector=MetricsCollector(enabled=False),
+        )
+
+        result = await engine.execute(monthly_query())
+
+        assert result["meta"]["pre_aggregation_used"] is True
+        assert "pre_aggregations.orders_daily" in connector.queries[-1]
+        # The cube itself is never modified
+        assert schema.get_cube("orders").table == "orders"
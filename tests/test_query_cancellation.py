@@ -0,0 +1,123 @@
+"""Tests for query deadlines and killing active queries."""
+
+import asyncio
+
+import pytest
+
+from semantic_layer.exceptions import QueryCancelledError, QueryTimeoutError
+from semantic_layer.models.cube import Cube
+from semantic_layer.models.dimension import Dimension
+from semantic_layer.models.measure import Measure
+from semantic_layer.models.schema import Schema
+from semantic_layer.monitoring.metrics import MetricsCollector
+from semantic_layer.orchestrator import AdmissionController, QueryEngine
+from semantic_layer.query.query import Query
+from semantic_layer.utils.deadlines import deadline, remaining_seconds
+
+
+class SlowConnector:
+    """Connector taking ``delay`` seconds per statement and noting cancellations."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.cancelled = 0
+
+    async def execute_query(self, sql, params=None):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return [{"orders_count": 1}]
+
+
+@pytest.fixture
+def schema():
+    orders = Cube(
+        name="orders",
+        table="orders",
+        dimensions={"status": Dimension(name="status", type="string", sql="status")},
+        measures={"count": Measure(name="count", type="count", sql="id")},
+    )
+    return Schema(cubes={"orders": orders})
+
+
+def make_engine(schema, connector, **kwargs):
+    return QueryEngine(schema, connector, metrics_collector=MetricsCollector(enabled=False), **kwargs)
+
+
+QUERY = Query(measures=["orders.count"])
+
+
+class TestDeadlines:
+    """Test the deadline context."""
+
+    def test_no_deadline_by_default(self):
+        assert remaining_seconds() is None
+
+    def test_inner_deadline_cannot_extend_outer(self):
+        with deadline(0.5):
+            with deadline(10):
+                assert remaining_seconds() <= 0.5
+            with deadline(0.1):
+                assert remaining_seconds() <= 0.1
+        assert remaining_seconds() is None
+
+
+class TestQueryCancellation:
+    """Test timeouts and kills reaching the connector."""
+
+    @pytest.mark.asyncio
+    async def test_slow_query_times_out_and_is_cancelled(self, schema):
+        connector = SlowConnector(delay=1)
+        admission = AdmissionController(max_concurrency=1)
+        engine = make_engine(schema, connector, admission_controller=admission)
+
+        with pytest.raises(QueryTimeoutError):
+            await engine.execute(QUERY, timeout=0.05)
+
+        assert connector.cancelled == 1
+        assert admission.running == 0
+        assert engine.active_queries.list() == []
+
+    @pytest.mark.asyncio
+    async def test_engine_default_timeout(self, schema):
+        engine = make_engine(schema, SlowConnector(delay=1), query_timeout=0.05)
+
+        with pytest.raises(QueryTimeoutError):
+            await engine.execute(QUERY)
+
+    @pytest.mark.asyncio
+    async def test_fast_query_within_timeout(self, schema):
+        engine = make_engine(schema, SlowConnector(delay=0))
+
+        result = await engine.execute(QUERY, timeout=1)
+
+        assert result["data"] == [{"orders_count": 1}]
+
+    @pytest.mark.asyncio
+    async def test_killed_query_is_listed_then_cancelled(self, schema):
+        connector = SlowConnector(delay=1)
+        engine = make_engine(schema, connector)
+
+        task = asyncio.create_task(engine.execute(QUERY))
+        await asyncio.sleep(0.01)
+        active = engine.active_queries.list()
+        assert len(active) == 1
+        assert active[0].to_dict()["state"] == "running"
+
+        assert engine.active_queries.kill(active[0].id)
+        with pytest.raises(QueryCancelledError):
+            await task
+        assert connector.cancelled == 1
+        assert not engine.active_queries.kill(active[0].id)
+
+    @pytest.mark.asyncio
+    async def test_batch_timeout_fails_each_query(self, schema):
+        engine = make_engine(schema, SlowConnector(delay=1))
+
+        results = await engine.execute_many(
+            [QUERY, Query(measures=["orders.count"], dimensions=["orders.status"])], timeout=0.05, fuse=False
+        )
+
+        assert all("error" in result for result in results)
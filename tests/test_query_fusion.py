@@ -0,0 +1,109 @@
+"""Tests for fusing batched queries into one statement."""
+
+import pytest
+
+from semantic_layer.models.cube import Cube
+from semantic_layer.models.dimension import Dimension
+from semantic_layer.models.measure import Measure
+from semantic_layer.models.schema import Schema
+from semantic_layer.monitoring.metrics import MetricsCollector
+from semantic_layer.orchestrator import QueryEngine
+from semantic_layer.query.query import Query, QueryFilter
+
+
+class FakeConnector:
+    """Connector recording SQL and returning canned rows."""
+
+    def __init__(self, rows=(), fail_on=None):
+        self.rows = rows
+        self.fail_on = fail_on
+        self.queries = []
+
+    async def execute_query(self, sql, params=None):
+        self.queries.append(sql)
+        if self.fail_on and self.fail_on in sql:
+            raise RuntimeError("statement failed")
+        return [dict(row) for row in self.rows]
+
+
+@pytest.fixture
+def schema():
+    orders = Cube(
+        name="orders",
+        table="orders",
+        dimensions={
+            "status": Dimension(name="status", type="string", sql="status"),
+            "region": Dimension(name="region", type="string", sql="region"),
+        },
+        measures={
+            "count": Measure(name="count", type="count", sql="id"),
+            "revenue": Measure(name="revenue", type="sum", sql="amount"),
+        },
+    )
+    return Schema(cubes={"orders": orders})
+
+
+def make_engine(schema, connector):
+    return QueryEngine(schema, connector, metrics_collector=MetricsCollector(enabled=False))
+
+
+PAID = [QueryFilter(member="orders.status", operator="equals", values=["paid"])]
+
+
+class TestFusion:
+    """Test fusing and splitting batched queries."""
+
+    @pytest.mark.asyncio
+    async def test_same_dimensions_share_one_select(self, schema):
+        connector = FakeConnector([{"orders_status": "paid", "orders_count": 2, "orders_revenue": 10}])
+
+        results = await make_engine(schema, connector).execute_many([
+            Query(dimensions=["orders.status"], measures=["orders.count"], filters=PAID),
+            Query(dimensions=["orders.status"], measures=["orders.revenue"], filters=PAID),
+        ])
+
+        assert len(connector.queries) == 1
+        assert results[0]["data"] == [{"orders_status": "paid", "orders_count": 2}]
+        assert results[1]["data"] == [{"orders_status": "paid", "orders_revenue": 10}]
+        assert results[1]["meta"]["fused_queries"] == 2
+
+    @pytest.mark.asyncio
+    async def test_different_dimensions_use_grouping_sets(self, schema):
+        connector = FakeConnector([
+            {"orders_status": "paid", "orders_region": None, "orders_count": 2, "_grouping_set": 0},
+            {"orders_status": None, "orders_region": "eu", "orders_count": 5, "_grouping_set": 1},
+        ])
+
+        results = await make_engine(schema, connector).execute_many([
+            Query(dimensions=["orders.status"], measures=["orders.count"]),
+            Query(dimensions=["orders.region"], measures=["orders.count"]),
+        ])
+
+        assert len(connector.queries) == 1
+        assert "GROUP BY GROUPING SETS ((t0.status), (t0.region))" in connector.queries[0]
+        assert results[0]["data"] == [{"orders_status": "paid", "orders_count": 2}]
+        assert results[1]["data"] == [{"orders_region": "eu", "orders_count": 5}]
+
+    @pytest.mark.asyncio
+    async def test_paged_and_differently_filtered_queries_run_alone(self, schema):
+        connector = FakeConnector([{"orders_count": 1}])
+
+        await make_engine(schema, connector).execute_many([
+            Query(measures=["orders.count"]),
+            Query(measures=["orders.revenue"], limit=10),
+            Query(measures=["orders.revenue"], filters=PAID),
+        ])
+
+        assert len(connector.queries) == 3
+
+    @pytest.mark.asyncio
+    async def test_failed_fusion_falls_back_to_single_queries(self, schema):
+        connector = FakeConnector([{"orders_count": 1}], fail_on="GROUPING SETS")
+
+        results = await make_engine(schema, connector).execute_many([
+            Query(dimensions=["orders.status"], measures=["orders.count"]),
+            Query(dimensions=["orders.region"], measures=["orders.count"]),
+        ])
+
+        assert len(connector.queries) == 3
+        assert all("error" not in result for result in results)
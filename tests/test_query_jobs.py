@@ -0,0 +1,161 @@
+"""Tests for long-running query jobs."""
+
+import asyncio
+
+import pytest
+
+from semantic_layer.exceptions import OverloadedError
+from semantic_layer.models.cube import Cube
+from semantic_layer.models.dimension import Dimension
+from semantic_layer.models.measure import Measure
+from semantic_layer.models.schema import Schema
+from semantic_layer.monitoring.metrics import MetricsCollector
+from semantic_layer.orchestrator import QueryEngine, QueryJobManager
+from semantic_layer.query.query import Query
+from semantic_layer.scheduling.jobs import JobStatus
+
+
+class SlowConnector:
+    """Connector counting statements and taking ``delay`` seconds each."""
+
+    def __init__(self, delay=0.05, error=None):
+        self.delay = delay
+        self.error = error
+        self.queries = []
+
+    async def execute_query(self, sql, params=None):
+        self.queries.append(sql)
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return [{"orders_count": 1}]
+
+
+class MemoryStore:
+    """Result store keeping rows in a dict."""
+
+    def __init__(self):
+        self.rows = {}
+
+    async def store(self, key, data, metadata=None):
+        self.rows[key] = data
+
+    async def retrieve(self, key):
+        return self.rows.get(key)
+
+    async def delete(self, key):
+        self.rows.pop(key, None)
+
+
+@pytest.fixture
+def schema():
+    orders = Cube(
+        name="orders",
+        table="orders",
+        dimensions={"status": Dimension(name="status", type="string", sql="status")},
+        measures={"count": Measure(name="count", type="count", sql="id")},
+    )
+    return Schema(cubes={"orders": orders})
+
+
+def make_manager(schema, connector, **kwargs):
+    engine = QueryEngine(schema, connector, metrics_collector=MetricsCollector(enabled=False))
+    return QueryJobManager(engine, **kwargs)
+
+
+QUERY = Query(measures=["orders.count"])
+
+
+class TestQueryJobs:
+    """Test continue-wait, polling and attaching to running jobs."""
+
+    @pytest.mark.asyncio
+    async def test_fast_query_completes_within_wait(self, schema):
+        manager = make_manager(schema, SlowConnector(delay=0))
+
+        job = await manager.execute(QUERY, wait_seconds=1)
+
+        assert job.status == JobStatus.COMPLETED
+        assert (await manager.get_result(job))["data"] == [{"orders_count": 1}]
+        assert manager.get(job.id) is None
+
+    @pytest.mark.asyncio
+    async def test_slow_query_keeps_running_and_can_be_long_polled(self, schema):
+        connector = SlowConnector(delay=0.05)
+        manager = make_manager(schema, connector)
+
+        job = await manager.execute(QUERY, wait_seconds=0.001)
+        assert job.status == JobStatus.RUNNING
+
+        await manager.wait(job.id, timeout=1)
+        assert job.status == JobStatus.COMPLETED
+        assert len(connector.queries) == 1
+
+    @pytest.mark.asyncio
+    async def test_duplicate_submissions_attach_to_the_running_job(self, schema):
+        connector = SlowConnector()
+        manager = make_manager(schema, connector)
+
+        first = manager.submit(QUERY, {"user_id": "u1"})
+        second = manager.submit(Query(measures=["orders.count"]), {"user_id": "u1"})
+        other_user = manager.submit(QUERY, {"user_id": "u2"})
+        await manager.wait(first.id, timeout=1)
+        await manager.wait(other_user.id, timeout=1)
+
+        assert second is first
+        assert other_user is not first
+        assert len(connector.queries) == 2
+
+    @pytest.mark.asyncio
+    async def test_finished_jobs_are_not_reused(self, schema):
+        connector = SlowConnector(delay=0)
+        manager = make_manager(schema, connector)
+
+        first = manager.submit(QUERY)
+        await manager.wait(first.id, timeout=1)
+        second = manager.submit(QUERY)
+        await manager.wait(second.id, timeout=1)
+
+        assert second is not first
+        assert manager.get(first.id) is first
+        assert len(connector.queries) == 2
+
+    @pytest.mark.asyncio
+    async def test_job_count_is_bounded(self, schema):
+        manager = make_manager(schema, SlowConnector(), max_jobs=2)
+
+        finished = manager.submit(Query(dimensions=["orders.status"], measures=["orders.count"]))
+        await manager.wait(finished.id, timeout=1)
+        running = manager.submit(QUERY)
+        third = manager.submit(Query(measures=["orders.count"], limit=10))
+
+        assert manager.get(finished.id) is None
+        with pytest.raises(OverloadedError):
+            manager.submit(Query(measures=["orders.count"], limit=20))
+        await manager.wait(running.id, timeout=1)
+        await manager.wait(third.id, timeout=1)
+
+    @pytest.mark.asyncio
+    async def test_rows_go_to_the_result_store(self, schema):
+        store = MemoryStore()
+        manager = make_manager(schema, SlowConnector(), result_store=store)
+
+        job = await manager.execute(QUERY, wait_seconds=0.001)
+        await manager.wait(job.id, timeout=1)
+
+        assert store.rows[job.id] == [{"orders_count": 1}]
+        result = await manager.get_result(job)
+        assert result["data"] == [{"orders_count": 1}]
+        assert "sql" in result["meta"]
+
+    @pytest.mark.asyncio
+    async def test_failed_job_keeps_its_error_and_is_retried(self, schema):
+        connector = SlowConnector(delay=0, error=RuntimeError("boom"))
+        manager = make_manager(schema, connector)
+
+        job = await manager.execute(QUERY, wait_seconds=1)
+        retried = manager.submit(QUERY)
+
+        assert job.status == JobStatus.FAILED
+        assert "boom" in job.to_dict()["error"]
+        assert retried is not job
@@ -0,0 +1,129 @@
+"""Tests for the bounded query log and its JSONL files."""
+
+import pytest
+
+from semantic_layer.models.cube import Cube
+from semantic_layer.models.dimension import Dimension
+from semantic_layer.models.measure import Measure
+from semantic_layer.models.schema import Schema
+from semantic_layer.monitoring.log_sink import JSONLLogSink, log_files, read_query_log
+from semantic_layer.monitoring.logging import QueryLogger
+from semantic_layer.monitoring.metrics import MetricsCollector
+from semantic_layer.orchestrator import QueryEngine
+from semantic_layer.query.query import Query, QueryFilter
+
+
+def log(logger, measure="orders.count", cache_hit=False):
+    logger.log_query(
+        Query(
+            measures=[measure],
+            filters=[QueryFilter(dimension="orders.status", operator="equals", values=["paid"])],
+        ),
+        execution_time_ms=12.5,
+        cache_hit=cache_hit,
+    )
+
+
+class TestQueryLogger:
+    """Test the in-memory ring buffer."""
+
+    def test_keeps_only_latest_entries(self):
+        logger = QueryLogger(max_entries=3, echo=False)
+        for i in range(5):
+            log(logger, measure=f"orders.m{i}")
+
+        logs = logger.get_logs()
+        assert [entry["measures"] for entry in logs] == [["orders.m2"], ["orders.m3"], ["orders.m4"]]
+        assert [entry["measures"] for entry in logger.get_logs(limit=1)] == [["orders.m4"]]
+
+    def test_echo_off_prints_nothing(self, capsys):
+        log(QueryLogger(echo=False))
+
+        assert capsys.readouterr().out == ""
+
+    def test_echo_is_off_by_default(self, capsys):
+        log(QueryLogger())
+
+        assert capsys.readouterr().out == ""
+
+
+class TestJSONLLogSink:
+    """Test writing, rotating, sampling and replaying log files."""
+
+    @pytest.mark.asyncio
+    async def test_entries_round_trip_through_files(self, tmp_path):
+        sink = JSONLLogSink(tmp_path)
+        logger = QueryLogger(sink=sink, echo=False)
+        log(logger)
+        log(logger, measure="orders.total")
+        await sink.stop()
+
+        entries = list(read_query_log(tmp_path))
+        assert [entry["measures"] for entry in entries] == [["orders.count"], ["orders.total"]]
+        assert entries[0]["filters"] == [{"dimension": "orders.status", "operator": "equals", "values": ["paid"]}]
+
+    @pytest.mark.asyncio
+    async def test_background_writer_batches_entries(self, tmp_path):
+        sink = JSONLLogSink(tmp_path, batch_size=2, flush_interval=0.05)
+        sink.start()
+        for i in range(4):
+            sink.write({"measures": [f"orders.m{i}"]})
+        await sink.stop()
+
+        assert sink.get_stats()["written"] == 4
+        assert len(list(read_query_log(tmp_path))) == 4
+
+    @pytest.mark.asyncio
+    async def test_files_rotate_and_old_ones_are_deleted(self, tmp_path):
+        sink = JSONLLogSink(tmp_path, max_file_bytes=1, max_files=2, batch_size=1)
+        for i in range(4):
+            sink.write({"n": i})
+        await sink.flush()
+
+        files = log_files(tmp_path)
+        assert len(files) == 2
+        assert [entry["n"] for entry in read_query_log(tmp_path)] == [2, 3]
+
+    @pytest.mark.asyncio
+    async def test_cache_hits_are_sampled(self, tmp_path):
+        sink = JSONLLogSink(tmp_path, cache_hit_sample_rate=0)
+        logger = QueryLogger(sink=sink, echo=False)
+        log(logger, cache_hit=True)
+        log(logger, cache_hit=False)
+        await sink.flush()
+
+        assert [entry["cache_hit"] for entry in read_query_log(tmp_path)] == [False]
+        assert sink.sampled_out == 1
+
+
+class CountConnector:
+    """Connector answering every statement with one row."""
+
+    async def execute_query(self, sql, params=None):
+        return [{"orders_count": 1}]
+
+
+class TestEngineLogging:
+    """Test what the engine writes to the log files."""
+
+    @pytest.mark.asyncio
+    async def test_each_run_is_written_once(self, tmp_path):
+        orders = Cube(
+            name="orders",
+            table="orders",
+            dimensions={"status": Dimension(name="status", type="string", sql="status")},
+            measures={"count": Measure(name="count", type="count", sql="id")},
+        )
+        sink = JSONLLogSink(tmp_path)
+        engine = QueryEngine(
+            Schema(cubes={"orders": orders}),
+            CountConnector(),
+            query_logger=QueryLogger(sink=sink),
+            metrics_collector=MetricsCollector(enabled=False),
+        )
+
+        await engine.execute(Query(measures=["orders.count"]))
+        await engine.execute(Query(measures=["orders.count"], dimensions=["orders.status"]))
+        await sink.stop()
+
+        assert len(list(read_query_log(tmp_path))) == 2
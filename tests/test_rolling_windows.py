@@ -0,0 +1,148 @@
+"""Tests for rolling-window and cumulative measures."""
+
+import pytest
+
+from semantic_layer.exceptions import QueryError
+from semantic_layer.models.cube import Cube
+from semantic_layer.models.dimension import Dimension
+from semantic_layer.models.measure import Measure
+from semantic_layer.models.schema import Schema
+from semantic_layer.pre_aggregations.base import BasePreAggregation, PreAggregationDefinition
+from semantic_layer.pre_aggregations.manager import PreAggregationManager
+from semantic_layer.query.query import Query, QueryTimeDimension
+from semantic_layer.sql.builder import SQLBuilder
+from semantic_layer.utils.time_windows import parse_trailing, shift_back
+
+
+class FakeStorage(BasePreAggregation):
+    """Storage where every pre-aggregation exists."""
+
+    async def create(self, definition, sql, indexes=None):
+        pass
+
+    async def refresh(self, definition, sql, indexes=None):
+        pass
+
+    async def exists(self, definition):
+        return True
+
+    async def get_table_name(self, definition):
+        return f"pre_aggregations.{definition.cube}_{definition.name}"
+
+
+@pytest.fixture
+def schema():
+    orders = Cube(
+        name="orders",
+        table="orders",
+        dimensions={
+            "status": Dimension(name="status", type="string", sql="status"),
+            "created_at": Dimension(name="created_at", type="time", sql="created_at"),
+        },
+        measures={
+            "revenue": Measure(name="revenue", type="sum", sql="amount"),
+            "revenue_7d": Measure(name="revenue_7d", type="sum", sql="amount", rolling_window={"trailing": "7 day"}),
+            "running_count": Measure(name="running_count", type="count", sql="id", rolling_window={}),
+            "users_7d": Measure(
+                name="users_7d", type="countDistinct", sql="user_id", rolling_window={"trailing": "7 day"}
+            ),
+        },
+    )
+    return Schema(cubes={"orders": orders})
+
+
+def daily_query(measures, date_range=("2024-03-01", "2024-03-31"), granularity="day"):
+    return Query(
+        dimensions=["orders.status"],
+        measures=list(measures),
+        time_dimensions=[QueryTimeDimension(
+            dimension="orders.created_at",
+            granularity=granularity,
+            date_range=list(date_range) if date_range else None,
+        )],
+    )
+
+
+class TestWindows:
+    """Test parsing and shifting trailing windows."""
+
+    def test_parse_trailing(self):
+        assert parse_trailing("7 days") == (7, "day")
+        assert parse_trailing("unbounded") is None
+        with pytest.raises(ValueError):
+            parse_trailing("seven days")
+
+    def test_shift_back_clamps_month_ends(self):
+        assert shift_back("2024-03-31", 1, "month") == "2024-02-29"
+        assert shift_back("2024-03-01T12:00:00", 7, "day") == "2024-02-23T12:00:00"
+
+    def test_invalid_window_is_rejected(self):
+        with pytest.raises(ValueError):
+            Measure(name="m", type="sum", sql="amount", rolling_window={"trailing": "a week"})
+
+
+class TestSQL:
+    """Test compiling windows over a single grouped scan."""
+
+    def test_trailing_window_widens_the_scan(self, schema):
+        sql = SQLBuilder(schema).build(daily_query(["orders.revenue", "orders.revenue_7d"]))
+
+        assert sql.count("FROM orders AS t0") == 1
+        assert "t0.created_at >= '2024-02-23'" in sql
+        assert (
+            "SUM(orders_revenue_7d) OVER (PARTITION BY orders_status ORDER BY orders_created_at_day "
+            "RANGE BETWEEN (INTERVAL '7 day' - INTERVAL '1 day') PRECEDING AND CURRENT ROW)"
+        ) in sql
+        assert "WHERE orders_created_at_day >= DATE_TRUNC('day', TIMESTAMP '2024-03-01')" in sql
+
+    def test_running_total_scans_all_history(self, schema):
+        sql = SQLBuilder(schema).build(daily_query(["orders.running_count"]))
+
+        assert "t0.created_at >= " not in sql
+        assert "t0.created_at <= '2024-03-31'" in sql
+        assert "RANGE BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW" in sql
+
+    def test_non_additive_and_ungrouped_windows_are_rejected(self, schema):
+        builder = SQLBuilder(schema)
+        with pytest.raises(QueryError):
+            builder.build(daily_query(["orders.users_7d"]))
+        with pytest.raises(QueryError):
+            builder.build(Query(measures=["orders.revenue_7d"]))
+        with pytest.raises(QueryError):
+            builder.build(daily_query(["orders.revenue_7d"], granularity="month"))
+
+
+class TestRollups:
+    """Test answering windows from daily rollups."""
+
+    def manager(self, schema):
+        manager = PreAggregationManager(schema, connector=None, storage=FakeStorage())
+        manager.register(PreAggregationDefinition(
+            name="daily",
+            cube="orders",
+            dimensions=["status"],
+            measures=["revenue_7d"],
+            time_dimension="created_at",
+            granularity="day",
+        ))
+        return manager
+
+    @pytest.mark.asyncio
+    async def test_rollup_stores_daily_values(self, schema):
+        manager = self.manager(schema)
+
+        sql = await manager.build_pre_aggregation_sql(manager._definitions["daily"])
+
+        assert "OVER" not in sql
+        assert "SUM(t0.amount) AS orders_revenue_7d" in sql
+
+    @pytest.mark.asyncio
+    async def test_rollup_serves_window(self, schema):
+        manager = self.manager(schema)
+        query = daily_query(["orders.revenue_7d"])
+
+        definition = manager.find_matching_pre_aggregation(query)
+        sql = await manager.build_query_sql(definition, query)
+
+        assert "FROM pre_aggregations.orders_daily AS t0" in sql
+        assert "SUM(orders_revenue_7d) OVER" in sql
@@ -0,0 +1,200 @@
+"""Tests for the slow query log."""
+
+import asyncio
+from uuid import uuid4
+
+import pytest
+
+from semantic_layer.models.cube import Cube
+from semantic_layer.models.dimension import Dimension
+from semantic_layer.models.measure import Measure
+from semantic_layer.models.schema import Schema
+from semantic_layer.monitoring.handlers import SlowQueryCallbackHandler
+from semantic_layer.monitoring.metrics import MetricsCollector
+from semantic_layer.monitoring.slow_queries import SlowQueryLog, fingerprint_sql
+from semantic_layer.orchestrator import AdmissionController, QueryEngine
+from semantic_layer.query.query import Query
+from semantic_layer.utils.deadlines import deadline, remaining_seconds
+
+
+class ExplainingConnector:
+    """Connector answering EXPLAIN statements with a plan."""
+
+    dialect = "postgresql"
+
+    def __init__(self, delay=0.0, fail_explain=False):
+        self.delay = delay
+        self.fail_explain = fail_explain
+        self.statements = []
+        self.explain_deadlines = []
+
+    async def execute_query(self, sql, params=None):
+        self.statements.append(sql)
+        if sql.startswith("EXPLAIN"):
+            self.explain_deadlines.append(remaining_seconds())
+            if self.fail_explain:
+                raise RuntimeError("permission denied")
+            return [{"QUERY PLAN": "Seq Scan on orders"}, {"QUERY PLAN": "Execution Time: 12.3 ms"}]
+        await asyncio.sleep(self.delay)
+        return [{"orders_count": 1}]
+
+
+@pytest.fixture
+def schema():
+    orders = Cube(
+        name="orders",
+        table="orders",
+        dimensions={"status": Dimension(name="status", type="string", sql="status")},
+        measures={"count": Measure(name="count", type="count", sql="id")},
+    )
+    return Schema(cubes={"orders": orders})
+
+
+def report(handler, sql, execution_time_ms=2000.0):
+    handler.on_sql_generated(sql, execution_time_ms, run_id=uuid4())
+
+
+class TestFingerprint:
+    """Test statement normalization."""
+
+    def test_literals_become_parameters(self):
+        fingerprint, normalized, params = fingerprint_sql(
+            "SELECT t1.id FROM orders t1 WHERE status = 'it''s' AND amount > 10.5 LIMIT 100"
+        )
+
+        assert normalized == "SELECT t1.id FROM orders t1 WHERE status = ? AND amount > ? LIMIT ?"
+        assert params == ["it's", 10.5, 100]
+        assert len(fingerprint) == 16
+
+    def test_same_shape_shares_fingerprint(self):
+        first = fingerprint_sql("SELECT * FROM orders WHERE id IN (1, 2, 3) -- dashboard")
+        second = fingerprint_sql("select *  from orders\nwhere id in (7)")
+        other = fingerprint_sql("SELECT * FROM users WHERE id IN (1, 2, 3)")
+
+        assert first[0] == second[0]
+        assert first[0] != other[0]
+        assert "IN (?+)" in first[1]
+
+
+class TestSlowQueryLog:
+    """Test storage and grouping."""
+
+    def test_groups_by_fingerprint(self):
+        log = SlowQueryLog()
+        log.record("SELECT * FROM orders WHERE id = 1", 1500)
+        log.record("SELECT * FROM orders WHERE id = 2", 2500)
+        log.record("SELECT * FROM users WHERE id = 1", 5000)
+
+        groups = log.group_by_fingerprint()
+
+        assert [group["count"] for group in groups] == [1, 2]
+        orders = groups[1]
+        assert orders["total_time_ms"] == 4000
+        assert orders["avg_time_ms"] == 2000
+        assert orders["max_time_ms"] == 2500
+        assert orders["latest"]["params"] == [2]
+
+    def test_ring_buffer_is_bounded(self):
+        log = SlowQueryLog(max_entries=2)
+        for i in range(3):
+            log.record(f"SELECT {i}", 1500)
+
+        assert [entry["sql"] for entry in log.get_entries()] == ["SELECT 2", "SELECT 1"]
+
+
+class TestSlowQueryCallbackHandler:
+    """Test recording and plan capture."""
+
+    def test_fast_statements_are_not_recorded(self):
+        handler = SlowQueryCallbackHandler(threshold_ms=1000)
+        report(handler, "SELECT 1", execution_time_ms=10)
+
+        assert handler.slow_query_log.get_entries() == []
+
+    @pytest.mark.asyncio
+    async def test_plan_is_captured_in_background(self):
+        connector = ExplainingConnector()
+        handler = SlowQueryCallbackHandler(connector=connector)
+
+        with deadline(0.5):
+            report(handler, "SELECT * FROM orders")
+        await handler.flush()
+
+        entry = handler.slow_query_log.get_entries()[0]
+        assert connector.statements == ["EXPLAIN (ANALYZE, BUFFERS) SELECT * FROM orders"]
+        assert connector.explain_deadlines == [None]
+        assert entry["plan_status"] == "captured"
+        assert entry["plan"] == ["Seq Scan on orders", "Execution Time: 12.3 ms"]
+        assert handler.slow_query_log.group_by_fingerprint()[0]["plan"]["lines"] == entry["plan"]
+
+    @pytest.mark.asyncio
+    async def test_plans_are_rate_limited(self):
+        connector = ExplainingConnector()
+        handler = SlowQueryCallbackHandler(connector=connector, max_explains_per_minute=2)
+
+        report(handler, "SELECT * FROM orders WHERE id = 1")
+        report(handler, "SELECT * FROM orders WHERE id = 2")
+        report(handler, "SELECT * FROM users")
+        report(handler, "SELECT * FROM products")
+        await handler.flush()
+
+        statuses = [entry["plan_status"] for entry in reversed(handler.slow_query_log.get_entries())]
+        assert statuses == ["captured", "skipped", "captured", "skipped"]
+        assert len(connector.statements) == 2
+
+    @pytest.mark.asyncio
+    async def test_capture_waits_for_a_slot_behind_queries(self):
+        connector = ExplainingConnector()
+        controller = AdmissionController(max_concurrency=1)
+        handler = SlowQueryCallbackHandler(connector=connector, admission_controller=controller)
+        await controller.acquire()
+
+        report(handler, "SELECT * FROM orders")
+        await asyncio.sleep(0.01)
+        assert connector.statements == []
+        assert controller.queue_depth == 1
+
+        controller.release()
+        await handler.flush()
+        assert handler.slow_query_log.get_entries()[0]["plan_status"] == "captured"
+        assert controller.running == 0
+
+    @pytest.mark.asyncio
+    async def test_capture_is_skipped_when_the_queue_is_full(self):
+        connector = ExplainingConnector()
+        controller = AdmissionController(max_concurrency=1, max_queue_depth=0)
+        handler = SlowQueryCallbackHandler(connector=connector, admission_controller=controller)
+        await controller.acquire()
+
+        report(handler, "SELECT * FROM orders")
+        await handler.flush()
+
+        assert connector.statements == []
+        assert handler.slow_query_log.get_entries()[0]["plan_status"] == "skipped"
+
+    @pytest.mark.asyncio
+    async def test_failed_capture_is_recorded(self):
+        handler = SlowQueryCallbackHandler(connector=ExplainingConnector(fail_explain=True))
+
+        report(handler, "SELECT * FROM orders")
+        await handler.flush()
+
+        entry = handler.slow_query_log.get_entries()[0]
+        assert entry["plan_status"] == "failed"
+        assert entry["plan_error"] == "permission denied"
+
+    @pytest.mark.asyncio
+    async def test_engine_reports_slow_statements(self, schema):
+        connector = ExplainingConnector(delay=0.02)
+        handler = SlowQueryCallbackHandler(connector=connector, threshold_ms=10)
+        engine = QueryEngine(
+            schema, connector, metrics_collector=MetricsCollector(enabled=False), callbacks=[handler]
+        )
+
+        await engine.execute(Query(measures=["orders.count"], dimensions=["orders.status"]))
+        await handler.flush()
+
+        groups = handler.slow_query_log.group_by_fingerprint()
+        assert len(groups) == 1
+        assert groups[0]["cubes"] == ["orders"]
+        assert groups[0]["plan"] is not None
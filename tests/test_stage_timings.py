@@ -0,0 +1,96 @@
+"""Tests for per-stage query timings."""
+
+import asyncio
+
+import pytest
+
+from semantic_layer.models.cube import Cube
+from semantic_layer.models.dimension import Dimension
+from semantic_layer.models.measure import Measure
+from semantic_layer.models.schema import Schema
+from semantic_layer.monitoring import metrics
+from semantic_layer.monitoring.metrics import MetricsCollector
+from semantic_layer.monitoring.timings import StageTimings, collect_timings, current_timings, stage
+from semantic_layer.orchestrator import QueryEngine
+from semantic_layer.query.query import Query
+
+
+class DecodingConnector:
+    """Connector spending time in the database and in a decode stage."""
+
+    async def execute_query(self, sql, params=None):
+        await asyncio.sleep(0.01)
+        with stage("decode"):
+            return [{"orders_count": 1}]
+
+
+@pytest.fixture
+def schema():
+    orders = Cube(
+        name="orders",
+        table="orders",
+        dimensions={"status": Dimension(name="status", type="string", sql="status")},
+        measures={"count": Measure(name="count", type="count", sql="id")},
+    )
+    return Schema(cubes={"orders": orders})
+
+
+class TestStageTimings:
+    """Test stage accounting."""
+
+    def test_stages_outside_a_collection_are_not_recorded(self):
+        with stage("parse"):
+            pass
+        assert current_timings() is None
+
+    def test_nested_stage_is_subtracted_from_outer(self):
+        with collect_timings() as timings:
+            with stage("database"):
+                with stage("decode"):
+                    sum(range(1000000))
+
+        assert timings.get("decode") > 0
+        assert timings.get("database") < timings.get("decode")
+
+    def test_nested_collection_merges_into_parent(self):
+        with collect_timings() as outer:
+            with collect_timings() as inner:
+                inner.add("cache", 1.5)
+            other = StageTimings()
+            other.add("cache", 0.5)
+            outer.merge(other)
+
+        assert outer.get("cache") == 2.0
+
+    def test_server_timing_header(self):
+        timings = StageTimings()
+        timings.add("parse", 1.234)
+        timings.add("database", 10)
+
+        assert timings.server_timing() == "parse;dur=1.23, database;dur=10.00"
+
+
+class TestQueryEngineTimings:
+    """Test stages timed during execution."""
+
+    @pytest.mark.asyncio
+    async def test_query_stages_are_collected(self, schema):
+        engine = QueryEngine(schema, DecodingConnector(), metrics_collector=MetricsCollector(enabled=False))
+
+        with collect_timings() as timings:
+            await engine.execute(Query(measures=["orders.count"]))
+
+        stages = timings.to_dict()
+        for name in ("optimize", "compile", "queue", "database", "decode", "format"):
+            assert name in stages
+        assert stages["database"] >= 5
+
+    @pytest.mark.asyncio
+    async def test_stage_metrics_are_recorded(self, schema, monkeypatch):
+        monkeypatch.setattr(metrics, "PROMETHEUS_AVAILABLE", False)
+        collector = MetricsCollector()
+        engine = QueryEngine(schema, DecodingConnector(), metrics_collector=collector)
+
+        await engine.execute(Query(measures=["orders.count"]))
+
+        assert collector.get_stats()["stages"]["database"]["count"] == 1
@@ -0,0 +1,120 @@
+"""Tests for streaming latency histograms."""
+
+import random
+
+import pytest
+
+from semantic_layer.monitoring.histogram import LatencyHistogram, StreamingHistogram, WindowedHistogram
+from semantic_layer.monitoring import metrics
+from semantic_layer.monitoring.metrics import MetricsCollector
+
+
+class FakeClock:
+    """Clock advanced by hand."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestStreamingHistogram:
+    """Test percentile accuracy and memory."""
+
+    def test_percentiles_within_relative_accuracy(self):
+        rng = random.Random(7)
+        values = [rng.lognormvariate(3, 1) for _ in range(20000)]
+        histogram = StreamingHistogram(relative_accuracy=0.02)
+        for value in values:
+            histogram.record(value)
+
+        ordered = sorted(values)
+        for q in (0.5, 0.95, 0.99):
+            exact = ordered[int(q * (len(ordered) - 1))]
+            assert histogram.percentile(q) == pytest.approx(exact, rel=0.03)
+
+    def test_memory_does_not_grow_with_count(self):
+        histogram = StreamingHistogram()
+        for i in range(100000):
+            histogram.record(1 + i % 100)
+
+        assert histogram.count == 100000
+        assert len(histogram._buckets) < 150
+
+    def test_merge_and_empty(self):
+        first, second = StreamingHistogram(), StreamingHistogram()
+        assert first.percentile(0.99) == 0.0
+        first.record(1)
+        second.record(100)
+        first.merge(second)
+
+        assert first.count == 2
+        assert first.max == 100
+        assert first.percentile(1.0) == pytest.approx(100, rel=0.02)
+
+
+class TestWindowedHistogram:
+    """Test sliding windows."""
+
+    def test_old_values_age_out(self):
+        clock = FakeClock()
+        window = WindowedHistogram(60, slots=6, clock=clock)
+        window.record(500)
+        clock.now = 30
+        window.record(5)
+
+        assert window.snapshot().count == 2
+        clock.now = 65
+        assert window.snapshot().count == 1
+        assert window.snapshot().max == 5
+        clock.now = 200
+        assert window.snapshot().count == 0
+
+    def test_latency_summary_has_every_window(self):
+        latency = LatencyHistogram(clock=FakeClock())
+        latency.record(12)
+
+        summary = latency.summary()
+        assert set(summary) == {"1m", "5m", "1h", "all"}
+        assert summary["1m"]["count"] == 1
+
+
+class TestMetricsCollectorLatency:
+    """Test labelled latency in MetricsCollector."""
+
+    def test_collectors_can_be_created_twice(self):
+        MetricsCollector()
+        MetricsCollector()
+
+    def test_latency_by_label_set(self):
+        collector = MetricsCollector()
+        collector.record_query(5, cache_hit=True, cube="orders", tenant="a")
+        collector.record_query(80, cube="orders", pre_agg_used=True, tenant="a")
+        collector.record_query(40, cube="users", tenant="b")
+
+        stats = collector.get_stats()
+        assert stats["p99_execution_time_ms"] == pytest.approx(80, rel=0.02)
+        assert stats["latency_ms"]["5m"]["count"] == 3
+        series = {
+            (entry["cube"], entry["cache_hit"], entry["pre_agg_used"], entry["tenant"]): entry
+            for entry in stats["latency_ms_by_labels"]
+        }
+        assert series[("orders", "true", "false", "a")]["all"]["count"] == 1
+        assert series[("orders", "false", "true", "a")]["1m"]["p50"] == pytest.approx(80, rel=0.02)
+
+    def test_label_sets_beyond_the_limit_are_folded_in_prometheus_too(self, monkeypatch):
+        monkeypatch.setattr(metrics, "MAX_LATENCY_SERIES", 3)
+        collector = MetricsCollector()
+        for tenant in range(10):
+            collector.record_query(5, cube="folded_cube", tenant=f"t{tenant}")
+
+        exported = {
+            tuple(sample.labels[label] for label in metrics.LATENCY_LABELS)
+            for family in collector.query_duration.collect()
+            for sample in family.samples
+            if sample.labels.get("cube") in ("folded_cube", metrics.OVERFLOW_LABEL)
+        }
+        assert len(collector.get_stats()["latency_ms_by_labels"]) == 4
+        assert len(exported) == 4
+        assert (metrics.OVERFLOW_LABEL,) * 4 in exported
@@ -0,0 +1,125 @@
+"""Tests for subtotals and grand totals."""
+
+import pytest
+
+from semantic_layer.exceptions import QueryError
+from semantic_layer.models.cube import Cube
+from semantic_layer.models.dimension import Dimension
+from semantic_layer.models.measure import Measure
+from semantic_layer.models.schema import Schema
+from semantic_layer.monitoring.metrics import MetricsCollector
+from semantic_layer.orchestrator import QueryEngine
+from semantic_layer.query.parser import QueryParser
+from semantic_layer.query.query import Query, QueryOrderBy, QueryTimeDimension
+from semantic_layer.sql.builder import SQLBuilder
+
+
+class FakeConnector:
+    """Connector recording SQL and returning canned rows."""
+
+    def __init__(self, rows=()):
+        self.rows = rows
+        self.queries = []
+
+    async def execute_query(self, sql, params=None):
+        self.queries.append(sql)
+        return [dict(row) for row in self.rows]
+
+
+@pytest.fixture
+def schema():
+    orders = Cube(
+        name="orders",
+        table="orders",
+        dimensions={
+            "status": Dimension(name="status", type="string", sql="status"),
+            "region": Dimension(name="region", type="string", sql="region"),
+            "created_at": Dimension(name="created_at", type="time", sql="created_at"),
+        },
+        measures={
+            "count": Measure(name="count", type="count", sql="id"),
+            "revenue_7d": Measure(name="revenue_7d", type="sum", sql="amount", rolling_window={"trailing": "7 day"}),
+        },
+    )
+    return Schema(cubes={"orders": orders})
+
+
+class TestGroupingSets:
+    """Test resolving totals and subtotals to grouping sets."""
+
+    def test_totals_add_the_empty_set(self):
+        query = Query(dimensions=["orders.status", "orders.region"], measures=["orders.count"], totals=True)
+
+        assert query.get_grouping_sets() == [["orders.status", "orders.region"], []]
+
+    def test_subtotals_roll_up_prefixes(self):
+        query = Query(dimensions=["orders.region", "orders.status"], measures=["orders.count"], subtotals=True)
+
+        assert query.get_grouping_sets() == [["orders.region", "orders.status"], ["orders.region"], []]
+        assert Query(measures=["orders.count"]).get_grouping_sets() is None
+
+    def test_parser_reads_flags(self):
+        query = QueryParser.parse({"measures": ["orders.count"], "dimensions": ["orders.status"], "totals": True})
+
+        assert query.totals is True and query.subtotals is False
+
+
+class TestSQL:
+    """Test compiling totals into one statement."""
+
+    def test_totals_use_grouping_sets(self, schema):
+        sql = SQLBuilder(schema).build(
+            Query(dimensions=["orders.status"], measures=["orders.count"], totals=True)
+        )
+
+        assert "GROUP BY GROUPING SETS ((t0.status), ())" in sql
+        assert "CASE GROUPING(t0.status) WHEN 0 THEN 0 WHEN 1 THEN 1 END AS _grouping_set" in sql
+        assert sql.endswith("ORDER BY _grouping_set")
+
+    def test_paging_applies_to_detail_rows_only(self, schema):
+        sql = SQLBuilder(schema).build(Query(
+            dimensions=["orders.status"],
+            measures=["orders.count"],
+            order_by=[QueryOrderBy(dimension="orders.count", direction="desc")],
+            limit=10,
+            offset=20,
+            totals=True,
+        ))
+
+        assert "ORDER BY COUNT(t0.id) DESC) AS _grouping_row" in sql
+        assert "WHERE _grouping_set <> 0 OR _grouping_row BETWEEN 21 AND 30" in sql
+        assert sql.startswith("SELECT orders_status, orders_count, _grouping_set FROM (")
+
+    def test_rolling_windows_reject_totals(self, schema):
+        query = Query(
+            measures=["orders.revenue_7d"],
+            time_dimensions=[QueryTimeDimension(
+                dimension="orders.created_at", granularity="day", date_range=["2024-01-01", "2024-01-31"]
+            )],
+            totals=True,
+        )
+        with pytest.raises(QueryError):
+            SQLBuilder(schema).build(query)
+
+
+class TestEngine:
+    """Test returning detail and total rows from one execution."""
+
+    @pytest.mark.asyncio
+    async def test_total_rows_are_labelled(self, schema):
+        connector = FakeConnector([
+            {"orders_region": "eu", "orders_status": "paid", "orders_count": 2, "_grouping_set": 0},
+            {"orders_region": "eu", "orders_status": None, "orders_count": 3, "_grouping_set": 1},
+            {"orders_region": None, "orders_status": None, "orders_count": 7, "_grouping_set": 2},
+        ])
+        engine = QueryEngine(schema, connector, metrics_collector=MetricsCollector(enabled=False))
+
+        result = await engine.execute(Query(
+            dimensions=["orders.region", "orders.status"], measures=["orders.count"], subtotals=True, totals=True
+        ))
+
+        assert len(connector.queries) == 1
+        assert result["data"] == [{"orders_region": "eu", "orders_status": "paid", "orders_count": 2}]
+        assert result["meta"]["row_count"] == 1
+        assert [row["_totalOf"] for row in result["totals"]] == [["orders.region"], []]
+        assert result["totals"][1]["orders_count"] == 7
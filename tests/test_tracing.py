@@ -0,0 +1,264 @@
+"""Tests for query tracing."""
+
+import asyncio
+import json
+
+import pytest
+
+from semantic_layer.exceptions import ConfigurationError
+from semantic_layer.models.cube import Cube
+from semantic_layer.models.dimension import Dimension
+from semantic_layer.models.measure import Measure
+from semantic_layer.models.schema import Schema
+from semantic_layer.monitoring.metrics import MetricsCollector
+from semantic_layer.monitoring.timings import stage
+from semantic_layer.monitoring.tracing import (
+    STATUS_ERROR,
+    BatchSpanProcessor,
+    FileSpanExporter,
+    InMemorySpanExporter,
+    SpanExporter,
+    TraceContext,
+    Tracer,
+    create_exporter,
+    current_span,
+    otlp_payload,
+    sql_hash,
+    trace_span,
+)
+from semantic_layer.orchestrator import QueryEngine
+from semantic_layer.query.query import Query
+
+
+class DecodingConnector:
+    """Connector with a decode stage."""
+
+    async def execute_query(self, sql, params=None):
+        with stage("decode"):
+            return [{"orders_count": 1}, {"orders_count": 2}]
+
+
+@pytest.fixture
+def schema():
+    orders = Cube(
+        name="orders",
+        table="orders",
+        dimensions={"status": Dimension(name="status", type="string", sql="status")},
+        measures={"count": Measure(name="count", type="count", sql="id")},
+    )
+    return Schema(cubes={"orders": orders})
+
+
+@pytest.fixture
+def exporter():
+    return InMemorySpanExporter()
+
+
+@pytest.fixture
+def tracer(exporter):
+    return Tracer(BatchSpanProcessor(exporter))
+
+
+class TestTraceContext:
+    """Test W3C traceparent handling."""
+
+    def test_parses_traceparent(self):
+        context = TraceContext.from_headers(
+            {"traceparent": "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"}
+        )
+
+        assert context.trace_id == "4bf92f3577b34da6a3ce929d0e0e4736"
+        assert context.span_id == "00f067aa0ba902b7"
+        assert context.sampled is True
+        assert context.to_traceparent() == "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+    @pytest.mark.parametrize("header", [
+        "",
+        "garbage",
+        "00-00000000000000000000000000000000-00f067aa0ba902b7-01",
+        "ff-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01",
+    ])
+    def test_rejects_invalid_traceparent(self, header):
+        assert TraceContext.from_headers({"traceparent": header}) is None
+
+
+class TestTracer:
+    """Test span creation and export."""
+
+    @pytest.mark.asyncio
+    async def test_child_spans_share_the_trace(self, tracer, exporter):
+        with tracer.start_span("request") as root:
+            with trace_span("parse") as child:
+                assert current_span() is child
+        await tracer.processor.flush()
+
+        assert [span.name for span in exporter.spans] == ["parse", "request"]
+        assert child.trace_id == root.trace_id
+        assert child.parent_span_id == root.span_id
+        assert current_span() is None
+
+    @pytest.mark.asyncio
+    async def test_continues_incoming_trace(self, tracer, exporter):
+        context = TraceContext("4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7")
+        with tracer.start_span("request", context=context) as span:
+            pass
+
+        assert span.trace_id == context.trace_id
+        assert span.parent_span_id == context.span_id
+
+    def test_unsampled_trace_records_nothing(self, tracer):
+        context = TraceContext("4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7", sampled=False)
+        with tracer.start_span("request", context=context) as span:
+            with trace_span("parse") as child:
+                pass
+
+        assert span is None and child is None
+        assert tracer.processor.get_stats()["pending"] == 0
+
+    def test_unsampled_trace_starts_no_new_root(self, tracer):
+        context = TraceContext("4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7", sampled=False)
+        with tracer.start_span("request", context=context):
+            with trace_span("query", tracer) as span:
+                pass
+        with trace_span("query", tracer) as after:
+            pass
+
+        assert span is None
+        assert after is not None and after.parent_span_id is None
+
+    def test_failed_span_has_error_status(self, tracer):
+        with pytest.raises(ValueError):
+            with tracer.start_span("request") as span:
+                raise ValueError("boom")
+
+        assert span.status_code == STATUS_ERROR
+        assert "boom" in span.status_message
+
+    def test_default_tracer_keeps_spans_in_memory(self):
+        tracer = Tracer()
+        span = tracer.start_trace("test")
+        trace = tracer.end_trace(span, {"rows": 1})
+
+        assert trace["traceId"] == span.trace_id
+        assert isinstance(tracer.processor.exporter, InMemorySpanExporter)
+        assert tracer.processor.get_stats()["pending"] == 1
+
+    def test_no_span_without_tracer(self):
+        with trace_span("query") as span:
+            assert span is None
+
+    def test_full_queue_drops_oldest(self, exporter):
+        tracer = Tracer(BatchSpanProcessor(exporter, max_queue_size=2))
+        for name in ("a", "b", "c"):
+            with tracer.start_span(name):
+                pass
+
+        assert [span.name for span in tracer.processor._queue] == ["b", "c"]
+        assert tracer.processor.get_stats()["dropped"] == 1
+
+    @pytest.mark.asyncio
+    async def test_background_export(self, exporter):
+        tracer = Tracer(BatchSpanProcessor(exporter, schedule_delay=0.05))
+        tracer.processor.start()
+        with tracer.start_span("request"):
+            pass
+        await asyncio.sleep(0.2)
+        await tracer.processor.stop()
+
+        assert len(exporter.spans) == 1
+
+
+class TestExporters:
+    """Test span serialization and exporters."""
+
+    def test_otlp_payload(self, tracer):
+        with tracer.start_span("query", attributes={"rows": 3, "cubes": ["orders"], "cached": False}) as span:
+            pass
+
+        payload = otlp_payload([span], "svc")
+        resource_spans = payload["resourceSpans"][0]
+        otlp_span = resource_spans["scopeSpans"][0]["spans"][0]
+        attributes = {a["key"]: a["value"] for a in otlp_span["attributes"]}
+
+        assert resource_spans["resource"]["attributes"][0]["value"] == {"stringValue": "svc"}
+        assert otlp_span["traceId"] == span.trace_id
+        assert attributes["rows"] == {"intValue": "3"}
+        assert attributes["cached"] == {"boolValue": False}
+        assert attributes["cubes"] == {"arrayValue": {"values": [{"stringValue": "orders"}]}}
+        assert int(otlp_span["endTimeUnixNano"]) >= int(otlp_span["startTimeUnixNano"])
+
+    @pytest.mark.asyncio
+    async def test_file_exporter_appends_jsonl(self, tmp_path):
+        path = tmp_path / "spans.jsonl"
+        tracer = Tracer(BatchSpanProcessor(FileSpanExporter(path)))
+        with tracer.start_span("request"):
+            with trace_span("parse"):
+                pass
+        await tracer.processor.stop()
+
+        spans = [json.loads(line) for line in path.read_text().splitlines()]
+        assert [span["name"] for span in spans] == ["parse", "request"]
+
+    def test_exporters_must_implement_export(self):
+        with pytest.raises(TypeError):
+            SpanExporter()
+
+    def test_create_exporter(self, tmp_path):
+        assert isinstance(create_exporter("memory"), InMemorySpanExporter)
+        assert isinstance(create_exporter("file", file_path=str(tmp_path / "s.jsonl")), FileSpanExporter)
+        with pytest.raises(ConfigurationError):
+            create_exporter("file")
+        with pytest.raises(ConfigurationError):
+            create_exporter("zipkin")
+
+
+class TestQueryEngineTracing:
+    """Test spans recorded during execution."""
+
+    @pytest.mark.asyncio
+    async def test_query_is_traced_by_stage(self, schema, tracer, exporter):
+        engine = QueryEngine(
+            schema, DecodingConnector(), metrics_collector=MetricsCollector(enabled=False), tracer=tracer
+        )
+
+        result = await engine.execute(Query(measures=["orders.count"]))
+        await tracer.processor.flush()
+
+        spans = {span.name: span for span in exporter.spans}
+        for name in ("query", "optimize", "compile", "database", "decode", "format"):
+            assert name in spans
+        query_span = spans["query"]
+        assert spans["database"].parent_span_id == query_span.span_id
+        assert spans["decode"].parent_span_id == spans["database"].span_id
+        assert query_span.attributes["semanticquark.cubes"] == ["orders"]
+        assert query_span.attributes["semanticquark.row_count"] == 2
+        assert query_span.attributes["semanticquark.pre_aggregation_used"] is False
+        assert query_span.attributes["semanticquark.sql_hash"] == sql_hash(result["meta"]["sql"])
+
+    @pytest.mark.asyncio
+    async def test_query_joins_the_current_trace(self, schema, tracer, exporter):
+        engine = QueryEngine(schema, DecodingConnector(), metrics_collector=MetricsCollector(enabled=False))
+
+        with tracer.start_span("POST /api/v1/query") as request_span:
+            await engine.execute(Query(measures=["orders.count"]))
+        await tracer.processor.flush()
+
+        query_span = next(span for span in exporter.spans if span.name == "query")
+        assert query_span.parent_span_id == request_span.span_id
+        assert {span.trace_id for span in exporter.spans} == {request_span.trace_id}
+
+    @pytest.mark.asyncio
+    async def test_unsampled_request_exports_no_query_spans(self, schema, tracer, exporter):
+        engine = QueryEngine(
+            schema,
+            DecodingConnector(),
+            metrics_collector=MetricsCollector(enabled=False),
+            tracer=tracer,
+        )
+        context = TraceContext("4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7", sampled=False)
+
+        with tracer.start_span("POST /api/v1/query", context=context):
+            await engine.execute(Query(measures=["orders.count"]))
+        await tracer.processor.flush()
+
+        assert exporter.spans == []